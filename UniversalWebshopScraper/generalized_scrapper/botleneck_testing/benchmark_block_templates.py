@@ -0,0 +1,93 @@
+import argparse
+import time
+
+from UniversalWebshopScraper.generalized_scrapper.core.generalized_scrapper import GeneralizedScraper
+from UniversalWebshopScraper.generalized_scrapper.core.block_templates import template_domain
+from UniversalWebshopScraper.generalized_scrapper.botleneck_testing.synthetic_pages import synthetic_listing_page
+
+"""
+Compare the extraction time of the following pages of a query with and without the learned block template.
+
+The first page is detected with the full heuristic (and teaches the template), every following page is then detected
+with the template, with the single-pass full heuristic and with the per-block legacy heuristic, each on its own
+scraper.
+
+Real listing pages wrap the results in navigation menus, recommendations and footers. --menu-columns adds a mega
+menu of that many columns of category links before the results: the full heuristics walk and score all of it, the
+template path only extracts the product blocks. With --menu-columns 0 the page is almost only product cards and the
+template path saves nothing over the single-pass heuristic.
+
+Usage:
+    PYTHONPATH=. python UniversalWebshopScraper/generalized_scrapper/botleneck_testing/benchmark_block_templates.py
+"""
+
+
+def menu_markup(columns, links_per_column=8):
+    parts = ['<nav class="mega-menu">']
+    for column in range(columns):
+        links = "".join(f'<li><a href="/c/{column}/{i}">Category {column}-{i} deals</a></li>'
+                        for i in range(links_per_column))
+        parts.append(f'<div class="menu-col"><h3>Department {column}</h3><ul>{links}</ul></div>')
+    parts.append('</nav>')
+    return "".join(parts)
+
+
+def make_scraper(base_url):
+    scraper = GeneralizedScraper(shopping_website=base_url, offline_mode=True)
+    scraper.detected_image_urls = set()  # Same list type the turbo workers share
+    return scraper
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark block template detection.")
+    parser.add_argument("--pages", type=int, default=5, help="Number of pages of the query")
+    parser.add_argument("--products", type=int, default=60, help="Products per page")
+    parser.add_argument("--menu-columns", type=int, default=200, help="Columns of the navigation menu of the pages")
+    parser.add_argument("--base-url", default="https://www.example.com", help="Home URL of the shop")
+    args = parser.parse_args()
+
+    templated = make_scraper(args.base_url)
+    full = make_scraper(args.base_url)
+    legacy = make_scraper(args.base_url)
+    template_time = full_time = legacy_time = 0
+
+    for page_number in range(args.pages):
+        html = synthetic_listing_page(args.products, seed=page_number, first_product=args.products * page_number)
+        html = html.replace('<ul class="results">', menu_markup(args.menu_columns) + '<ul class="results">', 1)
+        soup = templated.parse_html(html)
+        if page_number == 0:
+            templated.trash_detection(soup)
+            full.wrong_titles = set(templated.wrong_titles)
+            legacy.wrong_titles = set(templated.wrong_titles)
+
+        start = time.perf_counter()
+        templated.detect_page_products(soup)
+        elapsed_template = time.perf_counter() - start
+
+        start = time.perf_counter()
+        full.detect_product_blocks(soup)
+        elapsed_full = time.perf_counter() - start
+
+        start = time.perf_counter()
+        legacy.detect_product_blocks_legacy(soup)
+        elapsed_legacy = time.perf_counter() - start
+
+        # Marks are per page (scrape_all_products clears them after every page)
+        templated.marked_blocks.clear()
+        full.marked_blocks.clear()
+        legacy.marked_blocks.clear()
+
+        if page_number > 0:
+            template_time += elapsed_template
+            full_time += elapsed_full
+            legacy_time += elapsed_legacy
+
+    same_output = templated.stored_products == full.stored_products == legacy.stored_products
+    same = "same output" if same_output else "DIFFERENT OUTPUT"
+    print(f"Template: {templated.template_cache.get(template_domain(args.base_url))}")
+    print(f"Pages 2-{args.pages}: legacy heuristic {legacy_time:.3f}s, single-pass heuristic {full_time:.3f}s, "
+          f"block template {template_time:.3f}s ({same})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import pandas as pd
+
+from UniversalWebshopScraper.generalized_scrapper.core.dataset_writer import convert_csv_tree, load_dataset, parse_price
+
+"""
+Compare the CSV tree of save_to_csv with the Parquet dataset of ProductDatasetWriter: size on disk and load time.
+
+    csv         Read every <shop>/<category>/<query>.csv and parse the prices, what the downstream loads do now.
+    dataset     pd DataFrame of the whole Parquet dataset (typed prices, list columns), see load_dataset.
+    one shop    Only the partitions of one shop from the dataset.
+
+The CSV tree is generated with the columns and value shapes of store_product (needs pyarrow).
+
+Usage:
+    PYTHONPATH=. python UniversalWebshopScraper/generalized_scrapper/botleneck_testing/benchmark_dataset_writer.py
+"""
+
+CURRENCIES = ["$", "zł", "€", "USD"]
+
+
+def synthetic_product(rng, shop, i):
+    links = [f"https://www.{shop}.test/item/{i}?variant={v}" for v in range(rng.randint(1, 4))]
+    images = [f"https://img.{shop}.test/{i}/{v}.jpg" for v in range(rng.randint(1, 6))]
+    return {
+        "Website": f"https://www.{shop}.test",
+        "Product URL": links[0],
+        "Image URL": images[0],
+        "Price": f"{rng.randint(1, 5000):,}.{rng.randint(0, 99):02d}",
+        "Currency": rng.choice(CURRENCIES),
+        "Title": f"Product {i} " + " ".join(rng.choice(["wireless", "black", "pro", "2024", "set"]) for _ in range(6)),
+        "All Links": "|".join(links),
+        "All Images": "|".join(images),
+    }
+
+
+def write_csv_tree(root, shops, categories, queries, rows, seed=0):
+    rng = random.Random(seed)
+    product = 0
+    for shop in shops:
+        for category in range(categories):
+            directory = os.path.join(root, shop, f"category_{category}")
+            os.makedirs(directory, exist_ok=True)
+            for query in range(queries):
+                products = [synthetic_product(rng, shop, product + i) for i in range(rows)]
+                product += rows
+                pd.DataFrame(products).to_csv(os.path.join(directory, f"query {query}.csv"), index=False)
+
+
+def tree_size_mb(root):
+    return sum(os.path.getsize(os.path.join(path, name)) for path, _, names in os.walk(root) for name in names) / 1e6
+
+
+def load_csv_tree(root):
+    frames = []
+    for path, _, names in os.walk(root):
+        for name in names:
+            if name.endswith(".csv"):
+                frames.append(pd.read_csv(os.path.join(path, name)))
+    products = pd.concat(frames, ignore_index=True)
+    products["Price"] = products["Price"].map(parse_price)
+    return products
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Parquet product dataset against the CSV tree.")
+    parser.add_argument("--shops", type=int, default=4, help="Number of shops")
+    parser.add_argument("--categories", type=int, default=10, help="Categories per shop")
+    parser.add_argument("--queries", type=int, default=50, help="Searches (CSV files) per category")
+    parser.add_argument("--rows", type=int, default=60, help="Products per search")
+    args = parser.parse_args()
+
+    shops = [f"shop{i}" for i in range(args.shops)]
+    work_dir = tempfile.mkdtemp(prefix="dataset_benchmark_")
+    csv_root, dataset_root = os.path.join(work_dir, "csv"), os.path.join(work_dir, "dataset")
+    try:
+        write_csv_tree(csv_root, shops, args.categories, args.queries, args.rows)
+        rows, convert_seconds = timed(convert_csv_tree, csv_root, dataset_root)
+        csv_products, csv_seconds = timed(load_csv_tree, csv_root)
+        dataset_products, dataset_seconds = timed(load_dataset, dataset_root)
+        shop_products, shop_seconds = timed(load_dataset, dataset_root, shops=shops[:1])
+        assert len(csv_products) == len(dataset_products) == rows
+
+        print(f"\n{rows} products, {args.shops * args.categories * args.queries} CSV files "
+              f"(converted in {convert_seconds:.1f}s)")
+        print(f"{'':<12}{'size MB':>10}{'load s':>10}{'rows':>10}")
+        print(f"{'csv':<12}{tree_size_mb(csv_root):>10.1f}{csv_seconds:>10.2f}{len(csv_products):>10}")
+        print(f"{'dataset':<12}{tree_size_mb(dataset_root):>10.1f}{dataset_seconds:>10.2f}{len(dataset_products):>10}")
+        print(f"{'one shop':<12}{'':>10}{shop_seconds:>10.2f}{len(shop_products):>10}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import argparse
+import tracemalloc
+from collections import deque
+
+from UniversalWebshopScraper.generalized_scrapper.core.generalized_scrapper import PARENT_BLOCKS_LIMIT
+from UniversalWebshopScraper.generalized_scrapper.core.url_dedup import FingerprintSet
+
+"""
+Follow the memory of a worker's dedup state over a long run.
+
+    unbounded   A set of product URLs, a set of image URLs and a list of parent blocks, what a scraper kept before.
+    bounded     FingerprintSets with LRU eviction under a memory ceiling and a capped deque of parent blocks.
+
+Every search brings new products (two links and three images each). The unbounded state grows with every search,
+the bounded one stops growing once its tables are allocated, whatever the length of the run.
+
+Usage:
+    PYTHONPATH=. python UniversalWebshopScraper/generalized_scrapper/botleneck_testing/benchmark_dedup_memory.py
+"""
+
+
+def search_urls(search, products):
+    for i in range(search * products, (search + 1) * products):
+        links = [f"https://www.aliexpress.com/item/100500{i:09d}.html", f"https://www.aliexpress.com/i/{i}.html"]
+        images = [f"https://ae01.alicdn.com/kf/S{i:010d}abcdef{v}.jpg_480x480.jpg" for v in range(3)]
+        yield links, images, f'<div class="search-item-card-wrapper-gallery" data-id="{i}">'
+
+
+def run(make_state, searches, products, report_every):
+    tracemalloc.start()
+    detected_products, detected_image_urls, parent_blocks = make_state()
+    memory = []
+    for search in range(searches):
+        for links, images, block in search_urls(search, products):
+            for url in links:
+                detected_products.add(url)
+            for url in images:
+                if url not in detected_image_urls:
+                    detected_image_urls.add(url)
+            parent_blocks.append(block)
+        if (search + 1) % report_every == 0:
+            memory.append(tracemalloc.get_traced_memory()[0])
+    tracemalloc.stop()
+    return memory
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the memory of the dedup state over many searches.")
+    parser.add_argument("--searches", type=int, default=60, help="Searches of the run")
+    parser.add_argument("--products", type=int, default=2000, help="New products per search")
+    parser.add_argument("--max-mb", type=float, default=8, help="Memory ceiling of each bounded URL set")
+    parser.add_argument("--report-every", type=int, default=10, help="Searches between two reports")
+    args = parser.parse_args()
+
+    max_bytes = int(args.max_mb * 1024 * 1024)
+    modes = {
+        "unbounded": lambda: (set(), set(), []),
+        "bounded": lambda: (FingerprintSet(max_bytes=max_bytes, eviction="lru"),
+                            FingerprintSet(max_bytes=max_bytes, eviction="lru"), deque(maxlen=PARENT_BLOCKS_LIMIT)),
+    }
+    results = {mode: run(make_state, args.searches, args.products, args.report_every)
+               for mode, make_state in modes.items()}
+
+    print(f"\n{args.products} new products per search, MB traced after every {args.report_every} searches")
+    print(f"{'searches':>10}" + "".join(f"{mode:>12}" for mode in modes))
+    for index in range(len(results["bounded"])):
+        row = "".join(f"{results[mode][index] / 2 ** 20:>12.1f}" for mode in modes)
+        print(f"{(index + 1) * args.report_every:>10}{row}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import argparse
+import time
+
+from UniversalWebshopScraper.generalized_scrapper.core.generalized_scrapper import GeneralizedScraper
+from UniversalWebshopScraper.generalized_scrapper.core.http_fetch import DEFAULT_HEADERS, HttpFetcher
+from UniversalWebshopScraper.generalized_scrapper.core.rate_control import RateController
+from UniversalWebshopScraper.generalized_scrapper.botleneck_testing.listing_server import ListingServer
+
+"""
+Compare the pages per second of a search scraped over plain HTTP and in the browser, on a local shop.
+
+    http            fetch_mode="http" with the keep-alive connection pool.
+    http-no-pool    fetch_mode="http" opening a new connection for every page.
+    browser         fetch_mode="browser", Chrome renders every page (needs Chrome, enable with --browser).
+
+The rate controller is opened up so the fetching itself is measured.
+
+Usage:
+    PYTHONPATH=. python UniversalWebshopScraper/generalized_scrapper/botleneck_testing/benchmark_http_fetch.py
+"""
+
+
+def make_scraper(base_url, offline_mode=True, http_fetcher=None):
+    scraper = GeneralizedScraper(shopping_website=base_url, offline_mode=offline_mode, http_fetcher=http_fetcher,
+                                 rate_controller=RateController(initial_rate=1000, max_rate=1000, burst=1000))
+    scraper.detected_image_urls = set()  # Same list type the turbo workers share
+    return scraper
+
+
+def run(scraper, base_url, pages, fetch_mode):
+    start = time.perf_counter()
+    scraper.scrape_all_products(url_template=f"{base_url}/listing?p={{page_number}}", max_pages=pages,
+                                fetch_mode=fetch_mode)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark plain-HTTP fetching against the browser.")
+    parser.add_argument("--pages", type=int, default=30, help="Number of pages of the search")
+    parser.add_argument("--products", type=int, default=60, help="Products per page")
+    parser.add_argument("--latency", type=float, default=0.05, help="Server response time in seconds")
+    parser.add_argument("--browser", action="store_true", help="Also scrape the pages in Chrome")
+    args = parser.parse_args()
+
+    with ListingServer(n_products=args.products, latency=args.latency) as server:
+        base_url = server.base_url
+        results = {}
+
+        results["http"] = run(make_scraper(base_url, http_fetcher=HttpFetcher()), base_url, args.pages, "http")
+
+        no_pool = HttpFetcher(headers=dict(DEFAULT_HEADERS, Connection="close"))
+        results["http-no-pool"] = run(make_scraper(base_url, http_fetcher=no_pool), base_url, args.pages, "http")
+
+        if args.browser:
+            scraper = make_scraper(base_url, offline_mode=False)
+            try:
+                results["browser"] = run(scraper, base_url, args.pages, "browser")
+            finally:
+                scraper.close_driver()
+
+    print(f"\n{'mode':<14}{'seconds':>10}{'pages/s':>10}")
+    for mode, elapsed in results.items():
+        print(f"{mode:<14}{elapsed:>10.2f}{args.pages / elapsed:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
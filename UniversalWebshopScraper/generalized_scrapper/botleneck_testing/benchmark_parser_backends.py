@@ -0,0 +1,63 @@
+import argparse
+import time
+import tracemalloc
+
+from UniversalWebshopScraper.generalized_scrapper.core.parser_backends import PARSER_BACKENDS, HtmlParserBackend
+from UniversalWebshopScraper.generalized_scrapper.botleneck_testing.synthetic_pages import load_pages
+
+"""
+Report parse time and peak memory of every parser backend on recorded pages.
+
+The peak memory is measured with tracemalloc, it covers the Python objects of the tree (which is what a BeautifulSoup
+tree is made of) but not the parser's own C buffers.
+
+Usage:
+    PYTHONPATH=. python UniversalWebshopScraper/generalized_scrapper/botleneck_testing/benchmark_parser_backends.py \
+        --pages-dir ../Data/recorded_pages
+"""
+
+
+def measure(backend, html, repeat):
+    """
+    Parse the page repeat times with the backend.
+
+    Returns:
+        tuple: (best parse time in seconds, peak traced memory in MB, number of tags in the tree)
+    """
+    best_time = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        soup = backend.parse(html)
+        best_time = min(best_time, time.perf_counter() - start)
+        del soup
+
+    tracemalloc.start()
+    soup = backend.parse(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best_time, peak / 2 ** 20, len(soup.find_all(True))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the HTML parser backends.")
+    parser.add_argument("--pages-dir", help="Directory with recorded *.html pages (synthetic page if omitted)")
+    parser.add_argument("--products", type=int, default=1000, help="Products on the synthetic page")
+    parser.add_argument("--repeat", type=int, default=3, help="Parses per backend, the best time is reported")
+    args = parser.parse_args()
+
+    backends = [("html.parser (no pruning)", HtmlParserBackend(prune=False))]
+    backends += [(name, backend_class()) for name, backend_class in PARSER_BACKENDS.items()]
+
+    for name, html in load_pages(args.pages_dir, args.products):
+        print(f"{name} ({len(html) / 2 ** 20:.1f} MB of HTML)")
+        for backend_name, backend in backends:
+            try:
+                parse_time, peak_mb, n_tags = measure(backend, html, args.repeat)
+            except Exception as e:
+                print(f"  {backend_name:<26} unavailable: {e}")
+                continue
+            print(f"  {backend_name:<26} {parse_time * 1000:8.1f} ms  peak {peak_mb:7.1f} MB  {n_tags} tags")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import argparse
+import re
+import time
+
+from UniversalWebshopScraper.generalized_scrapper.core.generalized_scrapper import GeneralizedScraper
+from UniversalWebshopScraper.generalized_scrapper.core.rate_control import RateController
+from UniversalWebshopScraper.generalized_scrapper.core.parser_pool import ParserPool
+from UniversalWebshopScraper.generalized_scrapper.botleneck_testing.synthetic_pages import synthetic_listing_page
+
+"""
+Compare the wall time of a search scraped serially and with scrape_pages_pipelined.
+
+The browser is simulated: loading a page sleeps for --load seconds (the driver waits on Chrome without holding the
+GIL, like a real driver.get) and then shows a synthetic listing page. Serial scraping takes about load + parse per
+page, pipelined scraping about max(load, parse), with the parsing in a thread or in a parser pool (see parser_pool).
+
+Usage:
+    PYTHONPATH=. python UniversalWebshopScraper/generalized_scrapper/botleneck_testing/benchmark_pipeline.py
+"""
+
+
+class SimulatedDriver:
+    def __init__(self, n_products, load_seconds):
+        self.n_products = n_products
+        self.load_seconds = load_seconds
+        self.current_url = "https://shop.test/"
+        self.page_source = ""
+
+    def get(self, url):
+        time.sleep(self.load_seconds)
+        self.current_url = url
+        page = int(re.search(r"p=(\d+)", url).group(1))
+        self.page_source = synthetic_listing_page(self.n_products, seed=page,
+                                                  first_product=self.n_products * (page - 1))
+
+
+def run(args, pipelined, parser_pool=None):
+    scraper = GeneralizedScraper(shopping_website="https://shop.test", offline_mode=True,
+                                 rate_controller=RateController(initial_rate=1000, max_rate=1000, burst=1000))
+    scraper.driver = SimulatedDriver(args.products, args.load)
+    scraper.detected_image_urls = set()
+    start = time.perf_counter()
+    scraper.scrape_all_products(url_template="https://shop.test/s?p={page_number}", max_pages=args.pages,
+                                pipelined=pipelined, parser_pool=parser_pool)
+    return time.perf_counter() - start, scraper.product_count
+
+
+def parse_seconds(args):
+    # Parsing and detection alone, for the expected max(load, parse)
+    scraper = GeneralizedScraper(offline_mode=True)
+    scraper.detected_image_urls = set()
+    pages = [synthetic_listing_page(args.products, seed=page, first_product=args.products * (page - 1))
+             for page in range(1, args.pages + 1)]
+    start = time.perf_counter()
+    for page, html in enumerate(pages, start=1):
+        scraper.parse_page_products(html, page == 1, True)
+    return (time.perf_counter() - start) / args.pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipelined fetch/parse loop.")
+    parser.add_argument("--pages", type=int, default=10, help="Number of pages of the search")
+    parser.add_argument("--products", type=int, default=60, help="Products per page")
+    parser.add_argument("--load", type=float, default=0.15, help="Seconds the browser takes to load a page")
+    args = parser.parse_args()
+
+    parse = parse_seconds(args)
+    serial, serial_count = run(args, pipelined=False)
+    pipelined, pipelined_count = run(args, pipelined=True)
+    with ParserPool(n_processes=2) as pool:
+        pooled, pooled_count = run(args, pipelined=True, parser_pool=pool.client(0))
+    assert serial_count == pipelined_count == pooled_count
+
+    print(f"\nload {args.load * 1000:.0f} ms/page, parse {parse * 1000:.0f} ms/page, {args.pages} pages")
+    print(f"{'mode':<12}{'seconds':>10}{'ms/page':>10}")
+    print(f"{'serial':<12}{serial:>10.2f}{serial / args.pages * 1000:>10.0f}")
+    print(f"{'pipelined':<12}{pipelined:>10.2f}{pipelined / args.pages * 1000:>10.0f}")
+    print(f"{'pool':<12}{pooled:>10.2f}{pooled / args.pages * 1000:>10.0f}")
+    print(f"{'max(l, p)':<12}{max(args.load, parse) * args.pages:>10.2f}{max(args.load, parse) * 1000:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
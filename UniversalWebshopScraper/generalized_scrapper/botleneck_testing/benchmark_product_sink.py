@@ -0,0 +1,82 @@
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import pandas as pd
+
+from UniversalWebshopScraper.generalized_scrapper.core.product_sink import ProductSink, make_backend
+
+"""
+Compare the time the scraping loop spends writing products.
+
+    per-row     A one-row DataFrame and to_csv(mode='a') per product, what mock_db_generalized_scrapper did.
+    sink-csv    ProductSink with the CSV backend: put in the loop, batches written on the background thread.
+    sink-jsonl  ProductSink with the JSON Lines backend.
+
+"loop ms" is the time spent in the scraping loop (the overhead the scraper sees), "total ms" includes the final
+flush of the sink.
+
+Usage:
+    PYTHONPATH=. python UniversalWebshopScraper/generalized_scrapper/botleneck_testing/benchmark_product_sink.py
+"""
+
+
+def synthetic_product(i):
+    return {"Website": "https://www.shop.test", "Product URL": f"https://www.shop.test/item/{i}",
+            "Image URL": f"https://img.shop.test/{i}.jpg", "Price": f"{i % 5000}.99", "Currency": "$",
+            "Title": f"Product {i} wireless black pro", "All Links": f"https://www.shop.test/item/{i}",
+            "All Images": f"https://img.shop.test/{i}.jpg|https://img.shop.test/{i}-2.jpg"}
+
+
+def write_per_row(root, queries, products_per_query):
+    started = time.perf_counter()
+    for query in range(queries):
+        path = os.path.join(root, "shop", "category", f"query_{query}.csv")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        for i in range(products_per_query):
+            df = pd.DataFrame([synthetic_product(i)])
+            if not os.path.exists(path):
+                df.to_csv(path, index=False)
+            else:
+                df.to_csv(path, mode='a', header=False, index=False)
+    seconds = time.perf_counter() - started
+    return seconds, seconds
+
+
+def write_with_sink(root, queries, products_per_query, kind):
+    started = time.perf_counter()
+    sink = ProductSink(make_backend(kind, root))
+    for query in range(queries):
+        for i in range(products_per_query):
+            sink.put(("shop", "category", f"query_{query}"), synthetic_product(i))
+    loop_seconds = time.perf_counter() - started
+    sink.close()
+    return loop_seconds, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the product sink against per-row CSV appends.")
+    parser.add_argument("--queries", type=int, default=10, help="Searches (files)")
+    parser.add_argument("--products", type=int, default=300, help="Products per search")
+    args = parser.parse_args()
+
+    n_products = args.queries * args.products
+    print(f"\n{n_products} products in {args.queries} files")
+    print(f"{'mode':<12}{'loop ms':>10}{'total ms':>10}{'us/product':>12}")
+    for mode in ("per-row", "sink-csv", "sink-jsonl"):
+        root = tempfile.mkdtemp(prefix="sink_benchmark_")
+        try:
+            if mode == "per-row":
+                loop_seconds, total_seconds = write_per_row(root, args.queries, args.products)
+            else:
+                loop_seconds, total_seconds = write_with_sink(root, args.queries, args.products, mode[len("sink-"):])
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+        print(f"{mode:<12}{loop_seconds * 1e3:>10.1f}{total_seconds * 1e3:>10.1f}"
+              f"{loop_seconds / n_products * 1e6:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+from UniversalWebshopScraper.generalized_scrapper.core.product_store import ProductStore
+
+"""
+Compare the memory of the stored products and the time to convert them at save time.
+
+    dicts   A list of product dicts, what stored_products was.
+    store   ProductStore: flat text buffer, integer references and interned website, price and currency.
+
+The products look like AliExpress ones: two links and three images per product, the first of each is the product
+and image URL. "B/product" is the memory traced while storing them, "DataFrame ms" the time to build a DataFrame of
+them, "CSV ms" the time of what save_to_csv does (DataFrame.to_csv for the dicts, ProductStore.to_csv for the store,
+through Arrow when pyarrow is installed) and "Arrow ms" the one of ProductStore.to_arrow (skipped without pyarrow).
+
+Usage:
+    PYTHONPATH=. python UniversalWebshopScraper/generalized_scrapper/botleneck_testing/benchmark_product_store.py
+"""
+
+
+def synthetic_product(i):
+    # Built from new strings for every product, like the scraper does
+    links = [f"https://www.aliexpress.com/item/100500{i:07d}.html?spm=a2g0o.productlist.main.{v}" for v in range(2)]
+    images = [f"https://ae01.alicdn.com/kf/S{i:010d}abcdef{v}.jpg_480x480.jpg" for v in range(3)]
+    return {"Website": "https://www.aliexpress.com", "Product URL": links[0], "Image URL": images[0],
+            "Price": f"{i % 300}.99", "Currency": "US $"[-1:], "Title": f"Wireless Bluetooth Headphones model {i}",
+            "All Links": "|".join(links), "All Images": "|".join(images)}
+
+
+def measure(build, n_products):
+    tracemalloc.start()
+    products = build(synthetic_product(i) for i in range(n_products))
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    if isinstance(products, ProductStore):
+        products.to_dataframe()
+    else:
+        pd.DataFrame(products)
+    dataframe_seconds = time.perf_counter() - started
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "products.csv")
+        started = time.perf_counter()
+        if isinstance(products, ProductStore):
+            products.to_csv(path)
+        else:
+            pd.DataFrame(products).to_csv(path, index=False)
+        csv_seconds = time.perf_counter() - started
+
+    arrow_seconds = None
+    if isinstance(products, ProductStore):
+        try:
+            started = time.perf_counter()
+            products.to_arrow()
+            arrow_seconds = time.perf_counter() - started
+        except ImportError:
+            pass
+    return memory, dataframe_seconds, csv_seconds, arrow_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the memory of ProductStore against a list of dicts.")
+    parser.add_argument("--products", type=int, default=50000, help="Products stored")
+    args = parser.parse_args()
+
+    print(f"\n{args.products} products")
+    print(f"{'mode':<8}{'B/product':>12}{'DataFrame ms':>14}{'CSV ms':>10}{'Arrow ms':>10}")
+    for mode, build in (("dicts", list), ("store", ProductStore)):
+        memory, dataframe_seconds, csv_seconds, arrow_seconds = measure(build, args.products)
+        arrow = f"{arrow_seconds * 1e3:>10.1f}" if arrow_seconds is not None else f"{'-':>10}"
+        print(f"{mode:<8}{memory / args.products:>12.1f}{dataframe_seconds * 1e3:>14.1f}{csv_seconds * 1e3:>10.1f}"
+              f"{arrow}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import argparse
+import threading
+import time
+
+from UniversalWebshopScraper.generalized_scrapper.core.shop_scheduler import ShopScheduler
+
+"""
+Compare the completion time of a multi-shop run with workers split between the shops and with one ShopScheduler.
+
+    per-shop    Every shop gets n_workers / n_shops workers of its own, like one process group per shop.
+    scheduler   All workers share one ShopScheduler, within the shops' concurrency limits.
+    ideal       Total work divided by the workers, or the work of the shop most limited by its concurrency.
+
+Searches are simulated by sleeping for the shop's search time, the workers are threads.
+
+Usage:
+    PYTHONPATH=. python UniversalWebshopScraper/generalized_scrapper/botleneck_testing/benchmark_shop_scheduler.py
+"""
+
+# Shop -> (searches, seconds per search)
+DEFAULT_SHOPS = {"aliexpress": (24, 0.2), "temu": (6, 0.4), "ebay": (6, 0.2), "amazon": (4, 0.3)}
+
+
+def run_workers(scheduler, worker_indexes, shops):
+    def work(worker_index):
+        while True:
+            result = scheduler.wait_for_task(worker_index)
+            if result is None:
+                return
+            shop, _ = result[0]
+            time.sleep(shops[shop][1])
+            scheduler.task_done(worker_index)
+
+    threads = [threading.Thread(target=work, args=(worker_index,)) for worker_index in worker_indexes]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def simulate(shops, n_workers, concurrency, shared=True):
+    """
+    Run the simulated searches of the shops.
+
+    Args:
+        shops (dict): Shop -> (searches, seconds per search).
+        n_workers (int): Number of workers.
+        concurrency (int): Concurrency limit of every shop.
+        shared (bool, optional): One scheduler for all workers, or the workers split between the shops.
+
+    Returns:
+        float: Seconds until every search is done.
+    """
+    groups = {(shop, "all"): [(shop, i) for i in range(searches)] for shop, (searches, _) in shops.items()}
+    start = time.perf_counter()
+    threads = []
+    if shared:
+        scheduler = ShopScheduler(list(shops), n_workers, concurrency={shop: concurrency for shop in shops})
+        scheduler.assign(groups)
+        threads += run_workers(scheduler, range(n_workers), shops)
+    else:
+        per_shop = max(1, n_workers // len(shops))
+        for shop in shops:
+            scheduler = ShopScheduler([shop], per_shop, concurrency={shop: concurrency})
+            scheduler.assign({key: tasks for key, tasks in groups.items() if key[0] == shop})
+            threads += run_workers(scheduler, range(per_shop), shops)
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def ideal_seconds(shops, n_workers, concurrency):
+    total = sum(searches * seconds for searches, seconds in shops.values())
+    limited = max(searches * seconds / min(concurrency, n_workers) for searches, seconds in shops.values())
+    return max(total / n_workers, limited)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the multi-shop scheduler.")
+    parser.add_argument("--workers", type=int, default=8, help="Number of browser workers")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrency limit of every shop")
+    args = parser.parse_args()
+
+    per_shop = simulate(DEFAULT_SHOPS, args.workers, args.concurrency, shared=False)
+    scheduler = simulate(DEFAULT_SHOPS, args.workers, args.concurrency, shared=True)
+    ideal = ideal_seconds(DEFAULT_SHOPS, args.workers, args.concurrency)
+
+    print(f"\n{len(DEFAULT_SHOPS)} shops, {args.workers} workers, concurrency {args.concurrency} per shop")
+    print(f"{'mode':<12}{'seconds':>10}")
+    print(f"{'per-shop':<12}{per_shop:>10.2f}")
+    print(f"{'scheduler':<12}{scheduler:>10.2f}")
+    print(f"{'ideal':<12}{ideal:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import argparse
+import time
+from multiprocessing import Manager
+
+from UniversalWebshopScraper.generalized_scrapper.core.url_dedup import SharedFingerprintSet
+
+"""
+Compare the cost of `url in detected_image_urls` as the number of known URLs grows.
+
+    manager-list    Manager list proxy, what the turbo workers shared before (IPC + linear scan).
+    list            Plain list in the process.
+    shared-set      SharedFingerprintSet in shared memory (no IPC, hash lookup).
+
+Half of the lookups hit a known URL, half miss.
+
+Usage:
+    PYTHONPATH=. python UniversalWebshopScraper/generalized_scrapper/botleneck_testing/benchmark_url_dedup.py
+"""
+
+
+def image_url(i):
+    return f"https://images.shop.test/thumbs/{i:08d}/product-image-{i}.jpg?w=300"
+
+
+def lookup_microseconds(urls, size, lookups):
+    queries = [image_url(i * 7919 % size if i % 2 else size + i) for i in range(lookups)]
+    start = time.perf_counter()
+    for url in queries:
+        url in urls
+    return (time.perf_counter() - start) / lookups * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark URL dedup lookups.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000, 200000],
+                        help="Numbers of known URLs")
+    parser.add_argument("--lookups", type=int, default=200, help="Lookups per size and structure")
+    args = parser.parse_args()
+
+    manager = Manager()
+    shared = SharedFingerprintSet(capacity=2 * max(args.sizes))
+    print(f"\n{'URLs':>8}{'manager-list':>16}{'list':>12}{'shared-set':>14}   (microseconds per lookup)")
+    try:
+        for size in args.sizes:
+            urls = [image_url(i) for i in range(size)]
+            proxy = manager.list(urls)
+            for url in urls:
+                shared.add(url)
+            results = [lookup_microseconds(structure, size, args.lookups) for structure in (proxy, urls, shared)]
+            print(f"{size:>8}{results[0]:>16.1f}{results[1]:>12.1f}{results[2]:>14.2f}")
+    finally:
+        shared.unlink()
+        manager.shutdown()
+
+
+if __name__ == "__main__":
+    main()
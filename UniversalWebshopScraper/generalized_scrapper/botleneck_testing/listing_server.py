@@ -0,0 +1,76 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from UniversalWebshopScraper.generalized_scrapper.botleneck_testing.synthetic_pages import synthetic_listing_page
+
+"""
+Local shop serving synthetic listing pages, for the fetch benchmarks and tests.
+
+    /listing?p=<page>   The page-th listing page (keep-alive, HTTP/1.1).
+    /blocked            403, like an anti-bot block.
+    /                   Home page setting a session cookie.
+"""
+
+
+class ListingRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive connections
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/listing":
+            page_number = int(parse_qs(url.query).get("p", ["1"])[0])
+            n_products = self.server.n_products
+            body = synthetic_listing_page(n_products, seed=page_number,
+                                          first_product=n_products * (page_number - 1)).encode("utf-8")
+            status = 200
+        elif url.path == "/blocked":
+            body = b"<html><body>Access denied</body></html>"
+            status = 403
+        else:
+            body = b"<html><body><a href='/listing?p=1'>Search</a></body></html>"
+            status = 200
+
+        if self.server.latency:
+            time.sleep(self.server.latency)  # Server-side rendering time of a real shop
+
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if url.path == "/":
+            self.send_header("Set-Cookie", "session=local; Path=/")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Quiet, the benchmarks print their own results
+
+
+class ListingServer:
+    """
+    The local shop running in a background thread, use it as a context manager.
+
+    Args:
+        n_products (int, optional): Products per listing page.
+        latency (float, optional): Seconds the server waits before answering.
+        port (int, optional): Port to listen on, a free port if 0.
+    """
+    def __init__(self, n_products=60, latency=0.0, port=0):
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), ListingRequestHandler)
+        self.server.daemon_threads = True
+        self.server.n_products = n_products
+        self.server.latency = latency
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.server.shutdown()
+        self.server.server_close()
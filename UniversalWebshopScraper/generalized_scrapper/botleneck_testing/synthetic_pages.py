@@ -0,0 +1,89 @@
+import json
+import os
+import random
+
+"""
+Listing pages for the bottleneck benchmarks.
+
+Recorded pages (the HTML of a search page saved from the browser) are the real benchmark input. When none are
+available a synthetic listing page is generated, shaped like the scrolled AliExpress/Allegro pages: deep wrappers
+around every product, shared navigation, ratings, strike-through prices, repeated promo strings and the inline JSON
+state blob shops embed for their JavaScript.
+"""
+
+PROMO_STRINGS = ["Free delivery", "Super seller", "Add to cart", "Sponsored offer", "Recommended for you"]
+CURRENCIES = ["zł", "$", "€", "USD"]
+
+
+def synthetic_listing_page(n_products=500, wrapper_depth=6, seed=0, first_product=0):
+    """
+    Generate the HTML of a listing page with n_products product cards.
+
+    Args:
+        n_products (int): Number of product cards on the page.
+        wrapper_depth (int): Number of nested <div> wrappers around each card.
+        seed (int): Seed of the random generator, the same seed gives the same page.
+        first_product (int): Id of the first product, use n_products * (page - 1) for the following pages.
+
+    Returns:
+        str: The HTML of the page.
+    """
+    rng = random.Random(seed)
+    state = {"items": [{"id": i, "sku": f"SKU-{i:08d}", "tracking": "x" * 200}
+                       for i in range(first_product, first_product + n_products)]}
+    parts = [
+        '<html><head><title>Search results</title>',
+        f'<script>window.__INIT_DATA__ = {json.dumps(state)};</script>',
+        '<style>.card{display:block}</style></head><body>',
+        '<div class="header"><a href="/">Home</a><a href="/cart">Cart</a>',
+        '<img src="/static/logo.png" alt="logo"><span>Hotline 24/7</span></div>',
+        '<ul class="results">',
+    ]
+    for i in range(first_product, first_product + n_products):
+        currency = rng.choice(CURRENCIES)
+        price = f"{rng.randint(1, 4999)},{rng.randint(0, 99):02d}"
+        old_price = f"{rng.randint(5000, 9999)},{rng.randint(0, 99):02d}"
+        title = f"Product {i} {rng.choice(['Smart TV', 'Lawnmower', 'Headphones', 'Air Fryer'])} model X{rng.randint(100, 999)}"
+        parts.append(f'<li class="card card-{i % 7}" data-id="{i}">')
+        parts.append('<div class="wrap">' * wrapper_depth)
+        parts.append(f'<a href="/offer/{i}?utm_source=listing&id={i}">')
+        parts.append(f'<img src="https://img.example.com/{i}/s180.jpg" '
+                     f'srcset="https://img.example.com/{i}/s180.jpg 1x, https://img.example.com/{i}/s720.jpg 2x">')
+        parts.append('</a>')
+        if i % 3 == 0:
+            parts.append(f'<h2 class="title"><a href="/offer/{i}">{title}</a></h2>')
+        else:
+            parts.append(f'<div><span>{title}</span></div>')
+        parts.append(f'<div class="rating"><span>4,{rng.randint(0, 9)}</span><span>({rng.randint(1, 999)})</span></div>')
+        parts.append(f'<div class="price"><span>{price}</span>&nbsp;<span>{currency}</span></div>')
+        if i % 4 == 0:
+            parts.append(f'<div class="old"><s>{old_price} {currency}</s></div>')
+        parts.append(f'<div class="promo" style="background-image: url(/static/badge-{i % 3}.png)">'
+                     f'<span>{rng.choice(PROMO_STRINGS)}</span></div>')
+        parts.append('<!-- tracking pixel --><script>track(%d)</script>' % i)
+        parts.append('</div>' * wrapper_depth)
+        parts.append('</li>')
+    parts.append('</ul><div class="footer"><a href="/help">Help</a><span>© 2024 Shop</span></div></body></html>')
+    return ''.join(parts)
+
+
+def load_pages(pages_dir=None, n_products=500):
+    """
+    Load the recorded pages from pages_dir, or generate a synthetic page when no directory is given.
+
+    Args:
+        pages_dir (str, optional): Directory with recorded pages saved as *.html files.
+        n_products (int): Number of products of the synthetic page.
+
+    Returns:
+        list: (page name, HTML) tuples.
+    """
+    if not pages_dir:
+        return [(f"synthetic_{n_products}", synthetic_listing_page(n_products))]
+
+    pages = []
+    for file_name in sorted(os.listdir(pages_dir)):
+        if file_name.endswith(('.html', '.htm')):
+            with open(os.path.join(pages_dir, file_name), encoding='utf-8', errors='replace') as file:
+                pages.append((file_name, file.read()))
+    return pages
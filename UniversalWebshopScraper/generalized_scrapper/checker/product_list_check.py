@@ -91,6 +91,53 @@ def generate_missing_products_file(shop_name, scraped_data_path, categories_prod
         file.write("# Missing Products\n")
         file.write("categories_products = " + str(missing_products))
 
+def check_missing_products_in_ledger(shop_name, ledger_path, categories_products, scraped_data_path=None):
+    """
+    Checks for missing products with the job ledger of the scrapers instead of listing the CSV folders.
+
+    The orchestrators skip the searches the ledger records as done on their own, this is for reporting. The ledger
+    is only read: searches it does not know are not added to it.
+
+    Parameters:
+    - shop_name (str): The name of the shop (e.g., 'aliexpress').
+    - ledger_path (str): Path of the job ledger database (see core/job_ledger).
+    - categories_products (dict): A dictionary where keys are category names (str)
+      and values are lists of expected product names (list of str).
+    - scraped_data_path (str, optional): CSVs found here that the ledger does not know count as scraped.
+
+    Returns:
+    - missing_products (dict): Category name -> list of missing product names, like check_missing_products.
+    """
+    from UniversalWebshopScraper.generalized_scrapper.core.job_ledger import DONE, JobLedger
+
+    ledger = None
+    if os.path.exists(ledger_path):
+        ledger = JobLedger(ledger_path)
+    else:
+        print(f"Job ledger '{ledger_path}' not found, only the CSV files are checked.")
+
+    missing_products = {}
+    try:
+        for category, products in categories_products.items():
+            missing_in_category = []
+            for product in products:
+                status = ledger.status(shop_name, category, product) if ledger else None
+                if status is None:
+                    # Scraped before the ledger existed
+                    scraped = bool(scraped_data_path) and os.path.exists(
+                        os.path.join(scraped_data_path, shop_name, category, f"{product}.csv"))
+                else:
+                    scraped = status == DONE
+                if not scraped:
+                    missing_in_category.append(product)
+            if missing_in_category:
+                missing_products[category] = missing_in_category
+    finally:
+        if ledger:
+            ledger.close()
+    return missing_products
+
+
 if __name__ == "__main__":
     # Identify the current working directory of the script
     current_dir = os.path.dirname(os.path.abspath(__file__))
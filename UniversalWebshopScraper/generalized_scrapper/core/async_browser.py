@@ -0,0 +1,454 @@
+import asyncio
+import itertools
+import json
+import re
+import shutil
+import subprocess
+import tempfile
+from collections import defaultdict
+
+"""
+Asyncio browser engine speaking the Chrome DevTools Protocol (CDP).
+
+One undetected Chrome per worker process costs hundreds of MB and seconds of startup, and drives a single tab. Here a
+few Chrome processes are started with --remote-debugging-port and every one of them hosts many tabs. All tabs of a
+browser share its single websocket connection (flattened CDP sessions), so one event loop drives tens of concurrent
+pages, e.g. while one tab waits for its page to load, the others scroll or transfer their results.
+
+Chrome is started directly, without chromedriver, so the page does not see navigator.webdriver or the chromedriver
+variables undetected-chromedriver patches out.
+
+The tabs offer the small part of the Selenium driver API the scraper uses (get, execute_script, page_source) as
+coroutines, see async_scraper for the scraper running on them.
+"""
+
+# Chrome prints this line on stderr once its DevTools endpoint is listening
+DEVTOOLS_URL_REGEX = re.compile(r'DevTools listening on (ws://\S+)')
+
+CHROME_EXECUTABLES = ['google-chrome', 'google-chrome-stable', 'chromium', 'chromium-browser', 'chrome']
+
+CHROME_ARGUMENTS = [
+    "--no-first-run",
+    "--no-default-browser-check",
+    "--disable-extensions",
+    "--disable-popup-blocking",
+    # Background tabs must keep rendering and running timers, most of the tabs are never in the foreground
+    "--disable-background-timer-throttling",
+    "--disable-backgrounding-occluded-windows",
+    "--disable-renderer-backgrounding",
+    "--disable-blink-features=AutomationControlled",
+    "--force-device-scale-factor=1",
+    "--window-size=1920,1080",
+]
+
+LAUNCH_TIMEOUT = 30  # Seconds to wait for the DevTools endpoint of a new browser
+PAGE_LOAD_TIMEOUT = 60  # Seconds to wait for the load event of a page
+
+
+class CDPError(Exception):
+    """Error returned by the browser for a CDP command, or raised by a script evaluated in a page."""
+
+
+def find_chrome_executable():
+    """
+    Find the Chrome or Chromium executable.
+
+    Returns:
+        str: Path of the executable, or None if none is found.
+    """
+    for name in CHROME_EXECUTABLES:
+        path = shutil.which(name)
+        if path:
+            return path
+
+    try:
+        import undetected_chromedriver as uc
+    except ImportError:
+        return None
+    # Also knows the default install locations on Windows and macOS
+    return uc.find_chrome_executable()
+
+
+class CDPConnection:
+    """
+    Websocket connection to a browser's DevTools endpoint.
+
+    Commands are matched to their responses by id, events are dispatched to the handlers registered for their method
+    and session, so commands of many tabs can be in flight at the same time.
+
+    Args:
+        websocket: An open websocket connection to the browser endpoint.
+    """
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.ids = itertools.count(1)
+        self.pending = {}  # Command id -> future of its result
+        self.handlers = defaultdict(list)  # (session id, method) -> event handlers
+        self.reader = asyncio.ensure_future(self._read())
+
+    @classmethod
+    async def connect(cls, ws_url):
+        """
+        Open a connection to a DevTools endpoint.
+
+        Args:
+            ws_url (str): The browser's websocket URL (ws://127.0.0.1:<port>/devtools/browser/<id>).
+
+        Returns:
+            CDPConnection: The open connection.
+        """
+        from websockets.asyncio.client import connect
+
+        # Page sources and script results can be megabytes long
+        websocket = await connect(ws_url, max_size=None)
+        return cls(websocket)
+
+    async def _read(self):
+        try:
+            async for message in self.websocket:
+                data = json.loads(message)
+                if 'id' in data:
+                    future = self.pending.pop(data['id'], None)
+                    if future is None or future.done():
+                        continue
+                    if 'error' in data:
+                        future.set_exception(CDPError(data['error'].get('message', str(data['error']))))
+                    else:
+                        future.set_result(data.get('result', {}))
+                else:
+                    for handler in list(self.handlers.get((data.get('sessionId'), data.get('method')), [])):
+                        handler(data.get('params', {}))
+        except Exception as e:
+            print(f"CDP connection lost: {e}")
+        finally:
+            # Nobody would ever answer the commands still waiting
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("CDP connection closed"))
+            self.pending.clear()
+
+    async def send(self, method, params=None, session_id=None):
+        """
+        Send a CDP command and wait for its result.
+
+        Args:
+            method (str): The command, e.g. 'Page.navigate'.
+            params (dict, optional): The command's parameters.
+            session_id (str, optional): The session of the target (tab) the command is for, None for the browser.
+
+        Returns:
+            dict: The command's result.
+        """
+        if self.reader.done():
+            raise ConnectionError("CDP connection closed")
+
+        message_id = next(self.ids)
+        message = {'id': message_id, 'method': method, 'params': params or {}}
+        if session_id:
+            message['sessionId'] = session_id
+
+        future = asyncio.get_running_loop().create_future()
+        self.pending[message_id] = future
+        await self.websocket.send(json.dumps(message))
+        return await future
+
+    def on(self, method, handler, session_id=None):
+        """Call handler(params) for every event of a method (and session)."""
+        self.handlers[(session_id, method)].append(handler)
+
+    def off(self, method, handler, session_id=None):
+        """Remove an event handler added with on."""
+        handlers = self.handlers.get((session_id, method), [])
+        if handler in handlers:
+            handlers.remove(handler)
+        if not handlers:
+            self.handlers.pop((session_id, method), None)
+
+    def expect_event(self, method, session_id=None):
+        """
+        Get a future resolved with the parameters of the next event of a method.
+
+        Call it before sending the command triggering the event, so the event cannot be missed.
+
+        Args:
+            method (str): The event, e.g. 'Page.loadEventFired'.
+            session_id (str, optional): The session the event must come from.
+
+        Returns:
+            asyncio.Future: The future of the event's parameters.
+        """
+        future = asyncio.get_running_loop().create_future()
+
+        def handler(params):
+            if not future.done():
+                future.set_result(params)
+            self.off(method, handler, session_id)
+
+        self.on(method, handler, session_id)
+        # Cancelled waits (e.g. timeouts) must not leave their handler behind
+        future.add_done_callback(lambda _: self.off(method, handler, session_id))
+        return future
+
+    async def close(self):
+        await self.websocket.close()
+        try:
+            await self.reader
+        except asyncio.CancelledError:
+            pass
+
+
+class AsyncTab:
+    """
+    A browser tab driven through its own CDP session, with Selenium-like coroutines.
+
+    Args:
+        connection (CDPConnection): The connection of the browser hosting the tab.
+        target_id (str): The tab's target id.
+        session_id (str): The session attached to the tab.
+    """
+    def __init__(self, connection, target_id, session_id):
+        self.connection = connection
+        self.target_id = target_id
+        self.session_id = session_id
+
+    @classmethod
+    async def open(cls, connection):
+        """
+        Open a new blank tab.
+
+        Args:
+            connection (CDPConnection): The connection of the browser.
+
+        Returns:
+            AsyncTab: The new tab.
+        """
+        target = await connection.send('Target.createTarget', {'url': 'about:blank'})
+        session = await connection.send('Target.attachToTarget', {'targetId': target['targetId'], 'flatten': True})
+        tab = cls(connection, target['targetId'], session['sessionId'])
+        await tab.send('Page.enable')
+        return tab
+
+    async def send(self, method, params=None):
+        """Send a CDP command to the tab's session."""
+        return await self.connection.send(method, params, self.session_id)
+
+    async def get(self, url, timeout=PAGE_LOAD_TIMEOUT):
+        """
+        Open a URL in the tab and wait for its load event, like WebDriver.get.
+
+        Args:
+            url (str): The URL to open.
+            timeout (float, optional): Maximum number of seconds to wait for the page to load.
+        """
+        loaded = self.connection.expect_event('Page.loadEventFired', self.session_id)
+        try:
+            result = await self.send('Page.navigate', {'url': url})
+            if result.get('errorText'):
+                raise CDPError(f"Failed to open {url}: {result['errorText']}")
+            await asyncio.wait_for(loaded, timeout)
+        finally:
+            loaded.cancel()
+
+    async def execute_script(self, script, *args):
+        """
+        Run a script in the page, like WebDriver.execute_script.
+
+        The script is the body of a function: it reads its arguments from `arguments` and returns its result with
+        `return`, so the scripts written for Selenium run unchanged.
+
+        Args:
+            script (str): The function body.
+            *args: JSON-serializable arguments.
+
+        Returns:
+            The JSON-serializable value returned by the script.
+        """
+        expression = f"(function() {{\n{script}\n}}).apply(null, {json.dumps(list(args))})"
+        result = await self.send('Runtime.evaluate', {
+            'expression': expression,
+            'returnByValue': True,
+            'awaitPromise': True
+        })
+        if 'exceptionDetails' in result:
+            details = result['exceptionDetails']
+            description = details.get('exception', {}).get('description') or details.get('text')
+            raise CDPError(f"Script failed: {description}")
+        return result.get('result', {}).get('value')
+
+    async def page_source(self):
+        """Get the current HTML of the page, like WebDriver.page_source."""
+        return await self.execute_script("return document.documentElement.outerHTML;")
+
+    async def close(self):
+        """Close the tab."""
+        try:
+            await self.connection.send('Target.closeTarget', {'targetId': self.target_id})
+        except (CDPError, ConnectionError) as e:
+            print(f"Failed to close tab {self.target_id}: {e}")
+
+
+class AsyncBrowser:
+    """
+    A Chrome process controlled over CDP.
+
+    Args:
+        process (asyncio.subprocess.Process): The browser process, None for a browser started by someone else.
+        connection (CDPConnection): The connection to the browser endpoint.
+        temp_dir (str, optional): Temporary profile directory removed when the browser is closed.
+    """
+    def __init__(self, process, connection, temp_dir=None):
+        self.process = process
+        self.connection = connection
+        self.temp_dir = temp_dir
+        self.stderr_reader = None
+
+    @classmethod
+    async def launch(cls, chrome_path=None, headless=False, user_data_dir=None, extra_arguments=()):
+        """
+        Start a Chrome process with a DevTools endpoint and connect to it.
+
+        Args:
+            chrome_path (str, optional): Path of the Chrome executable, searched for if not given.
+            headless (bool, optional): Whether to run without a window (CAPTCHAs cannot be resolved by hand then).
+            user_data_dir (str, optional): Profile directory, a temporary one is created if not given.
+            extra_arguments (iterable, optional): Additional command line arguments.
+
+        Returns:
+            AsyncBrowser: The connected browser.
+        """
+        chrome_path = chrome_path or find_chrome_executable()
+        if not chrome_path:
+            raise FileNotFoundError("Chrome executable not found")
+
+        temp_dir = None
+        if not user_data_dir:
+            temp_dir = user_data_dir = tempfile.mkdtemp(prefix="async_chrome_")
+
+        arguments = [chrome_path, "--remote-debugging-port=0", f"--user-data-dir={user_data_dir}"]
+        arguments += CHROME_ARGUMENTS + list(extra_arguments)
+        if headless:
+            arguments.append("--headless=new")
+        arguments.append("about:blank")
+
+        process = await asyncio.create_subprocess_exec(*arguments, stdout=subprocess.DEVNULL,
+                                                       stderr=subprocess.PIPE)
+        try:
+            ws_url = await asyncio.wait_for(cls._read_devtools_url(process), LAUNCH_TIMEOUT)
+            connection = await CDPConnection.connect(ws_url)
+        except BaseException:
+            process.kill()
+            await process.wait()
+            if temp_dir:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+            raise
+
+        browser = cls(process, connection, temp_dir)
+        # Chrome keeps logging to stderr, a full pipe would block it
+        browser.stderr_reader = asyncio.ensure_future(cls._drain(process.stderr))
+        return browser
+
+    @classmethod
+    async def connect(cls, ws_url):
+        """
+        Connect to an already running browser, e.g. one started with --remote-debugging-port=9222.
+
+        Args:
+            ws_url (str): The browser's websocket URL.
+
+        Returns:
+            AsyncBrowser: The connected browser, closing it only closes the connection.
+        """
+        return cls(None, await CDPConnection.connect(ws_url))
+
+    @staticmethod
+    async def _read_devtools_url(process):
+        while True:
+            line = await process.stderr.readline()
+            if not line:
+                raise RuntimeError("Chrome exited before opening its DevTools endpoint")
+            match = DEVTOOLS_URL_REGEX.search(line.decode('utf-8', errors='replace'))
+            if match:
+                return match.group(1)
+
+    @staticmethod
+    async def _drain(stream):
+        while await stream.read(65536):
+            pass
+
+    async def new_tab(self):
+        """Open a new tab in the browser."""
+        return await AsyncTab.open(self.connection)
+
+    async def close(self):
+        """Close the connection, then stop the browser process and remove its temporary profile."""
+        try:
+            if self.process:
+                await self.connection.send('Browser.close')
+        except (CDPError, ConnectionError):
+            pass
+        await self.connection.close()
+
+        if self.process:
+            try:
+                await asyncio.wait_for(self.process.wait(), 10)
+            except asyncio.TimeoutError:
+                self.process.kill()
+                await self.process.wait()
+        if self.stderr_reader:
+            self.stderr_reader.cancel()
+        if self.temp_dir:
+            shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+
+class BrowserEngine:
+    """
+    A few browsers hosting many tabs.
+
+    Use it as an async context manager, the tabs are in engine.tabs once it is entered:
+
+        async with BrowserEngine(n_browsers=2, tabs_per_browser=8) as engine:
+            ...
+
+    Args:
+        n_browsers (int, optional): Number of browser processes.
+        tabs_per_browser (int, optional): Number of tabs opened in every browser.
+        **launch_options: Options of AsyncBrowser.launch (chrome_path, headless, extra_arguments).
+    """
+    def __init__(self, n_browsers=1, tabs_per_browser=4, **launch_options):
+        self.n_browsers = n_browsers
+        self.tabs_per_browser = tabs_per_browser
+        self.launch_options = launch_options
+        self.browsers = []
+        self.tabs = []
+
+    async def start(self):
+        """Start the browsers and open their tabs."""
+        launched = await asyncio.gather(
+            *(AsyncBrowser.launch(**self.launch_options) for _ in range(self.n_browsers)), return_exceptions=True
+        )
+        # Keep the browsers that did start so close() stops them if another one failed
+        self.browsers = [browser for browser in launched if not isinstance(browser, BaseException)]
+        errors = [error for error in launched if isinstance(error, BaseException)]
+        if errors:
+            await self.close()
+            raise errors[0]
+        for browser in self.browsers:
+            self.tabs.extend(await asyncio.gather(*(browser.new_tab() for _ in range(self.tabs_per_browser))))
+        print(f"Browser engine started: {len(self.browsers)} browsers, {len(self.tabs)} tabs.")
+        return self
+
+    async def close(self):
+        """Close all browsers."""
+        await asyncio.gather(*(browser.close() for browser in self.browsers), return_exceptions=True)
+        self.browsers = []
+        self.tabs = []
+
+    async def __aenter__(self):
+        try:
+            return await self.start()
+        except BaseException:
+            await self.close()
+            raise
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        await self.close()
@@ -0,0 +1,372 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from UniversalWebshopScraper.generalized_scrapper.core.generalized_scrapper import GeneralizedScraper, TRASH_THRESHOLD
+from UniversalWebshopScraper.generalized_scrapper.core.block_templates import template_domain
+from UniversalWebshopScraper.generalized_scrapper.core.browser_extraction import (
+    BROWSER_AGGREGATES_SCRIPT, BROWSER_CAPTCHA_SCRIPT, BROWSER_MARK_SCRIPT, BROWSER_TRASH_SCRIPT,
+    aggregates_from_browser
+)
+from UniversalWebshopScraper.generalized_scrapper.core.captcha_detection import detect_captcha
+from UniversalWebshopScraper.generalized_scrapper.core.scrolling import (
+    SCROLL_POLL_INTERVAL, SCROLL_PROBE_SCRIPT, SCROLL_QUIET_PERIOD, SCROLL_STEP, SCROLL_STEP_SCRIPT, content_grew
+)
+
+"""
+GeneralizedScraper running on a tab of the async browser engine.
+
+The page I/O (loading, scrolling, scripts, page_source) is awaited, so many scrapers share one event loop and a few
+browsers (see async_browser). The coroutines have names of their own (load_page_async, scrape_all_products_async...),
+the synchronous methods of GeneralizedScraper keep their meaning and are not shadowed by coroutines.
+
+The product detection is the synchronous code of GeneralizedScraper, CPU work on data already transferred from the
+tab. It runs in a parser thread (parse_executor, one thread shared by the scrapers of the process) so the event loop
+keeps driving the other tabs while a page is parsed. Pages are parsed one at a time, the dedup sets the tabs share
+are never updated by two pages at once.
+
+The search loop is the one of scrape_all_products: begin_page and end_page (on_page_done, the catalog, the stop
+conditions and the pagination) are shared, only the loading and the detection of a page are awaited here.
+"""
+
+# One CAPTCHA prompt at a time, the tabs of all scrapers share the console
+_captcha_lock = None
+
+# Thread the pages of all scrapers of the process are parsed in, created when first needed
+_parse_executor = None
+
+
+def parse_executor():
+    """Get the thread the async scrapers parse the pages in."""
+    global _parse_executor
+    if _parse_executor is None:
+        _parse_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="async-parser")
+    return _parse_executor
+
+
+async def wait_for_captcha_resolution(message="Resolve Captcha and click enter button"):
+    """
+    Ask the user to resolve a CAPTCHA without blocking the other tabs.
+
+    Args:
+        message (str, optional): The prompt shown to the user.
+    """
+    global _captcha_lock
+    if _captcha_lock is None:
+        _captcha_lock = asyncio.Lock()
+    async with _captcha_lock:
+        await asyncio.get_running_loop().run_in_executor(None, input, message)
+
+
+async def wait_for_page_to_settle_async(tab, before, timeout, poll_interval=SCROLL_POLL_INTERVAL,
+                                        quiet_period=SCROLL_QUIET_PERIOD):
+    """
+    Probe the page until it settles after a scroll, like scrolling.wait_for_page_to_settle.
+
+    Args:
+        tab (AsyncTab): The tab of the page.
+        before (list): Probe result before the scroll.
+        timeout (float): Maximum number of seconds to wait for new content.
+        poll_interval (float, optional): Seconds between two probes.
+        quiet_period (float, optional): Seconds without any change after which the page has settled.
+
+    Returns:
+        list: The last probe result.
+    """
+    deadline = time.monotonic() + timeout
+    state = before
+    last_change = None
+
+    while time.monotonic() < deadline:
+        await asyncio.sleep(poll_interval)
+        current = await tab.execute_script(SCROLL_PROBE_SCRIPT)
+        if current != state:
+            state = current
+            last_change = time.monotonic()
+        elif last_change is not None and time.monotonic() - last_change >= quiet_period:
+            break  # Content arrived and nothing changed since
+
+    return state
+
+
+class AsyncGeneralizedScraper(GeneralizedScraper):
+    """
+    GeneralizedScraper driving a tab of the async browser engine.
+
+    The methods doing page I/O are coroutines named after their GeneralizedScraper counterparts with an _async suffix
+    and taking the same arguments, the detection methods are inherited unchanged and run in the parser thread.
+
+    Args:
+        tab (AsyncTab): The tab the scraper works in.
+        shopping_website (str, optional): The URL of the shopping website to scrape.
+        executor (Executor, optional): Where the pages are parsed, the shared parser thread by default.
+        **kwargs: parser_backend, template_cache and rate_controller, see GeneralizedScraper.
+    """
+    def __init__(self, tab, shopping_website=None, executor=None, **kwargs):
+        super().__init__(shopping_website=shopping_website, offline_mode=True, **kwargs)
+        self.tab = tab
+        self.executor = executor
+
+    async def run_in_parser(self, function, *args):
+        """
+        Run a synchronous (CPU-bound) step off the event loop.
+
+        Args:
+            function (callable): The step, e.g. parse_page_products.
+            *args: Its arguments.
+
+        Returns:
+            The result of the step.
+        """
+        return await asyncio.get_running_loop().run_in_executor(self.executor or parse_executor(), function, *args)
+
+    async def load_page_async(self, url):
+        """
+        Open a URL once the shop's rate controller allows it, without blocking the other tabs.
+
+        Args:
+            url (str): The URL to open.
+        """
+        domain = template_domain(self.shopping_website)
+        wait = self.rate_controller.reserve(domain)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        self.pages_loaded += 1
+        try:
+            await self.tab.get(url)
+        except Exception:
+            self.rate_controller.record_error(domain)
+            raise
+
+    async def extract_page_structure_async(self):
+        """
+        Extract the page's HTML content using the scraper's parser backend, parsed in the parser thread.
+
+        Returns:
+            BeautifulSoup: Parsed HTML content of the page.
+        """
+        return await self.run_in_parser(self.parse_html, await self.tab.page_source())
+
+    async def detect_captcha_async(self):
+        """
+        Find the CAPTCHA indicator in the raw HTML of the tab's page, without parsing it.
+
+        Returns:
+            tuple: (indicator, matched HTML), or None if no CAPTCHA is detected.
+        """
+        return self._report_captcha(detect_captcha(await self.tab.page_source()))
+
+    async def detect_captcha_in_browser_async(self):
+        """
+        Find the CAPTCHA indicator of the tab's page without transferring page_source, see
+        GeneralizedScraper.detect_captcha_in_browser.
+
+        Returns:
+            tuple: (indicator, matched HTML), or None if no CAPTCHA is detected.
+        """
+        return self._report_captcha(detect_captcha(await self.tab.execute_script(BROWSER_CAPTCHA_SCRIPT)))
+
+    async def _open_page_async(self, url, description):
+        try:
+            await self.load_page_async(url)
+            if await self.detect_captcha_async():
+                await wait_for_captcha_resolution()
+            return True
+        except Exception as e:
+            print(f"Failed to navigate to the {description}: {e}")
+            return False
+
+    async def open_home_page_async(self, home_url):
+        """
+        Open the homepage and handle CAPTCHA if detected.
+
+        Args:
+            home_url (str): The URL of the homepage.
+
+        Returns:
+            bool: True if the page opened successfully, False otherwise.
+        """
+        return await self._open_page_async(home_url, "home page")
+
+    async def open_search_url_async(self, search_url):
+        """
+        Open the first page of a search and handle CAPTCHA if detected.
+
+        Args:
+            search_url (str): The URL template of the search, with a {page_number} placeholder.
+
+        Returns:
+            bool: True if the page opened successfully, False otherwise.
+        """
+        return await self._open_page_async(search_url.format(page_number=1), "search URL")
+
+    async def extract_page_aggregates_async(self, incremental=False):
+        """
+        Collect the aggregates of the candidate product blocks inside the browser.
+
+        Args:
+            incremental (bool, optional): Skip the products already detected on the page.
+
+        Returns:
+            PageAggregates: The aggregates of the page's candidate product blocks.
+        """
+        payload = await self.tab.execute_script(BROWSER_AGGREGATES_SCRIPT, incremental)
+        return await self.run_in_parser(aggregates_from_browser, payload, self.shopping_website)
+
+    async def detect_product_blocks_in_browser_async(self):
+        """
+        Detect product blocks of the page without transferring and parsing page_source.
+
+        Returns:
+            list: The detected product blocks.
+        """
+        aggregates = await self.extract_page_aggregates_async()
+        return await self.run_in_parser(self._detect_product_blocks_in_aggregates, aggregates)
+
+    async def detect_new_products_in_browser_async(self):
+        """
+        Detect the products added to the page since the last call, e.g. by the last scroll of an infinite list.
+
+        Returns:
+            list: The detected product blocks.
+        """
+        aggregates = await self.extract_page_aggregates_async(incremental=True)
+        detected_blocks = await self.run_in_parser(self._detect_product_blocks_in_aggregates, aggregates)
+
+        # Tell the page which blocks are products now
+        block_indices = {id(block): index for index, block in enumerate(aggregates.blocks)}
+        await self.tab.execute_script(BROWSER_MARK_SCRIPT, [block_indices[id(block)] for block in detected_blocks])
+        return detected_blocks
+
+    async def trash_detection_in_browser_async(self):
+        """
+        Detect irrelevant strings like trash_detection, counting the strings inside the browser.
+        """
+        payload = await self.tab.execute_script(BROWSER_TRASH_SCRIPT, TRASH_THRESHOLD)
+        self.wrong_titles = set(json.loads(payload))
+
+    async def incremental_scroll_with_html_check_async(self, max_scrolls=10, scroll_pause_time=1,
+                                                       on_new_content=None):
+        """
+        Scroll incrementally while more content is being loaded, see GeneralizedScraper.
+
+        Args:
+            max_scrolls (int): Maximum number of scroll attempts.
+            scroll_pause_time (int): Maximum time in seconds to wait for new content after a scroll.
+            on_new_content (coroutine function, optional): Awaited after every scroll that added nodes to the page.
+        """
+        domain = template_domain(self.shopping_website)
+        budget = self.scroll_budget.budget(domain, max_scrolls)
+        state = await self.tab.execute_script(SCROLL_PROBE_SCRIPT)  # Initial state for comparison
+        last_productive_scroll = 0
+
+        for scroll in range(max_scrolls):
+            # Past the budget, only a page that is still growing is scrolled further
+            if scroll >= budget and last_productive_scroll < scroll:
+                print(f"Scroll budget of {budget} scrolls used. Stopping.")
+                break
+
+            # Scroll down incrementally
+            at_bottom = await self.tab.execute_script(SCROLL_STEP_SCRIPT, SCROLL_STEP)
+
+            # Wait until the new content (if any) is loaded, the other tabs run meanwhile
+            new_state = await wait_for_page_to_settle_async(
+                self.tab, state, scroll_pause_time,
+                poll_interval=min(SCROLL_POLL_INTERVAL, scroll_pause_time / 4),
+                quiet_period=min(SCROLL_QUIET_PERIOD, scroll_pause_time / 2)
+            )
+
+            if on_new_content and new_state[2] != state[2]:
+                await on_new_content()
+
+            if content_grew(state, new_state):
+                print(f"Scroll {scroll + 1}: Additional content detected.")
+                last_productive_scroll = scroll + 1
+            elif at_bottom:
+                print(f"Scroll {scroll + 1}: No additional content loaded. Stopping.")
+                break
+
+            # Update the last state
+            state = new_state
+
+        # Remember how many scrolls this shop needed
+        self.scroll_budget.record(domain, last_productive_scroll)
+        print(f"Finished scrolling ({last_productive_scroll} productive scrolls, budget {budget}).")
+
+    async def scrape_page_in_browser_async(self, page_count, scroll_based, max_scrolls, url_template,
+                                           page_number_supported, use_block_templates, in_browser, incremental,
+                                           first_page):
+        """
+        Load a page of the search in the tab and detect its products, see GeneralizedScraper.scrape_page_in_browser.
+        """
+        if page_number_supported and url_template:
+            await self.load_page_async(url_template.format(page_number=page_count))
+
+        # check if we have captcha, in the page itself when the products are detected in the browser
+        if in_browser or (scroll_based and incremental):
+            captcha_present = await self.detect_captcha_in_browser_async() is not None
+        else:
+            captcha_present = await self.detect_captcha_async() is not None
+        self.record_page_result(captcha_present)
+        if captcha_present:
+            await wait_for_captcha_resolution()
+
+        if scroll_based and incremental:
+            # Products are detected while scrolling, from the content added by every scroll
+            if first_page:
+                await self.trash_detection_in_browser_async()
+            await self.detect_new_products_in_browser_async()
+            await self.incremental_scroll_with_html_check_async(
+                max_scrolls, on_new_content=self.detect_new_products_in_browser_async)
+        else:
+            if scroll_based:
+                await self.incremental_scroll_with_html_check_async(max_scrolls)
+
+            if in_browser:
+                if first_page:
+                    await self.trash_detection_in_browser_async()
+                await self.detect_product_blocks_in_browser_async()
+            else:
+                await self.run_in_parser(self.parse_page_products, await self.tab.page_source(), first_page,
+                                         use_block_templates)
+
+    async def scrape_all_products_async(self, scroll_based=False, max_pages=99, max_scrolls=20, url_template=None,
+                                        page_number_supported=True, use_block_templates=True, in_browser=False,
+                                        incremental=False, start_page=1, on_page_done=None):
+        """
+        Scrape all products using pagination and scrolling if enabled, see GeneralizedScraper.scrape_all_products.
+
+        Args:
+            scroll_based (bool): Whether to use scrolling.
+            max_pages (int): Maximum number of pages to scrape.
+            max_scrolls (int): Maximum scrolls per page.
+            url_template (str): Template URL with page number placeholder.
+            page_number_supported (bool): Whether pagination is supported.
+            use_block_templates (bool): Whether to select product blocks with the learned template of the shop.
+            in_browser (bool): Whether to detect the products inside the browser instead of parsing page_source.
+            incremental (bool): With scroll_based, detect the products inside the browser after every scroll.
+            start_page (int): First page to scrape, to continue a search interrupted after page start_page - 1.
+            on_page_done (callable, optional): Called after every page with the page number, the products stored for
+                                               the page and the seconds it took (see job_ledger).
+        """
+        self.saturation.reset()
+        page_count = start_page
+        while page_count is not None and page_count <= max_pages:
+            page = self.begin_page(page_count)
+            await self.scrape_page_in_browser_async(page_count, scroll_based, max_scrolls, url_template,
+                                                    page_number_supported, use_block_templates, in_browser,
+                                                    incremental, first_page=page_count == start_page)
+            page_count = self.end_page(page, on_page_done, page_number_supported)
+
+        # clear all trash titles after scraping all products on all pages
+        self.wrong_titles.clear()
+
+    async def close_driver_async(self):
+        """
+        Close the scraper's tab and print the count of detected products.
+        """
+        print("Closing the browser tab...")
+        print(f"Detected {self.product_count} products.")
+        if self.tab:
+            await self.tab.close()
@@ -0,0 +1,231 @@
+import csv
+import os
+import time
+from collections import defaultdict
+
+from UniversalWebshopScraper.generalized_scrapper.core.browser_pool import MAX_DRIVER_RSS_MB
+
+"""
+Runtime scaling of the number of browser workers of a shop.
+
+How many browsers a run should use depends on the machine (memory per Chrome, cores left for the parsing) and on the
+shop (its request rate limit, its CAPTCHAs), so a fixed n_workers is either too small or too large. WorkerAutoscaler
+looks at the last AUTOSCALE_INTERVAL seconds of the run and decides to add a worker, retire one, or hold:
+
+    retire  free memory below min_free_memory_mb, or too many CAPTCHAs (the shop pushes back), or the worker added
+            last did not raise the products per minute by at least min_gain (e.g. the shop's rate limit is the
+            bottleneck, see rate_control). The count reached is then a ceiling for CEILING_HOLD_SECONDS.
+    add     below max_workers and the ceiling, with memory for one more browser and CPU left for the parsing.
+    hold    otherwise.
+
+So the number of workers climbs while the marginal worker still pays off and steps back when it does not. Every
+decision is printed and, with a log_path, appended to a CSV file with the throughput it was based on, to tune the
+bounds of each shop.
+
+The memory and CPU readings use psutil when it is installed, /proc/meminfo and the load average otherwise.
+"""
+
+AUTOSCALE_INTERVAL = 120  # Seconds of scraping a decision is based on
+MIN_THROUGHPUT_GAIN = 0.1  # Relative products per minute a worker must add to be kept
+MIN_FREE_MEMORY_MB = 1024  # Free memory kept for the system and the parser processes
+MAX_CPU_LOAD = 0.9  # Share of the CPU capacity in use above which no worker is added (parsing is saturated)
+MAX_CAPTCHA_RATE = 0.05  # CAPTCHAs per page above which a worker is retired
+CEILING_HOLD_SECONDS = 1800  # Time a worker count that did not pay off is not exceeded
+
+LOG_COLUMNS = ["time", "workers", "change", "reason", "products_per_minute", "worker_products_per_minute",
+               "free_memory_mb", "cpu_load", "captcha_rate"]
+
+
+def available_memory_mb():
+    """
+    Get the memory available to new processes.
+
+    Returns:
+        float: Available memory in MB, None if it cannot be measured.
+    """
+    try:
+        import psutil
+        return psutil.virtual_memory().available / (1024 * 1024)
+    except ImportError:
+        pass
+    try:
+        with open("/proc/meminfo") as file:
+            for line in file:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def cpu_load():
+    """
+    Get the share of the CPU capacity in use.
+
+    Returns:
+        float: Load between 0 and 1 (may exceed 1 with the load average), None if it cannot be measured.
+    """
+    try:
+        import psutil
+        return psutil.cpu_percent(interval=None) / 100
+    except ImportError:
+        pass
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (AttributeError, OSError):
+        return None
+
+
+def default_max_workers(worker_memory_mb=MAX_DRIVER_RSS_MB, min_free_memory_mb=MIN_FREE_MEMORY_MB):
+    """
+    Get the largest number of browser workers the machine can run.
+
+    Args:
+        worker_memory_mb (float, optional): Memory of a worker's browser.
+        min_free_memory_mb (float, optional): Memory kept free.
+
+    Returns:
+        int: At most one worker per core and as many as fit in the available memory, at least 1.
+    """
+    n_workers = os.cpu_count() or 1
+    memory_mb = available_memory_mb()
+    if memory_mb is not None:
+        n_workers = min(n_workers, int((memory_mb - min_free_memory_mb) // worker_memory_mb))
+    return max(1, n_workers)
+
+
+class WorkerAutoscaler:
+    """
+    Decides from the products, pages and CAPTCHAs reported by the workers whether to add or retire a worker.
+
+    The main process records the workers' reports, calls decide when due() and starts or retires a worker.
+
+    Args:
+        min_workers (int, optional): Fewest workers.
+        max_workers (int, optional): Most workers, see default_max_workers.
+        interval (float, optional): Seconds of scraping a decision is based on.
+        min_gain (float, optional): Relative throughput gain a worker must bring to be kept.
+        min_free_memory_mb (float, optional): Free memory below which a worker is retired.
+        worker_memory_mb (float, optional): Memory of one more worker, needed free to add it.
+        max_cpu_load (float, optional): CPU load above which no worker is added.
+        max_captcha_rate (float, optional): CAPTCHAs per page above which a worker is retired.
+        log_path (str, optional): CSV file the decisions are appended to.
+        memory (callable, optional): Gets the available memory in MB, memory().
+        cpu (callable, optional): Gets the CPU load, cpu().
+        clock (callable, optional): Monotonic clock.
+    """
+    def __init__(self, min_workers=1, max_workers=None, interval=AUTOSCALE_INTERVAL, min_gain=MIN_THROUGHPUT_GAIN,
+                 min_free_memory_mb=MIN_FREE_MEMORY_MB, worker_memory_mb=MAX_DRIVER_RSS_MB,
+                 max_cpu_load=MAX_CPU_LOAD, max_captcha_rate=MAX_CAPTCHA_RATE, log_path=None,
+                 memory=available_memory_mb, cpu=cpu_load, clock=time.monotonic):
+        self.min_workers = min_workers
+        self.max_workers = max_workers if max_workers is not None else default_max_workers(worker_memory_mb,
+                                                                                         min_free_memory_mb)
+        self.interval = interval
+        self.min_gain = min_gain
+        self.min_free_memory_mb = min_free_memory_mb
+        self.worker_memory_mb = worker_memory_mb
+        self.max_cpu_load = max_cpu_load
+        self.max_captcha_rate = max_captcha_rate
+        self.log_path = log_path
+        self.memory = memory
+        self.cpu = cpu
+        self.clock = clock
+        self.previous = None  # (workers, products per minute) of the last window
+        self.ceiling = self.max_workers
+        self.ceiling_until = None
+        self.restart_window()
+
+    def restart_window(self):
+        """Start a new measurement window, e.g. once the workers of the last decision are ready."""
+        self.window_start = self.clock()
+        self.products = defaultdict(int)  # Worker index -> products of the window
+        self.pages = 0
+        self.captchas = 0
+
+    def record_page(self, worker_index, products):
+        """Record a page a worker finished and the products it stored."""
+        self.products[worker_index] += products
+        self.pages += 1
+
+    def record_captcha(self, worker_index):
+        """Record a CAPTCHA a worker ran into."""
+        self.captchas += 1
+
+    def due(self):
+        """Check if the current window is long enough for a decision."""
+        return self.clock() - self.window_start >= self.interval
+
+    def slowest_worker(self, workers):
+        """
+        Get the worker to retire: the one with the fewest products in the window.
+
+        Args:
+            workers (list): Indexes of the running workers, the first one wins a tie.
+
+        Returns:
+            int: The worker index.
+        """
+        return min(workers, key=lambda worker_index: self.products[worker_index])
+
+    def decide(self, n_workers):
+        """
+        Decide the change of the number of workers from the current window, and start the next window.
+
+        Args:
+            n_workers (int): Number of running workers.
+
+        Returns:
+            tuple: (change, reason), change is 1 (add a worker), -1 (retire one) or 0.
+        """
+        now = self.clock()
+        minutes = max(now - self.window_start, 1e-9) / 60
+        throughput = sum(self.products.values()) / minutes
+        worker_throughput = {index: count / minutes for index, count in sorted(self.products.items())}
+        captcha_rate = self.captchas / max(self.pages + self.captchas, 1)
+        memory_mb = self.memory()
+        load = self.cpu()
+
+        if self.ceiling_until is not None and now >= self.ceiling_until:
+            self.ceiling, self.ceiling_until = self.max_workers, None
+
+        change, reason = 0, "hold"
+        if n_workers > self.min_workers and memory_mb is not None and memory_mb < self.min_free_memory_mb:
+            change, reason = -1, f"free memory {memory_mb:.0f} MB"
+        elif n_workers > self.min_workers and captcha_rate > self.max_captcha_rate:
+            change, reason = -1, f"CAPTCHA rate {captcha_rate:.0%}"
+        elif (self.previous and self.previous[0] < n_workers and n_workers > self.min_workers
+              and throughput < self.previous[1] * (1 + self.min_gain)):
+            change = -1
+            reason = f"worker {n_workers} added {throughput - self.previous[1]:+.1f} products/min"
+            self.ceiling, self.ceiling_until = n_workers - 1, now + CEILING_HOLD_SECONDS
+        elif n_workers < min(self.max_workers, self.ceiling):
+            if load is not None and load > self.max_cpu_load:
+                reason = f"hold, CPU load {load:.0%}"
+            elif memory_mb is not None and memory_mb < self.min_free_memory_mb + self.worker_memory_mb:
+                reason = f"hold, free memory {memory_mb:.0f} MB"
+            else:
+                change, reason = 1, "probe one more worker"
+
+        print(f"[AUTOSCALE] {n_workers} workers, {throughput:.1f} products/min "
+              f"({', '.join(f'{index}: {value:.1f}' for index, value in worker_throughput.items()) or 'no pages'}), "
+              f"CAPTCHA rate {captcha_rate:.0%}: {change:+d} ({reason}).")
+        self._log(n_workers, change, reason, throughput, worker_throughput, memory_mb, load, captcha_rate)
+
+        self.previous = (n_workers, throughput)
+        self.restart_window()
+        return change, reason
+
+    def _log(self, n_workers, change, reason, throughput, worker_throughput, memory_mb, load, captcha_rate):
+        if not self.log_path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.log_path)), exist_ok=True)
+        new_file = not os.path.exists(self.log_path)
+        with open(self.log_path, "a", newline="") as file:
+            writer = csv.writer(file)
+            if new_file:
+                writer.writerow(LOG_COLUMNS)
+            writer.writerow([time.strftime("%Y-%m-%d %H:%M:%S"), n_workers, change, reason, f"{throughput:.2f}",
+                             " ".join(f"{index}:{value:.2f}" for index, value in worker_throughput.items()),
+                             "" if memory_mb is None else f"{memory_mb:.0f}",
+                             "" if load is None else f"{load:.2f}", f"{captcha_rate:.3f}"])
@@ -0,0 +1,384 @@
+import re
+from operator import itemgetter
+
+from bs4 import CData, NavigableString, Tag
+
+from UniversalWebshopScraper.generalized_scrapper.core.functions import normalize_url
+
+"""
+Single-pass product block detection.
+
+The heuristic in GeneralizedScraper used to call find_all/get_text/stripped_strings on every candidate block, so the
+same subtree was traversed again for each of its ancestors. Here the parse tree is walked once and every string, link,
+image and "title"-classed tag is appended to a page-wide list in document order. Because a subtree is a contiguous
+slice of the document, each candidate block only has to remember where its slice starts and ends in those lists.
+Block selection then works on the slices and gives the same products as the per-block heuristic.
+"""
+
+# Tags that can wrap a single product on a listing page
+BLOCK_TAGS = frozenset(['div', 'li', 'article', 'span', 'ul'])
+
+# Tags checked for a 'title'/'name' class when looking for a product title
+TITLE_TAGS = frozenset(['h1', 'h2', 'h3', 'span', 'a', 'div'])
+
+# Image sources in the order find_image_url collects them, the index is the "kind" of an image entry
+IMAGE_SOURCE_ATTRIBUTES = [
+    ('img', 'src'),
+    ('img', 'srcset'),
+    ('img', 'data-src'),
+    ('img', 'data-srcset'),
+    ('source', 'srcset')
+]
+# Images taken from inline styles are collected after all <img>/<source> attributes
+STYLE_IMAGE_KIND = len(IMAGE_SOURCE_ATTRIBUTES)
+
+BACKGROUND_URL_PATTERN = re.compile(r'background(?:-image)?:\s*url\((.*?)\)')
+CONTENT_URL_PATTERN = re.compile(r'content:\s*url\((.*?)\)')
+
+# Only these string types are returned by get_text()/stripped_strings (no comments, scripts, styles...)
+TEXT_STRING_TYPES = (NavigableString, CData)
+
+DIGIT_PATTERN = re.compile(r'\d')
+
+
+def safe_normalize_url(base_url, url):
+    """
+    Normalize a URL like normalize_url, but return None for URLs that urllib refuses to parse.
+
+    Args:
+        base_url (str): The base URL to use for resolving relative URLs.
+        url (str): The URL found in the page.
+
+    Returns:
+        str: The normalized URL, or None if the URL is empty or invalid.
+    """
+    try:
+        return normalize_url(base_url, url)
+    except ValueError:
+        return None
+
+
+def split_image_sources(value):
+    """
+    Split an src/srcset attribute value into the URL part of each candidate.
+
+    Args:
+        value (str): The attribute value (e.g. "a.jpg 1x, b.jpg 2x").
+
+    Returns:
+        list: The URL of every non-empty candidate.
+    """
+    urls = []
+    for candidate in value.split(','):
+        parts = candidate.split()
+        if parts:
+            urls.append(parts[0])
+    return urls
+
+
+def opening_tag(block):
+    """
+    Render only the opening tag of a block, e.g. '<div class="item"', without serializing its children.
+
+    Args:
+        block (Tag): The HTML block.
+
+    Returns:
+        str: The same string as str(block).split('>')[0].
+    """
+    return str(Tag(name=block.name, attrs=block.attrs, prefix=block.prefix)).split('>')[0]
+
+
+class PageAggregates:
+    """
+    Page-wide lists collected in one walk over the parse tree, plus the slice of each list covered by every candidate
+    block.
+
+    Attributes:
+        strings (list): Stripped, non-empty text strings in document order.
+        digit_counts (list): digit_counts[i] is the number of strings among strings[:i] that contain a digit.
+        anchors (list): Normalized href of every <a href> in document order.
+        images (list): (kind, normalized URL) for every image source in document order.
+        titled (list): [start, end) string slice of every tag with a 'title' or 'name' class.
+        blocks (list): The candidate block tags (div, li, article, span, ul) in document order.
+        depths (list): Number of ancestors of each block.
+        parents (list): Index of the closest enclosing block, or -1.
+        ranges (list): For each block [strings start, end, anchors start, end, images start, end, titled start, end].
+        marked (list): Indices of the blocks already marked by an earlier extraction of the same page.
+    """
+    def __init__(self):
+        self.strings = []
+        self.digit_counts = [0]
+        self.anchors = []
+        self.images = []
+        self.titled = []
+        self.blocks = []
+        self.depths = []
+        self.parents = []
+        self.ranges = []
+        self.marked = []
+
+    def block_text(self, index):
+        """Return block.get_text(strip=True) for the block at index."""
+        ranges = self.ranges[index]
+        return ''.join(self.strings[ranges[0]:ranges[1]])
+
+    def block_product_urls(self, index):
+        """Return the set of product URLs inside the block, built in the same order as find_product_url."""
+        ranges = self.ranges[index]
+        return set(self.anchors[ranges[2]:ranges[3]])
+
+    def block_image_urls(self, index):
+        """Return the set of image URLs inside the block, built in the same order as find_image_url."""
+        ranges = self.ranges[index]
+        entries = sorted(self.images[ranges[4]:ranges[5]], key=itemgetter(0))
+        return {url for _, url in entries}
+
+
+def aggregate_page(soup, base_url, normalized_urls=None):
+    """
+    Walk the parse tree once and collect the page aggregates used for block detection.
+
+    Args:
+        soup (BeautifulSoup or Tag): Parsed HTML of the page, or a single block (the block itself is not included).
+        base_url (str): Base URL used to resolve relative links and images.
+        normalized_urls (dict, optional): Memo of the normalized URLs, shared when several blocks of a page are walked.
+
+    Returns:
+        PageAggregates: The collected aggregates.
+    """
+    aggregates = PageAggregates()
+    strings = aggregates.strings
+    digit_counts = aggregates.digit_counts
+    anchors = aggregates.anchors
+    images = aggregates.images
+    titled = aggregates.titled
+
+    # The same link or image often appears several times in a card (thumbnail src and srcset, title link...)
+    if normalized_urls is None:
+        normalized_urls = {}
+
+    def normalize(url):
+        if url not in normalized_urls:
+            normalized_urls[url] = safe_normalize_url(base_url, url)
+        return normalized_urls[url]
+
+    # Stack of open tags as (tag, block index or -1, titled index or -1, closest enclosing block index or -1)
+    stack = []
+
+    def close(entry):
+        _, block_index, titled_index, _ = entry
+        if block_index != -1:
+            ranges = aggregates.ranges[block_index]
+            ranges[1] = len(strings)
+            ranges[3] = len(anchors)
+            ranges[5] = len(images)
+            ranges[7] = len(titled)
+        if titled_index != -1:
+            titled[titled_index][1] = len(strings)
+
+    for element in soup.descendants:
+        # Close every tag whose subtree ended before this element
+        parent = element.parent
+        while stack and stack[-1][0] is not parent:
+            close(stack.pop())
+
+        if isinstance(element, Tag):
+            name = element.name
+            attrs = element.attrs
+            enclosing_block = stack[-1][3] if stack else -1
+
+            # Entries of the tag itself come first, a block does not see its own entries (find_all skips the block)
+            if name == 'a' and 'href' in attrs:
+                product_url = normalize(attrs['href'])
+                if product_url:
+                    anchors.append(product_url)
+
+            if name == 'img' or name == 'source':
+                for kind, (tag_name, attribute) in enumerate(IMAGE_SOURCE_ATTRIBUTES):
+                    if tag_name == name and attribute in attrs:
+                        for url in split_image_sources(attrs[attribute]):
+                            normalized_url = normalize(url)
+                            if normalized_url:
+                                images.append((kind, normalized_url))
+
+            if 'style' in attrs:
+                style = attrs['style']
+                for pattern in (BACKGROUND_URL_PATTERN, CONTENT_URL_PATTERN):
+                    match = pattern.search(style)
+                    if match:
+                        image_url = normalize(match.group(1))
+                        if image_url:
+                            images.append((STYLE_IMAGE_KIND, image_url))
+
+            titled_index = -1
+            if name in TITLE_TAGS:
+                classes = attrs.get('class', [])
+                if 'title' in classes or 'name' in classes:
+                    titled_index = len(titled)
+                    titled.append([len(strings), len(strings)])
+
+            block_index = -1
+            if name in BLOCK_TAGS:
+                block_index = len(aggregates.blocks)
+                aggregates.blocks.append(element)
+                aggregates.depths.append(len(stack) + 1)
+                aggregates.parents.append(enclosing_block)
+                aggregates.ranges.append([
+                    len(strings), len(strings),
+                    len(anchors), len(anchors),
+                    len(images), len(images),
+                    len(titled), len(titled)
+                ])
+                enclosing_block = block_index
+
+            stack.append((element, block_index, titled_index, enclosing_block))
+
+        elif type(element) in TEXT_STRING_TYPES:
+            text = element.strip()
+            if text:
+                strings.append(text)
+                digit_counts.append(digit_counts[-1] + (1 if DIGIT_PATTERN.search(text) else 0))
+
+    while stack:
+        close(stack.pop())
+
+    return aggregates
+
+
+def find_block_title(aggregates, ranges, scraper, titled_titles):
+    """
+    Find the title of a block like find_title, from the block's slices of the aggregates.
+
+    Args:
+        aggregates (PageAggregates): Aggregates of the page.
+        ranges (list): The block's slices (see PageAggregates.ranges).
+        scraper (GeneralizedScraper): Scraper providing the title heuristic.
+        titled_titles (dict): Cache of the valid title (or None) of every 'title'/'name' tag already checked.
+
+    Returns:
+        str: The title, or None if the block has no valid title.
+    """
+    strings = aggregates.strings
+
+    # First valid 'title'/'name' tag inside the block
+    for titled_index in range(ranges[6], ranges[7]):
+        if titled_index not in titled_titles:
+            start, end = aggregates.titled[titled_index]
+            text_content = ''.join(strings[start:end])
+            titled_titles[titled_index] = text_content if scraper._is_valid_title(text_content) else None
+        if titled_titles[titled_index]:
+            return titled_titles[titled_index]
+
+    # Fallback to the longest text if no specific title is found
+    longest_text = max(strings[ranges[0]:ranges[1]], key=len, default="")
+    if scraper._is_valid_title(longest_text):
+        return longest_text
+    return None
+
+
+def evaluate_block(aggregates, ranges, scraper, titled_titles):
+    """
+    Extract the product information of a block like extract_product_info, from the block's slices of the aggregates.
+
+    Args:
+        aggregates (PageAggregates): Aggregates of the page.
+        ranges (list): The block's slices (see PageAggregates.ranges).
+        scraper (GeneralizedScraper): Scraper providing the title/price heuristics and the dedup state.
+        titled_titles (dict): Cache of the titles of the 'title'/'name' tags, shared by the blocks of a page.
+
+    Returns:
+        tuple: (product URLs, image URLs, price, title), or None if the block is not a new product.
+    """
+    digit_counts = aggregates.digit_counts
+
+    # Cheap structural checks: a product needs links, images and a digit somewhere in its text
+    if ranges[2] == ranges[3] or ranges[4] == ranges[5]:
+        return None
+    if digit_counts[ranges[1]] == digit_counts[ranges[0]]:
+        return None
+
+    title = find_block_title(aggregates, ranges, scraper, titled_titles)
+    if not title:
+        return None
+
+    price = scraper._find_price_in_text(''.join(aggregates.strings[ranges[0]:ranges[1]]))
+    if not price:
+        return None
+
+    product_urls = [url for url in set(aggregates.anchors[ranges[2]:ranges[3]]) if url not in scraper.detected_products]
+    if not product_urls:
+        return None
+
+    image_entries = sorted(aggregates.images[ranges[4]:ranges[5]], key=itemgetter(0))
+    image_urls = [url for url in {url for _, url in image_entries} if url not in scraper.detected_image_urls]
+    if not image_urls:
+        return None
+
+    return product_urls, image_urls, price, title
+
+
+def extract_block_product_info(block, scraper, normalized_urls=None):
+    """
+    Extract the product information of a single block with one walk over its subtree.
+
+    Gives the same result as scraper.extract_product_info(block), used when the product blocks are already known
+    (e.g. selected with a block template).
+
+    Args:
+        block (Tag): The HTML block.
+        scraper (GeneralizedScraper): Scraper providing the heuristics, the base URL and the dedup state.
+        normalized_urls (dict, optional): Memo of the normalized URLs, shared by the blocks of a page.
+
+    Returns:
+        tuple: (product URLs, image URLs, price, title), or None if the block is not a new product.
+    """
+    aggregates = aggregate_page(block, scraper.shopping_website, normalized_urls)
+    ranges = [
+        0, len(aggregates.strings),
+        0, len(aggregates.anchors),
+        0, len(aggregates.images),
+        0, len(aggregates.titled)
+    ]
+    return evaluate_block(aggregates, ranges, scraper, {})
+
+
+def select_product_blocks(aggregates, scraper):
+    """
+    Choose product blocks from the page aggregates, deepest blocks first, exactly like the per-block heuristic.
+
+    The scraper's dedup state (detected_products, detected_image_urls) is read when each block is evaluated, so the
+    caller has to record a yielded product before asking for the next one.
+
+    Args:
+        aggregates (PageAggregates): Aggregates of the page.
+        scraper (GeneralizedScraper): Scraper providing the title/price heuristics and the dedup state.
+
+    Yields:
+        tuple: (block index, (product URLs, image URLs, price, title)) for every detected product block.
+    """
+    parents = aggregates.parents
+    # Blocks already marked by the scraper (e.g. products found with a block template) are skipped like in the legacy loop
+    marked = [id(block) in scraper.marked_blocks for block in aggregates.blocks]
+    for index in aggregates.marked:
+        marked[index] = True
+    titled_titles = {}
+
+    # Deepest blocks first, blocks of the same depth in document order
+    order = sorted(range(len(aggregates.blocks)), key=aggregates.depths.__getitem__, reverse=True)
+
+    for index in order:
+        if marked[index]:
+            continue
+
+        product_info = evaluate_block(aggregates, aggregates.ranges[index], scraper, titled_titles)
+        if not product_info:
+            continue
+
+        # Mark the block and its enclosing blocks so they are not reported again
+        parent = index
+        while parent != -1 and not marked[parent]:
+            marked[parent] = True
+            parent = parents[parent]
+
+        yield index, product_info
@@ -0,0 +1,240 @@
+import json
+import os
+import tempfile
+from collections import Counter, defaultdict
+from itertools import islice
+from urllib.parse import urlparse
+
+from bs4 import Tag
+
+"""
+Learned product block templates.
+
+On a listing page every product is wrapped in the same kind of block (e.g. <li class="s-item s-item__pl-on-bottom">
+inside the same <ul>). Once the full heuristic has found the products of a page, the block that wraps them is
+summarized as a template: the tag names on the path to the block and the class tokens shared by the blocks. Later
+pages and later queries of the same shop select the product blocks directly with the template and only run the
+per-block extraction on them. The templates are kept per domain and can be persisted to a JSON file shared by all
+workers.
+"""
+
+# Number of tag names in a template path (the block and its closest ancestors)
+TEMPLATE_PATH_DEPTH = 4
+
+# A template is only learned if the same block layout holds most of the products of the page
+MIN_TEMPLATE_BLOCKS = 3
+MIN_TEMPLATE_COVERAGE = 0.9
+
+# Class tokens present on at least this share of the product blocks are part of the template
+STABLE_TOKEN_RATIO = 0.9
+
+# The full heuristic is run again when the template finds less than this share of the learned product count
+MIN_TEMPLATE_YIELD = 0.5
+
+
+def template_domain(shopping_website):
+    """
+    Get the key under which the templates of a shop are stored, e.g. 'ebay.com' for 'https://www.ebay.com'.
+
+    Args:
+        shopping_website (str): The URL of the shopping website.
+
+    Returns:
+        str: The domain of the shop without 'www.'.
+    """
+    netloc = (urlparse(shopping_website or '').netloc or (shopping_website or '')).lower()
+    return netloc[len('www.'):] if netloc.startswith('www.') else netloc
+
+
+def block_path(block, path_depth=TEMPLATE_PATH_DEPTH):
+    """
+    Get the tag names from the path_depth-th ancestor of a block down to the block.
+
+    Args:
+        block (Tag): The HTML block.
+        path_depth (int, optional): Number of tag names in the path.
+
+    Returns:
+        tuple: Tag names, the block's own name last.
+    """
+    names = [block.name] + [parent.name for parent in islice(block.parents, path_depth - 1)]
+    return tuple(reversed(names))
+
+
+class BlockTemplate:
+    """
+    Compact signature of the blocks wrapping the products of a shop.
+
+    Args:
+        path (tuple): Tag names on the path to the block, the block's own name last.
+        class_tokens (iterable): Class tokens every product block has.
+        expected_count (int): Number of product blocks on the page the template was learned from.
+    """
+    def __init__(self, path, class_tokens, expected_count):
+        self.path = tuple(path)
+        self.class_tokens = frozenset(class_tokens)
+        self.expected_count = expected_count
+
+    @property
+    def tag(self):
+        return self.path[-1]
+
+    def matches(self, block):
+        """
+        Check if a block has the template's class tokens and tag path.
+
+        Args:
+            block (Tag): The HTML block.
+
+        Returns:
+            bool: True if the block matches the template.
+        """
+        if block.name != self.tag:
+            return False
+        if self.class_tokens and not self.class_tokens.issubset(block.get('class', [])):
+            return False
+        return block_path(block, len(self.path)) == self.path
+
+    def select(self, soup):
+        """
+        Select the innermost blocks matching the template, in document order.
+
+        Args:
+            soup (BeautifulSoup): Parsed HTML of the page.
+
+        Returns:
+            list: The matching blocks.
+        """
+        # A plain walk over the tree, find_all's generic matching costs more than the checks themselves
+        tag = self.tag
+        class_tokens = self.class_tokens
+        blocks = []
+        for element in soup.descendants:
+            if element.__class__ is not Tag or element.name != tag:
+                continue
+            if class_tokens and not class_tokens.issubset(element.get('class', ())):
+                continue
+            if block_path(element, len(self.path)) == self.path:
+                blocks.append(element)
+
+        # Nested wrappers can match the same template, only the innermost one is the product block
+        matched = {id(block) for block in blocks}
+        outer = set()
+        for block in blocks:
+            for parent in block.parents:
+                if id(parent) in matched:
+                    outer.add(id(parent))
+                    break
+        return [block for block in blocks if id(block) not in outer]
+
+    def same_layout(self, other):
+        """Check if another template describes the same block layout."""
+        return other is not None and self.path == other.path and self.class_tokens == other.class_tokens
+
+    def min_yield(self):
+        """Number of products below which the template is considered to be failing on a page."""
+        return max(1, int(self.expected_count * MIN_TEMPLATE_YIELD))
+
+    def to_dict(self):
+        return {
+            "path": list(self.path),
+            "class_tokens": sorted(self.class_tokens),
+            "expected_count": self.expected_count
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["path"], data["class_tokens"], data["expected_count"])
+
+    def __repr__(self):
+        return f"BlockTemplate(path={'>'.join(self.path)}, class_tokens={sorted(self.class_tokens)})"
+
+
+def learn_block_template(blocks, path_depth=TEMPLATE_PATH_DEPTH):
+    """
+    Learn a block template from the product blocks detected on a page.
+
+    Args:
+        blocks (list): The detected product blocks (Tag objects).
+        path_depth (int, optional): Number of tag names in the template path.
+
+    Returns:
+        BlockTemplate: The learned template, or None if the products are not wrapped in one common layout.
+    """
+    groups = defaultdict(list)
+    for block in blocks:
+        groups[block_path(block, path_depth)].append(block)
+
+    if not groups:
+        return None
+
+    path, group = max(groups.items(), key=lambda item: len(item[1]))
+    if len(group) < MIN_TEMPLATE_BLOCKS or len(group) < MIN_TEMPLATE_COVERAGE * len(blocks):
+        return None
+
+    token_counts = Counter(token for block in group for token in set(block.get('class', [])))
+    class_tokens = [token for token, count in token_counts.items() if count >= STABLE_TOKEN_RATIO * len(group)]
+
+    return BlockTemplate(path, class_tokens, expected_count=len(group))
+
+
+class BlockTemplateCache:
+    """
+    Block templates per shop domain, optionally persisted to a JSON file.
+
+    Args:
+        cache_path (str, optional): JSON file storing the templates. If None, the templates are kept in memory only.
+    """
+    def __init__(self, cache_path=None):
+        self.cache_path = cache_path
+        self.loaded_mtime = None  # Modification time of the file when it was last read
+        self.templates = self._load()
+
+    def _mtime(self):
+        try:
+            return os.stat(self.cache_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _load(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return {}
+        self.loaded_mtime = self._mtime()
+        try:
+            with open(self.cache_path, encoding='utf-8') as file:
+                data = json.load(file)
+            return {domain: BlockTemplate.from_dict(template) for domain, template in data.items()}
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Failed to load block templates from {self.cache_path}: {e}")
+            return {}
+
+    def _save(self):
+        if not self.cache_path:
+            return
+
+        # Other workers may have learned templates for other shops in the meantime
+        templates = self._load()
+        templates.update(self.templates)
+        for domain in [domain for domain, template in templates.items() if template is None]:
+            del templates[domain]
+
+        directory = os.path.dirname(self.cache_path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        file_descriptor, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(file_descriptor, 'w', encoding='utf-8') as file:
+            json.dump({domain: template.to_dict() for domain, template in templates.items()}, file, indent=2)
+        os.replace(temp_path, self.cache_path)
+
+    def get(self, domain):
+        """Get the template of a domain, or None."""
+        if domain not in self.templates and self.cache_path and self._mtime() != self.loaded_mtime:
+            # Another worker may have learned it since the file was loaded, the file is only read again once changed
+            self.templates.update(self._load())
+        return self.templates.get(domain)
+
+    def put(self, domain, template):
+        """Store the template of a domain, None forgets the domain's template."""
+        self.templates[domain] = template
+        self._save()
+        if template is None:
+            self.templates.pop(domain, None)
@@ -0,0 +1,344 @@
+import json
+
+from bs4 import Tag
+from bs4.builder._htmlparser import HTMLParserTreeBuilder
+
+from UniversalWebshopScraper.generalized_scrapper.core.block_detection import (
+    BACKGROUND_URL_PATTERN, CONTENT_URL_PATTERN, DIGIT_PATTERN, STYLE_IMAGE_KIND, PageAggregates, safe_normalize_url,
+    split_image_sources
+)
+
+"""
+In-browser page aggregation.
+
+driver.page_source serializes the whole DOM (inline JSON state, scripts, styles, svg icons...) over the WebDriver
+wire, and the HTML is then parsed again in Python. Here the DOM is walked by a script injected with execute_script.
+The script collects the same page aggregates as block_detection.aggregate_page: the stripped strings, the raw href of
+the links, the raw image attributes and the slices of every candidate block. The page is pruned in the browser: only
+blocks that contain a link, an image and a digit can be product blocks, so only those blocks and the content inside
+them are returned.
+
+URL normalization, the price pattern, the title checks and the dedup against the URLs detected by the other workers
+stay in Python (select_product_blocks), so the stored products are the same as with the page_source path.
+
+With incremental extraction (infinite scroll), the products detected on the page are remembered inside the page:
+the next extractions skip their subtrees and only return the content added since, while the detected blocks and
+their ancestors stay marked like in the full-page detection.
+
+Differences with the page_source path: content of <noscript> is not parsed (the browser keeps it as text) and
+learned block templates are not used (they need the parse tree).
+
+The CAPTCHA check of these pages does not need page_source either: BROWSER_CAPTCHA_SCRIPT returns the few opening tags
+and text passages that can hold a CAPTCHA indicator, captcha_detection.detect_captcha then checks them in Python.
+"""
+
+# Walks the DOM and returns the aggregates of the candidate product blocks as a JSON string.
+# Python's str.strip() and re '\d' semantics are reproduced so the strings and the pruning match aggregate_page.
+BROWSER_AGGREGATES_SCRIPT = r"""
+var BLOCK_TAGS = {div: 1, li: 1, article: 1, span: 1, ul: 1};
+var TITLE_TAGS = {h1: 1, h2: 1, h3: 1, span: 1, a: 1, div: 1};
+var IMAGE_SOURCE_ATTRIBUTES = [['img', 'src'], ['img', 'srcset'], ['img', 'data-src'], ['img', 'data-srcset'],
+                               ['source', 'srcset']];
+var STYLE_IMAGE_KIND = IMAGE_SOURCE_ATTRIBUTES.length;
+// Strings inside these tags are not returned by BeautifulSoup's get_text()
+var NON_TEXT_TAGS = {script: 1, style: 1, template: 1, rt: 1, rp: 1, noscript: 1};
+// Python's str.strip() whitespace
+var STRIP_PATTERN = /^[\t\n\x0b\x0c\r\x1c-\x1f \x85\xa0\u1680\u2000-\u200a\u2028\u2029\u202f\u205f\u3000]+|[\t\n\x0b\x0c\r\x1c-\x1f \x85\xa0\u1680\u2000-\u200a\u2028\u2029\u202f\u205f\u3000]+$/g;
+var DIGIT_PATTERN = /\p{Nd}/u;
+
+// Elements of the page already handled by an incremental extraction (see BROWSER_MARK_SCRIPT)
+var incremental = arguments[0];
+var extraction = window.__scraperExtraction;
+if (!extraction) {
+    extraction = window.__scraperExtraction = {products: new WeakSet(), marked: new WeakSet(), blocks: []};
+}
+
+function walk(root, enter, exit) {
+    // Depth-first walk calling enter() on every node, the subtree of the node is walked if enter() returns true and
+    // exit() is called once its children are done
+    var node = root;
+    while (node) {
+        var entered = enter(node);
+        if (entered && node.firstChild) {
+            node = node.firstChild;
+            continue;
+        }
+        if (entered) exit(node);
+        while (node !== root && !node.nextSibling) {
+            node = node.parentNode;
+            exit(node);
+        }
+        if (node === root) break;
+        node = node.nextSibling;
+    }
+}
+
+function textOf(node) {
+    // Adjacent text nodes are a single string once the page is serialized and parsed again
+    if (node.previousSibling && node.previousSibling.nodeType === 3) return null;
+    var text = node.data;
+    for (var next = node.nextSibling; next && next.nodeType === 3; next = next.nextSibling) text += next.data;
+    return text.replace(STRIP_PATTERN, '');
+}
+
+function imageSources(element, name) {
+    var sources = [];
+    for (var kind = 0; kind < IMAGE_SOURCE_ATTRIBUTES.length; kind++) {
+        var source = IMAGE_SOURCE_ATTRIBUTES[kind];
+        if (source[0] === name && element.hasAttribute(source[1])) sources.push([kind, element.getAttribute(source[1])]);
+    }
+    if (element.hasAttribute('style')) sources.push([STYLE_IMAGE_KIND, element.getAttribute('style')]);
+    return sources;
+}
+
+var root = document.documentElement;
+var nonText = 0;
+
+// First walk: flag the blocks whose subtree has a link, an image and a digit (the block's own attributes excluded)
+var HAS_LINK = 1, HAS_IMAGE = 2, HAS_DIGIT = 4, IS_PRODUCT_CANDIDATE = 7;
+var subtreeFlags = [0];
+var candidates = new Set();
+walk(root, function (node) {
+    if (node.nodeType === 3) {
+        if (!nonText) {
+            var text = textOf(node);
+            if (text && DIGIT_PATTERN.test(text)) subtreeFlags[subtreeFlags.length - 1] |= HAS_DIGIT;
+        }
+        return false;
+    }
+    if (node.nodeType !== 1) return false;
+    // Products found by an earlier incremental extraction are not extracted again
+    if (incremental && extraction.products.has(node)) return false;
+    var name = node.localName;
+    var flags = 0;
+    if (name === 'a' && node.getAttribute('href')) flags |= HAS_LINK;
+    var sources = imageSources(node, name);
+    for (var i = 0; i < sources.length; i++) {
+        if (sources[i][0] !== STYLE_IMAGE_KIND ? sources[i][1] : sources[i][1].indexOf('url(') !== -1) flags |= HAS_IMAGE;
+    }
+    subtreeFlags[subtreeFlags.length - 1] |= flags;
+    subtreeFlags.push(0);
+    if (NON_TEXT_TAGS[name]) nonText++;
+    return true;
+}, function (element) {
+    var flags = subtreeFlags.pop();
+    subtreeFlags[subtreeFlags.length - 1] |= flags;
+    if (NON_TEXT_TAGS[element.localName]) nonText--;
+    if (BLOCK_TAGS[element.localName] && flags === IS_PRODUCT_CANDIDATE) candidates.add(element);
+});
+
+// Second walk: collect the aggregates inside the candidate blocks
+var strings = [], anchors = [], images = [], titled = [], blocks = [], blockElements = [];
+var depth = 0, openCandidates = [], openTitled = [];
+walk(root, function (node) {
+    var inside = openCandidates.length > 0;
+    if (node.nodeType === 3) {
+        if (inside && !nonText) {
+            var text = textOf(node);
+            if (text) strings.push(text);
+        }
+        return false;
+    }
+    if (node.nodeType !== 1) return false;
+    if (incremental && extraction.products.has(node)) return false;
+    var name = node.localName;
+    depth++;
+    if (NON_TEXT_TAGS[name]) nonText++;
+
+    // Entries of the element itself come first, a block does not see its own entries
+    if (inside) {
+        if (name === 'a' && node.hasAttribute('href')) anchors.push(node.getAttribute('href'));
+        Array.prototype.push.apply(images, imageSources(node, name));
+        if (TITLE_TAGS[name] && (node.classList.contains('title') || node.classList.contains('name'))) {
+            openTitled.push([node, titled.length]);
+            titled.push([strings.length, strings.length]);
+        }
+    }
+    if (candidates.has(node)) {
+        var attributes = [];
+        for (var i = 0; i < node.attributes.length; i++) attributes.push([node.attributes[i].name, node.attributes[i].value]);
+        var parent = openCandidates.length ? openCandidates[openCandidates.length - 1][1] : -1;
+        openCandidates.push([node, blocks.length]);
+        blockElements.push(node);
+        blocks.push([name, attributes, depth, parent, strings.length, strings.length, anchors.length, anchors.length,
+                     images.length, images.length, titled.length, titled.length,
+                     incremental && extraction.marked.has(node) ? 1 : 0]);
+    }
+    return true;
+}, function (element) {
+    depth--;
+    if (NON_TEXT_TAGS[element.localName]) nonText--;
+    if (openTitled.length && openTitled[openTitled.length - 1][0] === element) {
+        titled[openTitled.pop()[1]][1] = strings.length;
+    }
+    if (openCandidates.length && openCandidates[openCandidates.length - 1][0] === element) {
+        var block = blocks[openCandidates.pop()[1]];
+        block[5] = strings.length;
+        block[7] = anchors.length;
+        block[9] = images.length;
+        block[11] = titled.length;
+    }
+});
+
+extraction.blocks = blockElements;
+return JSON.stringify({strings: strings, anchors: anchors, images: images, titled: titled, blocks: blocks});
+"""
+
+# Remembers the blocks detected as products by the last extraction (arguments[0] holds their indices): their
+# subtrees are skipped and they and their ancestors are marked in the next incremental extractions, like
+# GeneralizedScraper.mark_and_block.
+BROWSER_MARK_SCRIPT = r"""
+var extraction = window.__scraperExtraction;
+var indices = arguments[0];
+for (var i = 0; i < indices.length; i++) {
+    var element = extraction.blocks[indices[i]];
+    extraction.products.add(element);
+    for (var ancestor = element; ancestor && !extraction.marked.has(ancestor); ancestor = ancestor.parentElement) {
+        extraction.marked.add(ancestor);
+    }
+}
+"""
+
+# Counts in how many elements every string appears, like trash_detection. arguments[0] is the threshold.
+BROWSER_TRASH_SCRIPT = r"""
+var NON_TEXT_TAGS = {script: 1, style: 1, template: 1, rt: 1, rp: 1, noscript: 1};
+var STRIP_PATTERN = /^[\t\n\x0b\x0c\r\x1c-\x1f \x85\xa0\u1680\u2000-\u200a\u2028\u2029\u202f\u205f\u3000]+|[\t\n\x0b\x0c\r\x1c-\x1f \x85\xa0\u1680\u2000-\u200a\u2028\u2029\u202f\u205f\u3000]+$/g;
+var DIGIT_PATTERN = /\p{Nd}/u;
+var threshold = arguments[0];
+
+var root = document.documentElement;
+var elements = new Map();
+var iterator = document.createNodeIterator(root, NodeFilter.SHOW_TEXT);
+for (var node = iterator.nextNode(); node; node = iterator.nextNode()) {
+    if (node.previousSibling && node.previousSibling.nodeType === 3) continue;
+    var text = node.data;
+    for (var next = node.nextSibling; next && next.nodeType === 3; next = next.nextSibling) text += next.data;
+    text = text.replace(STRIP_PATTERN, '');
+    // Same filter as trash_detection: longer than 5 characters and no digit
+    if (Array.from(text).length <= 5 || DIGIT_PATTERN.test(text)) continue;
+
+    var ancestors = [];
+    var excluded = false;
+    for (var element = node.parentElement; element; element = element.parentElement) {
+        if (NON_TEXT_TAGS[element.localName]) {
+            excluded = true;
+            break;
+        }
+        ancestors.push(element);
+    }
+    if (excluded) continue;
+
+    if (!elements.has(text)) elements.set(text, new Set());
+    var seen = elements.get(text);
+    for (var i = 0; i < ancestors.length; i++) seen.add(ancestors[i]);
+}
+
+var trash = [];
+elements.forEach(function (seen, text) {
+    if (seen.size >= threshold) trash.push(text);
+});
+return JSON.stringify(trash);
+"""
+
+# Returns a small HTML snippet holding the CAPTCHA indicators of the page, for captcha_detection.detect_captcha: the
+# opening tags of the elements the indicators are found in (a CAPTCHA iframe, form, script or widget id/class) and the
+# visible text around the words of the CAPTCHA messages, escaped so it is matched as text.
+BROWSER_CAPTCHA_SCRIPT = r"""
+var SELECTOR = 'iframe[src*="captcha" i], form[action*="captcha" i], script[src*="captcha" i]';
+['captcha', 'arkose', 'baxia-punish', 'nc-container'].forEach(function (word) {
+    SELECTOR += ', [id*="' + word + '" i], [class*="' + word + '" i]';
+});
+var TEXT_WORDS = ['slide', 'unusual', 'robot'];
+var MAX_TAGS = 5;
+var MAX_PASSAGES = 20;  // Per word, the words also appear in product titles
+var TEXT_WINDOW = 100;  // Characters around a word, longer than the messages
+
+var parts = [];
+var elements = document.querySelectorAll(SELECTOR);
+for (var i = 0; i < elements.length && i < MAX_TAGS; i++) {
+    var html = elements[i].outerHTML;
+    parts.push(html.slice(0, html.indexOf('>') + 1));
+}
+
+var text = document.body ? document.body.innerText || '' : '';
+var lowered = text.toLowerCase();
+TEXT_WORDS.forEach(function (word) {
+    for (var index = lowered.indexOf(word), found = 0; index >= 0 && found < MAX_PASSAGES;
+         index = lowered.indexOf(word, index + word.length), found++) {
+        var passage = text.slice(Math.max(0, index - TEXT_WINDOW), index + word.length + TEXT_WINDOW);
+        parts.push(passage.replace(/&/g, '&amp;').replace(/</g, '&lt;'));
+    }
+});
+return parts.join('\n');
+"""
+
+# Splits multi-valued attributes (class, rel...) like the HTML tree builders, so opening_tag renders the same tag
+_TAG_BUILDER = HTMLParserTreeBuilder()
+
+
+def aggregates_from_browser(payload, base_url):
+    """
+    Build the page aggregates from the JSON returned by BROWSER_AGGREGATES_SCRIPT.
+
+    The links and images are normalized here, with the same rules as aggregate_page, and the block slices are shifted
+    to the normalized lists. The blocks are tags without children, they only carry the name and attributes of the
+    block for the parent_blocks report.
+
+    Args:
+        payload (str): JSON string returned by the script.
+        base_url (str): Base URL used to resolve relative links and images.
+
+    Returns:
+        PageAggregates: The aggregates of the candidate product blocks.
+    """
+    data = json.loads(payload)
+    aggregates = PageAggregates()
+
+    normalized_urls = {}
+
+    def normalize(url):
+        if url not in normalized_urls:
+            normalized_urls[url] = safe_normalize_url(base_url, url)
+        return normalized_urls[url]
+
+    for text in data["strings"]:
+        aggregates.strings.append(text)
+        aggregates.digit_counts.append(aggregates.digit_counts[-1] + (1 if DIGIT_PATTERN.search(text) else 0))
+
+    # anchor_offsets[i] is the number of normalized links among the first i raw links, same for the images
+    anchor_offsets = [0]
+    for href in data["anchors"]:
+        product_url = normalize(href)
+        if product_url:
+            aggregates.anchors.append(product_url)
+        anchor_offsets.append(len(aggregates.anchors))
+
+    image_offsets = [0]
+    for kind, value in data["images"]:
+        if kind == STYLE_IMAGE_KIND:
+            urls = [match.group(1) for match in (BACKGROUND_URL_PATTERN.search(value), CONTENT_URL_PATTERN.search(value))
+                    if match]
+        else:
+            urls = split_image_sources(value)
+        for url in urls:
+            image_url = normalize(url)
+            if image_url:
+                aggregates.images.append((kind, image_url))
+        image_offsets.append(len(aggregates.images))
+
+    aggregates.titled = [list(titled_range) for titled_range in data["titled"]]
+
+    for name, attributes, depth, parent, *ranges, marked in data["blocks"]:
+        if marked:
+            aggregates.marked.append(len(aggregates.blocks))
+        aggregates.blocks.append(Tag(builder=_TAG_BUILDER, name=name, attrs=dict(attributes)))
+        aggregates.depths.append(depth)
+        aggregates.parents.append(parent)
+        aggregates.ranges.append([
+            ranges[0], ranges[1],
+            anchor_offsets[ranges[2]], anchor_offsets[ranges[3]],
+            image_offsets[ranges[4]], image_offsets[ranges[5]],
+            ranges[6], ranges[7]
+        ])
+
+    return aggregates
@@ -0,0 +1,455 @@
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+"""
+Pool of warm Chrome drivers.
+
+Starting undetected Chrome takes seconds: chromedriver is patched, a fresh profile is created and Chrome runs its
+first-run work. The pool copies a profile template prepared once (first run done, shop cookies and cache in place)
+into a temporary directory per driver and launches its drivers in parallel. Drivers are handed out to scraping tasks
+and recycled once they loaded a number of pages or their processes use too much memory, a long-lived Chrome keeps
+growing. The memory is read from the processes (psutil) and from the page's JavaScript heap through Chrome's
+performance metrics (CDP), which also works without psutil. Every driver's profile directory is removed when the
+driver is closed.
+
+Page loads time out after PAGE_LOAD_TIMEOUT seconds instead of hanging, a driver that raises out of a lease is
+considered broken and replaced.
+"""
+
+MAX_PAGES_PER_DRIVER = 300  # Pages loaded by a driver before it is replaced
+MAX_DRIVER_RSS_MB = 1500  # Memory of the driver's processes (chromedriver and Chrome) above which it is replaced
+MAX_DRIVER_JS_HEAP_MB = 1024  # JavaScript heap of the driver's page above which it is replaced
+PAGE_LOAD_TIMEOUT = 60  # Seconds driver.get waits for a page before raising a TimeoutException
+
+# Files of a running Chrome profile, a copied profile must not contain them
+PROFILE_LOCK_FILES = ('SingletonLock', 'SingletonCookie', 'SingletonSocket', 'lockfile')
+
+
+def chrome_options(profile_dir):
+    """
+    Chrome options of the scraper's drivers, see GeneralizedScraper.default_initialize_driver.
+
+    Args:
+        profile_dir (str): The user data directory of the driver.
+
+    Returns:
+        ChromeOptions: The options.
+    """
+    import undetected_chromedriver as uc
+
+    options = uc.ChromeOptions()
+    options.add_argument(f"--user-data-dir={profile_dir}")
+    options.add_argument("--no-first-run")
+    options.add_argument("--new-window")
+    options.add_argument("--disable-extensions")
+    options.add_argument("--disable-popup-blocking")
+
+    # Prevent throttling and simulate foreground activity
+    options.add_argument("--disable-background-timer-throttling")
+    options.add_argument("--disable-backgrounding-occluded-windows")
+    options.add_argument("--disable-renderer-backgrounding")
+    options.add_argument("--disable-blink-features=AutomationControlled")
+    options.add_argument("--force-device-scale-factor=1")
+    options.add_argument(
+        "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/110.0.5481.178 Safari/537.36"
+    )
+    return options
+
+
+def launch_chrome(profile_dir, parallel=True):
+    """
+    Launch an undetected Chrome driver on a profile directory.
+
+    Args:
+        profile_dir (str): The user data directory of the driver, it is not removed when the driver quits.
+        parallel (bool, optional): Reuse the already patched chromedriver binary, so drivers can be launched at the
+                                   same time by several threads or processes.
+
+    Returns:
+        WebDriver: The driver.
+    """
+    import undetected_chromedriver as uc
+
+    try:
+        driver = uc.Chrome(options=chrome_options(profile_dir), user_multi_procs=parallel)
+    except ValueError:
+        if not parallel:
+            raise
+        # No patched chromedriver yet, this launch patches it
+        driver = uc.Chrome(options=chrome_options(profile_dir))
+
+    try:
+        driver.set_window_size(1920, 1080)
+    except Exception as e:
+        print(f"Failed to resize the browser window: {e}")
+    return driver
+
+
+def process_tree_rss_mb(pids):
+    """
+    Get the memory used by processes and all their children.
+
+    Args:
+        pids (iterable): Process ids.
+
+    Returns:
+        float: Resident memory in MB, None if psutil is not installed.
+    """
+    try:
+        import psutil
+    except ImportError:
+        return None
+
+    processes = {}
+    for pid in pids:
+        try:
+            process = psutil.Process(pid)
+            processes[process.pid] = process
+            for child in process.children(recursive=True):
+                processes[child.pid] = child
+        except psutil.Error:
+            continue
+
+    rss = 0
+    for process in processes.values():
+        try:
+            rss += process.memory_info().rss
+        except psutil.Error:
+            continue
+    return rss / (1024 * 1024)
+
+
+def driver_rss_mb(driver):
+    """
+    Get the memory used by a driver's chromedriver and Chrome processes.
+
+    Args:
+        driver (WebDriver): The driver.
+
+    Returns:
+        float: Resident memory in MB, None if it cannot be measured.
+    """
+    pids = [getattr(driver, 'browser_pid', None)]
+    service = getattr(driver, 'service', None)
+    process = getattr(service, 'process', None)
+    pids.append(getattr(process, 'pid', None))
+    return process_tree_rss_mb(pid for pid in pids if pid)
+
+
+def js_heap_mb(driver):
+    """
+    Get the JavaScript heap used by a driver's page, from Chrome's performance metrics (CDP).
+
+    Args:
+        driver (WebDriver): The driver.
+
+    Returns:
+        float: Used JavaScript heap in MB, None if it cannot be measured.
+    """
+    try:
+        driver.execute_cdp_cmd("Performance.enable", {})
+        metrics = driver.execute_cdp_cmd("Performance.getMetrics", {})
+    except Exception:
+        return None
+    for metric in metrics.get("metrics", []):
+        if metric.get("name") == "JSHeapUsedSize":
+            return metric["value"] / (1024 * 1024)
+    return None
+
+
+def copy_profile(template_dir, profile_dir):
+    """
+    Copy a profile template into a new profile directory, without the lock files of a running Chrome.
+
+    Args:
+        template_dir (str): The profile template.
+        profile_dir (str): The new profile directory, it must not exist.
+    """
+    shutil.copytree(template_dir, profile_dir, ignore=shutil.ignore_patterns(*PROFILE_LOCK_FILES),
+                    ignore_dangling_symlinks=True)
+
+
+def prepare_profile_template(template_dir, warm_url=None, launch=launch_chrome, settle_seconds=2):
+    """
+    Create the profile template once: Chrome's first run, and the shop's cookies and cache if warm_url is given.
+
+    The first launch also patches chromedriver, later launches can then run in parallel.
+
+    Args:
+        template_dir (str): Directory of the template, nothing is done if it already exists.
+        warm_url (str or list, optional): Page(s) opened before the template is saved, e.g. the shops' home pages.
+        launch (callable, optional): Launches a driver on a profile directory, launch(profile_dir, parallel).
+        settle_seconds (float, optional): Time given to every warm_url to set its cookies and fill the cache.
+
+    Returns:
+        str: The template directory.
+    """
+    if os.path.isdir(template_dir) and os.listdir(template_dir):
+        return template_dir
+
+    parent_dir = os.path.dirname(os.path.abspath(template_dir))
+    os.makedirs(parent_dir, exist_ok=True)
+    staging_dir = tempfile.mkdtemp(prefix="profile_template_", dir=parent_dir)
+
+    print(f"Preparing Chrome profile template in {template_dir}")
+    try:
+        driver = launch(staging_dir, parallel=False)
+    except BaseException:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+    try:
+        for url in [warm_url] if isinstance(warm_url, str) else warm_url or []:
+            driver.get(url)
+            time.sleep(settle_seconds)
+    finally:
+        driver.quit()
+
+    try:
+        # Renamed when complete, another process may have prepared the template in the meantime
+        if os.path.isdir(template_dir) and not os.listdir(template_dir):
+            os.rmdir(template_dir)
+        os.replace(staging_dir, template_dir)
+    except OSError:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+    return template_dir
+
+
+class PooledDriver:
+    """
+    A driver of the pool with its profile directory and usage.
+
+    Args:
+        driver (WebDriver): The driver.
+        profile_dir (str): The driver's profile directory, removed when the driver is closed.
+        launch_seconds (float): Time it took to launch the driver.
+    """
+    def __init__(self, driver, profile_dir, launch_seconds):
+        self.driver = driver
+        self.profile_dir = profile_dir
+        self.launch_seconds = launch_seconds
+        self.pages = 0  # Pages loaded since the launch, counted by the user of the driver
+
+    def quit(self):
+        """Quit the driver and remove its profile directory."""
+        try:
+            self.driver.quit()
+        except Exception as e:
+            print(f"Error closing driver: {e}")
+        shutil.rmtree(self.profile_dir, ignore_errors=True)
+
+
+class BrowserPool:
+    """
+    Drivers launched in parallel from a profile template, handed out to scraping tasks and recycled.
+
+    Args:
+        size (int, optional): Number of drivers.
+        profile_template (str, optional): Profile template copied for every driver (see prepare_profile_template),
+                                          an empty profile if not given.
+        max_pages (int, optional): Pages loaded by a driver before it is replaced.
+        max_rss_mb (float, optional): Memory of a driver's processes above which it is replaced, None to disable.
+        max_js_heap_mb (float, optional): JavaScript heap of a driver's page above which it is replaced, None to
+                                          disable.
+        page_load_timeout (float, optional): Seconds a page load may take, None to keep the driver's default.
+        launch (callable, optional): Launches a driver on a profile directory, launch(profile_dir, parallel).
+        memory_usage (callable, optional): Gets the memory used by a driver in MB, memory_usage(driver).
+        js_heap_usage (callable, optional): Gets the JavaScript heap used by a driver in MB, js_heap_usage(driver).
+        temp_root (str, optional): Directory of the drivers' profile directories, the system's temp dir if not given.
+    """
+    def __init__(self, size=1, profile_template=None, max_pages=MAX_PAGES_PER_DRIVER, max_rss_mb=MAX_DRIVER_RSS_MB,
+                 max_js_heap_mb=MAX_DRIVER_JS_HEAP_MB, page_load_timeout=PAGE_LOAD_TIMEOUT, launch=launch_chrome,
+                 memory_usage=driver_rss_mb, js_heap_usage=js_heap_mb, temp_root=None):
+        self.size = size
+        self.profile_template = profile_template
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        self.max_js_heap_mb = max_js_heap_mb
+        self.page_load_timeout = page_load_timeout
+        self.launch = launch
+        self.memory_usage = memory_usage
+        self.js_heap_usage = js_heap_usage
+        self.temp_root = temp_root
+        self.idle = queue.Queue()
+        self.drivers = []  # All drivers of the pool, idle or in use
+        self.lock = threading.Lock()
+        self.launches = 0
+        self.recycles = 0
+        self.launch_seconds = 0.0
+
+    def _launch(self):
+        start = time.monotonic()
+        profile_dir = tempfile.mkdtemp(prefix="pooled_chrome_", dir=self.temp_root)
+        try:
+            if self.profile_template:
+                # copytree needs a directory that does not exist yet
+                os.rmdir(profile_dir)
+                copy_profile(self.profile_template, profile_dir)
+            driver = self.launch(profile_dir, parallel=True)
+        except BaseException:
+            shutil.rmtree(profile_dir, ignore_errors=True)
+            raise
+        if self.page_load_timeout:
+            try:
+                driver.set_page_load_timeout(self.page_load_timeout)
+            except Exception as e:
+                print(f"Failed to set the page load timeout: {e}")
+
+        pooled = PooledDriver(driver, profile_dir, time.monotonic() - start)
+        with self.lock:
+            self.drivers.append(pooled)
+            self.launches += 1
+            self.launch_seconds += pooled.launch_seconds
+        print(f"Launched driver in {pooled.launch_seconds:.1f}s ({profile_dir}).")
+        return pooled
+
+    def start(self):
+        """
+        Launch the pool's drivers in parallel.
+
+        Returns:
+            BrowserPool: The started pool.
+        """
+        with ThreadPoolExecutor(max_workers=self.size) as executor:
+            futures = [executor.submit(self._launch) for _ in range(self.size)]
+
+        errors = []
+        for future in futures:
+            try:
+                self.idle.put(future.result())
+            except Exception as e:
+                errors.append(e)
+        if errors and self.idle.empty():
+            raise errors[0]
+        for error in errors:
+            print(f"Failed to launch a driver: {error}")
+        return self
+
+    def needs_recycling(self, pooled):
+        """
+        Check if a driver loaded too many pages or uses too much memory (processes or JavaScript heap).
+
+        Args:
+            pooled (PooledDriver): The driver.
+
+        Returns:
+            bool: True if the driver must be replaced.
+        """
+        if self.max_pages and pooled.pages >= self.max_pages:
+            return True
+        if self.max_rss_mb:
+            rss_mb = self.memory_usage(pooled.driver)
+            if rss_mb is not None and rss_mb >= self.max_rss_mb:
+                print(f"Driver uses {rss_mb:.0f} MB.")
+                return True
+        if self.max_js_heap_mb:
+            heap_mb = self.js_heap_usage(pooled.driver)
+            if heap_mb is not None and heap_mb >= self.max_js_heap_mb:
+                print(f"Driver's JavaScript heap uses {heap_mb:.0f} MB.")
+                return True
+        return False
+
+    def acquire(self, timeout=None):
+        """
+        Take an idle driver, waiting for one if all are in use.
+
+        Args:
+            timeout (float, optional): Maximum number of seconds to wait.
+
+        Returns:
+            PooledDriver: The driver.
+        """
+        return self.idle.get(timeout=timeout)
+
+    def release(self, pooled):
+        """
+        Give a driver back to the pool, it is replaced by a new driver if it needs recycling.
+
+        Args:
+            pooled (PooledDriver): The driver taken with acquire.
+        """
+        if self.needs_recycling(pooled):
+            print(f"Recycling driver after {pooled.pages} pages.")
+            self._close(pooled)
+            with self.lock:
+                self.recycles += 1
+            pooled = self._launch()
+        self.idle.put(pooled)
+
+    def discard(self, pooled):
+        """
+        Close a broken driver and give a new one to the pool.
+
+        Args:
+            pooled (PooledDriver): The driver taken with acquire.
+        """
+        self._close(pooled)
+        self.idle.put(self._launch())
+
+    @contextmanager
+    def lease(self, timeout=None):
+        """
+        Borrow a driver for a task, it is given back (and recycled if needed) at the end of the block. A driver the
+        block raises out of (a page load that timed out, a crashed Chrome) is discarded.
+
+        Args:
+            timeout (float, optional): Maximum number of seconds to wait for an idle driver.
+
+        Yields:
+            PooledDriver: The driver.
+        """
+        pooled = self.acquire(timeout)
+        try:
+            yield pooled
+        except BaseException:
+            try:
+                self.discard(pooled)
+            except Exception as e:
+                print(f"Failed to replace a broken driver: {e}")
+            raise
+        self.release(pooled)
+
+    def _close(self, pooled):
+        with self.lock:
+            if pooled in self.drivers:
+                self.drivers.remove(pooled)
+        pooled.quit()
+
+    def close(self):
+        """Quit all drivers and remove their profile directories."""
+        with self.lock:
+            drivers = list(self.drivers)
+        for pooled in drivers:
+            self._close(pooled)
+        while not self.idle.empty():
+            self.idle.get_nowait()
+
+    def metrics(self):
+        """
+        Get launch and memory statistics of the pool.
+
+        Returns:
+            dict: Number of launches and recycles, mean launch time in seconds, and memory and JavaScript heap per
+                  driver in MB.
+        """
+        with self.lock:
+            drivers = list(self.drivers)
+            launches, recycles, launch_seconds = self.launches, self.recycles, self.launch_seconds
+        return {
+            "launches": launches,
+            "recycles": recycles,
+            "mean_launch_seconds": launch_seconds / launches if launches else None,
+            "rss_mb": [self.memory_usage(pooled.driver) for pooled in drivers],
+            "js_heap_mb": [self.js_heap_usage(pooled.driver) for pooled in drivers]
+        }
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
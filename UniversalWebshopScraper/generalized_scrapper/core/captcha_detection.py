@@ -0,0 +1,77 @@
+import re
+
+"""
+CAPTCHA detection on the raw HTML of a page, in one regex pass and without a parse tree.
+
+The indicators are the ones GeneralizedScraper.is_captcha_present used to look for in the soup:
+
+    attribute   an id or class naming a CAPTCHA widget (captcha, recaptcha, h-captcha, nocaptcha, arkose, ...)
+    iframe      an iframe loading a CAPTCHA
+    form        a form posting to a CAPTCHA endpoint
+    script      a script loaded from a CAPTCHA provider
+    text        a CAPTCHA message in the text of the page ("unusual traffic", ...)
+
+All of them are alternatives of one compiled pattern scanned once over the HTML. The content of <script> and <style>
+elements and of comments is matched as a whole and skipped, so text indicators are only found in the visible text
+(like soup.get_text) and never in a script bundle that happens to contain the message.
+
+Every indicator contains one of CAPTCHA_KEYWORDS, so a page without any of them (most pages) is ruled out with a few
+substring searches before the pattern is scanned.
+"""
+
+CAPTCHA_ATTRIBUTE_WORDS = r"captcha|arkose|baxia-punish|nc-container"  # "captcha" also covers recaptcha, h-captcha...
+CAPTCHA_URL_WORDS = r"captcha"  # Covers recaptcha and hcaptcha
+CAPTCHA_TEXTS = [
+    r"Please\s+slide\s+to\s+verify",  # AliExpress NoCaptcha prompt
+    r"unusual\s+traffic",  # Generic unusual traffic message, also AliExpress' "Sorry, we have detected ..."
+    r"prove\s+you(?:'|&#0?39;|&#x27;|&apos;|\u2019)re\s+not\s+a\s+robot",  # Generic CAPTCHA message
+]
+
+# One of these is in every match of CAPTCHA_PATTERN (in the lowercased HTML)
+CAPTCHA_KEYWORDS = ("captcha", "arkose", "baxia-punish", "nc-container", "slide", "unusual", "robot")
+
+CAPTCHA_PATTERN = re.compile(
+    # Tags loading a CAPTCHA, the script one before the script content is skipped
+    r"(?P<iframe>(?i:<iframe\b[^>]*?\bsrc\s*=\s*[\"']?[^\"'\s>]*?(?:" + CAPTCHA_URL_WORDS + r")))"
+    r"|(?P<form>(?i:<form\b[^>]*?\baction\s*=\s*[\"']?[^\"'\s>]*?(?:" + CAPTCHA_URL_WORDS + r")))"
+    r"|(?P<script>(?i:<script\b[^>]*?\bsrc\s*=\s*[\"']?[^\"'\s>]*?(?:" + CAPTCHA_URL_WORDS + r")))"
+    # Content that is not text of the page
+    r"|(?P<skip>(?is:<script\b.*?</script\s*>|<style\b.*?</style\s*>|<!--.*?-->))"
+    r"|(?P<attribute>(?i:(?<![\w-])(?:id|class)\s*=\s*[\"']?[^\"'>]*?(?:" + CAPTCHA_ATTRIBUTE_WORDS + r")))"
+    r"|(?P<text>" + "|".join(CAPTCHA_TEXTS) + r")"
+)
+
+
+class CaptchaDetected(Exception):
+    """
+    A page shows a CAPTCHA and nobody can solve it at the console, e.g. in a worker process without stdin.
+
+    Args:
+        url (str, optional): The URL of the page.
+    """
+    def __init__(self, url=None):
+        super().__init__(f"CAPTCHA on {url}" if url else "CAPTCHA detected")
+        self.url = url
+
+
+def detect_captcha(html):
+    """
+    Find the first CAPTCHA indicator in the raw HTML of a page.
+
+    Args:
+        html (str): The HTML of the page.
+
+    Returns:
+        tuple: (indicator, matched HTML) of the first indicator found, e.g. ("iframe", '<iframe src="...recaptcha'),
+               or None if the page shows no CAPTCHA.
+    """
+    if not html:
+        return None
+    lowered = html.lower()
+    if not any(keyword in lowered for keyword in CAPTCHA_KEYWORDS):
+        return None
+    for match in CAPTCHA_PATTERN.finditer(html):
+        indicator = match.lastgroup
+        if indicator != "skip":
+            return indicator, match.group()
+    return None
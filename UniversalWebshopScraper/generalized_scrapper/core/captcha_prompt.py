@@ -0,0 +1,84 @@
+import queue
+import threading
+
+"""
+CAPTCHA prompts for the operator that do not block the orchestrator.
+
+The main process reports a worker that hit a CAPTCHA and goes on handling the status messages of the other workers.
+A background thread asks the operator to solve the pending CAPTCHAs one at a time, and the main process picks up the
+solved ones whenever it checks.
+"""
+
+
+class CaptchaPrompt:
+    """
+    Queue of workers waiting for the operator to solve a CAPTCHA, prompted in a background thread.
+
+    Args:
+        read_line (callable, optional): Shows a prompt and waits for the operator, input by default.
+    """
+    def __init__(self, read_line=input):
+        self.read_line = read_line
+        self.pending = queue.Queue()
+        self.solved = queue.Queue()
+        self.cancelled = set()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def report(self, worker_index, description=""):
+        """
+        Add a worker to the workers waiting for the operator.
+
+        Args:
+            worker_index (int): The worker showing the CAPTCHA.
+            description (str, optional): What the worker was doing, shown in the prompt.
+        """
+        with self.lock:
+            self.cancelled.discard(worker_index)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="captcha-prompt", daemon=True)
+                self.thread.start()
+        self.pending.put((worker_index, description))
+
+    def cancel(self, worker_index):
+        """Forget a pending CAPTCHA, e.g. because the worker exited."""
+        with self.lock:
+            self.cancelled.add(worker_index)
+
+    def resolved(self):
+        """
+        Get the workers whose CAPTCHA the operator solved since the last call.
+
+        Returns:
+            list: Worker indexes.
+        """
+        workers = []
+        while True:
+            try:
+                workers.append(self.solved.get_nowait())
+            except queue.Empty:
+                return workers
+
+    def waiting(self):
+        """Number of CAPTCHAs not shown to the operator yet."""
+        return self.pending.qsize()
+
+    def _run(self):
+        while True:
+            worker_index, description = self.pending.get()
+            with self.lock:
+                if worker_index in self.cancelled:
+                    continue
+            others = self.waiting()
+            print(f"[CAPTCHA] Resolve CAPTCHA for Worker-{worker_index}{f' ({description})' if description else ''}"
+                  f"{f', {others} more waiting' if others else ''}.")
+            try:
+                self.read_line("Press Enter to continue...")
+            except EOFError:
+                # No operator: the worker stays parked and the other workers finish its tasks
+                print("[CAPTCHA] No input available, CAPTCHAs are left unsolved.")
+                return
+            with self.lock:
+                if worker_index in self.cancelled:
+                    continue
+            self.solved.put(worker_index)
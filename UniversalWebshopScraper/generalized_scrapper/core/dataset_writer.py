@@ -0,0 +1,355 @@
+import glob
+import os
+import re
+import uuid
+from collections import OrderedDict
+from urllib.parse import quote
+
+import pandas as pd
+
+from UniversalWebshopScraper.generalized_scrapper.core.functions import normalize_price
+
+"""
+Typed, columnar Parquet dataset of the scraped products, next to the CSV files of save_to_csv.
+
+The CSV files keep every value as text: the price as scraped ("1,299.99"), the currency as a free-text symbol, and
+the links and images of a product as pipe-joined strings, so loading tens of thousands of files means parsing every
+row and every price again. ProductDatasetWriter appends the products to one Parquet dataset instead:
+
+    <root>/shop=<shop>/category=<category>/part-<writer id>-<n>.parquet
+
+    - Price is a float64 (None when it cannot be read), Website, Query and Currency are dictionary encoded (a few
+      distinct values repeated on every row), All Links and All Images are lists of strings,
+    - the rows of a partition are buffered and written as a row group of row_group_size rows, the writer of a
+      partition stays open between row groups (least recently used writers are closed past max_open_files),
+    - every writer writes its own part files, so several worker processes append to the same dataset,
+    - a part file is written as .part-<...> and renamed when its writer closes it, readers skip the dot files, so a
+      worker killed while writing does not leave a file without its footer in the dataset (its rows are lost).
+
+write_part writes the rows of one search at once instead, as a closed part file named after the query and the page
+of the search (part-q=<query>=p<page>=<writer id>-<n>.parquet) that is in the dataset as soon as it is written, and
+remove_parts removes the part files of a search, or of its pages from a first page on, e.g. before it is run again or
+resumed (see product_sink.ParquetBackend).
+
+The shop and category are hive partitions: pd.read_parquet(root) loads them as columns, and a filter on them only
+reads the files of the matching partitions (see load_dataset).
+
+pyarrow is imported when the dataset is written or read, the scraper itself runs without it.
+"""
+
+ROW_GROUP_SIZE = 10000  # Rows buffered per partition before they are written as a row group
+MAX_OPEN_FILES = 64  # Partition files kept open between row groups
+LIST_DELIMITER = '|'  # Delimiter of the links and images in the CSV files
+
+
+def product_schema():
+    """
+    Get the Arrow schema of the product rows of the dataset.
+
+    Returns:
+        pyarrow.Schema: The schema, without the shop and category partition columns.
+    """
+    import pyarrow as pa
+
+    category = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ("Website", category),
+        ("Query", category),
+        ("Product URL", pa.string()),
+        ("Image URL", pa.string()),
+        ("Price", pa.float64()),
+        ("Currency", category),
+        ("Title", pa.string()),
+        ("All Links", pa.list_(pa.string())),
+        ("All Images", pa.list_(pa.string())),
+    ])
+
+
+def parse_price(price):
+    """
+    Read the number of a scraped price string.
+
+    Args:
+        price (str or float): The price, e.g. "1,299.99" or "12,50".
+
+    Returns:
+        float: The price, None if it has no number.
+    """
+    if price is None:
+        return None
+    if isinstance(price, (int, float)):
+        return None if pd.isna(price) else float(price)
+    match = re.search(r'\d+(?:\.\d+)?', normalize_price(str(price)).replace(' ', ''))
+    return float(match.group()) if match else None
+
+
+def split_list(value):
+    """Split the pipe-joined links or images of a CSV row, a list is kept as it is."""
+    if isinstance(value, list):
+        return value
+    if value is None or (isinstance(value, float) and pd.isna(value)) or value == '':
+        return []
+    return str(value).split(LIST_DELIMITER)
+
+
+def _text(value):
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return None
+    return str(value).strip()
+
+
+def to_record(product, query=None):
+    """
+    Convert a product dict (see GeneralizedScraper.store_product) or a CSV row to a typed dataset row.
+
+    Args:
+        product (dict): The product.
+        query (str, optional): The search the product was found by.
+
+    Returns:
+        dict: The row, with the columns of product_schema.
+    """
+    return {
+        "Website": _text(product.get("Website")),
+        "Query": query,
+        "Product URL": _text(product.get("Product URL")),
+        "Image URL": _text(product.get("Image URL")),
+        "Price": parse_price(product.get("Price")),
+        "Currency": _text(product.get("Currency")),
+        "Title": _text(product.get("Title")),
+        "All Links": split_list(product.get("All Links")),
+        "All Images": split_list(product.get("All Images")),
+    }
+
+
+def partition_dir(root, shop, category):
+    """Get the directory of a shop's category in a dataset."""
+    return os.path.join(root, f"shop={quote(str(shop), safe='')}", f"category={quote(str(category), safe='')}")
+
+
+def query_prefix(query):
+    """Get the start of the names of the part files of a search (write_part), '=' is quoted in the query."""
+    return f"part-q={quote(str(query), safe='')}="
+
+
+def part_page(filename, prefix):
+    """Get the page of a write_part file of a search from its name, None if it was written without a page."""
+    match = re.match(r'p(\d+)=', filename.lstrip('.')[len(prefix):])
+    return int(match.group(1)) if match else None
+
+
+class ProductDatasetWriter:
+    """
+    Appends product rows to a Parquet dataset partitioned by shop and category.
+
+    Close the writer (or use it as a context manager) to write the buffered rows, a part file is only readable once
+    its writer is closed.
+
+    Args:
+        root (str): Directory of the dataset, created if needed.
+        row_group_size (int, optional): Rows of a partition written at once.
+        max_open_files (int, optional): Partition files kept open, the least recently used is closed past it.
+        compression (str, optional): Parquet compression codec.
+    """
+    def __init__(self, root, row_group_size=ROW_GROUP_SIZE, max_open_files=MAX_OPEN_FILES, compression="zstd"):
+        self.root = root
+        self.row_group_size = row_group_size
+        self.max_open_files = max_open_files
+        self.compression = compression
+        self.writer_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.buffers = {}  # (shop, category) -> rows not written yet
+        self.writers = OrderedDict()  # (shop, category) -> (open ParquetWriter, its paths), least recently used first
+        self.files_written = 0
+        self.rows_written = 0
+        self._schema = None
+
+    @property
+    def schema(self):
+        if self._schema is None:
+            self._schema = product_schema()
+        return self._schema
+
+    def write(self, shop, category, products, query=None):
+        """
+        Append products to the partition of a shop's category.
+
+        Args:
+            shop (str): Name of the shop.
+            category (str): Category of the search.
+            products (list): Product dicts (see GeneralizedScraper.store_product) or CSV rows.
+            query (str, optional): The search the products were found by.
+        """
+        if not products:
+            return
+        key = (shop, category)
+        rows = self.buffers.setdefault(key, [])
+        rows.extend(to_record(product, query) for product in products)
+        if len(rows) >= self.row_group_size:
+            self._write_row_group(key)
+
+    def write_part(self, shop, category, products, query=None, page=None):
+        """
+        Write products as a part file of their own, readable once the call returns.
+
+        Args:
+            shop (str): Name of the shop.
+            category (str): Category of the search.
+            products (list): Product dicts (see GeneralizedScraper.store_product) or CSV rows.
+            query (str, optional): The search the products were found by, the part file is named after it.
+            page (int, optional): The page of the search the products are from, the part file is named after it.
+
+        Returns:
+            int: Number of rows written.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if not products:
+            return 0
+        table = pa.Table.from_pylist([to_record(product, query) for product in products], schema=self.schema)
+        directory = partition_dir(self.root, shop, category)
+        os.makedirs(directory, exist_ok=True)
+        page_tag = "" if page is None else f"p{int(page)}="
+        path = os.path.join(directory,
+                            f"{query_prefix(query)}{page_tag}{self.writer_id}-{self.files_written}.parquet")
+        self.files_written += 1
+        temporary_path = os.path.join(directory, f".{os.path.basename(path)}")
+        pq.write_table(table, temporary_path, compression=self.compression, row_group_size=self.row_group_size)
+        os.replace(temporary_path, path)
+        self.rows_written += len(table)
+        return len(table)
+
+    def remove_parts(self, shop, category, query=None, first_page=None):
+        """
+        Remove the part files write_part wrote for a search, by any writer.
+
+        Args:
+            shop (str): Name of the shop.
+            category (str): Category of the search.
+            query (str, optional): The search.
+            first_page (int, optional): Only remove the parts of this page of the search and the later ones, the
+                                        parts of a search resumed at first_page are kept. Parts written without a
+                                        page are always removed.
+
+        Returns:
+            int: Number of files removed.
+        """
+        prefix = query_prefix(query)
+        pattern = glob.escape(prefix) + "*.parquet"
+        directory = partition_dir(self.root, shop, category)
+        paths = glob.glob(os.path.join(glob.escape(directory), pattern))
+        # Also the unfinished file of a writer killed while writing the search
+        paths += glob.glob(os.path.join(glob.escape(directory), "." + pattern))
+        if first_page is not None:
+            pages = {path: part_page(os.path.basename(path), prefix) for path in paths}
+            paths = [path for path in paths if pages[path] is None or pages[path] >= first_page]
+        for path in paths:
+            os.remove(path)
+        return len(paths)
+
+    def flush(self):
+        """Write the buffered rows of every partition as row groups."""
+        for key in list(self.buffers):
+            self._write_row_group(key)
+
+    def close(self):
+        """Write the buffered rows and close the part files."""
+        self.flush()
+        while self.writers:
+            self._close_oldest()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _write_row_group(self, key):
+        import pyarrow as pa
+
+        rows = self.buffers.pop(key, None)
+        if not rows:
+            return
+        self._writer(key).write_table(pa.Table.from_pylist(rows, schema=self.schema), row_group_size=len(rows))
+        self.rows_written += len(rows)
+
+    def _writer(self, key):
+        import pyarrow.parquet as pq
+
+        if key in self.writers:
+            self.writers.move_to_end(key)
+            return self.writers[key][0]
+        while len(self.writers) >= self.max_open_files:
+            self._close_oldest()
+        directory = partition_dir(self.root, *key)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"part-{self.writer_id}-{self.files_written}.parquet")
+        self.files_written += 1
+        temporary_path = os.path.join(directory, f".{os.path.basename(path)}")
+        writer = pq.ParquetWriter(temporary_path, self.schema, compression=self.compression)
+        self.writers[key] = (writer, temporary_path, path)
+        return writer
+
+    def _close_oldest(self):
+        _, (writer, temporary_path, path) = self.writers.popitem(last=False)
+        writer.close()
+        os.replace(temporary_path, path)
+
+
+def load_dataset(root, columns=None, shops=None, categories=None):
+    """
+    Load the products of a dataset, or of some of its shops and categories.
+
+    Args:
+        root (str): Directory of the dataset.
+        columns (list, optional): Columns to read, all by default.
+        shops (list, optional): Shops to read, all by default.
+        categories (list, optional): Categories to read, all by default.
+
+    Returns:
+        pd.DataFrame: The products, with shop and category columns.
+    """
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(root, format="parquet", partitioning="hive")
+    conditions = []
+    if shops is not None:
+        conditions.append(ds.field("shop").isin(list(shops)))
+    if categories is not None:
+        conditions.append(ds.field("category").isin(list(categories)))
+    condition = None
+    for expression in conditions:
+        condition = expression if condition is None else condition & expression
+    return dataset.to_table(columns=columns, filter=condition).to_pandas()
+
+
+def convert_csv_tree(csv_root, root, row_group_size=ROW_GROUP_SIZE):
+    """
+    Append the CSV files of save_to_csv (<csv_root>/<shop>/<category>/<query>.csv) to a dataset.
+
+    Args:
+        csv_root (str): Directory of the CSV files.
+        root (str): Directory of the dataset.
+        row_group_size (int, optional): Rows of a partition written at once.
+
+    Returns:
+        int: Number of rows written.
+    """
+    with ProductDatasetWriter(root, row_group_size=row_group_size) as writer:
+        for shop in sorted(os.listdir(csv_root)):
+            shop_dir = os.path.join(csv_root, shop)
+            if not os.path.isdir(shop_dir):
+                continue
+            for category in sorted(os.listdir(shop_dir)):
+                category_dir = os.path.join(shop_dir, category)
+                if not os.path.isdir(category_dir):
+                    continue
+                for filename in sorted(os.listdir(category_dir)):
+                    if not filename.endswith(".csv"):
+                        continue
+                    try:
+                        products = pd.read_csv(os.path.join(category_dir, filename), dtype=str)
+                    except pd.errors.EmptyDataError:
+                        continue
+                    writer.write(shop, category, products.to_dict("records"), query=filename[:-len(".csv")])
+    return writer.rows_written
@@ -1,6 +1,8 @@
 from urllib.parse import urljoin, urlparse, parse_qs, urlencode, urlunparse
 from functools import wraps
 
+from UniversalWebshopScraper.generalized_scrapper.core.captcha_detection import detect_captcha
+
 
 def detect_captcha_detector(func):
     """
@@ -21,8 +23,8 @@ def detect_captcha_detector(func):
         # Execute the original function
         result = func(self, *args, **kwargs)
 
-        # Check if CAPTCHA is present either by URL or elements on the page
-        if "validateCaptcha" in self.driver.current_url or self.is_captcha_present():
+        # Check if CAPTCHA is present either by URL or in the HTML of the page
+        if "validateCaptcha" in self.driver.current_url or detect_captcha(self.driver.page_source):
             print("CAPTCHA detected. Please solve the CAPTCHA manually.")
             input("Once solved, press Enter to proceed: ")
 
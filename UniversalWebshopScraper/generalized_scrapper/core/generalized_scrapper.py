@@ -1,12 +1,13 @@
+import json
 import random
 import time
 from bs4 import BeautifulSoup
 import re
-from sortedcontainers import SortedSet
 import pandas as pd
 import os
 from line_profiler import profile
-from collections import defaultdict
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 import tempfile
 import undetected_chromedriver as uc
 from selenium.webdriver.common.by import By
@@ -14,6 +15,28 @@ import re
 from bs4 import BeautifulSoup, Tag
 
 from UniversalWebshopScraper.generalized_scrapper.core.functions import normalize_price, normalize_url
+from UniversalWebshopScraper.generalized_scrapper.core.block_detection import (
+    IMAGE_SOURCE_ATTRIBUTES, aggregate_page, extract_block_product_info, opening_tag, select_product_blocks,
+    split_image_sources
+)
+from UniversalWebshopScraper.generalized_scrapper.core.parser_backends import get_parser_backend
+from UniversalWebshopScraper.generalized_scrapper.core.product_store import ProductStore
+from UniversalWebshopScraper.generalized_scrapper.core.url_dedup import url_set
+from UniversalWebshopScraper.generalized_scrapper.core.block_templates import (
+    BlockTemplateCache, learn_block_template, template_domain
+)
+from UniversalWebshopScraper.generalized_scrapper.core.scrolling import (
+    SCROLL_POLL_INTERVAL, SCROLL_PROBE_SCRIPT, SCROLL_QUIET_PERIOD, SCROLL_STEP, SCROLL_STEP_SCRIPT, ScrollBudget,
+    content_grew, wait_for_page_to_settle
+)
+from UniversalWebshopScraper.generalized_scrapper.core.rate_control import RateController
+from UniversalWebshopScraper.generalized_scrapper.core.http_fetch import BlockedResponse, HttpFetcher
+from UniversalWebshopScraper.generalized_scrapper.core.captcha_detection import CaptchaDetected, detect_captcha
+from UniversalWebshopScraper.generalized_scrapper.core.product_catalog import PageSaturation
+from UniversalWebshopScraper.generalized_scrapper.core.browser_extraction import (
+    BROWSER_AGGREGATES_SCRIPT, BROWSER_CAPTCHA_SCRIPT, BROWSER_MARK_SCRIPT, BROWSER_TRASH_SCRIPT,
+    aggregates_from_browser
+)
 
 """
 
@@ -24,6 +47,19 @@ from UniversalWebshopScraper.generalized_scrapper.core.functions import normaliz
 CURRENCY_PATTERN = r"(\$|€|£|zł|PLN|USD|GBP|JPY|AUD)"
 PRICE_PATTERN = r"(\d+(?:[.,]\d{3})*(?:[.,]\d\d))"
 COST_PATTERN = rf"{PRICE_PATTERN}\s*{CURRENCY_PATTERN}|{CURRENCY_PATTERN}\s*{PRICE_PATTERN}"
+COST_REGEX = re.compile(COST_PATTERN)
+
+# Texts looking like ratings or sizes ("4.5 stars", "12,5 cm") are not titles
+WRONG_TITLE_REGEX = re.compile(r'\d{1,2}[.,]\d{1,2}\s*[a-zA-Z]*')
+
+# Strings found in at least this many tags of the first page are "trash" (e.g. 'promotion' or 'discount')
+TRASH_THRESHOLD = 5
+
+# In fetch_mode="http", the pages of a search are loaded in the browser after this many consecutive HTTP fallbacks
+HTTP_MAX_FALLBACKS = 3
+
+# Opening tags of the last detected product blocks kept for the parent_blocks report
+PARENT_BLOCKS_LIMIT = 1000
 
 class GeneralizedScraper:
     """
@@ -36,8 +72,26 @@ class GeneralizedScraper:
         user_data_dir (str, optional): The directory path for storing user data, allowing
                                        persistence of session information between scrapes.
         initialize_driver_func (callable, optional): Custom function to initialize the WebDriver.
+        parser_backend (str or ParserBackend, optional): HTML parser used for the pages, 'html.parser' (default),
+                                                         'lxml' or 'lexbor'.
+        template_cache (BlockTemplateCache, optional): Learned product block templates per shop, kept in memory
+                                                       if not given.
+        rate_controller (RateController, optional): Pacing of the page loads per shop, share one controller between
+                                                    the workers of a shop.
+        http_fetcher (HttpFetcher, optional): HTTP client of fetch_mode="http", created when first needed.
+        product_sink (ProductSink, optional): Buffered output the products are streamed to, for sink_destination,
+                                              instead of keeping the products of a whole search in memory.
+        catalog (ProductCatalog, optional): Persistent catalog every page's products are upserted into, a search
+                                            stops once its pages only bring known, unchanged products.
+        prompt_captcha (bool, optional): Wait at the console for the operator to solve a CAPTCHA (default). If
+                                         False, CaptchaDetected is raised instead, for workers without a console.
+        dedup_max_bytes (int, optional): Memory ceiling of each of the sets of scraped product and image URLs. Past
+                                         it the least recently seen URLs are forgotten (and scraped again if they
+                                         show up again). Without it the sets keep every URL.
     """
-    def __init__(self, shopping_website=None, user_data_dir=None, offline_mode=False, initialize_driver_func=None):
+    def __init__(self, shopping_website=None, user_data_dir=None, offline_mode=False, initialize_driver_func=None,
+                 parser_backend=None, template_cache=None, rate_controller=None, http_fetcher=None,
+                 product_sink=None, catalog=None, prompt_captcha=True, dedup_max_bytes=None):
         """
         Initializes the GeneralizedScraper instance with necessary attributes
         for web scraping operations.
@@ -51,10 +105,28 @@ class GeneralizedScraper:
             user_data_dir (str, optional): Directory for storing user data, enabling
                                             persistence of session information.
             initialize_driver_func (callable, optional): A custom function to initialize the WebDriver.
+            parser_backend (str or ParserBackend, optional): HTML parser backend, see parser_backends.
+            template_cache (BlockTemplateCache, optional): Learned product block templates, see block_templates.
+            rate_controller (RateController, optional): Adaptive pacing of the page loads, see rate_control.
+            http_fetcher (HttpFetcher, optional): Keep-alive HTTP client for server-rendered pages, see http_fetch.
+            product_sink (ProductSink, optional): Buffered output the products are streamed to, see product_sink.
+            catalog (ProductCatalog, optional): Products of all runs and their changes, see product_catalog.
+            prompt_captcha (bool, optional): Whether a CAPTCHA is solved at the console, see resolve_captcha.
+            dedup_max_bytes (int, optional): Memory ceiling of each URL set, see url_dedup.url_set.
         """
         self.shopping_website = shopping_website  # The URL of the shopping website
         self.user_data_dir = user_data_dir  # Directory for storing user data
         self.initialize_driver_func = initialize_driver_func  # Custom or default driver initializer
+        self.parser_backend = get_parser_backend(parser_backend)  # Parser used to build the page trees
+        self.template_cache = template_cache if template_cache is not None else BlockTemplateCache()
+        self.scroll_budget = ScrollBudget()  # Scrolls per shop that loaded new content
+        self.rate_controller = rate_controller if rate_controller is not None else RateController()
+        self.pages_loaded = 0  # Pages opened with load_page, used to recycle pooled drivers
+        self.http_fetcher = http_fetcher  # Plain-HTTP client of fetch_mode="http"
+        self.prompt_captcha = prompt_captcha  # Ask the operator to solve CAPTCHAs, raise CaptchaDetected otherwise
+        self.http_blocked = False  # Whether the last HTTP fetch was blocked (already counted by the rate controller)
+        self.page_html = None  # Raw HTML of the last parsed page, scanned for CAPTCHAs
+        self.page_soup = None  # The parsed page_html
         if offline_mode:
             self.driver = None
         else:
@@ -64,12 +136,19 @@ class GeneralizedScraper:
                 self.driver = self.default_initialize_driver()  # Use the default driver initializer
 
         self.marked_blocks = set()  # Set to store marked blocks
-        self.detected_products = set()  # Set to store detected products
+        # Product and image URLs already scraped, bounded only with dedup_max_bytes (a turbo worker shares the sets of
+        # its run instead, see url_dedup)
+        self.detected_products = url_set(dedup_max_bytes)
         self.wrong_titles = set()  # Set to store detected titles
-        self.detected_image_urls = SortedSet()  # Ordered set for image URLs
-        self.parent_blocks = []  # List to store all parent blocks (convert to set later if needed)
+        self.detected_image_urls = url_set(dedup_max_bytes)
+        self.parent_blocks = deque(maxlen=PARENT_BLOCKS_LIMIT)  # Opening tags of the last detected product blocks
         self.product_count = 0  # Counter for the number of products detected
-        self.stored_products = []  # List to store gathered products (dict format)
+        self.stored_products = ProductStore()  # Gathered products, a list of dicts kept in compact column buffers
+        self.product_sink = product_sink  # With a sink stored_products only keeps the products of the current page
+        self.sink_destination = None  # (shop, category, query) the products are streamed to
+        self.sink_page = None  # Page of the search the stored products are from, for the sink
+        self.catalog = catalog  # Products of earlier runs, to log changes and stop saturated searches
+        self.saturation = PageSaturation()  # Pages of the current search with only known, unchanged products
 
     def default_initialize_driver(self):
         """
@@ -88,7 +167,8 @@ class GeneralizedScraper:
         options = uc.ChromeOptions()
 
         # User data directory for separate profiles
-        options.add_argument(f"user-data-dir={self.user_data_dir}")
+        if self.user_data_dir:
+            options.add_argument(f"--user-data-dir={self.user_data_dir}")
         options.add_argument("--no-first-run")
         options.add_argument("--new-window")
         options.add_argument("--disable-extensions")
@@ -109,11 +189,9 @@ class GeneralizedScraper:
             "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/110.0.5481.178 Safari/537.36"
         )
 
-        # Create a unique temporary directory for undetected_chromedriver data_path
-        temp_data_path = tempfile.mkdtemp()
-
-        # Initialize Chrome driver with the specified options and unique data_path
-        driver = uc.Chrome(options=options, user_data_dir=temp_data_path)
+        # Initialize Chrome driver with the specified options, without a user data directory undetected_chromedriver
+        # creates a temporary profile and removes it when the driver quits
+        driver = uc.Chrome(options=options)
 
         # Move browser window to the foreground by simulating activity
         try:
@@ -124,6 +202,113 @@ class GeneralizedScraper:
 
         return driver
 
+    def load_page(self, url):
+        """
+        Open a URL once the shop's rate controller allows it.
+
+        Args:
+            url (str): The URL to open.
+        """
+        domain = template_domain(self.shopping_website)
+        self.rate_controller.acquire(domain)
+        self.pages_loaded += 1
+        try:
+            self.driver.get(url)
+        except Exception:
+            self.rate_controller.record_error(domain)
+            raise
+
+    def scrape_page_over_http(self, url, first_page=False, use_block_templates=True):
+        """
+        Download a page without the browser and detect its products.
+
+        The HTTP client is seeded with the browser's cookies the first time. The page counts as failed when the
+        response is blocked, shows a CAPTCHA or has no products, the caller then loads it in the browser. Only a
+        blocked response or a CAPTCHA lowers the shop's request rate (http_blocked is then True and the browser load
+        of the same page is not counted again), an empty page or a page without products is not an anti-bot signal.
+
+        Args:
+            url (str): The URL of the page.
+            first_page (bool, optional): Whether it is the first page of the search (trash strings are detected).
+            use_block_templates (bool, optional): Whether to use and learn block templates.
+
+        Returns:
+            bool: True if products were detected, False if the page must be loaded in the browser.
+        """
+        domain = template_domain(self.shopping_website)
+        self.http_blocked = False
+        if self.http_fetcher is None:
+            self.http_fetcher = HttpFetcher()
+        if not self.http_fetcher.seeded and self.driver:
+            # The browser's cookies can only be read on the shop's own pages
+            if template_domain(self.driver.current_url) != domain:
+                self.load_page(self.shopping_website)
+            self.http_fetcher.seed_from_driver(self.driver)
+
+        self.rate_controller.acquire(domain)
+        try:
+            html = self.http_fetcher.fetch(url)
+        except BlockedResponse as e:
+            print(e)
+            self.http_blocked = True
+            self.record_page_result(captcha_present=True)
+            return False
+        except Exception as e:
+            print(f"HTTP fetch of {url} failed: {e}")
+            self.rate_controller.record_error(domain)
+            return False
+
+        if html is None:
+            return False
+
+        soup = self.parse_html(html)
+        if self.is_captcha_present(soup):
+            self.http_blocked = True
+            self.record_page_result(captcha_present=True)
+            return False
+
+        if first_page:
+            self.trash_detection(soup)
+        if not self.detect_page_products(soup, use_block_templates):
+            print(f"No products in the HTTP response of {url}.")
+            return False
+        self.record_page_result(captcha_present=False)
+        return True
+
+    def memory_metrics(self):
+        """
+        Get the sizes of the scraper's state that lives across searches, to check that a long-lived worker stays
+        within bounded memory.
+
+        Returns:
+            dict: Number of entries of the URL sets, bookkeeping lists and stored products, and the metrics of the
+                  URL sets that have them (bytes, evictions, see url_dedup).
+        """
+        metrics = {"detected_products": len(self.detected_products),
+                   "detected_image_urls": len(self.detected_image_urls),
+                   "parent_blocks": len(self.parent_blocks), "marked_blocks": len(self.marked_blocks),
+                   "wrong_titles": len(self.wrong_titles), "stored_products": len(self.stored_products)}
+        for name in ("detected_products", "detected_image_urls"):
+            urls = getattr(self, name)
+            if hasattr(urls, "metrics"):
+                metrics[f"{name}_bytes"] = urls.nbytes
+                metrics[f"{name}_evicted"] = urls.metrics()["evicted"]
+        return metrics
+
+    def record_page_result(self, captcha_present):
+        """
+        Adapt the shop's request rate to the result of the last page load.
+
+        Args:
+            captcha_present (bool): Whether the page showed a CAPTCHA.
+        """
+        domain = template_domain(self.shopping_website)
+        if captcha_present:
+            rate = self.rate_controller.record_captcha(domain)
+            print(f"CAPTCHA on {domain}, request rate lowered to {rate:.2f} pages/s.")
+        else:
+            self.rate_controller.record_success(domain)
+
     def random_delay(self, min_seconds=0, max_seconds=1):
         """
         Introduces a random delay to mimic human-like browsing behavior
@@ -146,78 +331,64 @@ class GeneralizedScraper:
         except Exception as e:
             print(f"Failed to move browser window: {e}")
 
-    def is_captcha_present(self, soup):
+    def is_captcha_present(self, soup=None):
         """
         Detect if a CAPTCHA is present based on known CAPTCHA indicators in the HTML.
 
         Args:
-            soup (BeautifulSoup): Parsed HTML of the page.
+            soup (BeautifulSoup, optional): Parsed HTML of the page. Without it the page shown in the browser is checked.
 
         Returns:
             bool: True if CAPTCHA is detected, False otherwise.
         """
-        import re
-
-        # Define common CAPTCHA selectors (updated for AliExpress-specific elements)
-        captcha_selectors = [
-            {'id': re.compile(r'captcha', re.I)},
-            {'class': re.compile(r'captcha', re.I)},
-            {'id': re.compile(r'recaptcha', re.I)},
-            {'class': re.compile(r'recaptcha', re.I)},
-            {'id': re.compile(r'g-recaptcha', re.I)},
-            {'class': re.compile(r'g-recaptcha', re.I)},
-            {'id': re.compile(r'h-captcha', re.I)},
-            {'class': re.compile(r'h-captcha', re.I)},
-            {'class': re.compile(r'arkose', re.I)},  # For Arkose Labs
-            {'class': re.compile(r'cf-captcha', re.I)},  # For Cloudflare captchas
-            # AliExpress-specific selectors
-            {'id': re.compile(r'nocaptcha', re.I)},  # Specific ID for AliExpress CAPTCHA
-            {'class': re.compile(r'baxia-punish', re.I)},  # AliExpress punish page
-            {'id': re.compile(r'nc_\d+_nocaptcha', re.I)},  # NoCaptcha module
-            {'class': re.compile(r'nc-container', re.I)},  # NoCaptcha container
-        ]
-
-        # Check for elements matching the CAPTCHA selectors
-        for selector in captcha_selectors:
-            if soup.find(attrs=selector):
-                print("CAPTCHA detected based on HTML attributes.")
-                return True
-
-        # Check for iframes that may contain CAPTCHA challenges
-        for iframe in soup.find_all('iframe'):
-            src = iframe.get('src', '')
-            if re.search(r'captcha|recaptcha|hcaptcha', src, re.I):
-                print("CAPTCHA detected in an iframe.")
-                return True
-
-        # Check for CAPTCHA keywords in form actions or JavaScript
-        forms = soup.find_all('form', action=True)
-        for form in forms:
-            if re.search(r'captcha', form['action'], re.I):
-                print("CAPTCHA detected in form action.")
-                return True
-
-        scripts = soup.find_all('script', src=True)
-        for script in scripts:
-            if re.search(r'captcha', script['src'], re.I):
-                print("CAPTCHA detected in script source.")
-                return True
-
-        # Check for common CAPTCHA messages in text content
-        text_indicators = [
-            "Please slide to verify",  # AliExpress NoCaptcha prompt
-            "unusual traffic",  # Generic unusual traffic message
-            "Sorry, we have detected unusual traffic",  # AliExpress-specific message
-            "prove you're not a robot",  # Generic CAPTCHA message
-        ]
-
-        for text in text_indicators:
-            if soup.body and text in soup.body.get_text(strip=True):
-                print(f"CAPTCHA detected based on text content: '{text}'")
-                return True
-
-        # If none of the CAPTCHA indicators are found, assume no CAPTCHA is present
-        return False
+        return self.detect_captcha(soup) is not None
+
+    def detect_captcha(self, soup=None):
+        """
+        Find the CAPTCHA indicator of a page in its raw HTML (see captcha_detection), the parse tree is not traversed.
+
+        Args:
+            soup (BeautifulSoup, optional): Parsed HTML of the page. Without it the page shown in the browser is checked.
+
+        Returns:
+            tuple: (indicator, matched HTML), or None if no CAPTCHA is detected.
+        """
+        if soup is None:
+            html = self.driver.page_source if self.driver else self.page_html
+        elif soup is self.page_soup:
+            html = self.page_html
+        else:
+            # A soup this scraper did not parse, serialized back to HTML
+            html = str(soup)
+        return self._report_captcha(detect_captcha(html))
+
+    def detect_captcha_in_browser(self):
+        """
+        Find the CAPTCHA indicator of the page loaded in the browser without transferring page_source: a script
+        returns the few tags and text passages that can hold an indicator (see browser_extraction).
+
+        Returns:
+            tuple: (indicator, matched HTML), or None if no CAPTCHA is detected.
+        """
+        return self._report_captcha(detect_captcha(self.driver.execute_script(BROWSER_CAPTCHA_SCRIPT)))
+
+    @staticmethod
+    def _report_captcha(detection):
+        if detection:
+            indicator, matched = detection
+            print(f"CAPTCHA detected based on {indicator}: {matched[:100]!r}")
+        return detection
+
+    def resolve_captcha(self):
+        """
+        Wait for the operator to solve the CAPTCHA of the current page.
+
+        Raises:
+            CaptchaDetected: If the scraper has no operator (prompt_captcha=False), the caller hands the page over.
+        """
+        if not self.prompt_captcha:
+            raise CaptchaDetected(self.driver.current_url if self.driver else self.shopping_website)
+        input("Resolve Captcha and click enter button")
 
     def open_home_page(self, home_url):
         """
@@ -232,7 +403,7 @@ class GeneralizedScraper:
         try:
             soup = self.extract_page_structure()
             if self.is_captcha_present(soup):
-                input("Resolve Captcha and click enter button")
+                self.resolve_captcha()
             return True
 
 
@@ -240,8 +411,10 @@ class GeneralizedScraper:
             self.random_delay()
             soup = self.extract_page_structure()
             if self.is_captcha_present(soup):
-                input("Resolve Captcha and click enter button")
+                self.resolve_captcha()
             return True
+        except CaptchaDetected:
+            raise
         except Exception as e:
             print(f"Failed to navigate to the product URL: {e}")
             return False
@@ -260,7 +433,7 @@ class GeneralizedScraper:
             # check if we have captcha
             soup = self.extract_page_structure()
             if self.is_captcha_present(soup):
-                input("Resolve Captcha and click enter button")
+                self.resolve_captcha()
             return True
 
             # open the search URL
@@ -270,26 +443,43 @@ class GeneralizedScraper:
 
             # check if we have captcha
             if self.is_captcha_present(soup):
-                input("Resolve Captcha and click enter button")
+                self.resolve_captcha()
             return True
+        except CaptchaDetected:
+            raise
         except Exception as e:
             print(f"Failed to navigate to the product URL: {e}")
             return
 
     def extract_page_structure(self):
         """
-        Extract the page's HTML content using BeautifulSoup.
+        Extract the page's HTML content using the scraper's parser backend.
 
         Returns:
             BeautifulSoup: Parsed HTML content of the page.
         """
-        soup = BeautifulSoup(self.driver.page_source, 'html.parser')
+        return self.parse_html(self.driver.page_source)
+
+    def parse_html(self, html):
+        """
+        Parse raw HTML with the scraper's parser backend.
+
+        Args:
+            html (str): The raw HTML of a page.
+
+        Returns:
+            BeautifulSoup: Parsed HTML content of the page.
+        """
+        soup = self.parser_backend.parse(html)
+        self.page_html, self.page_soup = html, soup
         return soup
 
     def store_product(self, product_url, image_url, price, currency, title, all_product_urls, all_image_urls):
         """
         Store the product information in a list of dictionaries, including all links and images.
 
+        With a product sink the product is also put into the sink, for sink_destination and sink_page.
+
         Args:
             product_url (str): Primary product URL.
             image_url (str): Primary image URL.
@@ -299,7 +489,7 @@ class GeneralizedScraper:
             all_product_urls (list): All related product URLs.
             all_image_urls (list): All related image URLs.
         """
-        self.stored_products.append({
+        self.add_stored_products([{
             "Website": self.shopping_website,
             "Product URL": product_url,
             "Image URL": image_url,
@@ -308,17 +498,147 @@ class GeneralizedScraper:
             "Title": title,
             "All Links": '|'.join(all_product_urls),  # Combine all product URLs with a delimiter
             "All Images": '|'.join(all_image_urls)  # Combine all image URLs with a delimiter
-        })
+        }])
+
+    def add_stored_products(self, products):
+        """
+        Add products to stored_products and stream them to the product sink, if any.
+
+        Args:
+            products (list): Product dicts (see store_product).
+        """
+        self.stored_products.extend(products)
+        if self.product_sink is not None:
+            self.product_sink.put_many(self.sink_destination, products, page=self.sink_page)
+
+    def page_saturated(self, products):
+        """
+        Upsert the products of a finished page into the catalog and check if the search brings anything new.
+
+        Args:
+            products (list): The products stored for the page.
+
+        Returns:
+            bool: True if the last pages only had products the catalog knows unchanged, the search can stop.
+        """
+        if self.catalog is None:
+            return False
+        statuses = self.catalog.upsert(template_domain(self.shopping_website), products)
+        if self.saturation.page_done(statuses):
+            print(f"Search saturated: {self.saturation.pages} pages of known, unchanged products")
+            return True
+        return False
+
+    def release_page_products(self):
+        """
+        Drop the products of a finished page from stored_products when they are already in the product sink, so the
+        memory of a search does not grow with its number of products.
+        """
+        if self.product_sink is not None:
+            self.stored_products.clear()
 
     @profile
     def detect_product_blocks(self, soup):
         """
         Detect product blocks on the page by identifying the smallest subtrees with product information.
 
+        The page is walked once to collect its strings, links and images (see block_detection), then blocks are
+        chosen from those aggregates, deepest first. The result is the same as detect_product_blocks_legacy.
+
+        Args:
+            soup (BeautifulSoup): Parsed HTML of the page.
+
+        Returns:
+            list: The detected product blocks.
+        """
+        # Step 1: Collect strings, links, images and title tags of the whole page in a single pass.
+        aggregates = aggregate_page(soup, self.shopping_website)
+
+        # Step 2: Choose product blocks from the aggregates and store them.
+        return self._detect_product_blocks_in_aggregates(aggregates)
+
+    @profile
+    def detect_product_blocks_in_browser(self):
+        """
+        Detect product blocks of the page loaded in the browser without transferring and parsing page_source.
+
+        The page aggregates are collected by a script running in the browser (see browser_extraction), the blocks
+        are then chosen like in detect_product_blocks.
+
+        Returns:
+            list: The detected product blocks (tags without children, carrying the block's name and attributes).
+        """
+        return self._detect_product_blocks_in_aggregates(self.extract_page_aggregates())
+
+    @profile
+    def detect_new_products_in_browser(self):
+        """
+        Detect the products added to the page since the last call, e.g. by the last scroll of an infinite list.
+
+        The products already detected on the page are remembered inside the browser, their content is skipped and
+        they and their ancestors stay marked, so only the new content is transferred and evaluated.
+
+        Returns:
+            list: The detected product blocks (tags without children, carrying the block's name and attributes).
+        """
+        aggregates = self.extract_page_aggregates(incremental=True)
+        detected_blocks = self._detect_product_blocks_in_aggregates(aggregates)
+
+        # Tell the page which blocks are products now
+        block_indices = {id(block): index for index, block in enumerate(aggregates.blocks)}
+        self.driver.execute_script(BROWSER_MARK_SCRIPT, [block_indices[id(block)] for block in detected_blocks])
+        return detected_blocks
+
+    def extract_page_aggregates(self, incremental=False):
+        """
+        Collect the aggregates of the candidate product blocks inside the browser.
+
+        Args:
+            incremental (bool, optional): Skip the products already detected on the page (see
+                                          detect_new_products_in_browser).
+
+        Returns:
+            PageAggregates: The aggregates of the page's candidate product blocks.
+        """
+        payload = self.driver.execute_script(BROWSER_AGGREGATES_SCRIPT, incremental)
+        return aggregates_from_browser(payload, self.shopping_website)
+
+    def _detect_product_blocks_in_aggregates(self, aggregates):
+        """
+        Choose product blocks from page aggregates, deepest blocks first, and store their products.
+
+        Args:
+            aggregates (PageAggregates): Aggregates of the page.
+
+        Returns:
+            list: The detected product blocks.
+        """
+        detected_blocks = []
+
+        # The generator reads detected_products/detected_image_urls, so each product is stored before the next one.
+        for block_index, product_info in select_product_blocks(aggregates, self):
+            block = aggregates.blocks[block_index]
+            self._store_product_block(block, product_info)
+            detected_blocks.append(block)
+
+        print(f"Number of products scraped: {len(detected_blocks)}")
+        return detected_blocks
+
+    @profile
+    def detect_product_blocks_legacy(self, soup):
+        """
+        Detect product blocks by running extract_product_info on every candidate block.
+
+        Kept as the reference implementation of the heuristic, detect_product_blocks gives the same result in a
+        single pass over the page.
+
         Args:
             soup (BeautifulSoup): Parsed HTML of the page.
+
+        Returns:
+            list: The detected product blocks.
         """
-        product_scraped = 0
+        detected_blocks = []
 
         # Step 1: Identify all potential blocks that might contain product information.
         # We look for common HTML tags used to wrap products on e-commerce websites.
@@ -328,9 +648,6 @@ class GeneralizedScraper:
         # Sorting by the number of parent elements allows us to process smaller, more specific blocks before larger containers.
         blocks.sort(key=lambda x: len(list(x.parents)), reverse=True)
 
-        # how many block
-        # print(f"Number of blocks: {len(blocks)}")
-
         # Step 3: Iterate through each block to identify and process those containing product data.
         for block in blocks:
             # Skip blocks that have already been processed to prevent redundant work.
@@ -343,73 +660,144 @@ class GeneralizedScraper:
             if not product_info:
                 continue  # Skip block if product data is incomplete.
 
-            # Unpack extracted information.
-            product_urls, image_urls, price, title = product_info
-
             # Step 5: Mark the block and all of its child elements as processed.
             # This ensures we don't reprocess this block or its parents in future iterations.
             self.mark_and_block(block)
 
-            # Step 6: Output basic information about detected products for debugging purposes.
-            # print(f'number of product urls: {len(product_urls) if product_urls else 0}')
-            # print(f'number of image urls: {len(image_urls) if image_urls else 0}')
-
-            # Step 7: Extract the main product URL, image URL, price, and currency.
-            # We assume the first URL and image in the list are the main ones for the product.
-            product_url = product_urls[0]
-            image_url = image_urls[0]
-            price, currency = self._get_price_currency(price)
-
-            # Step 8: Add each detected product URL and image URL to their respective sets.
-            # This helps track which URLs have already been processed.
-            for url in product_urls:
-                self.detected_products.add(url)
-
-            for url in image_urls:
-                if url not in self.detected_image_urls:
-                    self.detected_image_urls.append(url)
-
-            # Step 9: Store the product data in a list, ready for future saving to CSV or other storage.
-            # Include all product URLs and all image URLs as delimited strings.
-            self.store_product(
-                product_url, image_url, price, currency, title,
-                all_product_urls=product_urls,  # Pass all product URLs
-                all_image_urls=image_urls  # Pass all image URLs
-            )
-
-            # Step 10: Add a simplified version of the block’s structure to the parent_blocks set.
-            # This is primarily for tracking and reporting purposes.
-            self.parent_blocks.append(str(block).split('>')[0])
-
-            # Step 11: Print detected product details for debugging and monitoring.
-            # These prints help verify that scraping is working as intended.
-            '''print(f"Detected parent block:\n{str(block).split('>')[0]}>")
-            print("\n--- Detected Product Block ---")
-            print(f"Website: {self.shopping_website}")
-            print(f"Product URL: {product_url}")
-            print(f"Image URL: {image_url}")
-            print(f"Price: {price}")
-            print(f"Currency: {currency}")
-            print(f"Title: {title}")
-            print('other urls:')
-
-            # Print all product URLs detected in this block.
-            print("All product URLs detected:")
-            for url in product_urls:
-                print(f"{url}\n")
-
-            # Print all image URLs detected in this block.
-            print("All image URLs detected:")
-            for url in image_urls:
-                print(f"{url}\n")
-
-            print("--- End of Product Block ---\n")'''
-
-            # Step 12: Increment the product count after successfully processing a product block.
-            self.product_count += 1
-            product_scraped += 1
-
-        print(f"Number of products scraped: {product_scraped}")
+            # Step 6: Store the product and update the detected URLs.
+            self._store_product_block(block, product_info)
+            detected_blocks.append(block)
+
+        print(f"Number of products scraped: {len(detected_blocks)}")
+        return detected_blocks
+
+    def detect_product_blocks_with_template(self, soup, template):
+        """
+        Detect product blocks using a learned block template instead of scanning every block of the page.
+
+        Only the subtrees of the blocks matching the template are walked (see extract_block_product_info), the
+        detected blocks are marked so a following full detection on the same page does not report them or their
+        parents again.
+
+        Args:
+            soup (BeautifulSoup): Parsed HTML of the page.
+            template (BlockTemplate): The learned template of the shop.
+
+        Returns:
+            list: The detected product blocks.
+        """
+        detected_blocks = []
+        normalized_urls = {}  # Badges, placeholders and shared links repeat across the blocks of a page
+
+        for block in template.select(soup):
+            if id(block) in self.marked_blocks:
+                continue
+
+            product_info = extract_block_product_info(block, self, normalized_urls)
+            if not product_info:
+                continue
+
+            self.mark_and_block(block)
+            self._store_product_block(block, product_info)
+            detected_blocks.append(block)
+
+        print(f"Number of products scraped with block template: {len(detected_blocks)}")
+        return detected_blocks
+
+    def detect_page_products(self, soup, use_block_templates=True):
+        """
+        Detect the products of a page, with the learned block template of the shop when there is one.
+
+        Without a template the full detection runs and a template is learned from its result. With a template, the
+        full detection only runs again when the template finds fewer products than expected: if it finds products the
+        template missed, the layout changed and the template is learned again.
+
+        Args:
+            soup (BeautifulSoup): Parsed HTML of the page.
+            use_block_templates (bool, optional): Whether to use and learn block templates.
+
+        Returns:
+            int: The number of products detected on the page.
+        """
+        if not use_block_templates:
+            return len(self.detect_product_blocks(soup))
+
+        domain = template_domain(self.shopping_website)
+        template = self.template_cache.get(domain)
+
+        template_blocks = []
+        if template:
+            template_blocks = self.detect_product_blocks_with_template(soup, template)
+            if len(template_blocks) >= template.min_yield():
+                return len(template_blocks)
+            print(f"Block template found {len(template_blocks)}/{template.expected_count} products, "
+                  f"running the full detection.")
+
+        detected_blocks = self.detect_product_blocks(soup)
+
+        # Learn the template from the first page, or again when the template missed products of the page
+        if detected_blocks:
+            learned_template = learn_block_template(template_blocks + detected_blocks)
+            if learned_template and learned_template.same_layout(template):
+                # A short last page must not lower the product count expected from the layout
+                learned_template.expected_count = max(learned_template.expected_count, template.expected_count)
+            self.template_cache.put(domain, learned_template)
+            if learned_template:
+                print(f"Learned block template for {domain}: {learned_template}")
+
+        return len(template_blocks) + len(detected_blocks)
+
+    def _store_product_block(self, block, product_info):
+        """
+        Store a detected product block and remember its URLs so they are not detected again.
+
+        Args:
+            block (Tag): The HTML block containing the product.
+            product_info (tuple): Product URLs, image URLs, price and title of the block.
+        """
+        # Unpack extracted information.
+        product_urls, image_urls, price, title = product_info
+
+        # Extract the main product URL, image URL, price, and currency.
+        # We assume the first URL and image in the list are the main ones for the product.
+        product_url = product_urls[0]
+        image_url = image_urls[0]
+        price, currency = self._get_price_currency(price)
+
+        # Add each detected product URL and image URL to their respective sets.
+        # This helps track which URLs have already been processed.
+        for url in product_urls:
+            self.detected_products.add(url)
+
+        for url in image_urls:
+            if url not in self.detected_image_urls:
+                self.detected_image_urls.add(url)
+
+        # Store the product data in a list, ready for future saving to CSV or other storage.
+        # Include all product URLs and all image URLs as delimited strings.
+        self.store_product(
+            product_url, image_url, price, currency, title,
+            all_product_urls=product_urls,  # Pass all product URLs
+            all_image_urls=image_urls  # Pass all image URLs
+        )
+
+        # Add a simplified version of the block’s structure (its opening tag) to the parent_blocks list.
+        # This is primarily for tracking and reporting purposes.
+        self.parent_blocks.append(opening_tag(block))
+
+        # Print detected product details for debugging and monitoring.
+        '''print(f"Detected parent block:\n{opening_tag(block)}>")
+        print("\n--- Detected Product Block ---")
+        print(f"Website: {self.shopping_website}")
+        print(f"Product URL: {product_url}")
+        print(f"Image URL: {image_url}")
+        print(f"Price: {price}")
+        print(f"Currency: {currency}")
+        print(f"Title: {title}")
+        print("--- End of Product Block ---\n")'''
+
+        # Increment the product count after successfully processing a product block.
+        self.product_count += 1
 
     @profile
     def extract_product_info(self, block):
@@ -461,7 +849,8 @@ class GeneralizedScraper:
         product_url_tags = block.find_all('a', href=True)
         for product_url_tag in product_url_tags:
             product_url = normalize_url(self.shopping_website, product_url_tag['href'])
-            product_urls.add(product_url)
+            if product_url:
+                product_urls.add(product_url)
 
         # Remove already detected URLs
         unique_product_urls = [url for url in product_urls if url not in self.detected_products]
@@ -485,26 +874,15 @@ class GeneralizedScraper:
         """
         image_urls = set()
 
-        # List of possible attributes for image sources in <img> and <source> tags
-        source_attributes = [
-            ('img', 'src'),
-            ('img', 'srcset'),
-            ('img', 'data-src'),
-            ('img', 'data-srcset'),
-            ('source', 'srcset')
-        ]
-
         # Check each attribute in <img> and <source> tags
-        for tag, attribute in source_attributes:
+        for tag, attribute in IMAGE_SOURCE_ATTRIBUTES:
             for element in block.find_all(tag):
                 if element.has_attr(attribute):
-                    urls = element[attribute].split(',')
-                    for url in urls:
-                        if not url == '':
-                            # Take the URL part only if srcset format, normalize it
-                            normalized_url = normalize_url(self.shopping_website, url.split()[0])
-                            if normalized_url:
-                                image_urls.add(normalized_url)
+                    # Take the URL part only if srcset format, normalize it
+                    for url in split_image_sources(element[attribute]):
+                        normalized_url = normalize_url(self.shopping_website, url)
+                        if normalized_url:
+                            image_urls.add(normalized_url)
 
         # Handle inline styles for background images in any tag with a style attribute
         for tag in block.find_all(True, style=True):
@@ -580,10 +958,20 @@ class GeneralizedScraper:
         """
         # Get all text within the block in one call
         full_text = block.get_text(strip=True)
+        return self._find_price_in_text(full_text)
 
+    def _find_price_in_text(self, full_text):
+        """
+        Find the maximum price in the text of a block.
+
+        Args:
+            full_text (str): The stripped text of the block joined without separators.
+
+        Returns:
+            str: The maximum price found, or None if no price is found.
+        """
         # Apply the COST_PATTERN to the combined text
-        price_pattern = re.compile(COST_PATTERN)
-        price_tags = re.findall(price_pattern, full_text)
+        price_tags = COST_REGEX.findall(full_text)
 
         if price_tags:
             max_price = self._get_max_price(price_tags)
@@ -608,18 +996,29 @@ class GeneralizedScraper:
             if 'title' in tag.get('class', []) or 'name' in tag.get('class', []):
                 text_content = tag.get_text(strip=True)
                 # Check if content is valid and not in the detected "trash" titles
-                if len(text_content) > 10 and text_content not in self.wrong_titles and \
-                        not re.search(r'\d{1,2}[.,]\d{1,2}\s*[a-zA-Z]*', text_content):
+                if self._is_valid_title(text_content):
                     return text_content
 
         # Fallback to the longest text if no specific title is found
         longest_text = max(block.stripped_strings, key=len, default="")
-        if len(longest_text) > 10 and longest_text not in self.wrong_titles and \
-                not re.search(r'\d{1,2}[.,]\d{1,2}\s*[a-zA-Z]*', longest_text):
+        if self._is_valid_title(longest_text):
             return longest_text
 
         return None
 
+    def _is_valid_title(self, text_content):
+        """
+        Check if a text can be a product title: long enough, not a "trash" string and not a number like a rating.
+
+        Args:
+            text_content (str): The candidate title.
+
+        Returns:
+            bool: True if the text can be used as a title.
+        """
+        return len(text_content) > 10 and text_content not in self.wrong_titles and \
+            not WRONG_TITLE_REGEX.search(text_content)
+
     @profile
     def mark_and_block(self, block):
         """
@@ -662,14 +1061,33 @@ class GeneralizedScraper:
 
             # Save the products to the CSV file
             try:
-                df = pd.DataFrame(self.stored_products)
-                df.to_csv(save_path, index=False)
+                if isinstance(self.stored_products, ProductStore):
+                    self.stored_products.to_csv(save_path)
+                else:
+                    pd.DataFrame(self.stored_products).to_csv(save_path, index=False)
                 print(f"Saved {len(self.stored_products)} products to {save_path}")
             except Exception as e:
                 print(f"Error saving file to {save_path}: {e}")
         else:
             print("No products to save.")
 
+    def save_to_dataset(self, dataset_writer, category=None, query=None, shop=None):
+        """
+        Append the stored products to a typed Parquet dataset (see core/dataset_writer).
+
+        Args:
+            dataset_writer (ProductDatasetWriter): Writer of the dataset.
+            category (str, optional): Category partition of the products.
+            query (str, optional): The search the products were found by.
+            shop (str, optional): Shop partition, the website name by default.
+        """
+        if not self.stored_products:
+            print("No products to save.")
+            return
+        shop = shop or self.shopping_website.replace("https://", "").replace("www.", "").split('.')[0]
+        dataset_writer.write(shop, category or "general", self.stored_products, query=query)
+        print(f"Added {len(self.stored_products)} products to the dataset {dataset_writer.root}")
+
     def close_driver(self):
         """
         Close the browser driver and print the count of detected products.
@@ -679,34 +1097,55 @@ class GeneralizedScraper:
         if self.driver:
             self.driver.quit()
 
-    def incremental_scroll_with_html_check(self, max_scrolls=10, scroll_pause_time=1):
+    def incremental_scroll_with_html_check(self, max_scrolls=10, scroll_pause_time=1, on_new_content=None):
         """
-        Scroll incrementally and check if more HTML is being loaded.
+        Scroll incrementally while more content is being loaded.
+
+        Every scroll is followed by cheap probes of the page (height, element count, added nodes, loaded resources,
+        see scrolling) instead of comparing page_source. Scrolling stops at the bottom of the page once a scroll
+        loaded nothing, or once the shop's learned scroll budget is used and the last scroll loaded nothing.
 
         Args:
             max_scrolls (int): Maximum number of scroll attempts.
-            scroll_pause_time (int): Pause time between scrolls in seconds.
+            scroll_pause_time (int): Maximum time in seconds to wait for new content after a scroll.
+            on_new_content (callable, optional): Called after every scroll that added nodes to the page (also when a
+                                                 virtualized list replaced its items without growing).
         """
-        last_page_source = self.driver.page_source  # Initial page source for comparison
+        domain = template_domain(self.shopping_website)
+        budget = self.scroll_budget.budget(domain, max_scrolls)
+        state = self.driver.execute_script(SCROLL_PROBE_SCRIPT)  # Initial state for comparison
+        last_productive_scroll = 0
 
         for scroll in range(max_scrolls):
+            # Past the budget, only a page that is still growing is scrolled further
+            if scroll >= budget and last_productive_scroll < scroll:
+                print(f"Scroll budget of {budget} scrolls used. Stopping.")
+                break
+
             # Scroll down incrementally
-            self.driver.execute_script("window.scrollBy(0, 2400);")
-            time.sleep(random.uniform(scroll_pause_time - 0.5, scroll_pause_time + 0.5))
+            at_bottom = self.driver.execute_script(SCROLL_STEP_SCRIPT, SCROLL_STEP)
 
-            # Get the current page source and compare with the last
-            current_page_source = self.driver.page_source
+            # Wait until the new content (if any) is loaded
+            new_state = wait_for_page_to_settle(self.driver, state, scroll_pause_time,
+                                                poll_interval=min(SCROLL_POLL_INTERVAL, scroll_pause_time / 4),
+                                                quiet_period=min(SCROLL_QUIET_PERIOD, scroll_pause_time / 2))
 
-            if current_page_source == last_page_source:
-                print(f"Scroll {scroll + 1}: No additional HTML loaded. Stopping.")
+            if on_new_content and new_state[2] != state[2]:
+                on_new_content()
+
+            if content_grew(state, new_state):
+                print(f"Scroll {scroll + 1}: Additional content detected.")
+                last_productive_scroll = scroll + 1
+            elif at_bottom:
+                print(f"Scroll {scroll + 1}: No additional content loaded. Stopping.")
                 break
-            else:
-                print(f"Scroll {scroll + 1}: Additional HTML detected.")
 
-            # Update the last page source
-            last_page_source = current_page_source
+            # Update the last state
+            state = new_state
 
-        print("Finished scrolling.")
+        # Remember how many scrolls this shop needed
+        self.scroll_budget.record(domain, last_productive_scroll)
+        print(f"Finished scrolling ({last_productive_scroll} productive scrolls, budget {budget}).")
 
     # detect of not interesting blocks
     def trash_detection(self, soup):
@@ -735,7 +1174,7 @@ class GeneralizedScraper:
                 string_occurrences[unique_string] += 1
 
         # Define a threshold for what constitutes "trash" (e.g., appears in 3 or more blocks)
-        threshold = 5
+        threshold = TRASH_THRESHOLD
         self.wrong_titles = {string for string, count in string_occurrences.items() if count >= threshold}
 
         # Optional: Print out detected "trash" strings for debugging, each on a new line
@@ -743,9 +1182,18 @@ class GeneralizedScraper:
         # for title in self.wrong_titles:
         #     print(title)
 
+    def trash_detection_in_browser(self):
+        """
+        Detect irrelevant strings like trash_detection, counting the strings inside the browser.
+        """
+        payload = self.driver.execute_script(BROWSER_TRASH_SCRIPT, TRASH_THRESHOLD)
+        self.wrong_titles = set(json.loads(payload))
+
     @profile
     def scrape_all_products(self, scroll_based=False, max_pages=99, max_scrolls=20, url_template=None,
-                            page_number_supported=True):
+                            page_number_supported=True, use_block_templates=True, in_browser=False, incremental=False,
+                            fetch_mode="browser", start_page=1, on_page_done=None, pipelined=False,
+                            parser_pool=None):
         """
         Scrape all products using pagination and scrolling if enabled.
 
@@ -755,60 +1203,314 @@ class GeneralizedScraper:
             max_scrolls (int): Maximum scrolls per page.
             url_template (str): Template URL with page number placeholder.
             page_number_supported (bool): Whether pagination is supported.
+            use_block_templates (bool): Whether to select product blocks with the learned template of the shop.
+            in_browser (bool): Whether to detect the products inside the browser instead of parsing page_source
+                               (block templates are not used in this mode).
+            incremental (bool): With scroll_based, detect the products inside the browser after every scroll, only in
+                                the content added by the scroll (products removed by virtualized lists are kept).
+            fetch_mode (str): "browser" renders every page in Chrome. "http" downloads the pages of server-rendered
+                              shops with a plain HTTP client (see http_fetch), a page is loaded in the browser when
+                              its response is blocked or has no products.
+            start_page (int): First page to scrape, to continue a search interrupted after page start_page - 1.
+            on_page_done (callable, optional): Called after every page with the page number, the products stored for
+                                               the page and the seconds it took (see job_ledger).
+            pipelined (bool): Parse each page in a background thread while the browser loads the next one (see
+                              scrape_pages_pipelined). Only for paginated searches parsed from page_source in
+                              fetch_mode="browser", the other modes ignore it.
+            parser_pool (ParserClient, optional): Parse the pages in a parser pool instead of the background thread
+                                                  (see parser_pool), implies pipelined.
         """
+        pipelined = pipelined or parser_pool is not None
+        if (pipelined and page_number_supported and url_template and fetch_mode == "browser" and not in_browser
+                and not incremental):
+            self.scrape_pages_pipelined(scroll_based, max_pages, max_scrolls, url_template, use_block_templates,
+                                        start_page, on_page_done, parser_pool)
+            self.wrong_titles.clear()
+            return
 
-        page_count = 1
-        while page_count <= max_pages:
-            print(f"Scraping page {page_count}")
+        http_fallbacks = 0  # Consecutive pages the HTTP client failed on
+        self.saturation.reset()
+        page_count = start_page
+        while page_count is not None and page_count <= max_pages:
+            page = self.begin_page(page_count)
+
+            # Server-rendered pages are downloaded without the browser
+            use_http = (fetch_mode == "http" and page_number_supported and url_template
+                        and http_fallbacks < HTTP_MAX_FALLBACKS)
+            if use_http and self.scrape_page_over_http(url_template.format(page_number=page_count),
+                                                       first_page=page_count == start_page,
+                                                       use_block_templates=use_block_templates):
+                http_fallbacks = 0
+            else:
+                if use_http:
+                    http_fallbacks += 1
+                    print(f"Loading page {page_count} in the browser.")
+                self.scrape_page_in_browser(page_count, scroll_based, max_scrolls, url_template, page_number_supported,
+                                            use_block_templates, in_browser, incremental,
+                                            first_page=page_count == start_page,
+                                            record_result=not (use_http and self.http_blocked))
+                if use_http and self.http_fetcher and self.driver:
+                    # The browser may have passed a challenge, the HTTP client continues with its cookies
+                    self.http_fetcher.seed_from_driver(self.driver)
+
+            page_count = self.end_page(page, on_page_done, page_number_supported)
 
-            # Load the current page using pagination if supported
-            if page_number_supported and url_template:
-                search_url = url_template.format(page_number=page_count)
-                self.driver.get(search_url)
-                self.random_delay()
+        # clear all trash titles after scraping all products on all pages
+        self.wrong_titles.clear()
 
-            # check if we have captcha
-            soup = self.extract_page_structure()
-            if self.is_captcha_present(soup):
-                input("Resolve Captcha and click enter button")
+    def begin_page(self, page_count):
+        """
+        Start a page of the search loop (scrape_all_products and AsyncGeneralizedScraper's).
 
-            # Scroll down the page if scroll_based is True
-            if scroll_based:
-                self.incremental_scroll_with_html_check(max_scrolls)  # Scroll down to load more products on the current page
+        Args:
+            page_count (int): The page number.
 
-            # Extract product blocks after scrolling
-            soup = self.extract_page_structure()
+        Returns:
+            tuple: (page number, start time, product count, number of stored products), for end_page.
+        """
+        print(f"Scraping page {page_count}")
+        self.sink_page = page_count
+        return page_count, time.perf_counter(), self.product_count, len(self.stored_products)
 
-            # we detect duplicated urls and titles to avoid trash that is duplicated (like 'promotion' or 'discount')
-            if page_count == 1:
-                self.trash_detection(soup)
+    def end_page(self, page, on_page_done, page_number_supported):
+        """
+        Finish a page of the search loop: report its products and decide if the search goes on.
 
-            # number of product before scraping
-            helper = self.product_count
+        Args:
+            page (tuple): What begin_page returned for the page.
+            on_page_done (callable, optional): See scrape_all_products.
+            page_number_supported (bool): Whether the search has further pages.
 
-            # Detect product blocks on the page
-            self.detect_product_blocks(soup)
+        Returns:
+            int: The next page number, None once the search is done.
+        """
+        page_count, page_started, count_before, stored_before = page
+        # clear marked blocks
+        self.marked_blocks.clear()
 
-            # how many marked blocks we have
-            # print(f"Number of marked blocks: {len(self.marked_blocks)}")
+        page_products = self.stored_products[stored_before:]
+        if self.report_page(page_count, page_products, time.perf_counter() - page_started, on_page_done):
+            return None
 
-            # clear marked blocks
-            self.marked_blocks.clear()
+        # if we dont scrap anything we move to next product ie number of product is same as before
+        if page_count > 3 and count_before == self.product_count:
+            print("No more products to scrape")
+            return None
 
-            # if we dont scrap anything we move to next product ie number of product is same as before
-            if page_count > 3:
-                if helper == self.product_count:
-                    print("No more products to scrape")
-                    break
+        # Handle pagination if supported, otherwise just scroll and stop
+        return page_count + 1 if page_number_supported else None
 
-            # Handle pagination if supported, otherwise just scroll and stop
-            if page_number_supported:
+    def report_page(self, page_count, products, seconds, on_page_done):
+        """
+        Hand the products of a finished page to on_page_done and the catalog, then release them.
+
+        Args:
+            page_count (int): The page number.
+            products (list): The products stored for the page.
+            seconds (float): Time the page took.
+            on_page_done (callable, optional): See scrape_all_products.
+
+        Returns:
+            bool: True if the search is saturated and stops (see page_saturated).
+        """
+        if on_page_done:
+            on_page_done(page_count, products, seconds)
+        saturated = self.page_saturated(products)
+        self.release_page_products()
+        return saturated
+
+    def scrape_pages_pipelined(self, scroll_based, max_pages, max_scrolls, url_template, use_block_templates,
+                               start_page=1, on_page_done=None, parser_pool=None):
+        """
+        Scrape the pages of a search with the browser and the parsing overlapped.
+
+        The browser loads (and scrolls) page N+1 while page N is parsed and its products are detected in a background
+        thread, or in a parser pool, so a page takes about max(load, parse) instead of their sum. Pages are parsed one
+        at a time and in order, so the dedup state and the trash strings of the first page are up to date for the
+        next page. The main thread checks the raw HTML for CAPTCHAs and reports the pages in order; the search stops
+        like scrape_all_products, at most one page later (the page loaded while the last one was parsed). When a load
+        fails (e.g. CaptchaDetected), the page parsed meanwhile is finished and reported before the error is raised,
+        its products are already deduplicated and would be lost for a retry resuming after the reported pages.
+
+        See scrape_all_products for the arguments.
+        """
+        self.saturation.reset()
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="page-parser") as parser:
+            in_flight = None  # (page number, its parsing job, time its loading started)
+            page_count = start_page
+            stop = False
+            while True:
+                html = None
+                if page_count <= max_pages and not stop:
+                    print(f"Scraping page {page_count}")
+                    page_started = time.perf_counter()
+                    try:
+                        html = self.load_page_html(url_template.format(page_number=page_count), scroll_based,
+                                                   max_scrolls)
+                    except Exception:
+                        if in_flight:
+                            self.finish_pipelined_page(in_flight, parser_pool, on_page_done)
+                        raise
+
+                if in_flight:
+                    if self.finish_pipelined_page(in_flight, parser_pool, on_page_done):
+                        print("No more products to scrape")
+                        stop = True
+                    in_flight = None
+
+                if html is None:
+                    break
+                first_page = page_count == start_page
+                # The products of the page are stored by its job, or by add_extracted_products before the next submit
+                self.sink_page = page_count
+                if parser_pool is None:
+                    job = parser.submit(self.parse_page_products, html, first_page, use_block_templates)
+                else:
+                    job = parser_pool.submit(html, self.shopping_website, first_page, self.wrong_titles,
+                                             use_block_templates)
+                in_flight = (page_count, job, page_started)
                 page_count += 1
+
+    def finish_pipelined_page(self, in_flight, parser_pool, on_page_done):
+        """
+        Wait for the parsing job of a page of scrape_pages_pipelined and report the page.
+
+        Args:
+            in_flight (tuple): (page number, its parsing job, time its loading started).
+            parser_pool (ParserPool, optional): The pool the job runs in, None for the parser thread.
+            on_page_done (callable, optional): See scrape_all_products.
+
+        Returns:
+            bool: True if the search stops after the page (saturated, or no new products after page 3).
+        """
+        finished_page, job, finished_started = in_flight
+        if parser_pool is None:
+            new_products, products = job.result()
+        else:
+            new_products, products = self.add_extracted_products(job.result())
+        saturated = self.report_page(finished_page, products, time.perf_counter() - finished_started, on_page_done)
+        # if we dont scrap anything we move to next product ie number of product is same as before
+        return saturated or (finished_page > 3 and new_products == 0)
+
+    def add_extracted_products(self, extraction):
+        """
+        Merge the products a parser pool extracted from a page into the scraper's products and dedup state.
+
+        Args:
+            extraction (PageExtraction): The result of the page (see parser_pool).
+
+        Returns:
+            tuple: (number of new products, the products stored for the page).
+        """
+        # Products another worker stored while the page was parsed are dropped
+        rows = [row for row in extraction.rows if row["Product URL"] not in self.detected_products]
+        for url in extraction.product_urls:
+            self.detected_products.add(url)
+        for url in extraction.image_urls:
+            if url not in self.detected_image_urls:
+                self.detected_image_urls.add(url)
+        if extraction.wrong_titles:
+            self.wrong_titles = set(extraction.wrong_titles)
+
+        self.add_stored_products(rows)
+        self.product_count += len(rows)
+        print(f"Number of products scraped: {len(rows)}")
+        return len(rows), rows
+
+    def load_page_html(self, url, scroll_based, max_scrolls):
+        """
+        Load a page in the browser, wait for a CAPTCHA to be solved, scroll it and return its HTML.
+
+        Args:
+            url (str): The URL of the page.
+            scroll_based (bool): Whether to scroll the page to load more products.
+            max_scrolls (int): Maximum scrolls.
+
+        Returns:
+            str: The page_source once the page is scrolled.
+        """
+        self.load_page(url)
+        detection = detect_captcha(self.driver.page_source)
+        self.record_page_result(detection is not None)
+        if detection:
+            print(f"CAPTCHA detected based on {detection[0]}.")
+            self.resolve_captcha()
+        if scroll_based:
+            self.incremental_scroll_with_html_check(max_scrolls)
+        return self.driver.page_source
+
+    def parse_page_products(self, html, first_page, use_block_templates):
+        """
+        Parse the HTML of a page and detect its products, the parsing step of scrape_pages_pipelined.
+
+        Args:
+            html (str): The HTML of the page.
+            first_page (bool): Whether it is the first page of the search (trash strings are detected).
+            use_block_templates (bool): Whether to use and learn block templates.
+
+        Returns:
+            tuple: (number of new products, the products stored for the page).
+        """
+        count_before, stored_before = self.product_count, len(self.stored_products)
+        soup = self.parse_html(html)
+        if first_page:
+            self.trash_detection(soup)
+        self.detect_page_products(soup, use_block_templates)
+        self.marked_blocks.clear()
+        return self.product_count - count_before, self.stored_products[stored_before:]
+
+    def scrape_page_in_browser(self, page_count, scroll_based, max_scrolls, url_template, page_number_supported,
+                               use_block_templates, in_browser, incremental, first_page=None, record_result=True):
+        """
+        Load a page of the search in the browser and detect its products, see scrape_all_products for the arguments.
+        Trash strings are detected on the first page scraped (page 1 unless first_page says otherwise). With
+        record_result=False the load is not reported to the rate controller, the blocked HTTP fetch of the same page
+        already was.
+        """
+        if first_page is None:
+            first_page = page_count == 1
+
+        # Load the current page using pagination if supported
+        if page_number_supported and url_template:
+            search_url = url_template.format(page_number=page_count)
+            self.load_page(search_url)
+
+        # check if we have captcha, in the page itself when the products are detected in the browser
+        if in_browser or (scroll_based and incremental):
+            captcha_present = self.detect_captcha_in_browser() is not None
+        else:
+            captcha_present = self.is_captcha_present(self.extract_page_structure())
+        if record_result:
+            self.record_page_result(captcha_present)
+        if captcha_present:
+            self.resolve_captcha()
+
+        if scroll_based and incremental:
+            # Products are detected while scrolling, from the content added by every scroll
+            if first_page:
+                self.trash_detection_in_browser()
+            self.detect_new_products_in_browser()
+            self.incremental_scroll_with_html_check(max_scrolls, on_new_content=self.detect_new_products_in_browser)
+        else:
+            # Scroll down the page if scroll_based is True
+            if scroll_based:
+                self.incremental_scroll_with_html_check(max_scrolls)  # Scroll down to load more products on the current page
+
+            if in_browser:
+                # Strings, links and images are collected in the browser, page_source is not transferred
+                if first_page:
+                    self.trash_detection_in_browser()
+                self.detect_product_blocks_in_browser()
             else:
-                break  # Stop after scrolling if pagination is not supported
+                # Extract product blocks after scrolling
+                soup = self.extract_page_structure()
 
-        # clear all trash titles after scraping all products on all pages
-        self.wrong_titles.clear()
+                # we detect duplicated urls and titles to avoid trash that is duplicated (like 'promotion' or 'discount')
+                if first_page:
+                    self.trash_detection(soup)
+
+                # Detect product blocks on the page, directly with the shop's block template once it is learned
+                self.detect_page_products(soup, use_block_templates)
 
 
 if __name__ == "__main__":
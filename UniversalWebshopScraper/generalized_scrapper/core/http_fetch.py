@@ -0,0 +1,107 @@
+import requests
+from requests.adapters import HTTPAdapter
+
+"""
+Plain-HTTP fetching of server-rendered listing pages.
+
+Some shops (eBay's /sch/i.html, Allegro's /listing) send the search results in the initial HTML, rendering them in
+Chrome only adds the page's scripts, images and layout to every page. HttpFetcher downloads such pages with a
+keep-alive connection pool. It is seeded with the cookies and the user agent of the browser session, so the requests
+continue the session the browser opened (consent, region, anti-bot cookies) instead of arriving as a new visitor.
+
+A response is treated as blocked when its status is one of the usual anti-bot statuses (BlockedResponse), the scraper
+then lowers the shop's request rate and loads the page in the browser instead (see
+GeneralizedScraper.scrape_page_over_http). An almost empty response is not an anti-bot signal, the page is only
+loaded in the browser.
+"""
+
+# Statuses anti-bot systems answer with instead of the page
+BLOCKED_STATUSES = frozenset([401, 403, 405, 429, 503])
+
+# A listing page shorter than this is an error or interstitial page
+MIN_PAGE_LENGTH = 2048
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+                  "Chrome/110.0.5481.178 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+
+
+class BlockedResponse(Exception):
+    """
+    The shop answered a request with an anti-bot status (one of BLOCKED_STATUSES).
+
+    Args:
+        url (str): The URL of the page.
+        status_code (int): The status of the response.
+    """
+    def __init__(self, url, status_code):
+        super().__init__(f"HTTP fetch of {url} blocked with status {status_code}.")
+        self.url = url
+        self.status_code = status_code
+
+
+class HttpFetcher:
+    """
+    Keep-alive HTTP client for listing pages, sharing the cookies of the browser session.
+
+    Args:
+        pool_size (int, optional): Number of connections kept open per host.
+        timeout (float, optional): Seconds to wait for a response.
+        headers (dict, optional): Request headers, browser-like headers if not given.
+    """
+    def __init__(self, pool_size=10, timeout=15, headers=None):
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update(headers or DEFAULT_HEADERS)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.seeded = False
+
+    def seed_from_driver(self, driver):
+        """
+        Copy the cookies and the user agent of a browser session.
+
+        Args:
+            driver (WebDriver): The driver whose current site's cookies are copied.
+        """
+        for cookie in driver.get_cookies():
+            self.session.cookies.set(cookie["name"], cookie["value"], domain=cookie.get("domain"),
+                                     path=cookie.get("path", "/"))
+        try:
+            user_agent = driver.execute_script("return navigator.userAgent;")
+            if user_agent:
+                self.session.headers["User-Agent"] = user_agent
+        except Exception as e:
+            print(f"Failed to read the browser's user agent: {e}")
+        self.seeded = True
+
+    def fetch(self, url):
+        """
+        Download a page.
+
+        Args:
+            url (str): The URL of the page.
+
+        Returns:
+            str: The HTML of the page, None if the response is almost empty.
+
+        Raises:
+            BlockedResponse: If the response has an anti-bot status.
+        """
+        response = self.session.get(url, timeout=self.timeout)
+        if response.status_code in BLOCKED_STATUSES:
+            raise BlockedResponse(url, response.status_code)
+        response.raise_for_status()
+
+        html = response.text
+        if len(html) < MIN_PAGE_LENGTH:
+            print(f"HTTP fetch of {url} returned an almost empty page ({len(html)} characters).")
+            return None
+        return html
+
+    def close(self):
+        self.session.close()
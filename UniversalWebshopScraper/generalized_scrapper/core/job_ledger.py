@@ -0,0 +1,353 @@
+import os
+import sqlite3
+import time
+
+import pandas as pd
+
+"""
+Persistent ledger of the scraping jobs, so an interrupted run resumes where it stopped.
+
+Every (shop, category, query) search has a row that goes pending -> in_progress -> done or failed, with the number
+of products and the time it took. Every finished page of a search has a row of its own (page 1, 2, ...), with its
+products, its time and the size of the search's partial CSV once the page's products were appended to it.
+
+A worker appends the products of each finished page to `<product>.csv.part` and then records the page. When a run is
+killed, the next run skips the finished searches, cuts the partial CSV of an unfinished search back to the size
+recorded for its last finished page (dropping a page written but not recorded) and continues with the next page.
+The partial CSV becomes `<product>.csv` once the search is done.
+
+The ledger is a SQLite database in WAL mode: the worker processes each open their own connection and write
+concurrently, and a row is on disk once its transaction is committed.
+"""
+
+PENDING, IN_PROGRESS, DONE, FAILED = "pending", "in_progress", "done", "failed"
+SEARCH_PAGE = 0  # Page number of the row describing the whole search
+BUSY_TIMEOUT = 30  # Seconds a connection waits for another process' write transaction
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    shop TEXT NOT NULL,
+    category TEXT NOT NULL,
+    query TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    rows INTEGER NOT NULL DEFAULT 0,
+    seconds REAL NOT NULL DEFAULT 0,
+    csv_offset INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (shop, category, query, page)
+)
+"""
+
+
+class JobLedger:
+    """
+    SQLite ledger of the searches and pages of scraping runs.
+
+    The object can be passed to worker processes, each process connects on first use.
+
+    Args:
+        path (str): Path of the database file, created if needed.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._connection = None
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.connection.execute(SCHEMA)
+        self.connection.commit()
+
+    def __getstate__(self):
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.path = state['path']
+        self._connection = None
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+        return self._connection
+
+    def _write(self, statement, parameters):
+        with self.connection:
+            self.connection.execute(statement, parameters)
+
+    def add_search(self, shop, category, query, done=False):
+        """
+        Add a search to the ledger as pending, a search already in the ledger keeps its state.
+
+        Args:
+            shop (str): Shop name.
+            category (str): Category of the search.
+            query (str): Searched product.
+            done (bool, optional): Add it as done, e.g. for a CSV scraped before the ledger existed.
+        """
+        self._write("INSERT OR IGNORE INTO jobs (shop, category, query, page, status, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (shop, category, query, SEARCH_PAGE, DONE if done else PENDING, time.time()))
+
+    def plan_searches(self, shop, categories_products, data_path=None):
+        """
+        Add the searches of a run to the ledger and keep those that are not done.
+
+        Args:
+            shop (str): Shop name.
+            categories_products (dict): Category -> list of searched products.
+            data_path (str, optional): Base path of the scraped data. A `<shop>/<category>/<product>.csv` there that
+                                       the ledger does not know yet (scraped before the ledger existed) counts as done.
+
+        Returns:
+            dict: Category -> list of the products still to scrape, in the original order.
+        """
+        for category, products in categories_products.items():
+            for product in products:
+                done = bool(data_path) and os.path.exists(os.path.join(data_path, shop, category, f"{product}.csv"))
+                self.add_search(shop, category, product, done=done)
+        unfinished = set(self.unfinished_searches(shop))
+        return {category: [product for product in products if (category, product) in unfinished]
+                for category, products in categories_products.items()}
+
+    def status(self, shop, category, query, page=SEARCH_PAGE):
+        """Get the status of a search (or of one of its pages), None if it is not in the ledger."""
+        row = self.connection.execute("SELECT status FROM jobs WHERE shop=? AND category=? AND query=? AND page=?",
+                                      (shop, category, query, page)).fetchone()
+        return row[0] if row else None
+
+    def unfinished_searches(self, shop):
+        """
+        Get the searches of a shop that are not done, the interrupted ones first.
+
+        Returns:
+            list: (category, query) tuples.
+        """
+        rows = self.connection.execute(
+            "SELECT category, query FROM jobs WHERE shop=? AND page=? AND status!=? "
+            "ORDER BY status!=?, category, query", (shop, SEARCH_PAGE, DONE, IN_PROGRESS)).fetchall()
+        return [tuple(row) for row in rows]
+
+    def start_search(self, shop, category, query):
+        """
+        Mark a search as in progress and find where it has to continue.
+
+        Args:
+            shop (str): Shop name.
+            category (str): Category of the search.
+            query (str): Searched product.
+
+        Returns:
+            tuple: (next page to scrape, size of the partial CSV after the last finished page).
+        """
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO jobs (shop, category, query, page, status, attempts, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, 1, ?) ON CONFLICT (shop, category, query, page) DO UPDATE SET "
+                "status=excluded.status, attempts=attempts + 1, error=NULL, updated_at=excluded.updated_at",
+                (shop, category, query, SEARCH_PAGE, IN_PROGRESS, time.time()))
+        row = self.connection.execute(
+            "SELECT page, csv_offset FROM jobs WHERE shop=? AND category=? AND query=? AND page>? AND status=? "
+            "ORDER BY page DESC LIMIT 1", (shop, category, query, SEARCH_PAGE, DONE)).fetchone()
+        return (row[0] + 1, row[1]) if row else (1, 0)
+
+    def page_done(self, shop, category, query, page, rows, seconds, csv_offset):
+        """
+        Record a finished page of a search.
+
+        Args:
+            shop (str): Shop name.
+            category (str): Category of the search.
+            query (str): Searched product.
+            page (int): Page number, from 1.
+            rows (int): Products found on the page.
+            seconds (float): Time the page took.
+            csv_offset (int): Size of the partial CSV once the page's products are in it.
+        """
+        self._write("INSERT OR REPLACE INTO jobs (shop, category, query, page, status, rows, seconds, csv_offset, "
+                    "attempts, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1, ?)",
+                    (shop, category, query, page, DONE, rows, seconds, csv_offset, time.time()))
+
+    def finish_search(self, shop, category, query, seconds):
+        """
+        Mark a search as done, its products and time are the sums of its pages plus the given seconds.
+
+        Args:
+            shop (str): Shop name.
+            category (str): Category of the search.
+            query (str): Searched product.
+            seconds (float): Time spent on the search outside of its pages (e.g. opening the search).
+        """
+        self._write("UPDATE jobs SET status=?, "
+                    "rows=(SELECT COALESCE(SUM(rows), 0) FROM jobs WHERE shop=? AND category=? AND query=? AND page>?), "
+                    "seconds=? + (SELECT COALESCE(SUM(seconds), 0) FROM jobs "
+                    "WHERE shop=? AND category=? AND query=? AND page>?), updated_at=? "
+                    "WHERE shop=? AND category=? AND query=? AND page=?",
+                    (DONE, shop, category, query, SEARCH_PAGE, seconds, shop, category, query, SEARCH_PAGE,
+                     time.time(), shop, category, query, SEARCH_PAGE))
+
+    def restart_search(self, shop, category, query):
+        """Forget the finished pages of a search, it starts over from page 1."""
+        self._write("DELETE FROM jobs WHERE shop=? AND category=? AND query=? AND page>?",
+                    (shop, category, query, SEARCH_PAGE))
+
+    def fail_search(self, shop, category, query, error):
+        """Mark a search as failed, its finished pages are kept for the next attempt."""
+        self._write("UPDATE jobs SET status=?, error=?, updated_at=? WHERE shop=? AND category=? AND query=? AND page=?",
+                    (FAILED, str(error), time.time(), shop, category, query, SEARCH_PAGE))
+
+    def release_search(self, shop, category, query):
+        """Put an in-progress search back to pending, e.g. when it is handed to another worker."""
+        self._write("UPDATE jobs SET status=?, updated_at=? WHERE shop=? AND category=? AND query=? AND page=? "
+                    "AND status=?", (PENDING, time.time(), shop, category, query, SEARCH_PAGE, IN_PROGRESS))
+
+    def summary(self, shop):
+        """
+        Count the searches of a shop by status.
+
+        Returns:
+            dict: Status -> {"searches", "rows", "seconds"}.
+        """
+        rows = self.connection.execute(
+            "SELECT status, COUNT(*), SUM(rows), SUM(seconds) FROM jobs WHERE shop=? AND page=? GROUP BY status",
+            (shop, SEARCH_PAGE)).fetchall()
+        return {status: {"searches": count, "rows": total_rows, "seconds": seconds}
+                for status, count, total_rows, seconds in rows}
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+def partial_csv_path(save_path):
+    """Path of the CSV a search writes page by page before it is done."""
+    return save_path + ".part"
+
+
+def resume_partial_csv(save_path, csv_offset):
+    """
+    Prepare the partial CSV of a search for its next page: cut off what was written after the last recorded page.
+
+    Args:
+        save_path (str): Final CSV path of the search.
+        csv_offset (int): Size recorded for the last finished page, 0 to start over.
+
+    Returns:
+        bool: False if the partial CSV is missing or shorter than recorded, the search has to start over (see
+              JobLedger.restart_search).
+    """
+    part_path = partial_csv_path(save_path)
+    if csv_offset and os.path.exists(part_path) and os.path.getsize(part_path) >= csv_offset:
+        with open(part_path, "r+b") as file:
+            file.truncate(csv_offset)
+        return True
+    if os.path.exists(part_path):
+        os.remove(part_path)
+    return csv_offset == 0
+
+
+def append_products_to_csv(save_path, products):
+    """
+    Append the products of a page to the partial CSV of a search and flush them to disk.
+
+    Args:
+        save_path (str): Final CSV path of the search.
+        products (list): Product dicts (see GeneralizedScraper.store_product).
+
+    Returns:
+        int: Size of the partial CSV afterwards.
+    """
+    part_path = partial_csv_path(save_path)
+    new_file = not os.path.exists(part_path) or os.path.getsize(part_path) == 0
+    with open(part_path, "a", encoding="utf-8", newline="") as file:
+        if products:
+            pd.DataFrame(products).to_csv(file, index=False, header=new_file)
+        file.flush()
+        os.fsync(file.fileno())
+        return file.tell()
+
+
+def finish_partial_csv(save_path):
+    """
+    Turn the partial CSV of a finished search into its final CSV.
+
+    Returns:
+        bool: False if the search found no products (no CSV is written, like save_to_csv).
+    """
+    part_path = partial_csv_path(save_path)
+    if not os.path.exists(part_path) or os.path.getsize(part_path) == 0:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        return False
+    os.replace(part_path, save_path)
+    return True
+
+
+class SearchCheckpoint:
+    """
+    Ledger entry and partial CSV of one search, used by the orchestrators around scrape_all_products.
+
+        checkpoint = SearchCheckpoint(ledger, shop, category, query, save_path)
+        start_page = checkpoint.begin()
+        scraper.scrape_all_products(..., start_page=start_page, on_page_done=checkpoint.page_done)
+        checkpoint.finish()
+
+    Args:
+        ledger (JobLedger): The ledger of the run.
+        shop (str): Shop name.
+        category (str): Category of the search.
+        query (str): Searched product.
+        save_path (str): Final CSV path of the search.
+    """
+    def __init__(self, ledger, shop, category, query, save_path):
+        self.ledger = ledger
+        self.key = (shop, category, query)
+        self.save_path = save_path
+        self.started = None
+        self.page_seconds = 0.0
+
+    def begin(self):
+        """
+        Mark the search as in progress and prepare its partial CSV.
+
+        Returns:
+            int: Page to start from, after the pages finished by an earlier run.
+        """
+        self.started = time.monotonic()
+        self.page_seconds = 0.0
+        next_page, csv_offset = self.ledger.start_search(*self.key)
+        if not resume_partial_csv(self.save_path, csv_offset):
+            print(f"Partial CSV of {self.key} is missing, the search starts over.")
+            self.ledger.restart_search(*self.key)
+            next_page = 1
+        if next_page > 1:
+            print(f"Resuming {self.key} at page {next_page}.")
+        return next_page
+
+    def page_done(self, page, products, seconds):
+        """Append the products of a finished page to the partial CSV and record the page."""
+        csv_offset = append_products_to_csv(self.save_path, products)
+        self.ledger.page_done(*self.key, page, len(products), seconds, csv_offset)
+        self.page_seconds += seconds
+
+    def finish(self):
+        """
+        Write the final CSV and mark the search as done.
+
+        Returns:
+            bool: False if the search found no products.
+        """
+        saved = finish_partial_csv(self.save_path)
+        self.ledger.finish_search(*self.key, time.monotonic() - self.started - self.page_seconds)
+        return saved
+
+    def fail(self, error):
+        """Mark the search as failed, its finished pages are kept."""
+        self.ledger.fail_search(*self.key, error)
+
+    def release(self):
+        """Put the search back to pending, e.g. when it is handed to another worker."""
+        self.ledger.release_search(*self.key)
@@ -0,0 +1,191 @@
+import re
+
+from bs4 import BeautifulSoup, Comment
+from bs4.builder import FAST, HTML, PERMISSIVE, HTMLTreeBuilder
+
+"""
+HTML parser backends for GeneralizedScraper.
+
+Every backend returns a BeautifulSoup tree, so find_price, find_title, find_image_url, find_product_url,
+is_captcha_present and the block detection work the same whatever backend parsed the page. The backends differ in
+the tree builder and all of them drop the content of <script>, <style> and <svg> tags and comments before the tree is
+built: on a search page this is most of the markup and none of it is used by the scraper. The tags themselves are
+kept (e.g. <script src="...captcha..."> is still visible to is_captcha_present).
+
+    html.parser  Python's built-in parser, no extra dependency.
+    lxml         libxml2 through lxml, much faster than html.parser.
+    lexbor       The HTML5 engine of selectolax, the tree is handed to BeautifulSoup without a second parse.
+"""
+
+# Tags whose content is dropped before parsing
+PRUNED_CONTENT_TAGS = frozenset(['script', 'style', 'svg'])
+
+# Comments, or the content of a (non self-closing) script/style/svg tag
+PRUNE_PATTERN = re.compile(
+    r'<!--.*?-->|(<(script|style|svg)\b[^>]*(?<!/)>).*?</\2\s*>',
+    re.DOTALL | re.IGNORECASE
+)
+
+
+def prune_html(html):
+    """
+    Remove comments and the content of script, style and svg tags from raw HTML.
+
+    Args:
+        html (str): The raw HTML of the page.
+
+    Returns:
+        str: The pruned HTML, the pruned tags are kept empty with their attributes.
+    """
+    def replace(match):
+        if match.group(1) is None:
+            return ''  # Comment
+        return f'{match.group(1)}</{match.group(2)}>'
+
+    return PRUNE_PATTERN.sub(replace, html)
+
+
+class ParserBackend:
+    """
+    Base class of the parser backends.
+
+    Args:
+        prune (bool, optional): Drop comments and the content of script, style and svg tags before parsing.
+    """
+    name = None
+
+    def __init__(self, prune=True):
+        self.prune = prune
+
+    def parse(self, html):
+        """
+        Parse the HTML of a page.
+
+        Args:
+            html (str): The raw HTML of the page.
+
+        Returns:
+            BeautifulSoup: Parsed HTML content of the page.
+        """
+        raise NotImplementedError
+
+
+class HtmlParserBackend(ParserBackend):
+    """
+    Backend using Python's built-in html.parser.
+    """
+    name = 'html.parser'
+
+    def parse(self, html):
+        if self.prune:
+            html = prune_html(html)
+        return BeautifulSoup(html, 'html.parser')
+
+
+class LxmlBackend(ParserBackend):
+    """
+    Backend using the lxml tree builder of BeautifulSoup.
+    """
+    name = 'lxml'
+
+    def parse(self, html):
+        if self.prune:
+            html = prune_html(html)
+        return BeautifulSoup(html, 'lxml')
+
+
+class LexborTreeBuilder(HTMLTreeBuilder):
+    """
+    BeautifulSoup tree builder parsing the markup with selectolax's lexbor engine.
+
+    The lexbor tree is walked once and replayed as start tag/data/end tag events, the content of pruned tags and the
+    comments are skipped during the walk.
+
+    Args:
+        prune (bool, optional): Skip comments and the content of script, style and svg tags.
+    """
+    NAME = 'lexbor'
+    ALTERNATE_NAMES = ['selectolax']
+    features = ALTERNATE_NAMES + [NAME, HTML, FAST, PERMISSIVE]
+
+    def __init__(self, prune=True, **kwargs):
+        super().__init__(**kwargs)
+        self.prune = prune
+
+    def feed(self, markup):
+        from selectolax.lexbor import LexborHTMLParser
+
+        if isinstance(markup, bytes):
+            markup = markup.decode('utf-8', errors='replace')
+
+        soup = self.soup
+        node = LexborHTMLParser(markup).root
+        open_nodes = []
+
+        while node is not None:
+            tag = node.tag
+            if tag == '-text':
+                soup.handle_data(node.text_content)
+            elif tag == '-comment':
+                if not self.prune:
+                    soup.endData()
+                    soup.handle_data(node.comment_content or '')
+                    soup.endData(Comment)
+            elif node.is_element_node:
+                # Valueless attributes (e.g. <input disabled>) are empty strings in BeautifulSoup
+                attrs = {key: '' if value is None else value for key, value in node.attributes.items()}
+                soup.handle_starttag(tag, None, None, attrs)
+                pruned = self.prune and tag in PRUNED_CONTENT_TAGS
+                if node.child is not None and not pruned:
+                    open_nodes.append(node)
+                    node = node.child
+                    continue
+                soup.handle_endtag(tag)
+
+            # Move to the next sibling, closing every parent whose children are done
+            next_node = node.next
+            while next_node is None and open_nodes:
+                parent = open_nodes.pop()
+                soup.handle_endtag(parent.tag)
+                next_node = parent.next
+            node = next_node
+
+    def test_fragment_to_document(self, fragment):
+        """See `TreeBuilder`."""
+        return '<html><head></head><body>%s</body></html>' % fragment
+
+
+class LexborBackend(ParserBackend):
+    """
+    Backend using the lexbor HTML5 engine of selectolax (pip install selectolax).
+    """
+    name = 'lexbor'
+
+    def parse(self, html):
+        return BeautifulSoup(html, builder=LexborTreeBuilder(prune=self.prune))
+
+
+PARSER_BACKENDS = {
+    HtmlParserBackend.name: HtmlParserBackend,
+    LxmlBackend.name: LxmlBackend,
+    LexborBackend.name: LexborBackend,
+}
+
+
+def get_parser_backend(parser_backend=None):
+    """
+    Get a parser backend by name, or return the given backend instance.
+
+    Args:
+        parser_backend (str or ParserBackend, optional): 'html.parser' (default), 'lxml', 'lexbor' or a backend.
+
+    Returns:
+        ParserBackend: The parser backend.
+    """
+    if isinstance(parser_backend, ParserBackend):
+        return parser_backend
+
+    name = parser_backend or HtmlParserBackend.name
+    if name not in PARSER_BACKENDS:
+        raise ValueError(f"Unknown parser backend '{name}', available: {', '.join(PARSER_BACKENDS)}")
+    return PARSER_BACKENDS[name]()
@@ -0,0 +1,354 @@
+import os
+import queue
+import time
+import uuid
+from multiprocessing import Process, Queue
+from multiprocessing.shared_memory import SharedMemory
+
+from UniversalWebshopScraper.generalized_scrapper.core.block_templates import BlockTemplateCache
+
+"""
+Product extraction without a browser, and a pool of parser processes the browser workers hand their pages to.
+
+The block detection is CPU-bound and used to run in the process of each Chrome driver, so the cores used for parsing
+were tied to the number of browsers that fit in memory. extract_products turns raw HTML plus the page's URL into
+product rows without a driver, and ParserPool runs it in processes of its own: the number of browsers and the number
+of parsing cores are chosen independently.
+
+A browser worker gets a ParserClient (picklable, pass it when the worker process is started) and submits the HTML of
+its pages. Pages larger than SHARED_MEMORY_MIN_BYTES are written to a shared memory block and only its name is sent,
+so multi-MB pages are not pickled through a pipe.
+
+A parser process that dies takes the page it was parsing with it: the client waiting for the page gives up after
+PARSER_RESULT_TIMEOUT seconds (TimeoutError, the search fails and is retried) and removes the page's shared memory,
+and the process owning the pool starts the dead parsers again (ParserPool.restart_dead).
+
+Dedup: a parser reads the URLs the workers already know from the sets given to the pool (shared sets, see url_dedup)
+but never adds to them. The URLs it detects on a page come back with the rows, and the browser worker merges them into
+its sets (GeneralizedScraper.add_extracted_products). Without shared sets, only the page itself is deduplicated in
+the parser, the worker still drops rows it already has when merging.
+"""
+
+SHARED_MEMORY_MIN_BYTES = 256 * 1024  # Smaller pages are sent through the job queue
+PARSER_RESULT_TIMEOUT = 120.0  # Seconds a client waits for the extraction of a page
+
+
+class PageExtraction:
+    """
+    Products of a page extracted without a browser.
+
+    Attributes:
+        rows (list): Product dicts, like GeneralizedScraper.stored_products.
+        product_urls (list): Every product URL detected on the page (primary and related links).
+        image_urls (list): Every image URL detected on the page.
+        wrong_titles (set): Trash strings of the search (detected on its first page, otherwise the ones given).
+    """
+    def __init__(self, rows, product_urls, image_urls, wrong_titles):
+        self.rows = rows
+        self.product_urls = product_urls
+        self.image_urls = image_urls
+        self.wrong_titles = wrong_titles
+
+
+class KnownUrls:
+    """
+    URLs known before the page (read only) plus the URLs detected on it, with the set API the detection uses.
+    """
+    def __init__(self, known=None):
+        self.known = known if known is not None else ()
+        self.new = []
+        self.new_set = set()
+
+    def __contains__(self, url):
+        return url in self.new_set or url in self.known
+
+    def add(self, url):
+        if url not in self.new_set:
+            self.new_set.add(url)
+            self.new.append(url)
+
+
+_scrapers = {}  # Offline scraper per parser backend, reused by the extractions of a process
+
+
+def extract_products(html, base_url, first_page=True, wrong_titles=None, use_block_templates=True,
+                     parser_backend=None, template_cache=None, known_products=None, known_image_urls=None):
+    """
+    Extract the product rows of a listing page from its raw HTML, without a driver.
+
+    Args:
+        html (str): The HTML of the page.
+        base_url (str): The shop's URL (rows' "Website", block template domain).
+        first_page (bool, optional): Whether it is the first page of the search, its trash strings are detected.
+        wrong_titles (set, optional): Trash strings detected on the first page of the search.
+        use_block_templates (bool, optional): Whether to use and learn block templates.
+        parser_backend (str, optional): Parser backend, see parser_backends.
+        template_cache (BlockTemplateCache, optional): Templates to use and update, in memory by default.
+        known_products (optional): Product URLs already scraped (anything supporting `in`), they are skipped.
+        known_image_urls (optional): Image URLs already scraped, they are skipped.
+
+    Returns:
+        PageExtraction: The rows and the URLs detected.
+    """
+    from UniversalWebshopScraper.generalized_scrapper.core.generalized_scrapper import GeneralizedScraper
+
+    scraper = _scrapers.get(parser_backend)
+    if scraper is None:
+        scraper = _scrapers[parser_backend] = GeneralizedScraper(offline_mode=True, parser_backend=parser_backend)
+
+    scraper.shopping_website = base_url
+    scraper.template_cache = template_cache if template_cache is not None else BlockTemplateCache()
+    scraper.detected_products = KnownUrls(known_products)
+    scraper.detected_image_urls = KnownUrls(known_image_urls)
+    scraper.stored_products = []
+    scraper.marked_blocks.clear()
+    scraper.wrong_titles = set(wrong_titles or ())
+
+    soup = scraper.parse_html(html)
+    if first_page:
+        scraper.trash_detection(soup)
+    scraper.detect_page_products(soup, use_block_templates)
+
+    extraction = PageExtraction(scraper.stored_products, scraper.detected_products.new,
+                                scraper.detected_image_urls.new, scraper.wrong_titles)
+    scraper.stored_products = []
+    scraper.page_html = scraper.page_soup = None
+    return extraction
+
+
+def _attach(name):
+    try:
+        # Python 3.13+: the browser worker that created the block owns it
+        return SharedMemory(name=name, track=False)
+    except TypeError:
+        return SharedMemory(name=name)
+
+
+def _read_html(payload):
+    kind, value, size = payload
+    if kind == "inline":
+        return value
+    shared_memory = _attach(value)
+    try:
+        return bytes(shared_memory.buf[:size]).decode("utf-8")
+    finally:
+        shared_memory.close()
+
+
+def parser_process(jobs, results, parser_backend, template_cache_path, known_products, known_image_urls):
+    """
+    Run the extraction jobs of the queue until the pool is closed.
+    """
+    template_cache = BlockTemplateCache(template_cache_path)
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        client_index, job_id, payload, base_url, first_page, wrong_titles, use_block_templates = job
+        try:
+            extraction = extract_products(_read_html(payload), base_url, first_page, wrong_titles,
+                                          use_block_templates, parser_backend, template_cache, known_products,
+                                          known_image_urls)
+            results[client_index].put((job_id, extraction, None))
+        except Exception as e:
+            results[client_index].put((job_id, None, f"{type(e).__name__}: {e}"))
+
+
+class ParserJob:
+    """
+    A page submitted to the pool, result() waits for its extraction (like a Future).
+    """
+    def __init__(self, client, job_id):
+        self.client = client
+        self.job_id = job_id
+
+    def result(self, timeout=PARSER_RESULT_TIMEOUT):
+        return self.client.result(self.job_id, timeout)
+
+
+class ParserClient:
+    """
+    Handle of one browser worker on a ParserPool.
+
+    Job ids are unique to the client's process, so a worker started again with the same client index ignores the
+    results of the jobs its killed predecessor left in the result queue.
+
+    Args:
+        jobs (Queue): The pool's job queue.
+        results (Queue): The client's own result queue.
+        client_index (int): Index of the client in the pool.
+    """
+    def __init__(self, jobs, results, client_index):
+        self.jobs = jobs
+        self.results = results
+        self.client_index = client_index
+        self.session = uuid.uuid4().hex
+        self.next_job_id = 0
+        self.finished = {}  # Results received for other jobs while waiting
+        self.shared_blocks = {}  # Shared memory of the jobs in flight
+        self.abandoned = set()  # Jobs given up on, their late results are dropped
+
+    def __getstate__(self):
+        return {'jobs': self.jobs, 'results': self.results, 'client_index': self.client_index}
+
+    def __setstate__(self, state):
+        self.__init__(state['jobs'], state['results'], state['client_index'])
+
+    def submit(self, html, base_url, first_page=True, wrong_titles=None, use_block_templates=True):
+        """
+        Hand the HTML of a page to the pool, see extract_products for the arguments.
+
+        Returns:
+            ParserJob: The job, its result() is a PageExtraction.
+        """
+        job_id = (self.session, self.next_job_id)
+        self.next_job_id += 1
+
+        data = html.encode("utf-8")
+        if len(data) >= SHARED_MEMORY_MIN_BYTES:
+            shared_memory = SharedMemory(create=True, size=len(data))
+            shared_memory.buf[:len(data)] = data
+            self.shared_blocks[job_id] = shared_memory
+            payload = ("shared", shared_memory.name, len(data))
+        else:
+            payload = ("inline", html, len(data))
+
+        self.jobs.put((self.client_index, job_id, payload, base_url, first_page,
+                       set(wrong_titles or ()), use_block_templates))
+        return ParserJob(self, job_id)
+
+    def result(self, job_id, timeout=PARSER_RESULT_TIMEOUT):
+        """
+        Wait for the extraction of a job.
+
+        Args:
+            job_id (tuple): The job.
+            timeout (float, optional): Seconds to wait, e.g. for a parser process that died with the page.
+
+        Returns:
+            PageExtraction: The products of the page.
+
+        Raises:
+            RuntimeError: If the extraction failed in the parser process.
+            TimeoutError: If no result came within timeout, the job is given up.
+        """
+        deadline = time.monotonic() + timeout
+        while job_id not in self.finished:
+            try:
+                finished_id, extraction, error = self.results.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                self.abandoned.add(job_id)
+                self._release(job_id)
+                raise TimeoutError(f"No extraction from the parser pool after {timeout:.0f}s, "
+                                   f"its parser processes may have died.") from None
+            if finished_id[0] != self.session:
+                continue
+            self._release(finished_id)
+            if finished_id in self.abandoned:
+                self.abandoned.discard(finished_id)
+                continue
+            self.finished[finished_id] = (extraction, error)
+
+        extraction, error = self.finished.pop(job_id)
+        if error:
+            raise RuntimeError(f"Extraction failed in the parser pool: {error}")
+        return extraction
+
+    def close(self):
+        """Remove the shared memory of the jobs still in flight, when the browser worker stops."""
+        for job_id in list(self.shared_blocks):
+            self._release(job_id)
+
+    def _release(self, job_id):
+        shared_memory = self.shared_blocks.pop(job_id, None)
+        if shared_memory is not None:
+            shared_memory.close()
+            try:
+                shared_memory.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class ParserPool:
+    """
+    Processes extracting products from the pages submitted by browser workers.
+
+    Create the pool and its clients in the main process, before the browser workers are started:
+
+        pool = ParserPool(n_clients=n_workers)
+        pool.start()
+        ... Process(target=worker, args=(pool.client(i), ...)) ...
+        pool.close()
+
+    Args:
+        n_clients (int, optional): Number of clients (browser workers) submitting pages.
+        n_processes (int, optional): Number of parser processes, the CPU count by default.
+        parser_backend (str, optional): Parser backend, see parser_backends.
+        template_cache_path (str, optional): JSON file of the block templates shared with the workers.
+        known_products (optional): Product URLs the workers already scraped, readable from any process (see
+                                   url_dedup.SharedFingerprintSet).
+        known_image_urls (optional): Image URLs the workers already scraped, like known_products.
+    """
+    def __init__(self, n_clients=1, n_processes=None, parser_backend=None, template_cache_path=None,
+                 known_products=None, known_image_urls=None):
+        self.n_processes = n_processes or os.cpu_count() or 1
+        self.jobs = Queue()
+        self.results = [Queue() for _ in range(n_clients)]
+        self.process_args = (self.jobs, self.results, parser_backend, template_cache_path, known_products,
+                             known_image_urls)
+        self.processes = []
+
+    def start(self):
+        """Start the parser processes."""
+        for _ in range(self.n_processes):
+            self.processes.append(self._start_process())
+        print(f"Started {self.n_processes} parser processes.")
+
+    def restart_dead(self):
+        """
+        Start the parser processes that died again, call it regularly from the process that started the pool.
+
+        Returns:
+            int: Number of processes started again.
+        """
+        restarted = 0
+        for i, process in enumerate(self.processes):
+            if not process.is_alive():
+                print(f"Parser process {process.pid} died (exit code {process.exitcode}), starting it again.")
+                self.processes[i] = self._start_process()
+                restarted += 1
+        return restarted
+
+    def _start_process(self):
+        process = Process(target=parser_process, args=self.process_args, daemon=True)
+        process.start()
+        return process
+
+    def client(self, client_index):
+        """
+        Get the client of a browser worker.
+
+        Args:
+            client_index (int): Index of the worker, below n_clients.
+
+        Returns:
+            ParserClient: The client.
+        """
+        return ParserClient(self.jobs, self.results[client_index], client_index)
+
+    def close(self):
+        """Stop the parser processes once the submitted jobs are done."""
+        for _ in self.processes:
+            self.jobs.put(None)
+        for process in self.processes:
+            process.join(timeout=30)
+            if process.is_alive():
+                process.terminate()
+        self.processes = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
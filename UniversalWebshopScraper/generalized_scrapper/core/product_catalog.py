@@ -0,0 +1,306 @@
+import os
+import sqlite3
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from UniversalWebshopScraper.generalized_scrapper.core.dataset_writer import parse_price
+
+"""
+Persistent catalog of the products seen by all runs, with a log of what changed.
+
+detected_products only lives as long as a run, so every nightly run writes the same products as new rows again. The
+catalog keeps one row per product, keyed by its canonical URL (canonical_product_url: no fragment, no tracking
+parameters), with its last title, price and currency and when it was first and last seen. Every page's products are
+upserted in one transaction, each product is then:
+
+    new         not in the catalog yet, a "new" change is logged,
+    changed     its price, currency or title differ from the catalog, a change is logged per field,
+    unchanged   only its last_seen time and seen count are updated.
+
+The changes table is the change feed: rows with an increasing id, so a consumer reads changes(since=<last id it
+read>) instead of diffing full CSV dumps.
+
+A search whose pages are saturated with known, unchanged products (CATALOG_SATURATION of a page's products, for
+CATALOG_SATURATED_PAGES pages in a row) has nothing new left, the scraper stops paginating it (see
+GeneralizedScraper.page_saturated), so a nightly run mostly pays for what changed.
+
+Like the job ledger the catalog is a SQLite database in WAL mode, every worker process opens its own connection.
+"""
+
+NEW, CHANGED, UNCHANGED = "new", "changed", "unchanged"
+CATALOG_SATURATION = 0.9  # Share of a page's products that are known and unchanged for the page to be saturated
+CATALOG_SATURATED_PAGES = 2  # Saturated pages in a row after which a search stops
+BUSY_TIMEOUT = 30  # Seconds a connection waits for another process' write transaction
+SQL_VARIABLES = 500  # URLs looked up per query
+
+# Query parameters that only track the visit, dropped from the canonical URL
+TRACKING_PARAMETERS = {"ref", "ref_", "tag", "spm", "scm", "pvid", "algo_pvid", "algo_exp_id", "btsid", "ws_ab_test",
+                       "_trksid", "_trkparms", "hash", "epid", "itmmeta", "gclid", "fbclid", "msclkid", "srsltid",
+                       "pf_rd_p", "pf_rd_r", "pd_rd_r", "pd_rd_w", "pd_rd_wg", "qid", "sr", "sprefix", "crid",
+                       "keywords", "dib", "dib_tag", "th", "psc", "search_key", "_bg_fs", "_x_sessn_id"}
+TRACKING_PREFIXES = ("utm_", "_trk", "pf_rd_", "pd_rd_", "sp_")
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS products (
+        url TEXT PRIMARY KEY,
+        shop TEXT NOT NULL,
+        title TEXT,
+        price REAL,
+        currency TEXT,
+        image_url TEXT,
+        first_seen REAL NOT NULL,
+        last_seen REAL NOT NULL,
+        last_changed REAL NOT NULL,
+        seen_count INTEGER NOT NULL DEFAULT 1
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS changes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        url TEXT NOT NULL,
+        shop TEXT NOT NULL,
+        field TEXT NOT NULL,
+        old_value TEXT,
+        new_value TEXT,
+        changed_at REAL NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS changes_shop ON changes (shop, id)",
+]
+
+
+def canonical_product_url(url):
+    """
+    Get the key of a product URL: lower-case scheme and host without 'www.', no fragment, no trailing slash, and the
+    query without tracking parameters, sorted.
+
+    Args:
+        url (str): The product URL.
+
+    Returns:
+        str: The canonical URL.
+    """
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    host = host[len("www."):] if host.startswith("www.") else host
+    query = sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                   if key.lower() not in TRACKING_PARAMETERS and not key.lower().startswith(TRACKING_PREFIXES))
+    path = parts.path.rstrip("/") or "/"
+    # Amazon appends /ref=... path segments to the product path
+    if "/ref=" in path:
+        path = path[:path.index("/ref=")]
+    return urlunsplit((parts.scheme.lower(), host, path, urlencode(query), ""))
+
+
+def _text(value):
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    return str(value).strip()
+
+
+def _value(value):
+    return None if value is None else str(value)
+
+
+class ProductCatalog:
+    """
+    SQLite catalog of the products of all runs and the change feed.
+
+    The object can be passed to worker processes, each process connects on first use.
+
+    Args:
+        path (str): Path of the database file, created if needed.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._connection = None
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self.connection:
+            for statement in SCHEMA:
+                self.connection.execute(statement)
+
+    def __getstate__(self):
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.path = state['path']
+        self._connection = None
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+        return self._connection
+
+    def upsert(self, shop, products, now=None):
+        """
+        Add or update the products of a page and log their changes, in one transaction.
+
+        Args:
+            shop (str): Shop name.
+            products (list): Product dicts (see GeneralizedScraper.store_product).
+            now (float, optional): Time of the update, time.time() by default.
+
+        Returns:
+            list: NEW, CHANGED or UNCHANGED for every product, in order.
+        """
+        now = time.time() if now is None else now
+        records = []
+        for product in products:
+            records.append((canonical_product_url(product["Product URL"]), _text(product.get("Title")),
+                            parse_price(product.get("Price")), _text(product.get("Currency")),
+                            _text(product.get("Image URL"))))
+        if not records:
+            return []
+
+        connection = self.connection
+        # Taken for writing before the lookup, so two workers cannot both add the same product as new
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            known = self._lookup(list({record[0] for record in records}))
+            statuses, inserts, updates, seen, changes = [], [], [], [], []
+            for url, title, price, currency, image_url in records:
+                if url not in known:
+                    statuses.append(NEW)
+                    inserts.append((url, shop, title, price, currency, image_url, now, now, now))
+                    changes.append((url, shop, NEW, None, _value(price), now))
+                    known[url] = (title, price, currency)
+                    continue
+                old_title, old_price, old_currency = known[url]
+                changed = [(field, old, new) for field, old, new in (("price", old_price, price),
+                                                                     ("currency", old_currency, currency),
+                                                                     ("title", old_title, title)) if old != new]
+                if changed:
+                    statuses.append(CHANGED)
+                    updates.append((title, price, currency, image_url, now, now, url))
+                    changes.extend((url, shop, field, _value(old), _value(new), now) for field, old, new in changed)
+                    known[url] = (title, price, currency)
+                else:
+                    statuses.append(UNCHANGED)
+                    seen.append((now, url))
+
+            connection.executemany(
+                "INSERT INTO products (url, shop, title, price, currency, image_url, first_seen, last_seen, "
+                "last_changed) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", inserts)
+            connection.executemany(
+                "UPDATE products SET title=?, price=?, currency=?, image_url=?, last_seen=?, last_changed=?, "
+                "seen_count=seen_count + 1 WHERE url=?", updates)
+            connection.executemany("UPDATE products SET last_seen=?, seen_count=seen_count + 1 WHERE url=?", seen)
+            connection.executemany(
+                "INSERT INTO changes (url, shop, field, old_value, new_value, changed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                changes)
+            connection.commit()
+        except BaseException:
+            connection.rollback()
+            raise
+        return statuses
+
+    def _lookup(self, urls):
+        known = {}
+        for start in range(0, len(urls), SQL_VARIABLES):
+            chunk = urls[start:start + SQL_VARIABLES]
+            rows = self.connection.execute(
+                f"SELECT url, title, price, currency FROM products WHERE url IN ({','.join('?' * len(chunk))})",
+                chunk).fetchall()
+            known.update((url, (title, price, currency)) for url, title, price, currency in rows)
+        return known
+
+    def product(self, url):
+        """
+        Get a product of the catalog.
+
+        Args:
+            url (str): The product URL, canonicalized for the lookup.
+
+        Returns:
+            dict: The catalog row, None if the product is not known.
+        """
+        cursor = self.connection.execute("SELECT * FROM products WHERE url=?", (canonical_product_url(url),))
+        row = cursor.fetchone()
+        return dict(zip([column[0] for column in cursor.description], row)) if row else None
+
+    def changes(self, since=0, shop=None, limit=None):
+        """
+        Read the change feed.
+
+        Args:
+            since (int, optional): Id of the last change already read, 0 for all changes.
+            shop (str, optional): Only the changes of this shop.
+            limit (int, optional): Most changes returned.
+
+        Returns:
+            list: Change dicts (id, url, shop, field, old_value, new_value, changed_at), oldest first.
+        """
+        query = "SELECT id, url, shop, field, old_value, new_value, changed_at FROM changes WHERE id>?"
+        parameters = [since]
+        if shop is not None:
+            query += " AND shop=?"
+            parameters.append(shop)
+        query += " ORDER BY id"
+        if limit is not None:
+            query += " LIMIT ?"
+            parameters.append(limit)
+        columns = ["id", "url", "shop", "field", "old_value", "new_value", "changed_at"]
+        return [dict(zip(columns, row)) for row in self.connection.execute(query, parameters).fetchall()]
+
+    def summary(self, shop=None, since=0):
+        """
+        Count the products of the catalog and the changes since a time.
+
+        Args:
+            shop (str, optional): Only this shop.
+            since (float, optional): Count the changes logged from this time on, e.g. the start of the run.
+
+        Returns:
+            dict: {"products": ..., "new": ..., "price": ..., "currency": ..., "title": ...}.
+        """
+        shop_filter, parameters = ("WHERE shop=?", [shop]) if shop is not None else ("", [])
+        products = self.connection.execute(f"SELECT COUNT(*) FROM products {shop_filter}", parameters).fetchone()[0]
+        rows = self.connection.execute(
+            f"SELECT field, COUNT(*) FROM changes WHERE changed_at>=? {'AND shop=?' if shop is not None else ''} "
+            f"GROUP BY field", [since] + parameters).fetchall()
+        summary = {"products": products, NEW: 0, "price": 0, "currency": 0, "title": 0}
+        summary.update(dict(rows))
+        return summary
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+class PageSaturation:
+    """
+    Tells when the pages of a search only bring products the catalog already knows unchanged.
+
+    Args:
+        threshold (float, optional): Share of known, unchanged products for a page to be saturated.
+        pages (int, optional): Saturated pages in a row after which the search stops.
+    """
+    def __init__(self, threshold=CATALOG_SATURATION, pages=CATALOG_SATURATED_PAGES):
+        self.threshold = threshold
+        self.pages = pages
+        self.saturated_pages = 0
+
+    def reset(self):
+        """Start a new search."""
+        self.saturated_pages = 0
+
+    def page_done(self, statuses):
+        """
+        Count a page by the catalog statuses of its products.
+
+        Args:
+            statuses (list): The statuses ProductCatalog.upsert returned for the page.
+
+        Returns:
+            bool: True once the search has enough saturated pages in a row to stop.
+        """
+        if statuses and statuses.count(UNCHANGED) >= self.threshold * len(statuses):
+            self.saturated_pages += 1
+        else:
+            self.saturated_pages = 0
+        return self.saturated_pages >= self.pages
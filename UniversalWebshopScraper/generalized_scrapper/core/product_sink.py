@@ -0,0 +1,292 @@
+import atexit
+import csv
+import json
+import os
+import threading
+import time
+import traceback
+
+from UniversalWebshopScraper.generalized_scrapper.core.dataset_writer import ProductDatasetWriter
+
+"""
+Buffered, streaming output of the scraped products.
+
+Writing every product on its own (a one-row DataFrame and a to_csv(mode='a') per product) reopens the file and
+builds a DataFrame per row, and holding every product of a search in stored_products until the search ends makes the
+memory grow with the search. A ProductSink sits between store_product and the files instead:
+
+    - the scraper puts every product into the sink with its destination (shop, category, query), put only appends to
+      an in-memory buffer,
+    - a background thread writes the buffer once it holds batch_size products or flush_interval seconds passed, one
+      file open and one write per destination and batch,
+    - the buffer is bounded: a put finding max_buffered products waits for the write (backpressure) instead of
+      growing the memory,
+    - close() writes what is left, it runs at interpreter exit too (atexit), also after an unhandled exception. A
+      killed process loses at most the products of the last flush_interval.
+
+The backends decide the file layout of a destination, all of them write <root>/<shop>/<category>/<query>.<ext>
+like save_to_csv, except the Parquet dataset (see dataset_writer):
+
+    CsvBackend          CSV files with the columns of store_product.
+    JsonLinesBackend    One JSON object per product and line.
+    ParquetBackend      Typed Parquet dataset partitioned by shop and category, the query is a column, one part
+                        file per written batch and page of a search.
+
+A product is put with the page of the search it is from, begin(destination, first_page) of a search resumed at
+first_page keeps what the backend wrote for the earlier pages (see ParquetBackend).
+"""
+
+SINK_BATCH_SIZE = 500  # Products written at once
+SINK_FLUSH_INTERVAL = 5.0  # Seconds after which buffered products are written anyway
+SINK_MAX_BUFFERED = 5000  # Products buffered before put waits for the write
+PRODUCT_COLUMNS = ["Website", "Product URL", "Image URL", "Price", "Currency", "Title", "All Links", "All Images"]
+
+
+class SinkBackend:
+    """
+    Writes batches of products to their destination, the base of the sink backends.
+
+    Args:
+        root (str): Directory of the files.
+        extension (str): Extension of the files of the destinations.
+    """
+    def __init__(self, root, extension):
+        self.root = root
+        self.extension = extension
+
+    def path(self, destination):
+        """Get the file of a (shop, category, query) destination."""
+        shop, category, query = destination
+        return os.path.join(self.root, str(shop), str(category), f"{query}.{self.extension}")
+
+    def begin(self, destination, first_page=1):
+        """
+        Start a destination anew, e.g. for a search that is run again: its file is removed. A search resumed at a
+        later page keeps its file.
+        """
+        path = self.path(destination)
+        if first_page <= 1 and os.path.exists(path):
+            os.remove(path)
+
+    def write(self, destination, products, page=None):
+        """Append products of a page (None if unknown) to a destination."""
+        raise NotImplementedError
+
+    def close(self):
+        """Release the files of the backend."""
+
+
+class CsvBackend(SinkBackend):
+    """CSV files with the columns of store_product, the header is written with the first products of a file."""
+    def __init__(self, root):
+        super().__init__(root, "csv")
+
+    def write(self, destination, products, page=None):
+        path = self.path(destination)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "a", encoding="utf-8", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=PRODUCT_COLUMNS, extrasaction="ignore", lineterminator="\n")
+            if file.tell() == 0:
+                writer.writeheader()
+            writer.writerows(products)
+
+
+class JsonLinesBackend(SinkBackend):
+    """JSON Lines files, one product per line."""
+    def __init__(self, root):
+        super().__init__(root, "jsonl")
+
+    def write(self, destination, products, page=None):
+        path = self.path(destination)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "a", encoding="utf-8") as file:
+            file.writelines(json.dumps(product, ensure_ascii=False) + "\n" for product in products)
+
+
+class ParquetBackend(SinkBackend):
+    """
+    Typed Parquet dataset partitioned by shop and category (see dataset_writer).
+
+    Every batch of a destination and page is written as a closed part file of its own (write_part), so its rows are
+    in the dataset once the batch is written, also when the worker is killed later. The part files are named after
+    the query and the page: begin removes those of an earlier attempt of the search from first_page on, a retried
+    search does not duplicate its rows and a resumed one keeps the pages it does not scrape again.
+
+    Args:
+        root (str): Directory of the dataset.
+        **writer_options: row_group_size and compression, see ProductDatasetWriter.
+    """
+    def __init__(self, root, **writer_options):
+        super().__init__(root, "parquet")
+        self.writer = ProductDatasetWriter(root, **writer_options)
+
+    def begin(self, destination, first_page=1):
+        shop, category, query = destination
+        self.writer.remove_parts(shop, category, query, first_page=first_page)
+
+    def write(self, destination, products, page=None):
+        shop, category, query = destination
+        self.writer.write_part(shop, category, products, query=query, page=page)
+
+    def close(self):
+        self.writer.close()
+
+
+SINK_BACKENDS = {"csv": CsvBackend, "jsonl": JsonLinesBackend, "parquet": ParquetBackend}
+
+
+def make_backend(kind, root, **options):
+    """
+    Create a sink backend by name.
+
+    Args:
+        kind (str): "csv", "jsonl" or "parquet".
+        root (str): Directory of the files.
+        **options: Options of the backend.
+
+    Returns:
+        SinkBackend: The backend.
+    """
+    if kind not in SINK_BACKENDS:
+        raise ValueError(f"Unknown product sink backend '{kind}', expected one of {sorted(SINK_BACKENDS)}.")
+    return SINK_BACKENDS[kind](root, **options)
+
+
+class ProductSink:
+    """
+    Buffers products in memory and writes them to one or more backends on a background thread.
+
+    Use it as a context manager or call close(), which is also called at interpreter exit.
+
+    Args:
+        backends (SinkBackend or list): Where the products are written.
+        batch_size (int, optional): Buffered products that trigger a write.
+        flush_interval (float, optional): Seconds after which buffered products are written anyway.
+        max_buffered (int, optional): Buffered products at which put writes them itself.
+    """
+    def __init__(self, backends, batch_size=SINK_BATCH_SIZE, flush_interval=SINK_FLUSH_INTERVAL,
+                 max_buffered=SINK_MAX_BUFFERED):
+        self.backends = list(backends) if isinstance(backends, (list, tuple)) else [backends]
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffered = max(max_buffered, batch_size)
+        self.buffer = []  # (destination, page, product) in the order they were put
+        self.condition = threading.Condition()
+        self.write_lock = threading.Lock()  # Held from taking a batch until it is written, keeps the batches in order
+        self.closed = False
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.flushes = 0
+        self.write_seconds = 0.0
+        self.thread = threading.Thread(target=self._run, name="product-sink", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def put(self, destination, product, page=None):
+        """
+        Add a product to the buffer.
+
+        Args:
+            destination (tuple): (shop, category, query) the product belongs to.
+            product (dict): The product (see GeneralizedScraper.store_product).
+            page (int, optional): The page of the search the product is from.
+        """
+        self.put_many(destination, [product], page=page)
+
+    def put_many(self, destination, products, page=None):
+        """Add the products of a destination (and page of its search) to the buffer."""
+        if not products:
+            return
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("The product sink is closed.")
+            self.buffer.extend((destination, page, product) for product in products)
+            size = len(self.buffer)
+            if size >= self.batch_size:
+                self.condition.notify()
+        if size >= self.max_buffered:
+            # The background thread falls behind, the producer writes instead of buffering more
+            self.flush()
+
+    def begin(self, destination, first_page=1):
+        """
+        Start a destination anew, before a search is run (again): its buffered and written products are discarded
+        where the backend can remove them. A search resumed at first_page keeps the products of the earlier pages.
+        """
+        self.flush()
+        with self.write_lock:
+            for backend in self.backends:
+                backend.begin(destination, first_page=first_page)
+
+    def flush(self):
+        """Write every buffered product now."""
+        with self.write_lock:
+            with self.condition:
+                batch, self.buffer = self.buffer, []
+            self._write(batch)
+
+    def close(self):
+        """Write the buffered products, stop the background thread and close the backends. Idempotent."""
+        with self.condition:
+            if self.closed:
+                return
+            self.closed = True
+            self.condition.notify()
+        self.thread.join()
+        self.flush()
+        with self.write_lock:
+            for backend in self.backends:
+                try:
+                    backend.close()
+                except Exception as e:
+                    print(f"Error closing product sink backend {type(backend).__name__}: {e}")
+                    traceback.print_exc()
+        atexit.unregister(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def metrics(self):
+        """
+        Get the sink's counters.
+
+        Returns:
+            dict: Products written and dropped (counted per backend), buffered now, number of writes and seconds
+                  spent writing.
+        """
+        return {"written": self.rows_written, "dropped": self.rows_dropped, "buffered": len(self.buffer),
+                "flushes": self.flushes, "write_seconds": round(self.write_seconds, 3)}
+
+    def _run(self):
+        while True:
+            with self.condition:
+                if not self.closed and len(self.buffer) < self.batch_size:
+                    self.condition.wait(timeout=self.flush_interval)
+                if self.closed:
+                    return
+            self.flush()
+
+    def _write(self, batch):
+        # Called with the write lock held
+        if not batch:
+            return
+        # Group by destination and page, keeping the first-seen order of the groups and of their products
+        groups = {}
+        for destination, page, product in batch:
+            groups.setdefault((destination, page), []).append(product)
+        started = time.perf_counter()
+        for backend in self.backends:
+            for (destination, page), products in groups.items():
+                try:
+                    backend.write(destination, products, page=page)
+                except Exception as e:
+                    self.rows_dropped += len(products)
+                    print(f"Error writing {len(products)} products to {destination} ({type(backend).__name__}): {e}")
+                    traceback.print_exc()
+                else:
+                    self.rows_written += len(products)
+        self.flushes += 1
+        self.write_seconds += time.perf_counter() - started
@@ -0,0 +1,345 @@
+import csv
+import os
+from array import array
+
+import numpy as np
+import pandas as pd
+
+"""
+Compact, column-oriented store of the scraped products, used as GeneralizedScraper.stored_products.
+
+A product stored as a dict costs the dict (8 keys) plus 7 string objects, two of them the pipe-joined links and images
+that repeat the product and image URL. A long AliExpress search holds tens of thousands of them. ProductStore keeps
+the same products in a few flat buffers instead:
+
+    - every text (URLs, titles) is appended once to one UTF-8 bytearray, a text is an integer id into it (the end
+      offsets of the texts are an array of int32, a store holds less than 2 GB of text),
+    - the product URL and the image URL are references to the first of the product's links and images (the way
+      store_product builds them), they are only stored separately when they differ,
+    - the links and images of a product are ranges of text ids (list offsets into an array of ids),
+    - the website, currency and price strings repeat from product to product, they are interned: an array of codes
+      into a list of the distinct values, -1 for a missing value.
+
+The store behaves like the list of product dicts it replaces: len, iteration, indexing and slicing give product dicts
+(built on access), append, extend and clear. to_arrow hands out its buffers without copying them (pyarrow is then
+required), to_dataframe builds the DataFrame column by column without going through per-row dicts, and to_csv writes
+the CSV of save_to_csv from the columns, through Arrow's CSV writer when pyarrow is installed.
+
+Measured with botleneck_testing/benchmark_product_store.py: the store takes about half the memory of the dicts, most
+of what is left is the UTF-8 of the URLs and titles themselves. to_dataframe is slower than pd.DataFrame(list of
+dicts), which finds the strings already built, but the CSV is written as fast as from the dicts without pyarrow and
+several times faster with it.
+"""
+
+COLUMNS = ["Website", "Product URL", "Image URL", "Price", "Currency", "Title", "All Links", "All Images"]
+LIST_DELIMITER = '|'  # Delimiter of the joined links and images of a product dict
+
+
+def is_missing(value):
+    """Check if a value is None or NaN (a missing value of a DataFrame or CSV row)."""
+    return value is None or (isinstance(value, float) and value != value)
+
+
+class ValueDictionary:
+    """Distinct values of a column and their codes, for the strings repeated from product to product."""
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    def code(self, value):
+        """Get the code of a value, adding it if it is new, -1 for a missing value."""
+        if is_missing(value):
+            return -1
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def value(self, code):
+        """Get the value of a code, None for -1."""
+        return self.values[code] if code >= 0 else None
+
+
+class ProductStore:
+    """
+    List-like store of product dicts (see GeneralizedScraper.store_product) in flat, typed buffers.
+
+    Args:
+        products (iterable, optional): Products to store first.
+    """
+    def __init__(self, products=()):
+        self.clear()
+        self.extend(products)
+
+    def clear(self):
+        """Remove every product, the buffers are replaced (a table from to_arrow keeps the old ones)."""
+        self.text_data = bytearray()  # UTF-8 of every text, one after the other
+        self.text_offsets = array('i', [0])  # Text i is text_data[text_offsets[i]:text_offsets[i + 1]]
+        self.product_urls = array('i')  # Text id of each product's URL
+        self.image_urls = array('i')  # Text id of each product's image URL, -1 if none
+        self.titles = array('i')  # Text id of each product's title, -1 if none
+        self.link_ids = array('i')  # Text ids of the links of all products
+        self.link_offsets = array('i', [0])  # Links of product i are link_ids[link_offsets[i]:link_offsets[i + 1]]
+        self.image_ids = array('i')
+        self.image_offsets = array('i', [0])
+        self.websites = ValueDictionary()
+        self.currencies = ValueDictionary()
+        self.prices = ValueDictionary()
+        self.website_codes = array('i')
+        self.currency_codes = array('i')
+        self.price_codes = array('i')
+
+    def _add_text(self, text):
+        if text is None:
+            return -1
+        self.text_data += str(text).encode('utf-8', errors='surrogatepass')
+        self.text_offsets.append(len(self.text_data))
+        return len(self.text_offsets) - 2
+
+    def _text(self, text_id):
+        if text_id < 0:
+            return None
+        start, end = self.text_offsets[text_id], self.text_offsets[text_id + 1]
+        return self.text_data[start:end].decode('utf-8', 'surrogatepass')
+
+    def _add_list(self, joined, ids, offsets):
+        if isinstance(joined, (list, tuple)):
+            items = joined
+        else:
+            items = joined.split(LIST_DELIMITER) if joined else []
+        first = -1
+        for item in items:
+            text_id = self._add_text(item)
+            ids.append(text_id)
+            first = text_id if first < 0 else first
+        offsets.append(len(ids))
+        return first
+
+    def _reference(self, value, first_id):
+        # The product and image URL are the first link and image of a product, else stored on their own
+        if is_missing(value):
+            return -1
+        if first_id >= 0 and self._text(first_id) == value:
+            return first_id
+        return self._add_text(value)
+
+    def append(self, product):
+        """
+        Store a product.
+
+        Args:
+            product (dict): The product, with the keys of COLUMNS.
+        """
+        first_link = self._add_list(product.get("All Links"), self.link_ids, self.link_offsets)
+        first_image = self._add_list(product.get("All Images"), self.image_ids, self.image_offsets)
+        self.product_urls.append(self._reference(product.get("Product URL"), first_link))
+        self.image_urls.append(self._reference(product.get("Image URL"), first_image))
+        self.titles.append(self._add_text(product.get("Title")))
+        self.website_codes.append(self.websites.code(product.get("Website")))
+        self.currency_codes.append(self.currencies.code(product.get("Currency")))
+        self.price_codes.append(self.prices.code(product.get("Price")))
+
+    def extend(self, products):
+        """Store several products."""
+        for product in products:
+            self.append(product)
+
+    def __len__(self):
+        return len(self.product_urls)
+
+    def _links(self, index, ids, offsets):
+        return LIST_DELIMITER.join(self._text(text_id) for text_id in ids[offsets[index]:offsets[index + 1]])
+
+    def product(self, index):
+        """
+        Build the dict of a stored product.
+
+        Args:
+            index (int): Position of the product, negative from the end.
+
+        Returns:
+            dict: The product, like store_product builds it.
+        """
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("product index out of range")
+        return {
+            "Website": self.websites.value(self.website_codes[index]),
+            "Product URL": self._text(self.product_urls[index]),
+            "Image URL": self._text(self.image_urls[index]),
+            "Price": self.prices.value(self.price_codes[index]),
+            "Currency": self.currencies.value(self.currency_codes[index]),
+            "Title": self._text(self.titles[index]),
+            "All Links": self._links(index, self.link_ids, self.link_offsets),
+            "All Images": self._links(index, self.image_ids, self.image_offsets),
+        }
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.product(i) for i in range(*index.indices(len(self)))]
+        return self.product(index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.product(index)
+
+    def __eq__(self, other):
+        if isinstance(other, (ProductStore, list, tuple)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self):
+        return f"ProductStore({len(self)} products, {self.nbytes()} bytes)"
+
+    def nbytes(self):
+        """
+        Get the memory of the buffers, without the interned values.
+
+        Returns:
+            int: Bytes used by the texts, ids, offsets and codes.
+        """
+        arrays = [self.text_offsets, self.product_urls, self.image_urls, self.titles, self.link_ids,
+                  self.link_offsets, self.image_ids, self.image_offsets, self.website_codes, self.currency_codes,
+                  self.price_codes]
+        return len(self.text_data) + sum(len(values) * values.itemsize for values in arrays)
+
+    def _all_texts(self):
+        # Every text at once: an ASCII buffer is decoded in one go and sliced, byte and character offsets are equal
+        data = self.text_data.decode('utf-8', 'surrogatepass')
+        offsets = self.text_offsets.tolist()
+        if len(data) != len(self.text_data):
+            return [self._text(text_id) for text_id in range(len(offsets) - 1)]
+        return [data[start:end] for start, end in zip(offsets, offsets[1:])]
+
+    @staticmethod
+    def _joined(texts, ids, offsets):
+        # The texts of a product's list are added one after the other, their ids are consecutive
+        ids = ids.tolist()
+        offsets = offsets.tolist()
+        join = LIST_DELIMITER.join
+        return [join(texts[ids[start]:ids[end - 1] + 1]) if end > start else ''
+                for start, end in zip(offsets, offsets[1:])]
+
+    def _columns(self):
+        # The columns of COLUMNS as lists of strings (None for missing values), the interned ones as (codes, values)
+        texts = self._all_texts()
+
+        def text_column(text_ids):
+            return [texts[text_id] if text_id >= 0 else None for text_id in text_ids]
+
+        return {
+            "Website": (self.website_codes, self.websites),
+            "Product URL": text_column(self.product_urls),
+            "Image URL": text_column(self.image_urls),
+            "Price": (self.price_codes, self.prices),
+            "Currency": (self.currency_codes, self.currencies),
+            "Title": text_column(self.titles),
+            "All Links": self._joined(texts, self.link_ids, self.link_offsets),
+            "All Images": self._joined(texts, self.image_ids, self.image_offsets),
+        }
+
+    def to_dataframe(self):
+        """
+        Build a DataFrame of the products, with the columns of store_product.
+
+        The website, currency and price columns are categoricals made from the codes (a missing value is NaN), the
+        text columns are decoded from the text buffer once.
+
+        Returns:
+            pd.DataFrame: The products.
+        """
+        n_products = len(self)
+
+        def category(codes, dictionary):
+            return pd.Categorical.from_codes(np.frombuffer(codes, dtype=np.int32, count=n_products).copy(),
+                                             categories=pd.Index(dictionary.values, dtype=object), validate=False)
+
+        columns = {name: category(*column) if isinstance(column, tuple) else column
+                   for name, column in self._columns().items()}
+        return pd.DataFrame(columns, columns=COLUMNS)
+
+    def to_csv(self, path):
+        """
+        Write the products to a CSV file, the one save_to_csv writes from a DataFrame.
+
+        With pyarrow the CSV is written from to_arrow (every text is quoted), else with the csv module from the
+        columns. Both are read back like the DataFrame's CSV: a missing value is an empty field.
+
+        Args:
+            path (str): The CSV file.
+        """
+        try:
+            import pyarrow.csv
+        except ImportError:
+            pyarrow = None
+        if pyarrow is not None:
+            pyarrow.csv.write_csv(self.to_arrow(joined=True), path,
+                                  write_options=pyarrow.csv.WriteOptions(quoting_style="needed"))
+            return
+
+        columns = []
+        for column in self._columns().values():
+            if isinstance(column, tuple):
+                codes, dictionary = column
+                column = [dictionary.value(code) for code in codes]
+            columns.append(column)
+        with open(path, "w", encoding="utf-8", newline="") as file:
+            writer = csv.writer(file, lineterminator=os.linesep)
+            writer.writerow(COLUMNS)
+            writer.writerows(zip(*columns))
+
+    def to_arrow(self, joined=False):
+        """
+        Build an Arrow table of the products on top of the store's buffers, without copying them.
+
+        The text columns are dictionary arrays into one array of every text, All Links and All Images are lists of
+        them. The store cannot grow while the table (which holds its buffers) is alive, clear() it first.
+
+        Args:
+            joined (bool, optional): Give plain string columns with the links and images joined like in the
+                                     product dicts instead, e.g. to write a CSV (the strings are then copied).
+
+        Returns:
+            pyarrow.Table: The products, with the columns of store_product.
+        """
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        texts = pa.StringArray.from_buffers(len(self.text_offsets) - 1, pa.py_buffer(self.text_offsets),
+                                            pa.py_buffer(self.text_data))
+
+        def indices(values):
+            array = pa.Array.from_buffers(pa.int32(), len(values), [None, pa.py_buffer(values)])
+            if len(values) and min(values) < 0:
+                # -1 marks a missing value, only then the indices are copied to null them
+                array = pc.if_else(pc.less(array, 0), pa.scalar(None, pa.int32()), array)
+            return array
+
+        def ids(values):
+            return pa.DictionaryArray.from_arrays(indices(values), texts)
+
+        def interned(codes, dictionary):
+            return pa.DictionaryArray.from_arrays(indices(codes), pa.array(dictionary.values, pa.string()))
+
+        def lists(values, offsets):
+            list_offsets = pa.Array.from_buffers(pa.int32(), len(offsets), [None, pa.py_buffer(offsets)])
+            array = pa.ListArray.from_arrays(list_offsets, ids(values))
+            if joined:
+                return pc.binary_join(array.cast(pa.list_(pa.string())), LIST_DELIMITER)
+            return array
+
+        table = pa.table({
+            "Website": interned(self.website_codes, self.websites),
+            "Product URL": ids(self.product_urls),
+            "Image URL": ids(self.image_urls),
+            "Price": interned(self.price_codes, self.prices),
+            "Currency": interned(self.currency_codes, self.currencies),
+            "Title": ids(self.titles),
+            "All Links": lists(self.link_ids, self.link_offsets),
+            "All Images": lists(self.image_ids, self.image_offsets),
+        })
+        if joined:
+            table = table.cast(pa.schema([(name, pa.string()) for name in table.column_names]))
+        return table
@@ -0,0 +1,141 @@
+import random
+import threading
+import time
+
+"""
+Adaptive request pacing per shop domain.
+
+Every page load takes a token from the domain's bucket, the bucket refills at the domain's current rate (pages per
+second). The rate follows additive-increase/multiplicative-decrease: every page loaded cleanly adds a little to the
+rate, a CAPTCHA halves it and an error lowers it. The scraper thus runs at the fastest rate the site tolerates instead
+of sleeping a fixed random interval.
+
+The state of the buckets is kept in a dict-like object guarded by a lock. With a multiprocessing Manager dict and
+Manager lock, all workers of a shop share the same bucket and the same rate.
+"""
+
+# Default pacing limits in pages per second
+INITIAL_RATE = 0.5
+MIN_RATE = 0.05
+MAX_RATE = 3.0
+
+# Rate added after every clean page, and rate multipliers after a CAPTCHA and after an error
+RATE_INCREASE = 0.05
+CAPTCHA_DECREASE = 0.5
+ERROR_DECREASE = 0.8
+
+# Random share added to or removed from every wait, so requests are not evenly spaced
+WAIT_JITTER = 0.2
+
+
+class RateController:
+    """
+    Token bucket per domain whose rate is adapted with additive-increase/multiplicative-decrease.
+
+    Args:
+        state (dict, optional): Shared state, domain -> (rate, tokens, last refill time). A plain dict if not given.
+        lock (Lock, optional): Lock guarding the state. A threading lock if not given.
+        initial_rate (float, optional): Rate of a domain seen for the first time, in pages per second.
+        min_rate (float, optional): Lowest rate, in pages per second.
+        max_rate (float, optional): Highest rate, in pages per second.
+        burst (int, optional): Number of pages that can be loaded back to back after an idle period.
+        clock (callable, optional): Monotonic clock shared by the processes (time.monotonic).
+        sleep (callable, optional): Function used to wait (time.sleep).
+    """
+    def __init__(self, state=None, lock=None, initial_rate=INITIAL_RATE, min_rate=MIN_RATE, max_rate=MAX_RATE,
+                 burst=1, clock=time.monotonic, sleep=time.sleep):
+        self.state = state if state is not None else {}
+        self.lock = lock if lock is not None else threading.Lock()
+        self.initial_rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.clock = clock
+        self.sleep = sleep
+
+    def _get(self, domain, now):
+        # Called with the lock held
+        if domain not in self.state:
+            return self.initial_rate, float(self.burst), now
+        return self.state[domain]
+
+    def reserve(self, domain):
+        """
+        Take the next token of the domain's bucket and get how long to wait before using it, without waiting.
+
+        The token is reserved right away, so concurrent workers queue up behind each other.
+
+        Args:
+            domain (str): The shop's domain.
+
+        Returns:
+            float: The number of seconds to wait before loading the page.
+        """
+        with self.lock:
+            now = self.clock()
+            rate, tokens, last_refill = self._get(domain, now)
+            tokens = min(float(self.burst), tokens + (now - last_refill) * rate) - 1
+            self.state[domain] = (rate, tokens, now)
+
+        if tokens >= 0:
+            return 0.0
+        return -tokens / rate * random.uniform(1 - WAIT_JITTER, 1 + WAIT_JITTER)
+
+    def acquire(self, domain):
+        """
+        Wait until the domain's bucket allows the next page load.
+
+        Args:
+            domain (str): The shop's domain.
+
+        Returns:
+            float: The number of seconds waited.
+        """
+        wait = self.reserve(domain)
+        if wait > 0:
+            self.sleep(wait)
+        return wait
+
+    def _update_rate(self, domain, update, drain=False):
+        with self.lock:
+            now = self.clock()
+            rate, tokens, last_refill = self._get(domain, now)
+            rate = min(self.max_rate, max(self.min_rate, update(rate)))
+            # After a block the next page waits for a full token at the new rate
+            self.state[domain] = (rate, min(tokens, 0.0) if drain else tokens, last_refill)
+        return rate
+
+    def record_success(self, domain):
+        """Increase the domain's rate after a page loaded without CAPTCHA or error."""
+        return self._update_rate(domain, lambda rate: rate + RATE_INCREASE)
+
+    def record_captcha(self, domain):
+        """Cut the domain's rate after a CAPTCHA."""
+        return self._update_rate(domain, lambda rate: rate * CAPTCHA_DECREASE, drain=True)
+
+    def record_error(self, domain):
+        """Lower the domain's rate after a failed page load."""
+        return self._update_rate(domain, lambda rate: rate * ERROR_DECREASE)
+
+    def rate(self, domain):
+        """
+        Get the current rate of a domain.
+
+        Args:
+            domain (str): The shop's domain.
+
+        Returns:
+            float: The rate in pages per second.
+        """
+        with self.lock:
+            return self._get(domain, self.clock())[0]
+
+    def metrics(self):
+        """
+        Get the current rate of every domain.
+
+        Returns:
+            dict: Domain -> rate in pages per second.
+        """
+        with self.lock:
+            return {domain: values[0] for domain, values in self.state.items()}
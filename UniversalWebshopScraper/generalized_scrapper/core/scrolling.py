@@ -0,0 +1,117 @@
+import time
+from collections import defaultdict, deque
+
+"""
+Scroll termination from cheap in-page signals.
+
+Comparing driver.page_source before and after every scroll transfers the whole DOM twice per scroll. Instead a small
+probe is injected in the page: it returns the document height, the number of elements, the number of nodes added
+since the probe was installed (MutationObserver) and the number of network resources loaded so far. A scroll loaded
+new content when the height or the element count grew, and the page has settled when no signal changed for a short
+quiet period.
+
+ScrollBudget learns per shop how many scrolls actually load content, so the pages of a shop stop scrolling once the
+usual number of productive scrolls is reached and the page stopped growing, even before its bottom.
+"""
+
+# Returns [document height, element count, added nodes, loaded resources], the observer is installed on the first call
+SCROLL_PROBE_SCRIPT = r"""
+var probe = window.__scraperScrollProbe;
+if (!probe) {
+    probe = window.__scraperScrollProbe = {addedNodes: 0};
+    new MutationObserver(function (records) {
+        for (var i = 0; i < records.length; i++) probe.addedNodes += records[i].addedNodes.length;
+    }).observe(document.documentElement, {childList: true, subtree: true});
+    if (performance.setResourceTimingBufferSize) performance.setResourceTimingBufferSize(100000);
+}
+return [document.documentElement.scrollHeight, document.getElementsByTagName('*').length, probe.addedNodes,
+        performance.getEntriesByType('resource').length];
+"""
+
+# Scrolls by arguments[0] pixels and tells if the bottom of the page is reached
+SCROLL_STEP_SCRIPT = r"""
+window.scrollBy(0, arguments[0]);
+return window.scrollY + window.innerHeight >= document.documentElement.scrollHeight - 2;
+"""
+
+SCROLL_STEP = 2400  # Pixels scrolled at every step
+SCROLL_POLL_INTERVAL = 0.1  # Seconds between two probes
+SCROLL_QUIET_PERIOD = 0.3  # Seconds without any change after which the page has settled
+
+
+def content_grew(before, after):
+    """
+    Check if the page got taller or got more elements between two probes.
+
+    Args:
+        before (list): Probe result before the scroll.
+        after (list): Probe result after the scroll.
+
+    Returns:
+        bool: True if new content was loaded.
+    """
+    return after[0] > before[0] or after[1] > before[1]
+
+
+def wait_for_page_to_settle(driver, before, timeout, poll_interval=SCROLL_POLL_INTERVAL,
+                            quiet_period=SCROLL_QUIET_PERIOD):
+    """
+    Probe the page until it settles after a scroll, or until the timeout when nothing changes.
+
+    Args:
+        driver (WebDriver): The Selenium WebDriver.
+        before (list): Probe result before the scroll.
+        timeout (float): Maximum number of seconds to wait for new content.
+        poll_interval (float, optional): Seconds between two probes.
+        quiet_period (float, optional): Seconds without any change after which the page has settled.
+
+    Returns:
+        list: The last probe result.
+    """
+    deadline = time.monotonic() + timeout
+    state = before
+    last_change = None
+
+    while time.monotonic() < deadline:
+        time.sleep(poll_interval)
+        current = driver.execute_script(SCROLL_PROBE_SCRIPT)
+        if current != state:
+            state = current
+            last_change = time.monotonic()
+        elif last_change is not None and time.monotonic() - last_change >= quiet_period:
+            break  # Content arrived and nothing changed since
+
+    return state
+
+
+class ScrollBudget:
+    """
+    Number of scrolls per shop, learned from the scrolls that loaded new content.
+
+    Args:
+        history (int, optional): Number of recent pages remembered per shop.
+        margin (int, optional): Extra scrolls allowed above the most productive page seen.
+    """
+    def __init__(self, history=20, margin=2):
+        self.margin = margin
+        self.productive_scrolls = defaultdict(lambda: deque(maxlen=history))
+
+    def budget(self, domain, max_scrolls):
+        """
+        Get the number of scrolls after which a page of a shop stops scrolling unless it is still growing.
+
+        Args:
+            domain (str): The shop's domain.
+            max_scrolls (int): The upper limit of scrolls.
+
+        Returns:
+            int: The scroll budget.
+        """
+        history = self.productive_scrolls.get(domain)
+        if not history:
+            return max_scrolls
+        return min(max_scrolls, max(history) + self.margin)
+
+    def record(self, domain, productive_scrolls):
+        """Record the number of scrolls that loaded new content on a page of a shop."""
+        self.productive_scrolls[domain].append(productive_scrolls)
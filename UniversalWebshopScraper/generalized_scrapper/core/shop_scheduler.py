@@ -0,0 +1,239 @@
+import queue
+import time
+from multiprocessing import Array, Lock, Queue, Value
+
+"""
+One scheduler for the searches of several shops, run by one shared set of browser workers.
+
+Running one group of workers per shop gates the run by its slowest shop: a shop with twice the searches, or one that
+throttles hard, keeps its workers busy long after the others are done while their workers sit idle. ShopScheduler
+keeps a queue per shop and hands every free worker a task of the shop that needs it most:
+
+    - a shop never runs more tasks at once than its concurrency limit (per-domain politeness, the page loads of its
+      workers are also paced by the shop's rate controller, see rate_control),
+    - a worker stays on its current shop while that shop has tasks and room (warm browser session and caches),
+    - otherwise it takes the shop with the largest backlog per running worker, so the capacity goes where the most
+      work is left and the shops finish together,
+    - a CAPTCHA halves the concurrency limit of its shop and every finished task of the shop raises it again by
+      CONCURRENCY_INCREASE (additive increase, multiplicative decrease like the request rate), the workers a throttled
+      shop no longer gets go to the other shops.
+
+A finished shop simply has no backlog left, its workers move on to the others. The run takes about the total work
+divided by the number of workers, as long as the concurrency limits leave every worker a shop to work on.
+
+The scheduler has the interface of WorkStealingQueues (see task_queue), the workers use either one, and like it the
+scheduler has slots for the largest number of workers with park, retire and activate.
+"""
+
+DEFAULT_SHOP_CONCURRENCY = 2  # Tasks of a shop run at the same time, unless configured per shop
+CONCURRENCY_INCREASE = 0.25  # Concurrency a shop gets back with every finished task after a CAPTCHA
+POLL_INTERVAL = 0.1  # Seconds a worker waits before looking for a shop with room again
+
+
+class ShopScheduler:
+    """
+    Task queues per shop with per-shop concurrency limits, shared between processes.
+
+    Pass the object to the worker processes when they are started.
+
+    Args:
+        shops (list): Names of the shops.
+        n_workers (int): Number of workers (slots for the largest number of workers).
+        n_active (int, optional): Number of workers started first, the other slots are retired until activated.
+        concurrency (dict, optional): Shop name -> most tasks of the shop running at once, DEFAULT_SHOP_CONCURRENCY
+                                      for the shops not given.
+    """
+    def __init__(self, shops, n_workers, n_active=None, concurrency=None):
+        concurrency = concurrency or {}
+        self.shops = list(shops)
+        self.queues = [Queue() for _ in self.shops]
+        self.sizes = Array('i', len(self.shops))  # Tasks queued per shop
+        self.running = Array('i', len(self.shops))  # Tasks running per shop
+        self.max_concurrency = [concurrency.get(shop, DEFAULT_SHOP_CONCURRENCY) for shop in self.shops]
+        self.concurrency = Array('d', self.max_concurrency)  # Current limits, lowered after CAPTCHAs
+        self.unfinished = Value('i', 0)  # Tasks put and not finished yet
+        self.worker_shops = Array('i', [-1] * n_workers)  # Shop of the task each worker runs, -1 if none
+        self.last_shops = Array('i', [-1] * n_workers)  # Shop of each worker's last task
+        self.parked = Array('b', n_workers)  # Workers waiting for a CAPTCHA to be solved, or retired
+        self.retired = Array('b', n_workers)  # Slots without a running worker
+        self.lock = Lock()  # Guards choosing a shop and counting its running tasks
+        for worker_index in range(n_workers if n_active is None else n_active, n_workers):
+            self.retire(worker_index)
+
+    @property
+    def n_workers(self):
+        return len(self.parked)
+
+    def put(self, shop, task):
+        """
+        Put a task into a shop's queue.
+
+        Args:
+            shop (str): Name of the shop.
+            task: The task, any picklable object.
+        """
+        shop_index = self.shops.index(shop)
+        with self.unfinished.get_lock():
+            self.unfinished.value += 1
+        with self.sizes.get_lock():
+            self.sizes[shop_index] += 1
+        self.queues[shop_index].put(task)
+
+    def assign(self, groups):
+        """
+        Put groups of tasks into the queues of their shops.
+
+        Args:
+            groups (dict): (shop name, group e.g. category) -> list of tasks.
+
+        Returns:
+            dict: Group key -> name of its shop.
+        """
+        for (shop, _), tasks in groups.items():
+            for task in tasks:
+                self.put(shop, task)
+        return {key: key[0] for key in groups}
+
+    def park(self, worker_index):
+        """Mark a worker as waiting for a CAPTCHA, and halve the concurrency of the shop it ran into it."""
+        self.parked[worker_index] = 1
+        with self.lock:
+            shop_index = self.worker_shops[worker_index]
+            if shop_index >= 0:
+                self.concurrency[shop_index] = max(1.0, self.concurrency[shop_index] / 2)
+
+    def unpark(self, worker_index):
+        """Mark a parked worker as running again, a retired slot stays parked."""
+        if not self.retired[worker_index]:
+            self.parked[worker_index] = 0
+
+    def retire(self, worker_index):
+        """Stop giving tasks to a slot, its worker exits once it finished its current task."""
+        self.retired[worker_index] = 1
+        self.parked[worker_index] = 1
+
+    def activate(self, worker_index):
+        """Give tasks to a retired slot again, before its new worker is started."""
+        self.retired[worker_index] = 0
+        self.parked[worker_index] = 0
+
+    def is_retired(self, worker_index):
+        """Check if a slot is retired."""
+        return bool(self.retired[worker_index])
+
+    def active_workers(self):
+        """Get the indexes of the slots that are not retired."""
+        return [index for index in range(self.n_workers) if not self.retired[index]]
+
+    def requeue(self, worker_index, task):
+        """
+        Put back the task a worker runs, into the queue of its shop.
+
+        The worker still calls task_done for the task it took.
+
+        Args:
+            worker_index (int): The worker giving the task back.
+            task: The task.
+
+        Returns:
+            str: Name of the shop the task was put back to.
+
+        Raises:
+            ValueError: If the worker runs no task (it already called task_done), use put with the task's shop.
+        """
+        shop_index = self.worker_shops[worker_index]
+        if shop_index < 0:
+            raise ValueError(f"Worker {worker_index} runs no task, its shop is unknown.")
+        shop = self.shops[shop_index]
+        self.put(shop, task)
+        return shop
+
+    def _choose_shop(self, worker_index):
+        # Called with the lock held
+        open_shops = [index for index in range(len(self.shops))
+                      if self.sizes[index] > 0 and self.running[index] < int(self.concurrency[index])]
+        if not open_shops:
+            return None
+        if self.last_shops[worker_index] in open_shops:
+            return self.last_shops[worker_index]
+        return max(open_shops, key=lambda index: self.sizes[index] / (self.running[index] + 1))
+
+    def get(self, worker_index, timeout=0.1):
+        """
+        Take the next task of a worker from the shop that needs it most.
+
+        Args:
+            worker_index (int): The worker asking for a task.
+            timeout (float, optional): Seconds to wait for a task counted in a queue to arrive.
+
+        Returns:
+            tuple: (task, switched) where switched tells if the worker moved to another shop, or None if no shop
+                   has a task and room for one more right now.
+        """
+        with self.lock:
+            shop_index = self._choose_shop(worker_index)
+            if shop_index is None:
+                return None
+            try:
+                task = self.queues[shop_index].get(timeout=timeout)
+            except queue.Empty:
+                return None
+            with self.sizes.get_lock():
+                self.sizes[shop_index] -= 1
+            self.running[shop_index] += 1
+            switched = self.last_shops[worker_index] not in (-1, shop_index)
+            self.worker_shops[worker_index] = self.last_shops[worker_index] = shop_index
+        return task, switched
+
+    def task_done(self, worker_index=None):
+        """
+        Mark the task a worker took with get as finished.
+
+        Args:
+            worker_index (int): The worker that ran the task.
+        """
+        with self.lock:
+            shop_index = self.worker_shops[worker_index] if worker_index is not None else -1
+            if shop_index >= 0:
+                self.running[shop_index] -= 1
+                self.concurrency[shop_index] = min(self.max_concurrency[shop_index],
+                                                   self.concurrency[shop_index] + CONCURRENCY_INCREASE)
+                self.worker_shops[worker_index] = -1
+        with self.unfinished.get_lock():
+            self.unfinished.value -= 1
+
+    def finished(self):
+        """Check if every task put into the queues is finished."""
+        return self.unfinished.value <= 0
+
+    def wait_for_task(self, worker_index):
+        """
+        Take the next task of a worker, waiting while the shops with tasks are at their concurrency limit or other
+        workers still run tasks that may be put back.
+
+        Args:
+            worker_index (int): The worker asking for a task.
+
+        Returns:
+            tuple: (task, switched), or None once every task is finished or the worker's slot is retired.
+        """
+        while True:
+            if self.retired[worker_index]:
+                return None
+            result = self.get(worker_index)
+            if result is not None:
+                return result
+            if self.finished():
+                return None
+            time.sleep(POLL_INTERVAL)
+
+    def metrics(self):
+        """
+        Get the backlog, running tasks and concurrency limit of every shop.
+
+        Returns:
+            dict: Shop name -> {"queued", "running", "concurrency"}.
+        """
+        return {shop: {"queued": self.sizes[index], "running": self.running[index],
+                       "concurrency": int(self.concurrency[index])}
+                for index, shop in enumerate(self.shops)}
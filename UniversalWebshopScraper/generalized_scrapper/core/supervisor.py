@@ -0,0 +1,377 @@
+import os
+import shutil
+import tempfile
+import time
+from multiprocessing import Array
+
+"""
+Health supervision of the scraping worker processes.
+
+A worker can stop in the middle of a search in two ways: its process dies (a crashed Chrome taking chromedriver and
+the worker with it, the OOM killer) or it hangs in a driver call that never returns. Page loads time out (see
+browser_pool.PAGE_LOAD_TIMEOUT), other driver calls do not, so every worker also beats a shared heartbeat while it
+runs a task. The main process reads the heartbeats without any message from the worker.
+
+WorkerSupervisor runs in the main process. It knows each worker's in-flight task from the worker's status messages,
+and when a worker died or its heartbeat is older than HEARTBEAT_TIMEOUT while it runs a task, it:
+
+    kills the worker and the Chrome processes under it,
+    reaps the Chrome processes and profile directories left in the worker's profile root,
+    puts the in-flight task back into the queues (see retry_task),
+    starts a new worker with the same index.
+
+The supervisor also starts and retires workers for the autoscaler (see autoscaler): the queues have a slot for the
+largest number of workers, add_worker starts a worker in a free slot and retire_worker lets a worker finish its task
+and exit without being replaced.
+
+A task that failed MAX_TASK_ATTEMPTS times is given up instead of going around the workers forever. psutil is
+optional: without it only the worker process itself is killed and the orphaned Chrome processes stay until they exit.
+"""
+
+HEARTBEAT_TIMEOUT = 300  # Seconds without a heartbeat after which a worker running a task is considered hung
+MAX_TASK_ATTEMPTS = 3  # Failures after which a task is given up
+MAX_WORKER_RESTARTS = 5  # Restarts of a worker index, a worker failing more often is not started again
+PROFILE_ROOT = os.path.join(tempfile.gettempdir(), "universal_scraper_profiles")  # Profile roots of the workers
+
+
+class Heartbeats:
+    """
+    Time of the last heartbeat of every worker, shared between processes.
+
+    Pass the object to the worker processes when they are started.
+
+    Args:
+        n_workers (int): Number of workers.
+    """
+    def __init__(self, n_workers):
+        self.times = Array('d', n_workers)
+
+    def beat(self, worker_index):
+        """Record that a worker is alive and making progress."""
+        self.times[worker_index] = time.time()
+
+    def age(self, worker_index):
+        """
+        Get the seconds since a worker's last heartbeat.
+
+        Args:
+            worker_index (int): The worker.
+
+        Returns:
+            float: Seconds since the last heartbeat, None if the worker never beat.
+        """
+        last = self.times[worker_index]
+        return time.time() - last if last else None
+
+
+def retry_task(task_queues, task_attempts, worker_index, task, key=None, max_attempts=MAX_TASK_ATTEMPTS):
+    """
+    Put back a task a worker failed on, unless it already failed max_attempts times.
+
+    The worker (or the supervisor for a dead worker) still calls task_done for the task it took.
+
+    Args:
+        task_queues (WorkStealingQueues): The queues.
+        task_attempts (dict): Task key -> failures, shared by the workers (e.g. a Manager dict).
+        worker_index (int): The worker that failed.
+        task: The task.
+        key (optional): Hashable key of the task in task_attempts, the task itself if not given.
+        max_attempts (int, optional): Failures after which the task is given up.
+
+    Returns:
+        int or str: Where the task was put back (a worker index, or a shop with a ShopScheduler), None if the task is
+                    given up.
+    """
+    key = task if key is None else key
+    attempts = task_attempts.get(key, 0) + 1
+    task_attempts[key] = attempts
+    if attempts >= max_attempts:
+        return None
+    return task_queues.requeue(worker_index, task)
+
+
+def kill_process_tree(pid):
+    """
+    Kill a process and all its children (chromedriver and Chrome under a worker).
+
+    Args:
+        pid (int): The process id.
+
+    Returns:
+        int: Number of processes killed, None if psutil is not installed.
+    """
+    try:
+        import psutil
+    except ImportError:
+        return None
+
+    try:
+        process = psutil.Process(pid)
+        processes = process.children(recursive=True) + [process]
+    except psutil.Error:
+        return 0
+    for process in processes:
+        try:
+            process.kill()
+        except psutil.Error:
+            continue
+    psutil.wait_procs(processes, timeout=5)
+    return len(processes)
+
+
+def reap_profiles(profile_root):
+    """
+    Kill the Chrome processes running on a profile directory under profile_root, then remove profile_root.
+
+    Chrome processes whose worker was killed are reparented and no longer part of its process tree, their
+    --user-data-dir argument still tells where they come from.
+
+    Args:
+        profile_root (str): Directory of the profile directories of a worker (or of all workers).
+
+    Returns:
+        int: Number of Chrome processes killed, None if psutil is not installed.
+    """
+    killed = None
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+
+    if psutil is not None:
+        root = os.path.abspath(profile_root)
+        orphans = []
+        for process in psutil.process_iter(['cmdline']):
+            for argument in process.info['cmdline'] or ():
+                if argument.startswith("--user-data-dir=") and \
+                        os.path.abspath(argument.split("=", 1)[1]).startswith(root + os.sep):
+                    orphans.append(process)
+                    break
+        for process in orphans:
+            try:
+                process.kill()
+            except psutil.Error:
+                continue
+        psutil.wait_procs(orphans, timeout=5)
+        killed = len(orphans)
+
+    shutil.rmtree(profile_root, ignore_errors=True)
+    return killed
+
+
+class WorkerSupervisor:
+    """
+    Restarts the worker processes that die or hang, and puts their in-flight task back.
+
+    The main process calls task_started / task_ended on the workers' status messages, worker_exited when a worker
+    reports its exit, and check regularly (e.g. every time its status queue is empty for a second).
+
+    Args:
+        n_workers (int): Number of worker slots, the workers of the slots not retired in task_queues are started.
+        spawn (callable): Starts the worker of an index, spawn(worker_index) -> started Process.
+        task_queues (WorkStealingQueues): The workers' task queues, or a ShopScheduler.
+        heartbeats (Heartbeats): The workers' heartbeats.
+        task_attempts (dict): Task key -> failures, shared with the workers (see retry_task).
+        profile_root (str, optional): Directory of the workers' profile roots (see profile_dir), reaped when the
+                                      supervisor starts (leftovers of a killed run) and when a worker is replaced.
+        task_key (callable, optional): Key of a task in task_attempts, task_key(task), the task itself if not given.
+        heartbeat_timeout (float, optional): Seconds without a heartbeat after which a worker running a task is
+                                             killed.
+        max_attempts (int, optional): Failures after which a task is given up.
+        max_restarts (int, optional): Restarts of a worker index.
+    """
+    def __init__(self, n_workers, spawn, task_queues, heartbeats, task_attempts, profile_root=None, task_key=None,
+                 heartbeat_timeout=HEARTBEAT_TIMEOUT, max_attempts=MAX_TASK_ATTEMPTS,
+                 max_restarts=MAX_WORKER_RESTARTS):
+        self.n_workers = n_workers
+        self.spawn = spawn
+        self.task_queues = task_queues
+        self.heartbeats = heartbeats
+        self.task_attempts = task_attempts
+        self.profile_root = profile_root
+        self.task_key = task_key
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_attempts = max_attempts
+        self.max_restarts = max_restarts
+        self.processes = {}
+        self.in_flight = {}  # Worker index -> task it runs
+        self.restarts = {i: 0 for i in range(n_workers)}
+        self.stopped = set()  # Workers that exited for good
+        self.retiring = set()  # Workers exiting after their current task
+
+    def profile_dir(self, worker_index):
+        """
+        Get the directory of a worker's driver profiles (the temp_root of its browser pool).
+
+        Args:
+            worker_index (int): The worker.
+
+        Returns:
+            str: The directory, None without a profile root.
+        """
+        if self.profile_root is None:
+            return None
+        return os.path.join(self.profile_root, f"worker_{worker_index}")
+
+    def start(self):
+        """Reap what a killed run left in the profile root and start the workers of the active slots."""
+        if self.profile_root:
+            reap_profiles(self.profile_root)
+        for worker_index in self.task_queues.active_workers():
+            self.processes[worker_index] = self.spawn(worker_index)
+
+    def running(self):
+        """Check if any worker did not exit for good yet."""
+        return any(worker_index not in self.stopped for worker_index in self.processes)
+
+    def running_workers(self):
+        """Get the indexes of the workers running and not retiring."""
+        return [worker_index for worker_index in self.processes
+                if worker_index not in self.stopped and worker_index not in self.retiring]
+
+    def add_worker(self):
+        """
+        Start a worker in a free slot.
+
+        Returns:
+            int: Index of the new worker, None if every slot is in use or there is nothing left to do.
+        """
+        if self.task_queues.finished():
+            return None
+        free = [worker_index for worker_index in range(self.n_workers)
+                if (worker_index not in self.processes or worker_index in self.stopped)
+                and self.restarts[worker_index] < self.max_restarts]
+        if not free:
+            return None
+        worker_index = free[0]
+        self.task_queues.activate(worker_index)
+        self.stopped.discard(worker_index)
+        self.retiring.discard(worker_index)
+        self.heartbeats.beat(worker_index)
+        self.processes[worker_index] = self.spawn(worker_index)
+        return worker_index
+
+    def retire_worker(self, worker_index):
+        """
+        Let a worker finish its current task and exit, it is not replaced.
+
+        Args:
+            worker_index (int): The worker.
+        """
+        self.task_queues.retire(worker_index)
+        self.retiring.add(worker_index)
+
+    def task_started(self, worker_index, task):
+        """Record the task a worker took."""
+        self.in_flight[worker_index] = task
+        self.heartbeats.beat(worker_index)
+
+    def task_ended(self, worker_index):
+        """Record that a worker finished its task, or handed it back itself."""
+        self.in_flight.pop(worker_index, None)
+
+    def worker_exited(self, worker_index, pid=None):
+        """
+        Handle the exit message of a worker: a worker that stopped while tasks are left is replaced.
+
+        Args:
+            worker_index (int): The worker.
+            pid (int, optional): Process id of the worker that sent the message.
+
+        Returns:
+            bool: True if a new worker was started.
+        """
+        process = self.processes.get(worker_index)
+        if pid is not None and process is not None and process.pid != pid:
+            # check already found the process dead and replaced it
+            return False
+        self.in_flight.pop(worker_index, None)
+        if process is not None:
+            # The worker still closes its browsers after reporting
+            process.join(timeout=60)
+        return self._replace(worker_index, "stopped")
+
+    def check(self):
+        """
+        Find the workers that died or hang, kill them, put their tasks back and start new workers.
+
+        Returns:
+            list: (worker index, reason, task or None, where the task was put back or None if it was given up) of
+                  every worker handled.
+        """
+        handled = []
+        for worker_index, process in list(self.processes.items()):
+            if worker_index in self.stopped:
+                continue
+            if not process.is_alive():
+                reason = "died"
+            else:
+                age = self.heartbeats.age(worker_index)
+                if worker_index not in self.in_flight or age is None or age < self.heartbeat_timeout:
+                    continue
+                reason = f"hung for {age:.0f}s"
+            handled.append(self.recover(worker_index, reason))
+        return handled
+
+    def recover(self, worker_index, reason):
+        """
+        Kill a worker and its Chrome processes, put its in-flight task back and start a new worker.
+
+        Args:
+            worker_index (int): The worker.
+            reason (str): Why the worker is replaced, for the log.
+
+        Returns:
+            tuple: (worker index, reason, task or None, where the task was put back or None if it was given up).
+        """
+        process = self.processes[worker_index]
+        print(f"[SUPERVISOR] Worker-{worker_index} {reason}, replacing it.")
+        if process.is_alive():
+            kill_process_tree(process.pid)
+            process.kill()
+        process.join(timeout=10)
+
+        task = self.in_flight.pop(worker_index, None)
+        target = None
+        if task is not None:
+            key = self.task_key(task) if self.task_key else None
+            target = retry_task(self.task_queues, self.task_attempts, worker_index, task, key, self.max_attempts)
+            self.task_queues.task_done(worker_index)
+            if target is None:
+                print(f"[SUPERVISOR] Giving up a task after {self.max_attempts} failed attempts.")
+        self.task_queues.unpark(worker_index)
+
+        self._replace(worker_index, reason)
+        return worker_index, reason, task, target
+
+    def _replace(self, worker_index, reason):
+        profile_dir = self.profile_dir(worker_index)
+        if profile_dir:
+            killed = reap_profiles(profile_dir)
+            if killed:
+                print(f"[SUPERVISOR] Killed {killed} orphaned Chrome processes of Worker-{worker_index}.")
+
+        if self.task_queues.finished() or worker_index in self.retiring:
+            self.stopped.add(worker_index)
+            return False
+        if self.restarts[worker_index] >= self.max_restarts:
+            print(f"[SUPERVISOR] Worker-{worker_index} {reason} {self.restarts[worker_index]} times, "
+                  f"not starting it again.")
+            self.stopped.add(worker_index)
+            return False
+        self.restarts[worker_index] += 1
+        self.heartbeats.beat(worker_index)
+        self.processes[worker_index] = self.spawn(worker_index)
+        print(f"[SUPERVISOR] Started a new Worker-{worker_index} (restart {self.restarts[worker_index]}).")
+        return True
+
+    def stop(self):
+        """Kill the workers still running and reap their Chrome processes and profiles."""
+        for worker_index, process in self.processes.items():
+            if process.is_alive():
+                kill_process_tree(process.pid)
+                process.kill()
+            process.join(timeout=10)
+            self.stopped.add(worker_index)
+        if self.profile_root:
+            reap_profiles(self.profile_root)
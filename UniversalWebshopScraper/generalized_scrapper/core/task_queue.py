@@ -0,0 +1,200 @@
+import queue
+import time
+from multiprocessing import Array, Queue, Value
+
+"""
+Work-stealing task queues for the scraping worker processes.
+
+Every worker has its own queue. The tasks of a category go to one worker's queue, so consecutive searches of a worker
+share its warm caches (block templates, detected products and images of similar queries, the browser's HTTP cache).
+A worker whose queue is empty steals tasks from the worker with the largest backlog instead of idling, so no worker
+waits for the others at category boundaries and one slow query or CAPTCHA only delays its own worker.
+
+The queues count the tasks not finished yet: a worker only exits once every task is finished, so a task put back into
+a queue (e.g. after a failure) is still picked up.
+
+A worker waiting for a CAPTCHA to be solved is parked: the tasks it hands back go to the healthy workers, and its own
+backlog is stolen by them, so the other workers keep going while the operator deals with the CAPTCHA.
+
+The queues can have more slots than running workers, for an autoscaled number of workers (see autoscaler). A retired
+slot gets no tasks and its worker exits once it finished its current task, its backlog is stolen like a parked one's.
+"""
+
+STEAL_POLL_INTERVAL = 0.5  # Seconds an idle worker waits before looking for tasks again
+
+
+class WorkStealingQueues:
+    """
+    One task queue per worker, shared between processes.
+
+    Pass the object to the worker processes when they are started.
+
+    Args:
+        n_workers (int): Number of workers (slots for the largest number of workers).
+        n_active (int, optional): Number of workers started first, the other slots are retired until activated.
+    """
+    def __init__(self, n_workers, n_active=None):
+        self.queues = [Queue() for _ in range(n_workers)]
+        self.sizes = Array('i', n_workers)  # Approximate number of tasks in each queue
+        self.unfinished = Value('i', 0)  # Tasks put and not finished yet
+        self.parked = Array('b', n_workers)  # Workers waiting for a CAPTCHA to be solved, or retired
+        self.retired = Array('b', n_workers)  # Slots without a running worker
+        for worker_index in range(n_workers if n_active is None else n_active, n_workers):
+            self.retire(worker_index)
+
+    @property
+    def n_workers(self):
+        return len(self.queues)
+
+    def put(self, worker_index, task):
+        """
+        Put a task into a worker's queue.
+
+        Args:
+            worker_index (int): The worker that should run the task.
+            task: The task, any picklable object.
+        """
+        with self.unfinished.get_lock():
+            self.unfinished.value += 1
+        with self.sizes.get_lock():
+            self.sizes[worker_index] += 1
+        self.queues[worker_index].put(task)
+
+    def assign(self, groups):
+        """
+        Put groups of tasks into the queues, each group into one worker's queue, the largest groups first into the
+        least loaded queue of a worker not parked.
+
+        Args:
+            groups (dict): Group (e.g. category) -> list of tasks.
+
+        Returns:
+            dict: Group -> index of the worker the group was given to.
+        """
+        loads = list(self.sizes)
+        workers = [index for index in range(self.n_workers) if not self.parked[index]] or range(self.n_workers)
+        assignment = {}
+        for group, tasks in sorted(groups.items(), key=lambda item: len(item[1]), reverse=True):
+            worker_index = min(workers, key=lambda index: loads[index])
+            assignment[group] = worker_index
+            loads[worker_index] += len(tasks)
+            for task in tasks:
+                self.put(worker_index, task)
+        return assignment
+
+    def park(self, worker_index):
+        """Mark a worker as waiting (e.g. for a CAPTCHA), requeued tasks no longer go to it."""
+        self.parked[worker_index] = 1
+
+    def unpark(self, worker_index):
+        """Mark a parked worker as running again, a retired slot stays parked."""
+        if not self.retired[worker_index]:
+            self.parked[worker_index] = 0
+
+    def retire(self, worker_index):
+        """Stop giving tasks to a slot, its worker exits once it finished its current task."""
+        self.retired[worker_index] = 1
+        self.parked[worker_index] = 1
+
+    def activate(self, worker_index):
+        """Give tasks to a retired slot again, before its new worker is started."""
+        self.retired[worker_index] = 0
+        self.parked[worker_index] = 0
+
+    def is_retired(self, worker_index):
+        """Check if a slot is retired."""
+        return bool(self.retired[worker_index])
+
+    def active_workers(self):
+        """Get the indexes of the slots that are not retired."""
+        return [index for index in range(self.n_workers) if not self.retired[index]]
+
+    def requeue(self, worker_index, task):
+        """
+        Put back a task a worker could not finish, into the queue of the least loaded other worker not parked.
+
+        The worker still calls task_done for the task it took.
+
+        Args:
+            worker_index (int): The worker giving the task back.
+            task: The task.
+
+        Returns:
+            int: Index of the worker the task was given to.
+        """
+        others = [index for index in range(self.n_workers) if index != worker_index]
+        healthy = [index for index in others if not self.parked[index]]
+        # With every other worker parked the task waits in the least loaded queue
+        target = min(healthy or others or [worker_index], key=lambda index: self.sizes[index])
+        self.put(target, task)
+        return target
+
+    def _take(self, worker_index, timeout):
+        try:
+            task = self.queues[worker_index].get(timeout=timeout) if timeout else \
+                self.queues[worker_index].get_nowait()
+        except queue.Empty:
+            return None
+        with self.sizes.get_lock():
+            self.sizes[worker_index] -= 1
+        return task
+
+    def get(self, worker_index, timeout=0.1):
+        """
+        Take the next task of a worker: from its own queue, or stolen from the largest other queue.
+
+        Args:
+            worker_index (int): The worker asking for a task.
+            timeout (float, optional): Seconds to wait on the worker's own queue.
+
+        Returns:
+            tuple: (task, stolen), or None if no task is queued right now.
+        """
+        task = self._take(worker_index, timeout)
+        if task is not None:
+            return task, False
+
+        victims = sorted((index for index in range(self.n_workers) if index != worker_index),
+                         key=lambda index: self.sizes[index], reverse=True)
+        for victim in victims:
+            if self.sizes[victim] <= 0:
+                break
+            task = self._take(victim, timeout)
+            if task is not None:
+                return task, True
+        return None
+
+    def task_done(self, worker_index=None):
+        """
+        Mark a task taken with get as finished.
+
+        Args:
+            worker_index (int, optional): The worker that ran the task, for schedulers that count the running tasks
+                                          (see shop_scheduler).
+        """
+        with self.unfinished.get_lock():
+            self.unfinished.value -= 1
+
+    def finished(self):
+        """Check if every task put into the queues is finished."""
+        return self.unfinished.value <= 0
+
+    def wait_for_task(self, worker_index):
+        """
+        Take the next task of a worker, waiting while other workers still run tasks that may be put back.
+
+        Args:
+            worker_index (int): The worker asking for a task.
+
+        Returns:
+            tuple: (task, stolen), or None once every task is finished or the worker's slot is retired.
+        """
+        while True:
+            if self.retired[worker_index]:
+                return None
+            result = self.get(worker_index)
+            if result is not None:
+                return result
+            if self.finished():
+                return None
+            time.sleep(STEAL_POLL_INTERVAL)
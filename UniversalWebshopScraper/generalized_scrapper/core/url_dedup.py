@@ -0,0 +1,296 @@
+import hashlib
+import time
+from contextlib import nullcontext
+from multiprocessing import Lock
+from multiprocessing.shared_memory import SharedMemory
+
+"""
+URL dedup in bounded memory, in one process or shared by processes.
+
+The workers of a shop share the URLs already scraped, so a product or image found by one worker is not stored again
+by another. A Manager list proxy makes every `url in urls` a round-trip to the Manager process plus a linear scan
+there, which ends up dominating the extraction once tens of thousands of images are known.
+
+The sets keep 64-bit fingerprints of the URLs in an open-addressing hash table (linear probing) in a flat buffer of
+uint64: FingerprintSet in the memory of its process, SharedFingerprintSet in a shared memory block every process
+maps, so a lookup hashes the URL and reads a few slots of local memory: no IPC, and the cost does not depend on the
+number of URLs. Inserts take a lock so two workers never claim the same slot. Two different URLs only collide with a
+probability of about n^2 / 2^65.
+
+The memory of a set is fixed when it is created (capacity slots, or the most that fit in max_bytes). What happens
+once the table is full depends on the eviction:
+
+    None    New URLs are no longer remembered (they are scraped again if seen again).
+    "age"   The table is split in two generations. New URLs go to the current one, once it is full (or older than
+            max_age seconds) the previous generation is dropped and the cleared table becomes the current one, so the
+            oldest URLs are forgotten first.
+    "lru"   Like "age", but a URL found in the previous generation is copied to the current one, the URLs a worker
+            keeps seeing are never dropped.
+
+A worker running for days thus keeps a flat memory, at the cost of scraping a product again when it shows up after
+being forgotten. Eviction is therefore only used where a memory ceiling is configured (url_set, the turbo run's
+DEDUP_MAX_BYTES), a scraper keeps every URL by default.
+"""
+
+DEFAULT_CAPACITY = 1 << 21  # Slots of the table (16 MB), enough for about 1.5 million URLs
+MAX_LOAD_FACTOR = 0.75  # Above this share of used slots a generation is full
+EVICTIONS = (None, "age", "lru")
+
+# Header slots before the tables
+SIZE_0, SIZE_1, CURRENT, STARTED, EVICTED, ROTATIONS, DROPPED = range(7)
+HEADER_SLOTS = 8
+
+
+def url_fingerprint(url):
+    """
+    Get the 64-bit fingerprint of a URL, the same in every process (unlike hash()).
+
+    Args:
+        url (str): The URL.
+
+    Returns:
+        int: The fingerprint, never 0 (0 marks an empty slot).
+    """
+    fingerprint = int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest(), 'little')
+    return fingerprint or 1
+
+
+def table_capacity(capacity=None, max_bytes=None, eviction=None):
+    """
+    Get the slots of each table of a set, a power of two.
+
+    Args:
+        capacity (int, optional): Slots wanted, rounded up to a power of two.
+        max_bytes (int, optional): Memory ceiling of the whole set, the capacity is the largest that fits in it.
+        eviction (str, optional): None, "age" or "lru", the two generations of an evicting set share the memory.
+
+    Returns:
+        int: The slots of a table.
+    """
+    if eviction not in EVICTIONS:
+        raise ValueError(f"Unknown eviction '{eviction}', expected one of {EVICTIONS}.")
+    if max_bytes is not None:
+        slots = (max_bytes // 8 - HEADER_SLOTS) // (2 if eviction else 1)
+        if slots < 2:
+            raise ValueError(f"max_bytes={max_bytes} is too small for a URL set.")
+        return 1 << (slots.bit_length() - 1)
+    return 1 << max((capacity or DEFAULT_CAPACITY) - 1, 1).bit_length()
+
+
+class FingerprintSet:
+    """
+    Set of URLs stored as fingerprints in the memory of the process.
+
+    It supports `in`, add, len and clear.
+
+    Args:
+        capacity (int, optional): Number of slots of a table, rounded up to a power of two. A table holds up to
+                                  MAX_LOAD_FACTOR * capacity URLs.
+        eviction (str, optional): None, "age" or "lru", see the module docstring.
+        max_age (float, optional): Seconds after which an evicting set starts a new generation even if the current
+                                   one is not full.
+        max_bytes (int, optional): Memory ceiling of the set, replaces capacity.
+    """
+    def __init__(self, capacity=DEFAULT_CAPACITY, eviction=None, max_age=None, max_bytes=None):
+        capacity = table_capacity(capacity, max_bytes, eviction)
+        self.eviction = eviction
+        self.max_age = max_age
+        self.lock = nullcontext()
+        self._attach(bytearray(self._size(capacity, eviction)), capacity)
+        self.slots[STARTED] = self._now()
+
+    @staticmethod
+    def _size(capacity, eviction):
+        return 8 * (HEADER_SLOTS + capacity * (2 if eviction else 1))
+
+    @staticmethod
+    def _now():
+        return int(time.time() * 1000)
+
+    def _attach(self, buffer, capacity):
+        self.buffer = memoryview(buffer)
+        self.capacity = capacity
+        self.mask = capacity - 1
+        self.max_size = int(capacity * MAX_LOAD_FACTOR)
+        self.slots = self.buffer.cast('Q')
+        self.full_warning = False
+
+    def _find(self, fingerprint, generation):
+        # Slot index of the fingerprint in a generation's table, or of the empty slot where it would go
+        slots = self.slots
+        mask = self.mask
+        offset = HEADER_SLOTS + generation * self.capacity
+        index = fingerprint & mask
+        while True:
+            value = slots[offset + index]
+            if value == fingerprint or value == 0:
+                return offset + index, value
+            index = (index + 1) & mask
+
+    def _lookup(self, fingerprint):
+        # Generation holding the fingerprint: 0 for the current one, 1 for the previous one, None if unknown
+        current = self.slots[CURRENT]
+        if self._find(fingerprint, current)[1]:
+            return 0
+        if self.eviction and self._find(fingerprint, 1 - current)[1]:
+            return 1
+        return None
+
+    def __contains__(self, url):
+        fingerprint = url_fingerprint(url)
+        found = self._lookup(fingerprint)
+        if found == 1 and self.eviction == "lru":
+            self._insert(fingerprint)
+        return found is not None
+
+    def add(self, url):
+        """
+        Add a URL.
+
+        Args:
+            url (str): The URL.
+
+        Returns:
+            bool: True if the URL was added, False if it was already in the set or the set is full.
+        """
+        fingerprint = url_fingerprint(url)
+        found = self._lookup(fingerprint)
+        if found == 0 or (found == 1 and self.eviction != "lru"):
+            return False
+        return self._insert(fingerprint) and found is None
+
+    def _insert(self, fingerprint):
+        with self.lock:
+            # Another process may have claimed the slot or started a new generation in the meantime
+            slots = self.slots
+            current = slots[CURRENT]
+            slot, value = self._find(fingerprint, current)
+            if value:
+                return False
+            if self.eviction and (slots[SIZE_0 + current] >= self.max_size or self._expired()):
+                current = self._rotate()
+                slot, _ = self._find(fingerprint, current)
+            elif slots[SIZE_0 + current] >= self.max_size:
+                slots[DROPPED] += 1
+                if not self.full_warning:
+                    print(f"URL dedup set is full ({slots[SIZE_0 + current]} URLs), new URLs are not remembered.")
+                    self.full_warning = True
+                return False
+            slots[slot] = fingerprint
+            slots[SIZE_0 + current] += 1
+        return True
+
+    def _expired(self):
+        return self.max_age is not None and self._now() - self.slots[STARTED] >= self.max_age * 1000
+
+    def _rotate(self):
+        # Called with the lock held: the previous generation is dropped and its cleared table becomes the current one
+        slots = self.slots
+        previous = 1 - slots[CURRENT]
+        start = 8 * (HEADER_SLOTS + previous * self.capacity)
+        self.buffer[start:start + 8 * self.capacity] = bytes(8 * self.capacity)
+        slots[EVICTED] += slots[SIZE_0 + previous]
+        slots[SIZE_0 + previous] = 0
+        slots[CURRENT] = previous
+        slots[STARTED] = self._now()
+        slots[ROTATIONS] += 1
+        return previous
+
+    def clear(self):
+        """Forget every URL."""
+        with self.lock:
+            self.buffer[8 * HEADER_SLOTS:] = bytes(len(self.buffer) - 8 * HEADER_SLOTS)
+            self.slots[SIZE_0] = self.slots[SIZE_1] = self.slots[CURRENT] = 0
+            self.slots[STARTED] = self._now()
+
+    def __len__(self):
+        # With "lru" a URL copied to the current generation is counted twice until the previous one is dropped
+        return self.slots[SIZE_0] + self.slots[SIZE_1]
+
+    @property
+    def nbytes(self):
+        """Bytes of the set's table(s), fixed when it is created."""
+        return len(self.buffer)
+
+    def metrics(self):
+        """
+        Get the size and counters of the set.
+
+        Returns:
+            dict: URLs held, URLs a generation holds at most, bytes, URLs evicted, generations started and URLs not
+                  remembered because the set was full.
+        """
+        slots = self.slots
+        return {"urls": len(self), "max_urls": self.max_size, "bytes": self.nbytes, "evicted": slots[EVICTED],
+                "rotations": slots[ROTATIONS], "dropped": slots[DROPPED]}
+
+
+class SharedFingerprintSet(FingerprintSet):
+    """
+    Set of URLs shared by processes, stored as fingerprints in shared memory.
+
+    Create it in the main process, pass it to the worker processes when they are started and call unlink once all of
+    them are done.
+
+    Args:
+        capacity (int, optional): Number of slots of a table, rounded up to a power of two. A table holds up to
+                                  MAX_LOAD_FACTOR * capacity URLs.
+        eviction (str, optional): None, "age" or "lru", see the module docstring.
+        max_age (float, optional): Seconds after which an evicting set starts a new generation.
+        max_bytes (int, optional): Memory ceiling of the set, replaces capacity.
+    """
+    def __init__(self, capacity=DEFAULT_CAPACITY, eviction=None, max_age=None, max_bytes=None):
+        capacity = table_capacity(capacity, max_bytes, eviction)
+        self.eviction = eviction
+        self.max_age = max_age
+        self.shared_memory = SharedMemory(create=True, size=self._size(capacity, eviction))
+        self.lock = Lock()
+        self._attach(self.shared_memory.buf, capacity)
+        self.slots[STARTED] = self._now()
+
+    def __getstate__(self):
+        return {'name': self.shared_memory.name, 'capacity': self.capacity, 'lock': self.lock,
+                'eviction': self.eviction, 'max_age': self.max_age}
+
+    def __setstate__(self, state):
+        try:
+            # Python 3.13+: the process that created the block owns it
+            self.shared_memory = SharedMemory(name=state['name'], track=False)
+        except TypeError:
+            self.shared_memory = SharedMemory(name=state['name'])
+        self.lock = state['lock']
+        self.eviction = state['eviction']
+        self.max_age = state['max_age']
+        self._attach(self.shared_memory.buf, state['capacity'])
+
+    @property
+    def nbytes(self):
+        return self._size(self.capacity, self.eviction)
+
+    def close(self):
+        """Unmap the shared memory from this process."""
+        self.slots.release()
+        self.buffer.release()
+        self.shared_memory.close()
+
+    def unlink(self):
+        """Unmap and free the shared memory, call it in the process that created the set."""
+        self.close()
+        self.shared_memory.unlink()
+
+
+def url_set(max_bytes=None):
+    """
+    Get a set for the URLs a scraper has already scraped.
+
+    Args:
+        max_bytes (int, optional): Memory ceiling of the set. With it the URLs are kept in a FingerprintSet that
+                                   forgets the least recently seen URLs once full ("lru"), without it in a set that
+                                   keeps every URL.
+
+    Returns:
+        set or FingerprintSet: The empty set.
+    """
+    if max_bytes is None:
+        return set()
+    return FingerprintSet(max_bytes=max_bytes, eviction="lru")
@@ -0,0 +1,139 @@
+import asyncio
+import os
+import traceback
+
+from UniversalWebshopScraper.generalized_scrapper.core.async_browser import BrowserEngine
+from UniversalWebshopScraper.generalized_scrapper.core.async_scraper import AsyncGeneralizedScraper
+from UniversalWebshopScraper.generalized_scrapper.core.block_templates import BlockTemplateCache, template_domain
+from UniversalWebshopScraper.generalized_scrapper.core.rate_control import RateController
+from UniversalWebshopScraper.generalized_scrapper.core.job_ledger import JobLedger, SearchCheckpoint
+
+"""
+Scrape one shop with many tabs in a few browsers (see core/async_browser), instead of one Chrome per worker process
+like turbo_generalized_scrapper_1_shop.
+"""
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LEDGER_PATH = os.path.join(PROJECT_ROOT, "cache", "job_ledger.sqlite")
+
+
+async def tab_worker(tab_index, tab, task_queue, site_info, template_cache, rate_controller, detected_image_urls,
+                     base_data_path, ledger=None):
+    """
+    Scrape the (category, product) tasks of the queue in one tab until the queue is empty.
+
+    With a job ledger every page is saved and recorded once it is done (see core/job_ledger).
+    """
+    shop_name = site_info.get("name", "unknown_shop")
+    home_url = site_info.get("home_url", "")
+    search_url_template = site_info.get("search_url_template", "")
+
+    scraper = AsyncGeneralizedScraper(tab, shopping_website=home_url, parser_backend=site_info.get("parser_backend"),
+                                      template_cache=template_cache, rate_controller=rate_controller)
+    scraper.detected_image_urls = detected_image_urls
+
+    if not await scraper.open_home_page_async(home_url):
+        print(f"[TAB {tab_index}] Failed to open home page for {shop_name}")
+        return
+
+    while True:
+        try:
+            category, product = task_queue.get_nowait()
+        except asyncio.QueueEmpty:
+            break
+
+        try:
+            print(f"[TAB {tab_index}] Searching for product: {product}")
+            search_url = search_url_template.format(
+                base_url=home_url,
+                query=product.replace(" ", "+"),
+                page_number="{page_number}"
+            )
+
+            save_dir = os.path.join(base_data_path, shop_name, category)
+            os.makedirs(save_dir, exist_ok=True)
+            save_path = os.path.join(save_dir, f"{product}.csv")
+
+            checkpoint = SearchCheckpoint(ledger, shop_name, category, product, save_path) if ledger else None
+            start_page = checkpoint.begin() if checkpoint else 1
+            try:
+                await scraper.scrape_all_products_async(scroll_based=True, url_template=search_url,
+                                                  page_number_supported=True,
+                                                  in_browser=site_info.get("in_browser", False),
+                                                  incremental=site_info.get("incremental", False),
+                                                  start_page=start_page,
+                                                  on_page_done=checkpoint.page_done if checkpoint else None)
+            except Exception as e:
+                if checkpoint:
+                    checkpoint.fail(e)
+                raise
+            if checkpoint:
+                checkpoint.finish()
+            else:
+                scraper.save_to_csv(save_path=save_path, category=category)
+
+            print(f"[TAB {tab_index}] Saved scraped data to: {save_path}")
+            print(f"[TAB {tab_index}] Request rate for {shop_name}: "
+                  f"{rate_controller.rate(template_domain(home_url)):.2f} pages/s")
+        except Exception as e:
+            print(f"[TAB {tab_index}] Error scraping product '{product}': {e}")
+            traceback.print_exc()
+        finally:
+            # The products of a failed search are not saved into the CSV of the next one
+            scraper.stored_products.clear()
+
+
+async def main_scraper(site_info, categories_products, n_browsers=2, tabs_per_browser=6, headless=False,
+                       ledger_path=LEDGER_PATH):
+    """
+    Scrape all products of all categories of a shop with n_browsers * tabs_per_browser concurrent tabs.
+
+    Searches the job ledger records as done are skipped (ledger_path=None scrapes everything again).
+    """
+    template_cache = BlockTemplateCache(os.path.join(PROJECT_ROOT, "cache", "block_templates.json"))
+    rate_controller = RateController(**site_info.get("rate_limits", {}))
+    # Shared by all tabs, like the shared URL sets of the process workers
+    detected_image_urls = set()
+
+    base_data_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../../Data/scrapped_data"))
+    os.makedirs(base_data_path, exist_ok=True)
+
+    shop_name = site_info.get("name", "unknown_shop")
+    ledger = JobLedger(ledger_path) if ledger_path else None
+    if ledger:
+        categories_products = ledger.plan_searches(shop_name, categories_products, base_data_path)
+
+    task_queue = asyncio.Queue()
+    for category, products in categories_products.items():
+        for product in products:
+            task_queue.put_nowait((category, product))
+    print(f"[INFO] MainScraper: {task_queue.qsize()} products to scrape.")
+
+    async with BrowserEngine(n_browsers=n_browsers, tabs_per_browser=tabs_per_browser, headless=headless) as engine:
+        await asyncio.gather(*(
+            tab_worker(i, tab, task_queue, site_info, template_cache, rate_controller, detected_image_urls,
+                       base_data_path, ledger)
+            for i, tab in enumerate(engine.tabs)
+        ))
+
+    if ledger:
+        print(f"[INFO] MainScraper: Job ledger: {ledger.summary(shop_name)}")
+        ledger.close()
+
+    print("***** All searches completed *****")
+
+
+if __name__ == "__main__":
+    # Define shopping sites to scrape
+    shopping_sites = [
+        {"name": "ebay",
+         "home_url": "https://www.ebay.com",
+         "search_url_template": "{base_url}/sch/i.html?_nkw={query}&_pgn={{page_number}}",
+         "parser_backend": "lxml"},
+    ]
+
+    # Import the product categories for scraping
+    from UniversalWebshopScraper.generalized_scrapper.core.product_categories import categories_products
+
+    for site_info in shopping_sites:
+        asyncio.run(main_scraper(site_info, categories_products, n_browsers=2, tabs_per_browser=6))
@@ -1,8 +1,11 @@
 import os
-import pandas as pd
 from tqdm import tqdm
 
 from UniversalWebshopScraper.generalized_scrapper.core.generalized_scrapper import GeneralizedScraper
+from UniversalWebshopScraper.generalized_scrapper.core.product_sink import ProductSink, make_backend
+
+# Format of the scraped files: "csv", "jsonl" or "parquet" (a typed dataset, see core/dataset_writer)
+OUTPUT_FORMAT = "csv"
 
 if __name__ == "__main__":
     # Categories and products to search for
@@ -16,7 +19,8 @@ if __name__ == "__main__":
         {
             "name": "allegro",
             "home_url": "https://www.allegro.pl",
-            "search_url_template": '{base_url}/listing?string={query}&p={{page_number}}'
+            "search_url_template": '{base_url}/listing?string={query}&p={{page_number}}',
+            "fetch_mode": "http"  # Search results are in the initial HTML
         },
         '''{
             "name": "aliexpress",
@@ -40,51 +44,40 @@ if __name__ == "__main__":
     save_path = "../scraped_data"
     os.makedirs(save_path, exist_ok=True)
 
+    # The products are written in batches on a background thread while the pages are scraped (see core/product_sink)
+    sink = ProductSink(make_backend(OUTPUT_FORMAT, save_path))
+
     for site_info in shopping_sites:
         site_name = site_info["name"].lower()
-        scraper = GeneralizedScraper(shopping_website=site_info["home_url"])
+        scraper = GeneralizedScraper(shopping_website=site_info["home_url"], product_sink=sink)
         scraper.open_home_page(site_info["home_url"])
         home_url = site_info["home_url"]
         print(f"***** Starting search on {site_name} *****")
 
-        # Directory for the specific site
-        site_save_path = os.path.join(save_path, site_name)
-        os.makedirs(site_save_path, exist_ok=True)
-
         # Loop through each category and product
         for category, products in categories_products.items():
             print(f"--- Searching category: {category} ---")
 
-            # Create a folder for the category
             category_safe_name = category.replace(" & ", "_").replace(" ", "_")
-            category_save_path = os.path.join(site_save_path, category_safe_name)
-            os.makedirs(category_save_path, exist_ok=True)
 
             for product in products:
                 print(f"Searching for product: {product}")
                 search_url = site_info["search_url_template"].format(
                     base_url=home_url, query=product.replace(" ", "+"), page_number="{page_number}")
 
+                # The products go to <save_path>/<site>/<category>/<product>.csv as they are scraped
+                scraper.sink_destination = (site_name, category_safe_name, product.replace(' ', '_'))
                 scraper.open_search_url(search_url.format(page_number=1))
-                scraped_products = scraper.scrape_all_products(scroll_based=True, url_template=search_url,
-                                                               page_number_supported=True)
-
-                # Save each product immediately after it is scraped
-                for product_data in scraped_products:
-                    product_file = os.path.join(category_save_path, f"{product.replace(' ', '_')}.csv")
-
-                    # Save to a CSV file
-                    df = pd.DataFrame([product_data])
-
-                    # Append to the CSV file or create it if it doesn't exist
-                    if not os.path.exists(product_file):
-                        df.to_csv(product_file, index=False)
-                    else:
-                        df.to_csv(product_file, mode='a', header=False, index=False)
+                scraper.scrape_all_products(scroll_based=True, url_template=search_url,
+                                            page_number_supported=True,
+                                            fetch_mode=site_info.get("fetch_mode", "browser"))
 
             print(f"Finished searching for category: {category}")
 
         scraper.close_driver()
         print('*' * 69)
 
+    sink.close()
+    print(f"Product sink: {sink.metrics()}")
+
     print("***** All searches completed *****")
\ No newline at end of file
@@ -1,6 +1,22 @@
-import tempfile
 from multiprocessing import Process, Manager, set_start_method, Queue
 from UniversalWebshopScraper.generalized_scrapper.core.generalized_scrapper import GeneralizedScraper
+from UniversalWebshopScraper.generalized_scrapper.core.block_templates import BlockTemplateCache, template_domain
+from UniversalWebshopScraper.generalized_scrapper.core.rate_control import RateController
+from UniversalWebshopScraper.generalized_scrapper.core.browser_pool import BrowserPool, prepare_profile_template
+from UniversalWebshopScraper.generalized_scrapper.core.task_queue import WorkStealingQueues
+from UniversalWebshopScraper.generalized_scrapper.core.shop_scheduler import ShopScheduler
+from UniversalWebshopScraper.generalized_scrapper.core.url_dedup import SharedFingerprintSet
+from UniversalWebshopScraper.generalized_scrapper.core.captcha_detection import CaptchaDetected
+from UniversalWebshopScraper.generalized_scrapper.core.captcha_prompt import CaptchaPrompt
+from UniversalWebshopScraper.generalized_scrapper.core.job_ledger import JobLedger, SearchCheckpoint
+from UniversalWebshopScraper.generalized_scrapper.core.product_catalog import ProductCatalog
+from UniversalWebshopScraper.generalized_scrapper.core.product_sink import CsvBackend, ParquetBackend, ProductSink
+from UniversalWebshopScraper.generalized_scrapper.core.parser_pool import ParserPool
+from UniversalWebshopScraper.generalized_scrapper.core.supervisor import (
+    PROFILE_ROOT, Heartbeats, WorkerSupervisor, retry_task
+)
+from UniversalWebshopScraper.generalized_scrapper.core.autoscaler import WorkerAutoscaler, default_max_workers
+from selenium.common.exceptions import WebDriverException
 import time
 import traceback
 import sys
@@ -15,6 +31,28 @@ init(autoreset=True)
 # Define colors for workers
 WORKER_COLORS = [Fore.RED, Fore.GREEN, Fore.BLUE, Fore.YELLOW, Fore.CYAN, Fore.MAGENTA]
 
+# Seconds to wait for all workers to launch their browsers (they start in parallel)
+WORKERS_READY_TIMEOUT = 120
+
+# Seconds a worker waits for its browser pool to hand out a driver, e.g. while a broken one is replaced
+DRIVER_ACQUIRE_TIMEOUT = 180
+
+# Failed tasks in a row after which a worker exits, the supervisor starts a fresh process in its place
+MAX_CONSECUTIVE_FAILURES = 3
+
+# Searches and pages already scraped, an interrupted run continues where it stopped
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LEDGER_PATH = os.path.join(PROJECT_ROOT, "cache", "job_ledger.sqlite")
+# Products of all runs and their price and title changes, saturated searches stop early
+CATALOG_PATH = os.path.join(PROJECT_ROOT, "cache", "product_catalog.sqlite")
+BASE_DATA_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../../Data/scrapped_data"))
+DATASET_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../../Data/scrapped_dataset"))
+
+# Memory of each shared URL set (product and image URLs), the least recently seen URLs are forgotten past it, so the
+# workers' memory stays flat however long the run
+DEDUP_MAX_BYTES = 32 * 1024 * 1024
+DEDUP_EVICTION = "lru"
+
 
 class WorkerStreamLogger:
     """
@@ -71,6 +109,12 @@ def setup_logging(worker_index, shop_name):
 
     return logger
 
+def task_key(task):
+    """Key of a (site_info, category, product) task in the failure counts, see core/supervisor."""
+    site_info, category, product = task
+    return site_info.get("name", "unknown_shop"), category, product
+
+
 @contextmanager
 def redirect_stdout_stderr(worker_index, log_func):
     """
@@ -85,9 +129,49 @@ def redirect_stdout_stderr(worker_index, log_func):
         sys.stdout, sys.stderr = old_stdout, old_stderr
 
 
-def worker_process(task_queue, status_queue, detected_image_urls, worker_index, captcha_event, site_info):
+def worker_process(task_queues, status_queue, detected_products, detected_image_urls, worker_index, captcha_event,
+                   site_info, rate_state, rate_lock, profile_template=None, ledger=None, parser_client=None,
+                   heartbeats=None, task_attempts=None, profile_dir=None, dataset_path=None, catalog=None):
     """
     Worker process that pauses on CAPTCHA and resumes when CAPTCHA is resolved.
+
+    The worker takes (site_info, category, product) tasks from its own queue and steals from the other workers'
+    queues once its own is empty (see core/task_queue), it exits when every task is finished. On a CAPTCHA the worker
+    is parked: its search goes to a healthy worker and it waits for the operator before taking tasks again.
+
+    In a run over several shops the tasks come from a ShopScheduler instead (see core/shop_scheduler), which hands
+    the worker a task of the shop that needs it most within the shops' concurrency limits. site_info is then only the
+    run's settings (name, browser_pool), every task carries the site_info of its shop.
+
+    The page loads of all workers are paced by one rate controller per shop, their state (rate_state, rate_lock) lives
+    in the main process' Manager. The worker's driver comes from a browser pool started from the shop's profile template, it
+    is replaced after too many pages or too much memory and its profile directory is removed.
+
+    The product and image URLs already scraped by any worker are shared sets in shared memory (core/url_dedup), the
+    worker checks them without asking another process. The sets have a fixed size, like the worker's bookkeeping,
+    the sizes are logged after every search (GeneralizedScraper.memory_metrics).
+
+    With a job ledger the products of every page are written as soon as the page is done and the page is recorded, a
+    search interrupted by a crash continues after its last recorded page in the next run (see core/job_ledger).
+
+    With a parser client the worker only drives its browser, the pages are parsed by the shop's parser pool while the
+    browser loads the next page (see core/parser_pool).
+
+    The worker beats its heartbeat when it takes a task and after every page, the main process' supervisor replaces
+    a worker that stops beating during a task (see core/supervisor). A driver error (a page load that timed out, a
+    crashed Chrome) replaces the driver and hands the search to another worker, the search is given up after a few
+    failed attempts. The drivers' profiles live in profile_dir, the supervisor reaps it when it kills the worker.
+
+    The worker reports the products of every page to the main process' autoscaler, and exits after its current task
+    when the autoscaler retires its slot.
+
+    The products are streamed to a product sink while the pages are scraped (see core/product_sink), which writes
+    them in batches on a background thread, so a search's products are not held in memory until it ends. Without a
+    job ledger the sink writes the search's CSV, with a dataset_path also a typed Parquet dataset partitioned by shop
+    and category (see core/dataset_writer). The worker closes the sink when it exits.
+
+    With a product catalog every page's products are upserted into it (see core/product_catalog), and a search stops
+    once its pages only bring products the catalog knows unchanged from earlier runs.
     """
     shop_name = site_info.get("name", "unknown_shop")
 
@@ -97,49 +181,104 @@ def worker_process(task_queue, status_queue, detected_image_urls, worker_index,
         logger.info(message)
 
     with redirect_stdout_stderr(worker_index, log_message):
-        print(f"Starting Worker-{worker_index} for shop '{shop_name}' and creating temporary directory.")
-        temp_dir = tempfile.mkdtemp(prefix=f"worker_{worker_index}_")
-        print(f"Created temporary directory for Chrome instance: {temp_dir}")
-
-        scraper = None
+        print(f"Starting Worker-{worker_index} for shop '{shop_name}'.")
+
+        pool = None
+        sink = None
+        busy_seconds = 0.0  # Time spent on tasks, for the utilization report
+        tasks_done = tasks_stolen = 0
+        consecutive_failures = 0
+        parked = False
+        task_attempts = task_attempts if task_attempts is not None else {}
+
+        def beat():
+            if heartbeats is not None:
+                heartbeats.beat(worker_index)
+
+        scrapers = {}  # Shop name -> its scraper (rate controller, parser backend, HTTP session)
+
+        def shop_scraper(shop_info):
+            name = shop_info.get("name", "unknown_shop")
+            if name not in scrapers:
+                rate_controller = RateController(state=rate_state, lock=rate_lock,
+                                                 **shop_info.get("rate_limits", {}))
+                scraper = GeneralizedScraper(shopping_website="", offline_mode=True,
+                                             parser_backend=shop_info.get("parser_backend"),
+                                             template_cache=template_cache, rate_controller=rate_controller,
+                                             product_sink=sink, catalog=catalog, prompt_captcha=False)
+                scraper.detected_products = detected_products
+                scraper.detected_image_urls = detected_image_urls
+                scrapers[name] = scraper
+            return scrapers[name]
 
         try:
             print(f"Initializing GeneralizedScraper.")
-            scraper = GeneralizedScraper(shopping_website="", user_data_dir=temp_dir)
-            scraper.detected_image_urls = detected_image_urls
+            # Block templates learned by any worker are shared through a JSON file and reused in later runs
+            template_cache = BlockTemplateCache(os.path.join(PROJECT_ROOT, "cache", "block_templates.json"))
+
+            if profile_dir:
+                os.makedirs(profile_dir, exist_ok=True)
+            pool = BrowserPool(size=1, profile_template=profile_template, temp_root=profile_dir,
+                               **site_info.get("browser_pool", {}))
+            pool.start()
 
             status_queue.put(('ready', worker_index))
             print(f"Worker-{worker_index}: Ready to receive tasks.")
 
             # Define the base path for saving data in the 'data' repository
-            base_data_path = os.path.abspath(
-                os.path.join(os.path.dirname(__file__), "../../../../Data/scrapped_data")
-            )
+            base_data_path = BASE_DATA_PATH
             # print(f"Worker-{worker_index}: Base data path: {base_data_path}")
             os.makedirs(base_data_path, exist_ok=True)  # Ensure the directory exists
 
+            # The checkpoints of the job ledger write the CSV files themselves
+            backends = [] if ledger else [CsvBackend(base_data_path)]
+            if dataset_path:
+                backends.append(ParquetBackend(dataset_path))
+            sink = ProductSink(backends) if backends else None
+
             while True:
-                task = task_queue.get()
-                if task is None:
-                    print(f"Worker-{worker_index}: Received termination signal. Exiting.")
+                if parked:
+                    # Wait for the operator, unless the other workers finish every task first or the slot is retired
+                    while not captcha_event.wait(timeout=1):
+                        if task_queues.finished() or task_queues.is_retired(worker_index):
+                            break
+                    else:
+                        print(f"Worker-{worker_index}: CAPTCHA resolved, taking tasks again.")
+                    captcha_event.clear()
+                    task_queues.unpark(worker_index)
+                    parked = False
+
+                result = task_queues.wait_for_task(worker_index)
+                if result is None:
+                    print(f"Worker-{worker_index}: All tasks finished. Exiting.")
                     break
 
-                site_info, category, product_chunk = task
+                task, stolen = result
+                site_info, category, product = task
+                started = time.monotonic()
+                beat()
+                status_queue.put(('start', worker_index, task))
                 try:
                     site_name = site_info.get("name", "unknown_site")
+                    scraper = shop_scraper(site_info)
                     home_url = site_info.get("home_url", "")
                     search_url_template = site_info.get("search_url_template", "")
 
                     if scraper.shopping_website != home_url:
                         scraper.shopping_website = home_url
-                        if not scraper.open_home_page(home_url):
-                            raise Exception(f"Failed to open home page for {site_name}")
+                        with pool.lease(timeout=DRIVER_ACQUIRE_TIMEOUT) as pooled:
+                            scraper.driver = pooled.driver
+                            if not scraper.open_home_page(home_url):
+                                raise Exception(f"Failed to open home page for {site_name}")
 
-                    print(f"***** Worker-{worker_index} processing category '{category}' on '{site_name}' *****")
+                    if stolen:
+                        print(f"Worker-{worker_index} took over a task of category '{category}' ({site_name}).")
 
-                    for product in product_chunk:
+                    with pool.lease(timeout=DRIVER_ACQUIRE_TIMEOUT) as pooled:
+                        scraper.driver = pooled.driver
+                        pages_before = scraper.pages_loaded
                         try:
-                            print(f"Searching for product: {product}")
+                            print(f"Searching for product: {product} ({category})")
                             search_url = search_url_template.format(
                                 base_url=home_url,
                                 query=product.replace(" ", "+"),
@@ -150,129 +289,401 @@ def worker_process(task_queue, status_queue, detected_image_urls, worker_index,
                             soup = scraper.extract_page_structure()
 
                             if scraper.is_captcha_present(soup):
-                                print(f"[CAPTCHA] CAPTCHA detected!")
-                                status_queue.put(('captcha', worker_index))
-
-                                print(f"[CAPTCHA] Worker-{worker_index} is waiting for CAPTCHA resolution.")
-                                captcha_event.wait()
-                                captcha_event.clear()
-
-                                print(f"CAPTCHA resolved. Resuming task...")
-                                continue
+                                scraper.record_page_result(captcha_present=True)
+                                raise CaptchaDetected(search_url.format(page_number=1))
 
                             # Define the save path inside the 'data' repository
-                            save_dir = os.path.join(base_data_path, f"{shop_name}", f"{category}")
+                            save_dir = os.path.join(base_data_path, f"{site_name}", f"{category}")
                             os.makedirs(save_dir, exist_ok=True)
                             save_path = os.path.join(save_dir, f"{product}.csv")
-                            scraper.scrape_all_products(scroll_based=True, url_template=search_url, page_number_supported=True)
-                            scraper.save_to_csv(save_path=save_path, category=category)
+                            checkpoint = None
+                            start_page = 1
+                            if ledger:
+                                checkpoint = SearchCheckpoint(ledger, site_name, category, product, save_path)
+                                start_page = checkpoint.begin()
+                            scraper.sink_destination = (site_name, category, product)
+                            if sink:
+                                # The products an earlier attempt of the search wrote from start_page on are
+                                # replaced, those of the pages the ledger already has are kept
+                                sink.begin(scraper.sink_destination, first_page=start_page)
+
+                            def page_done(page, products, seconds):
+                                beat()
+                                status_queue.put(('page', worker_index, len(products)))
+                                if checkpoint:
+                                    checkpoint.page_done(page, products, seconds)
+
+                            try:
+                                scraper.scrape_all_products(scroll_based=True, url_template=search_url,
+                                                            page_number_supported=True,
+                                                            in_browser=site_info.get("in_browser", False),
+                                                            incremental=site_info.get("incremental", False),
+                                                            fetch_mode=site_info.get("fetch_mode", "browser"),
+                                                            pipelined=site_info.get("pipelined", False),
+                                                            parser_pool=parser_client,
+                                                            start_page=start_page,
+                                                            on_page_done=page_done)
+                            except CaptchaDetected:
+                                if checkpoint:
+                                    # The worker taking the search over continues after its last finished page
+                                    checkpoint.release()
+                                raise
+                            except Exception as e:
+                                if checkpoint:
+                                    # A retried search continues after its last finished page
+                                    checkpoint.fail(e)
+                                raise
+                            if checkpoint:
+                                checkpoint.finish()
                             scraper.stored_products.clear()
 
                             print(f"Saved scraped data to: {save_path}")
-
+                            print(f"Request rate for {site_name}: "
+                                  f"{scraper.rate_controller.rate(template_domain(home_url)):.2f} pages/s")
+                            print(f"Scraper memory: {scraper.memory_metrics()}")
+
+                        except CaptchaDetected as e:
+                            # On any page of the search: a healthy worker runs it while this one waits for the
+                            # operator
+                            print(f"[CAPTCHA] {e}")
+                            task_queues.park(worker_index)
+                            target = task_queues.requeue(worker_index, task)
+                            parked = True
+                            status_queue.put(('captcha', worker_index, f"{category}: {product}"))
+                            print(f"[CAPTCHA] Search requeued ({target}), Worker-{worker_index} is waiting for "
+                                  f"CAPTCHA resolution.")
+                            continue
+                        except WebDriverException:
+                            # The lease replaces the driver, the task is handed to another worker
+                            raise
                         except Exception as e:
+                            # The search is failed in the ledger, the task is retried and reported failed below
                             print(f"Error scraping product '{product}': {e}")
-                            traceback.print_exc()
+                            raise
+                        finally:
+                            pooled.pages += scraper.pages_loaded - pages_before
 
-                    status_queue.put(('done', worker_index))
+                    tasks_done += 1
+                    tasks_stolen += stolen
+                    consecutive_failures = 0
+                    status_queue.put(('done', worker_index, site_name, category, product))
 
                 except Exception as e:
                     print(f"Failed to process category '{category}': {e}")
                     traceback.print_exc()
-                    status_queue.put(('failed', worker_index))
-                    break
+                    # Another worker takes the task over, unless it failed too often
+                    target = retry_task(task_queues, task_attempts, worker_index, task, key=task_key(task))
+                    status_queue.put(('failed', worker_index, task_key(task), target))
+                    consecutive_failures += 1
+                    if consecutive_failures >= MAX_CONSECUTIVE_FAILURES:
+                        print(f"Worker-{worker_index}: {consecutive_failures} tasks failed in a row. Exiting.")
+                        break
+
+                finally:
+                    task_queues.task_done(worker_index)
+                    busy_seconds += time.monotonic() - started
 
         finally:
+            status_queue.put(('exit', worker_index, busy_seconds, tasks_done, tasks_stolen, os.getpid()))
+            if parser_client:
+                # Pages still in the pool when the worker stops
+                parser_client.close()
+            try:
+                if sink:
+                    sink.close()
+                    print(f"Product sink: {sink.metrics()}")
+            except Exception as e:
+                print(f"Error closing the product sink: {e}")
+                traceback.print_exc()
             try:
-                if scraper:
-                    scraper.close_driver()
+                if pool:
+                    print(f"Browser pool: {pool.metrics()}")
+                    pool.close()
                     print(f"Closed Chrome driver.")
             except Exception as e:
                 print(f"Error closing driver: {e}")
                 traceback.print_exc()
 
 
-def main_scraper(site_info, categories_amazon_products, n_workers=2):
+def main_scraper(site_info, categories_amazon_products, n_workers=2, ledger_path=LEDGER_PATH, n_parsers=0,
+                 max_workers=None, dataset_path=None, catalog_path=CATALOG_PATH):
     """
     Manages worker processes and handles CAPTCHA resolution.
+
+    Every (shop, category, product) search is a task of its own. The tasks of a category are queued for one worker,
+    idle workers steal tasks from the others, categories are only used for the progress report.
+
+    See scrape_shops, which runs the searches of several shops with one set of workers. The autoscaler's bounds and
+    thresholds of the shop can be set in site_info["autoscale"].
+    """
+    scrape_shops([site_info], categories_amazon_products, n_workers=n_workers, ledger_path=ledger_path,
+                 n_parsers=n_parsers, max_workers=max_workers, autoscale=site_info.get("autoscale"),
+                 dataset_path=dataset_path, catalog_path=catalog_path)
+
+
+def scrape_shops(shopping_sites, categories_amazon_products, n_workers=2, ledger_path=LEDGER_PATH, n_parsers=0,
+                 max_workers=None, autoscale=None, run_name=None, dataset_path=None, catalog_path=CATALOG_PATH):
+    """
+    Scrapes the searches of one or several shops with one set of worker processes and handles CAPTCHA resolution.
+
+    With one shop the tasks of a category are queued for one worker and idle workers steal tasks from the others
+    (core/task_queue). With several shops a ShopScheduler (core/shop_scheduler) hands every free worker a task of the
+    shop that needs it most, at most site_info["max_concurrency"] tasks of a shop run at once and a shop with CAPTCHAs
+    gets fewer workers, so the capacity moves from throttled and finished shops to the others instead of every shop
+    running on its own workers. The page loads of every shop are paced by its own rate controller.
+
+    CAPTCHAs are prompted in a background thread (core/captcha_prompt), so the status messages of the other workers
+    are still handled while the operator solves one.
+
+    Searches the job ledger records as done are skipped, so running the scraper again after a crash only scrapes what
+    is left. Pass ledger_path=None to scrape everything again without a ledger.
+
+    With n_parsers > 0 the pages are parsed by a pool of n_parsers processes shared by the workers, the number of
+    browsers (n_workers) and of parsing cores are chosen independently. The pool uses the parser backend of the first
+    shop.
+
+    Workers that die or hang during a search are killed and started again by a supervisor (core/supervisor), their
+    search is handed to another worker and their Chrome processes and profiles are reaped, so one crashed browser
+    does not stop the run.
+
+    With max_workers above n_workers the run starts n_workers workers and an autoscaler (core/autoscaler) adds
+    workers up to max_workers while they raise the products per minute, and retires workers when memory runs low,
+    CAPTCHAs pile up or the last one added did not pay off. Its bounds and thresholds can be set in autoscale, its
+    decisions are logged to scraped_logs/<run name>/autoscale.csv.
+
+    With a dataset_path the products are also appended to a typed Parquet dataset (core/dataset_writer), which loads
+    much faster than the CSV files, e.g. DATASET_PATH.
+
+    The products are upserted into a persistent product catalog (core/product_catalog) that logs their price and
+    title changes across runs, the run ends with the changes of every shop. A search stops paginating once its pages
+    only bring known, unchanged products, so a nightly run mostly pays for what changed. Pass catalog_path=None to
+    scrape every page.
+
+    Args:
+        shopping_sites (list): site_info dicts of the shops.
+        categories_amazon_products (dict): Category -> searched products, searched in every shop.
+        n_workers (int, optional): Number of workers started.
+        ledger_path (str, optional): SQLite file of the job ledger, None to run without a ledger.
+        n_parsers (int, optional): Number of parser processes, 0 to parse in the workers.
+        max_workers (int, optional): Largest number of workers of the autoscaler, n_workers to disable it.
+        autoscale (dict, optional): Arguments of the WorkerAutoscaler.
+        run_name (str, optional): Name of the logs, profiles and autoscaler log of the run, the shop's name for one
+                                  shop and "multi_shop" for several.
+        dataset_path (str, optional): Directory of the Parquet dataset, None to only write the CSV files.
+        catalog_path (str, optional): SQLite file of the product catalog, None to run without a catalog.
     """
     print("[INFO] MainScraper: Starting main scraper.")
     manager = Manager()
-    detected_image_urls = manager.list()
+    # URLs already scraped by any worker, looked up in shared memory instead of through the Manager
+    detected_products = SharedFingerprintSet(max_bytes=DEDUP_MAX_BYTES, eviction=DEDUP_EVICTION)
+    detected_image_urls = SharedFingerprintSet(max_bytes=DEDUP_MAX_BYTES, eviction=DEDUP_EVICTION)
+
+    # Pacing state shared by all workers, one bucket per shop domain
+    rate_state = manager.dict()
+    rate_lock = manager.Lock()
+
+    # Slots for the largest number of workers, the ones above n_workers are started by the autoscaler
+    autoscale = dict(autoscale or {})
+    max_workers = max(n_workers, autoscale.pop("max_workers", max_workers) or n_workers)
 
-    task_queue = Queue()
     status_queue = Queue()
-    captcha_events = {i: manager.Event() for i in range(n_workers)}
+    captcha_events = {i: manager.Event() for i in range(max_workers)}
+    captcha_prompt = CaptchaPrompt()
+
+    shop_names = [site_info.get("name", "unknown_shop") for site_info in shopping_sites]
+    if run_name is None:
+        run_name = shop_names[0] if len(shopping_sites) == 1 else "multi_shop"
+    # The workers' own settings: the shop of a single-shop run, the run's name otherwise
+    run_info = shopping_sites[0] if len(shopping_sites) == 1 else {"name": run_name}
+
+    ledger = JobLedger(ledger_path) if ledger_path else None
+    catalog = ProductCatalog(catalog_path) if catalog_path else None
+    catalog_since = time.time()
+    shop_searches = {}
+    for site_info, shop_name in zip(shopping_sites, shop_names):
+        searches = categories_amazon_products
+        if ledger:
+            planned = sum(len(products) for products in searches.values())
+            searches = ledger.plan_searches(shop_name, searches, BASE_DATA_PATH)
+            left = sum(len(products) for products in searches.values())
+            print(f"[INFO] MainScraper: {shop_name}: {planned - left} searches already done, {left} left.")
+        shop_searches[shop_name] = (site_info, searches)
+
+    # All tasks are queued before the workers start, a worker exits once every task is finished
+    groups = {(shop_name, category): [(site_info, category, product) for product in products]
+              for shop_name, (site_info, searches) in shop_searches.items()
+              for category, products in searches.items() if products}
+    remaining = {group: len(tasks) for group, tasks in groups.items()}
+    if len(shopping_sites) == 1:
+        task_queues = WorkStealingQueues(max_workers, n_active=n_workers)
+        assignment = task_queues.assign({category: tasks for (_, category), tasks in groups.items()})
+        for category, worker_index in assignment.items():
+            print(f"[INFO] MainScraper: Category '{category}' ({remaining[shop_names[0], category]} products) queued "
+                  f"for Worker-{worker_index}")
+    else:
+        concurrency = {name: site_info["max_concurrency"] for name, site_info in zip(shop_names, shopping_sites)
+                       if "max_concurrency" in site_info}
+        task_queues = ShopScheduler(shop_names, max_workers, n_active=n_workers, concurrency=concurrency)
+        task_queues.assign(groups)
+        print(f"[INFO] MainScraper: Shops queued: {task_queues.metrics()}")
 
-    workers = []
     active_workers = set()
 
-    print(f"[INFO] MainScraper: Initializing {n_workers} workers.")
-    for i in range(n_workers):
+    # Chrome's first run and the chromedriver patching happen once here, the workers then launch in parallel
+    profile_template = prepare_profile_template(
+        os.path.join(PROJECT_ROOT, "cache", "chrome_profiles", run_name),
+        warm_url=[site_info.get("home_url") for site_info in shopping_sites if site_info.get("home_url")]
+    )
+
+    parser_pool = None
+    if n_parsers:
+        parser_pool = ParserPool(n_clients=max_workers, n_processes=n_parsers,
+                                 parser_backend=shopping_sites[0].get("parser_backend"),
+                                 template_cache_path=os.path.join(PROJECT_ROOT, "cache", "block_templates.json"),
+                                 known_products=detected_products, known_image_urls=detected_image_urls)
+        parser_pool.start()
+
+    # Failures of every search, a search failing too often is given up
+    task_attempts = manager.dict()
+    heartbeats = Heartbeats(max_workers)
+
+    def spawn(i):
         process = Process(
             target=worker_process,
-            args=(task_queue, status_queue, detected_image_urls, i, captcha_events[i], site_info)
+            args=(task_queues, status_queue, detected_products, detected_image_urls, i, captcha_events[i], run_info,
+                  rate_state, rate_lock, profile_template, ledger, parser_pool.client(i) if parser_pool else None,
+                  heartbeats, task_attempts, supervisor.profile_dir(i), dataset_path, catalog)
         )
-        workers.append(process)
         process.start()
-        time.sleep(2)
+        return process
+
+    supervisor = WorkerSupervisor(max_workers, spawn, task_queues, heartbeats, task_attempts,
+                                  profile_root=os.path.join(PROFILE_ROOT, run_name), task_key=task_key)
+
+    autoscaler = None
+    if max_workers > n_workers:
+        autoscale.setdefault("log_path", os.path.join(PROJECT_ROOT, "scraped_logs", run_name, "autoscale.csv"))
+        autoscaler = WorkerAutoscaler(max_workers=max_workers, **autoscale)
+
+    print(f"[INFO] MainScraper: Initializing {n_workers} workers" +
+          (f", autoscaled up to {max_workers}." if autoscaler else "."))
+    supervisor.start()
+
+    started = time.monotonic()
+    deadline = started + WORKERS_READY_TIMEOUT
+    utilization = {}
+
+    while supervisor.running():
+        for worker_index in captcha_prompt.resolved():
+            print(f"[CAPTCHA] MainScraper: Worker-{worker_index} resumes.")
+            captcha_events[worker_index].set()
+
+        if parser_pool:
+            # The searches waiting for a page of a dead parser time out and are retried
+            parser_pool.restart_dead()
+
+        if autoscaler and autoscaler.due():
+            running = supervisor.running_workers()
+            change, _ = autoscaler.decide(len(running))
+            if change > 0:
+                worker_index = supervisor.add_worker()
+                if worker_index is not None:
+                    print(f"[INFO] MainScraper: Autoscaler started Worker-{worker_index}.")
+            elif change < 0 and running:
+                # A worker waiting for a CAPTCHA is retired first, it scrapes nothing anyway
+                parked = [index for index in running if task_queues.parked[index]]
+                worker_index = parked[0] if parked else autoscaler.slowest_worker(running)
+                supervisor.retire_worker(worker_index)
+                print(f"[INFO] MainScraper: Autoscaler retires Worker-{worker_index} after its current task.")
+
+        if not active_workers and time.monotonic() > deadline:
+            print("[CRITICAL] MainScraper: No workers are active. Exiting scraper.")
+            supervisor.stop()
+            if parser_pool:
+                parser_pool.close()
+            detected_products.unlink()
+            detected_image_urls.unlink()
+            return
 
-    for i in range(n_workers):
         try:
-            status, worker_index = status_queue.get(timeout=30)
-            if status == 'ready':
-                active_workers.add(worker_index)
-                print(f"[INFO] MainScraper: Worker-{worker_index} is ready.")
-        except:
-            print("[ERROR] MainScraper: Timeout waiting for worker status. Exiting.")
-            break
-
-    if not active_workers:
-        print("[CRITICAL] MainScraper: No workers are active. Exiting scraper.")
-        return
-
-    print(f"[INFO] MainScraper: Active workers: {sorted(active_workers)}")
-
-    for category, products in categories_amazon_products.items():
-        print(f"\n[INFO] MainScraper: Starting category: {category}")
-        product_chunks = [[] for _ in active_workers]
-
-        for idx, product in enumerate(products):
-            worker_idx = idx % len(active_workers)
-            product_chunks[worker_idx].append(product)
-
-        for i, worker_index in enumerate(sorted(active_workers)):
-            task = (site_info, category, product_chunks[i])
-            task_queue.put(task)
-            print(f"[INFO] MainScraper: Assigned {len(product_chunks[i])} products to Worker-{worker_index}")
-
-        completed_workers = set()
-        while len(completed_workers) < len(active_workers):
-            status, worker_index = status_queue.get()
-
-            if status == 'done':
-                print(f"[INFO] MainScraper: Worker-{worker_index} completed its task.")
-                completed_workers.add(worker_index)
-            elif status == 'captcha':
-                print(f"[CAPTCHA] MainScraper: Worker-{worker_index} requires CAPTCHA resolution.")
-                print(f"Resolve CAPTCHA for Worker-{worker_index} and press Enter to continue.")
-                input("Press Enter to continue...")
-                captcha_events[worker_index].set()
-            elif status == 'failed':
-                print(f"[ERROR] MainScraper: Worker-{worker_index} failed.")
-                active_workers.discard(worker_index)
-                completed_workers.add(worker_index)
-
-        print(f"[INFO] MainScraper: Finished category: {category}")
-
-    print("[INFO] MainScraper: Terminating all workers.")
-    for _ in workers:
-        task_queue.put(None)
-
-    for process in workers:
-        process.join()
-        print(f"[INFO] MainScraper: Worker PID {process.pid} has terminated.")
-
+            message = status_queue.get(timeout=1)
+        except Exception:
+            # Workers that died or hang without reporting
+            for worker_index, reason, task, target in supervisor.check():
+                captcha_prompt.cancel(worker_index)
+                if task is not None and target is None:
+                    shop_name, category, product = task_key(task)
+                    remaining[shop_name, category] -= 1
+                    print(f"[ERROR] MainScraper: Gave up '{product}' ({shop_name}, {category}) after "
+                          f"Worker-{worker_index} {reason}.")
+            continue
+
+        status, worker_index = message[:2]
+        if status == 'ready':
+            active_workers.add(worker_index)
+            print(f"[INFO] MainScraper: Worker-{worker_index} is ready.")
+            if autoscaler:
+                # The window of the next decision starts with the new worker scraping
+                autoscaler.restart_window()
+        elif status == 'page':
+            if autoscaler:
+                autoscaler.record_page(worker_index, message[2])
+        elif status == 'start':
+            supervisor.task_started(worker_index, message[2])
+        elif status == 'done':
+            supervisor.task_ended(worker_index)
+            shop_name, category = message[2:4]
+            remaining[shop_name, category] -= 1
+            if remaining[shop_name, category] == 0:
+                print(f"[INFO] MainScraper: Finished category: {category} ({shop_name})")
+        elif status == 'captcha':
+            print(f"[CAPTCHA] MainScraper: Worker-{worker_index} requires CAPTCHA resolution, "
+                  f"its search was handed to another worker.")
+            supervisor.task_ended(worker_index)
+            captcha_prompt.report(worker_index, message[2])
+            if autoscaler:
+                autoscaler.record_captcha(worker_index)
+        elif status == 'failed':
+            supervisor.task_ended(worker_index)
+            (shop_name, category, product), target = message[2:]
+            if target is None:
+                remaining[shop_name, category] -= 1
+                print(f"[ERROR] MainScraper: Worker-{worker_index} gave up '{product}' ({shop_name}, {category}).")
+            else:
+                print(f"[ERROR] MainScraper: Worker-{worker_index} failed on '{product}' ({shop_name}, {category}), "
+                      f"requeued ({target}).")
+        elif status == 'exit':
+            busy_seconds, tasks_done, tasks_stolen, pid = message[2:]
+            captcha_prompt.cancel(worker_index)
+            utilization[worker_index] = busy_seconds / max(time.monotonic() - started, 1e-9)
+            print(f"[INFO] MainScraper: Worker-{worker_index} finished {tasks_done} tasks ({tasks_stolen} stolen), "
+                  f"utilization {utilization[worker_index]:.0%}.")
+            supervisor.worker_exited(worker_index, pid)
+
+    # Workers still closing their browsers, and the Chrome processes and profiles they left
+    supervisor.stop()
+
+    if parser_pool:
+        parser_pool.close()
+    print(f"[INFO] MainScraper: {len(detected_products)} products and {len(detected_image_urls)} images detected.")
+    print(f"[INFO] MainScraper: URL sets: products {detected_products.metrics()}, "
+          f"images {detected_image_urls.metrics()}")
+    detected_products.unlink()
+    detected_image_urls.unlink()
+
+    unfinished = [group for group, count in remaining.items() if count > 0]
+    if unfinished:
+        print(f"[ERROR] MainScraper: Unfinished categories: {unfinished}")
+    print(f"[INFO] MainScraper: Run took {time.monotonic() - started:.0f}s.")
+    if ledger:
+        for shop_name in shop_names:
+            print(f"[INFO] MainScraper: Job ledger of {shop_name}: {ledger.summary(shop_name)}")
+        ledger.close()
+    if catalog:
+        for site_info, shop_name in zip(shopping_sites, shop_names):
+            changes = catalog.summary(template_domain(site_info.get("home_url", "")), since=catalog_since)
+            print(f"[INFO] MainScraper: Product catalog of {shop_name}: {changes}")
+        catalog.close()
     print("***** All searches completed *****")
 
 
@@ -284,7 +695,9 @@ if __name__ == "__main__":
     shopping_sites = [
         {"name": "ebay",
          "home_url": "https://www.ebay.com",
-         "search_url_template": "{base_url}/sch/i.html?_nkw={query}&_pgn={{page_number}}"},
+         "search_url_template": "{base_url}/sch/i.html?_nkw={query}&_pgn={{page_number}}",
+         "parser_backend": "lxml",
+         "fetch_mode": "http"},  # Search results are in the initial HTML
     ]
 
     # Import the product categories for scraping
@@ -292,9 +705,11 @@ if __name__ == "__main__":
     # from UniversalWebshopScraper.generalized_scrapper.checker.missing_products import categories_products
 
     n_workers = 2  # Number of workers to spawn
+    max_workers = default_max_workers()  # The autoscaler adds workers up to what the machine can run
+    n_parsers = os.cpu_count()  # Parser processes shared by the workers
 
-    # Loop through the shopping sites and start the scraper
-    for site_info in shopping_sites:
-        main_scraper(site_info, categories_products, n_workers=n_workers)
+    # One set of workers for all shopping sites (see scrape_shops)
+    scrape_shops(shopping_sites, categories_products, n_workers=n_workers, n_parsers=n_parsers,
+                 max_workers=max_workers)
 
     print("***** All searches completed *****")
\ No newline at end of file
@@ -0,0 +1,142 @@
+import asyncio
+import json
+from bs4 import BeautifulSoup
+import pytest
+from UniversalWebshopScraper.generalized_scrapper.core.async_browser import (
+    AsyncBrowser, AsyncTab, BrowserEngine, CDPConnection, CDPError
+)
+from UniversalWebshopScraper.generalized_scrapper.core.async_scraper import AsyncGeneralizedScraper
+from UniversalWebshopScraper.generalized_scrapper.core.generalized_scrapper import GeneralizedScraper
+from UniversalWebshopScraper.generalized_scrapper.botleneck_testing.synthetic_pages import synthetic_listing_page
+
+HTML = synthetic_listing_page(20)
+
+
+async def fake_browser(websocket):
+    """
+    Answer the CDP commands of a tab like a browser would, scripts evaluate to a recorded result.
+    """
+    async for message in websocket:
+        command = json.loads(message)
+        session = command.get("sessionId")
+        result = {}
+        if command["method"] == "Target.createTarget":
+            result = {"targetId": "T1"}
+        elif command["method"] == "Target.attachToTarget":
+            result = {"sessionId": "S1"}
+        elif command["method"] == "Page.navigate":
+            if "unreachable" in command["params"]["url"]:
+                result = {"frameId": "F1", "errorText": "net::ERR_NAME_NOT_RESOLVED"}
+            else:
+                # The load event of the page follows the navigation
+                await websocket.send(json.dumps({"id": command["id"], "result": {"frameId": "F1"}}))
+                await websocket.send(json.dumps({"method": "Page.loadEventFired", "sessionId": session,
+                                                 "params": {"timestamp": 1}}))
+                continue
+        elif command["method"] == "Runtime.evaluate":
+            if "throw" in command["params"]["expression"]:
+                result = {"result": {"type": "object"},
+                          "exceptionDetails": {"text": "Uncaught", "exception": {"description": "Error: boom"}}}
+            else:
+                result = {"result": {"type": "string", "value": command["params"]["expression"]}}
+        elif command["method"] == "Unknown.method":
+            await websocket.send(json.dumps({"id": command["id"], "error": {"code": -32601,
+                                                                            "message": "'Unknown.method' wasn't found"}}))
+            continue
+        await websocket.send(json.dumps({"id": command["id"], "result": result, "sessionId": session}))
+
+
+def test_tab_over_cdp():
+    from websockets.asyncio.server import serve
+
+    async def run():
+        async with serve(fake_browser, "127.0.0.1", 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            connection = await CDPConnection.connect(f"ws://127.0.0.1:{port}")
+            tab = await AsyncTab.open(connection)
+            assert (tab.target_id, tab.session_id) == ("T1", "S1")
+
+            await tab.get("https://www.example.com")
+            with pytest.raises(CDPError):
+                await tab.get("https://unreachable.example.com")
+
+            # Scripts are function bodies called with their arguments, like in Selenium
+            expression = await tab.execute_script("return arguments[0];", [1, 2])
+            assert expression.startswith("(function() {\nreturn arguments[0];\n}).apply(null, [[1, 2]])")
+            with pytest.raises(CDPError, match="boom"):
+                await tab.execute_script("throw new Error('boom');")
+            with pytest.raises(CDPError, match="wasn't found"):
+                await tab.send("Unknown.method")
+
+            # Concurrent commands are matched to their own results
+            results = await asyncio.gather(*(tab.execute_script(f"return {i};") for i in range(20)))
+            assert all(f"return {i};" in result for i, result in enumerate(results))
+
+            assert not connection.handlers  # No load event handler left behind
+            await connection.close()
+
+    asyncio.run(run())
+
+
+class FakeTab:
+    """
+    Tab showing a static page.
+    """
+    def __init__(self, html):
+        self.html = html
+        self.urls = []
+
+    async def get(self, url):
+        self.urls.append(url)
+
+    async def page_source(self):
+        return self.html
+
+    async def execute_script(self, script, *args):
+        raise AssertionError("No script is run in page_source mode")
+
+
+def test_async_scraper_matches_sync_scraper():
+    sync_scraper = GeneralizedScraper(shopping_website="https://www.example.com", offline_mode=True)
+    sync_scraper.detected_image_urls = set()
+    soup = BeautifulSoup(HTML, "html.parser")
+    sync_scraper.trash_detection(soup)
+    sync_scraper.detect_page_products(soup)
+
+    tab = FakeTab(HTML)
+    async_scraper = AsyncGeneralizedScraper(tab, shopping_website="https://www.example.com")
+    async_scraper.detected_image_urls = set()
+    pages = []
+    asyncio.run(async_scraper.scrape_all_products_async(url_template="https://www.example.com/s?p={page_number}",
+                                                        max_pages=1, on_page_done=lambda *page: pages.append(page)))
+
+    assert tab.urls == ["https://www.example.com/s?p=1"]
+    assert async_scraper.product_count == 20
+    assert async_scraper.stored_products == sync_scraper.stored_products
+    assert [(page[0], len(page[1])) for page in pages] == [(1, 20)]
+    # The synchronous methods are not shadowed by the coroutines
+    assert not asyncio.iscoroutinefunction(async_scraper.scrape_all_products)
+    assert not asyncio.iscoroutinefunction(async_scraper.load_page)
+
+
+def test_engine_closes_the_launched_browsers_when_one_fails(monkeypatch):
+    closed = []
+
+    class FakeBrowser:
+        async def close(self):
+            closed.append(self)
+
+    launches = iter([FakeBrowser(), RuntimeError("Chrome did not start"), FakeBrowser()])
+
+    async def launch(**options):
+        launch = next(launches)
+        if isinstance(launch, Exception):
+            raise launch
+        return launch
+
+    monkeypatch.setattr(AsyncBrowser, "launch", staticmethod(launch))
+    engine = BrowserEngine(n_browsers=3)
+    with pytest.raises(RuntimeError, match="did not start"):
+        asyncio.run(engine.start())
+    assert len(closed) == 2
+    assert engine.browsers == []
@@ -0,0 +1,67 @@
+import csv
+
+from UniversalWebshopScraper.generalized_scrapper.core.autoscaler import WorkerAutoscaler
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_autoscaler(tmp_path, memory_mb=16000, load=0.5, **kwargs):
+    clock = Clock()
+    readings = {"memory": memory_mb, "cpu": load}
+    autoscaler = WorkerAutoscaler(min_workers=1, max_workers=4, interval=60, log_path=str(tmp_path / "autoscale.csv"),
+                                  memory=lambda: readings["memory"], cpu=lambda: readings["cpu"], clock=clock,
+                                  **kwargs)
+    return autoscaler, clock, readings
+
+
+def window(autoscaler, clock, n_workers, products_per_worker, captchas=0):
+    for worker_index in range(n_workers):
+        autoscaler.record_page(worker_index, products_per_worker)
+    for _ in range(captchas):
+        autoscaler.record_captcha(0)
+    clock.now += 60
+    assert autoscaler.due()
+    return autoscaler.decide(n_workers)[0]
+
+
+def test_workers_are_added_while_throughput_grows(tmp_path):
+    autoscaler, clock, _ = make_autoscaler(tmp_path)
+    assert window(autoscaler, clock, 1, 100) == 1
+    assert window(autoscaler, clock, 2, 100) == 1  # 200 products/min instead of 100
+    # The third worker only adds 5% (e.g. the shop's rate limit is reached): it is retired and not tried again
+    assert window(autoscaler, clock, 3, 70) == -1
+    assert window(autoscaler, clock, 2, 100) == 0
+
+    with open(tmp_path / "autoscale.csv") as file:
+        rows = list(csv.DictReader(file))
+    assert [row["change"] for row in rows] == ["1", "1", "-1", "0"]
+    assert rows[2]["products_per_minute"] == "210.00"
+    assert rows[2]["worker_products_per_minute"] == "0:70.00 1:70.00 2:70.00"
+
+
+def test_memory_cpu_and_captchas_limit_the_workers(tmp_path):
+    autoscaler, clock, readings = make_autoscaler(tmp_path, memory_mb=2000)
+    assert window(autoscaler, clock, 1, 100) == 0  # No memory for one more browser
+
+    readings["memory"], readings["cpu"] = 16000, 0.95
+    assert window(autoscaler, clock, 1, 100) == 0  # Parsing saturates the CPU
+
+    readings["cpu"] = 0.5
+    assert window(autoscaler, clock, 2, 100, captchas=20) == -1
+    readings["memory"] = 500
+    assert window(autoscaler, clock, 2, 100) == -1
+    assert window(autoscaler, clock, 1, 100) == 0  # Never below min_workers
+
+
+def test_slowest_worker_is_retired(tmp_path):
+    autoscaler, _, _ = make_autoscaler(tmp_path)
+    autoscaler.record_page(0, 50)
+    autoscaler.record_page(1, 10)
+    assert autoscaler.slowest_worker([0, 1, 2]) == 2
+    assert autoscaler.slowest_worker([0, 1]) == 1
@@ -0,0 +1,86 @@
+import pytest
+from bs4 import BeautifulSoup
+from UniversalWebshopScraper.generalized_scrapper.core.generalized_scrapper import GeneralizedScraper
+from UniversalWebshopScraper.generalized_scrapper.core.block_detection import (
+    aggregate_page, extract_block_product_info, opening_tag
+)
+from UniversalWebshopScraper.generalized_scrapper.botleneck_testing.synthetic_pages import synthetic_listing_page
+
+
+def make_scraper():
+    """
+    Create an offline scraper with the same list-based image dedup as the turbo workers.
+    """
+    scraper = GeneralizedScraper(shopping_website="https://www.example.com", offline_mode=True)
+    scraper.detected_image_urls = set()
+    return scraper
+
+
+PAGES = [
+    # Nested wrappers, a titled tag and a background image in a style
+    """<ul><li class="card"><div><div><a href="/p/1"><img src="/i/1.jpg"></a>
+       <h2 class="title">Wireless Bluetooth Earbuds Pro</h2><span>199,99 zł</span>
+       <div style="background-image: url(/b/1.png)"></div></div></div></li>
+       <li class="card"><div><div><a href="/p/2?utm_source=x"><img srcset="/i/2.jpg 1x, /i/2b.jpg 2x"></a>
+       <span>Noise-Cancelling Headphones</span><span>$</span><span>49.00</span></div></div></li></ul>""",
+    # Duplicated product links, the second card must be skipped
+    """<div><article><a href="/p/1">Robotic lawnmower with GPS</a><img data-src="/i/1.jpg"><p>1.299,00 PLN</p></article>
+       <article><a href="/p/1">Robotic lawnmower with GPS</a><img src="/i/9.jpg"><p>1.299,00 PLN</p></article></div>""",
+    # Script, style and comments are not part of the text, ratings are not titles
+    """<div><span class="name">4,5 stars</span><script>var title = "Script title of product";</script>
+       <!-- Hidden comment with a long text --><a href="/p/3"><img src="/i/3.jpg"></a>
+       <div>Portable Air Conditioner 9000 BTU</div><b>€ 349,99</b></div>""",
+    # Whitespace-only srcset entries and an empty href
+    """<li><a href=""><img srcset="/i/4.jpg 1x, "></a><span>Electric Pressure Cooker</span><span>89.90 USD</span></li>""",
+]
+
+
+@pytest.mark.parametrize("html_input", PAGES + [synthetic_listing_page(60)])
+def test_detect_product_blocks_matches_legacy(html_input):
+    """
+    The single-pass detection must give the same products as the per-block heuristic.
+    """
+    soup = BeautifulSoup(html_input, "html.parser")
+
+    legacy = make_scraper()
+    legacy.trash_detection(soup)
+    legacy.detect_product_blocks_legacy(soup)
+
+    single_pass = make_scraper()
+    single_pass.wrong_titles = set(legacy.wrong_titles)
+    single_pass.detect_product_blocks(soup)
+
+    assert single_pass.stored_products == legacy.stored_products
+    assert single_pass.parent_blocks == legacy.parent_blocks
+    assert single_pass.product_count == legacy.product_count
+
+
+@pytest.mark.parametrize("html_input", PAGES)
+def test_extract_block_product_info_matches_extract_product_info(html_input):
+    """
+    Walking a single block must give the same product information as the per-block heuristic.
+    """
+    soup = BeautifulSoup(html_input, "html.parser")
+    scraper = make_scraper()
+
+    for block in soup.find_all(['div', 'li', 'article', 'span', 'ul']):
+        assert extract_block_product_info(block, scraper) == scraper.extract_product_info(block)
+
+
+def test_aggregate_text_matches_get_text():
+    """
+    The string slice of every block must give the same text as get_text(strip=True).
+    """
+    soup = BeautifulSoup(PAGES[0] + PAGES[2], "html.parser")
+    aggregates = aggregate_page(soup, "https://www.example.com")
+
+    for index, block in enumerate(aggregates.blocks):
+        assert aggregates.block_text(index) == block.get_text(strip=True)
+
+
+def test_opening_tag():
+    """
+    opening_tag must render the same prefix as serializing the whole block.
+    """
+    soup = BeautifulSoup('<div class="a b" data-x="1 &amp; 2"><span>text</span></div>', "html.parser")
+    assert opening_tag(soup.div) == str(soup.div).split('>')[0]
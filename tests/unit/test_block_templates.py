@@ -0,0 +1,86 @@
+from bs4 import BeautifulSoup
+from UniversalWebshopScraper.generalized_scrapper.core.generalized_scrapper import GeneralizedScraper
+from UniversalWebshopScraper.generalized_scrapper.core.block_templates import (
+    BlockTemplateCache, learn_block_template, template_domain
+)
+from UniversalWebshopScraper.generalized_scrapper.botleneck_testing.synthetic_pages import synthetic_listing_page
+
+
+def make_scraper(template_cache=None):
+    scraper = GeneralizedScraper(shopping_website="https://www.example.com", offline_mode=True,
+                                 template_cache=template_cache)
+    scraper.detected_image_urls = set()
+    return scraper
+
+
+def page(number, n_products=30):
+    return BeautifulSoup(synthetic_listing_page(n_products, seed=number, first_product=n_products * number),
+                         "html.parser")
+
+
+def test_template_detection_matches_full_detection():
+    """
+    After the first page, the template must find the same products as the full heuristic.
+    """
+    first_page, second_page = page(0), page(1)
+
+    templated = make_scraper()
+    templated.trash_detection(first_page)
+    templated.detect_page_products(first_page)
+    template = templated.template_cache.get("example.com")
+    assert template is not None and template.expected_count == 30
+
+    full = make_scraper()
+    full.wrong_titles = set(templated.wrong_titles)
+    full.detect_product_blocks(first_page)
+
+    templated.detect_page_products(second_page)
+    full.detect_product_blocks(second_page)
+
+    assert templated.stored_products == full.stored_products
+
+
+def test_template_falls_back_when_layout_changes():
+    """
+    When the template finds nothing, the full heuristic runs and the template is learned again.
+    """
+    scraper = make_scraper()
+    scraper.detect_page_products(page(0))
+    old_template = scraper.template_cache.get("example.com")
+
+    new_layout = BeautifulSoup("".join(
+        f'<section><article class="offer"><a href="/n/{i}"><img src="/n/{i}.jpg"></a>'
+        f'<h3>New layout product number {i}</h3><b>{i}9,99 zł</b></article></section>' for i in range(5)
+    ), "html.parser")
+
+    assert scraper.detect_page_products(new_layout) == 5
+    assert scraper.template_cache.get("example.com").path != old_template.path
+
+
+def test_template_cache_persistence(tmp_path):
+    cache_path = str(tmp_path / "block_templates.json")
+    blocks = page(0).find_all("li")
+    BlockTemplateCache(cache_path).put("example.com", learn_block_template(blocks))
+
+    loaded = BlockTemplateCache(cache_path).get(template_domain("https://www.example.com"))
+    assert loaded.path[-1] == "li" and "card" in loaded.class_tokens
+
+
+def test_template_cache_reads_the_file_again_only_once_changed(tmp_path, monkeypatch):
+    cache_path = str(tmp_path / "block_templates.json")
+    blocks = page(0).find_all("li")
+    BlockTemplateCache(cache_path).put("example.com", learn_block_template(blocks))
+    reader = BlockTemplateCache(cache_path)
+
+    loads = []
+    original_load = BlockTemplateCache._load
+    monkeypatch.setattr(BlockTemplateCache, "_load", lambda self: loads.append(1) or original_load(self))
+    for _ in range(10):
+        assert reader.get("other.test") is None
+    assert loads == []
+
+    # Another worker learns the template of the shop
+    BlockTemplateCache(cache_path).put("other.test", learn_block_template(blocks))
+    loads.clear()
+    assert reader.get("other.test") is not None
+    assert len(loads) == 1
@@ -0,0 +1,174 @@
+import json
+import shutil
+import subprocess
+
+import pytest
+from bs4 import BeautifulSoup
+from UniversalWebshopScraper.generalized_scrapper.core.generalized_scrapper import GeneralizedScraper
+from UniversalWebshopScraper.generalized_scrapper.core.browser_extraction import (
+    BROWSER_AGGREGATES_SCRIPT, BROWSER_CAPTCHA_SCRIPT, BROWSER_MARK_SCRIPT, BROWSER_TRASH_SCRIPT
+)
+from UniversalWebshopScraper.generalized_scrapper.botleneck_testing.synthetic_pages import synthetic_listing_page
+
+HTML = """<html><body><ul><li class="card"><a href="/p/1?utm_source=x"><img srcset="/i/1.jpg 1x, /i/1b.jpg 2x"></a>
+<h2 class="title">Wireless Bluetooth Earbuds Pro</h2><div style="background-image: url(/b/1.png)">199,99 zł</div>
+</li></ul></body></html>"""
+
+# What BROWSER_AGGREGATES_SCRIPT returns for HTML: the <ul> and <li> are the only candidate blocks
+PAYLOAD = {
+    "strings": ["Wireless Bluetooth Earbuds Pro", "199,99 zł"],
+    "anchors": ["/p/1?utm_source=x"],
+    "images": [[1, "/i/1.jpg 1x, /i/1b.jpg 2x"], [5, "background-image: url(/b/1.png)"]],
+    "titled": [[0, 1]],
+    "blocks": [
+        ["ul", [], 3, -1, 0, 2, 0, 1, 0, 2, 0, 1, 0],
+        ["li", [["class", "card"]], 4, 0, 0, 2, 0, 1, 0, 2, 0, 1, 0],
+    ],
+}
+
+
+class FakeDriver:
+    """
+    Driver returning a recorded result of the injected script.
+    """
+    def __init__(self, result):
+        self.result = result
+        self.calls = []
+
+    def execute_script(self, script, *args):
+        self.calls.append((script, args))
+        return self.result
+
+
+def make_scraper(driver=None):
+    scraper = GeneralizedScraper(shopping_website="https://www.example.com", offline_mode=True)
+    scraper.driver = driver
+    scraper.detected_image_urls = set()
+    return scraper
+
+
+def test_browser_detection_matches_page_source_detection():
+    """
+    Products detected from the browser aggregates must be the same as the ones detected from the parsed page.
+    """
+    page_source = make_scraper()
+    page_source.detect_product_blocks(BeautifulSoup(HTML, "html.parser"))
+
+    in_browser = make_scraper(FakeDriver(json.dumps(PAYLOAD)))
+    in_browser.detect_product_blocks_in_browser()
+
+    assert in_browser.stored_products == page_source.stored_products
+    assert in_browser.parent_blocks == page_source.parent_blocks
+    assert in_browser.product_count == 1
+
+
+def test_trash_detection_in_browser():
+    scraper = make_scraper(FakeDriver(json.dumps(["Add to cart", "Free delivery"])))
+    scraper.trash_detection_in_browser()
+    assert scraper.wrong_titles == {"Add to cart", "Free delivery"}
+
+
+def test_incremental_detection_marks_detected_blocks():
+    """
+    The blocks detected by an incremental extraction are sent back to the page, blocks marked by an earlier
+    extraction are not reported again.
+    """
+    driver = FakeDriver(json.dumps(PAYLOAD))
+    scraper = make_scraper(driver)
+    scraper.detect_new_products_in_browser()
+    assert driver.calls[-1] == (BROWSER_MARK_SCRIPT, ([1],))
+
+    # Next extraction: the <ul> holding the first product is marked and its new content is not a new product
+    payload = dict(PAYLOAD, blocks=[PAYLOAD["blocks"][0][:-1] + [1]])
+    driver.result = json.dumps(payload)
+    scraper.detected_products.clear()
+    scraper.detected_image_urls.clear()
+    assert scraper.detect_new_products_in_browser() == []
+    assert scraper.product_count == 1
+
+
+class ScriptDriver(FakeDriver):
+    """
+    Driver answering every injected script with its own recorded result, page_source must not be read.
+    """
+    def __init__(self, results):
+        super().__init__(None)
+        self.results = results
+
+    @property
+    def page_source(self):
+        raise AssertionError("page_source was transferred")
+
+    def execute_script(self, script, *args):
+        self.calls.append((script, args))
+        return self.results[script]
+
+    def get(self, url):
+        pass
+
+
+def test_in_browser_pages_are_checked_for_captcha_without_page_source():
+    driver = ScriptDriver({BROWSER_CAPTCHA_SCRIPT: "", BROWSER_TRASH_SCRIPT: "[]",
+                           BROWSER_AGGREGATES_SCRIPT: json.dumps(PAYLOAD)})
+    scraper = make_scraper(driver)
+    scraper.scrape_page_in_browser(1, scroll_based=False, max_scrolls=0, url_template=None,
+                                   page_number_supported=False, use_block_templates=True, in_browser=True,
+                                   incremental=False)
+
+    assert scraper.product_count == 1
+    assert [script for script, _ in driver.calls][0] is BROWSER_CAPTCHA_SCRIPT
+
+    driver.results[BROWSER_CAPTCHA_SCRIPT] = '<div class="nc-container">\nPlease slide to verify'
+    assert scraper.detect_captcha_in_browser()[0] == "attribute"
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="node is not installed")
+@pytest.mark.parametrize("script", [BROWSER_AGGREGATES_SCRIPT, BROWSER_MARK_SCRIPT, BROWSER_TRASH_SCRIPT,
+                                    BROWSER_CAPTCHA_SCRIPT])
+def test_browser_scripts_compile(script, tmp_path):
+    # execute_script runs the script as the body of a function
+    path = tmp_path / "script.js"
+    path.write_text(f"(function () {{\n{script}\n}});\n", encoding="utf-8")
+    result = subprocess.run(["node", "--check", str(path)], capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+
+@pytest.fixture(scope="module")
+def chrome():
+    """Headless Chrome running the scripts for real, the tests are skipped without a browser."""
+    try:
+        from selenium import webdriver
+
+        options = webdriver.ChromeOptions()
+        for argument in ("--headless=new", "--no-sandbox", "--disable-dev-shm-usage"):
+            options.add_argument(argument)
+        driver = webdriver.Chrome(options=options)
+    except Exception as e:
+        pytest.skip(f"No headless Chrome available: {e}")
+    yield driver
+    driver.quit()
+
+
+def load(driver, html):
+    driver.get("about:blank")
+    driver.execute_script("document.open(); document.write(arguments[0]); document.close();", html)
+
+
+def test_browser_scripts_match_page_source_in_chrome(chrome):
+    html = synthetic_listing_page(20, seed=3)
+    page_source = make_scraper()
+    soup = BeautifulSoup(html, "html.parser")
+    page_source.trash_detection(soup)
+    page_source.detect_product_blocks(soup)
+
+    load(chrome, html)
+    in_browser = make_scraper(chrome)
+    in_browser.trash_detection_in_browser()
+    in_browser.detect_product_blocks_in_browser()
+
+    assert in_browser.wrong_titles == page_source.wrong_titles
+    assert in_browser.stored_products == page_source.stored_products
+    assert in_browser.detect_captcha_in_browser() is None
+
+    load(chrome, '<html><body><div id="nc-container"></div><p>Please slide to verify</p></body></html>')
+    assert in_browser.detect_captcha_in_browser() is not None
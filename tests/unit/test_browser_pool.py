@@ -0,0 +1,92 @@
+import os
+import pytest
+from UniversalWebshopScraper.generalized_scrapper.core.browser_pool import BrowserPool, prepare_profile_template
+
+
+class FakeDriver:
+    """
+    Driver recording its profile directory, writes a lock file there like a running Chrome.
+    """
+    def __init__(self, profile_dir):
+        self.profile_dir = profile_dir
+        self.closed = False
+        self.rss_mb = 100
+        self.js_heap_mb = 10
+        self.page_load_timeout = None
+        open(os.path.join(profile_dir, "SingletonLock"), "w").close()
+
+    def get(self, url):
+        with open(os.path.join(self.profile_dir, "Cookies"), "w") as file:
+            file.write(url)
+
+    def set_page_load_timeout(self, seconds):
+        self.page_load_timeout = seconds
+
+    def execute_cdp_cmd(self, cmd, params):
+        if cmd == "Performance.getMetrics":
+            return {"metrics": [{"name": "Nodes", "value": 100},
+                                {"name": "JSHeapUsedSize", "value": self.js_heap_mb * 1024 * 1024}]}
+        return {}
+
+    def quit(self):
+        self.closed = True
+
+
+def launch(profile_dir, parallel=True):
+    return FakeDriver(profile_dir)
+
+
+def make_pool(tmp_path, **kwargs):
+    template = prepare_profile_template(str(tmp_path / "template"), warm_url="https://www.example.com", launch=launch,
+                                        settle_seconds=0)
+    temp_root = tmp_path / "profiles"
+    temp_root.mkdir()
+    return BrowserPool(profile_template=template, launch=launch, memory_usage=lambda driver: driver.rss_mb,
+                       temp_root=str(temp_root), **kwargs)
+
+
+def test_drivers_start_from_the_warm_template(tmp_path):
+    with make_pool(tmp_path, size=3) as pool:
+        drivers = [pool.acquire(timeout=1) for _ in range(3)]
+        assert len({pooled.profile_dir for pooled in drivers}) == 3
+        for pooled in drivers:
+            with open(os.path.join(pooled.profile_dir, "Cookies")) as file:
+                assert file.read() == "https://www.example.com"
+            pool.release(pooled)
+    assert os.listdir(tmp_path / "profiles") == []  # Profile directories removed on close
+
+
+@pytest.mark.parametrize("pages, rss_mb, js_heap_mb, recycled", [
+    (9, 100, 10, False),
+    (10, 100, 10, True),  # Too many pages
+    (0, 2000, 10, True),  # Too much memory
+    (0, 100, 600, True),  # Too large JavaScript heap
+])
+def test_drivers_are_recycled(tmp_path, pages, rss_mb, js_heap_mb, recycled):
+    pool = make_pool(tmp_path, size=1, max_pages=10, max_rss_mb=1000, max_js_heap_mb=500).start()
+    with pool.lease() as pooled:
+        pooled.pages = pages
+        pooled.driver.rss_mb = rss_mb
+        pooled.driver.js_heap_mb = js_heap_mb
+
+    replacement = pool.acquire(timeout=1)
+    assert (replacement is not pooled) == recycled
+    assert pooled.driver.closed == recycled
+    assert os.path.exists(pooled.profile_dir) != recycled
+    assert pool.metrics()["recycles"] == int(recycled)
+    pool.close()
+
+
+def test_driver_raising_out_of_a_lease_is_replaced(tmp_path):
+    pool = make_pool(tmp_path, size=1, page_load_timeout=30).start()
+    with pytest.raises(TimeoutError):
+        with pool.lease() as pooled:
+            assert pooled.driver.page_load_timeout == 30
+            raise TimeoutError("page load timed out")
+
+    replacement = pool.acquire(timeout=1)
+    assert replacement is not pooled
+    assert pooled.driver.closed and not os.path.exists(pooled.profile_dir)
+    assert pool.metrics()["js_heap_mb"] == [10]
+    pool.release(replacement)
+    pool.close()
@@ -0,0 +1,95 @@
+import pytest
+
+from UniversalWebshopScraper.generalized_scrapper.core.captcha_detection import CaptchaDetected, detect_captcha
+from UniversalWebshopScraper.generalized_scrapper.core.functions import detect_captcha_detector
+from UniversalWebshopScraper.generalized_scrapper.core.generalized_scrapper import GeneralizedScraper
+from UniversalWebshopScraper.generalized_scrapper.botleneck_testing.synthetic_pages import synthetic_listing_page
+
+
+def page(body, head=""):
+    return f"<html><head><meta name='robots' content='index'>{head}</head><body>{body}</body></html>"
+
+
+@pytest.mark.parametrize("html, indicator", [
+    (page('<div id="px-captcha"></div>'), "attribute"),
+    (page('<div class="g-recaptcha" data-sitekey="x"></div>'), "attribute"),
+    (page("<div class=nc-container></div>"), "attribute"),
+    (page('<span id="nc_1_nocaptcha"></span>'), "attribute"),
+    (page('<div class="baxia-punish"></div>'), "attribute"),
+    (page('<div class="Arkose-challenge"></div>'), "attribute"),
+    (page('<iframe title="challenge" src="https://newassets.hcaptcha.com/captcha/v1"></iframe>'), "iframe"),
+    (page('<form method="post" action="/errors/validateCaptcha"><input></form>'), "form"),
+    (page("<p>Search</p>", '<script async src="https://www.google.com/recaptcha/api.js"></script>'), "script"),
+    (page("<p>Sorry, we have detected unusual traffic from your network.</p>"), "text"),
+    (page("<p>Please slide\n  to verify</p>"), "text"),
+    (page("<h1>Please prove you&#39;re not a robot</h1>"), "text"),
+])
+def test_indicators(html, indicator):
+    assert detect_captcha(html)[0] == indicator
+
+
+@pytest.mark.parametrize("html", [
+    synthetic_listing_page(20, seed=1),
+    # Messages in scripts, styles and comments are not text of the page
+    page("<p>Results</p><script>var messages = {blocked: 'unusual traffic'};</script>"),
+    page("<!-- prove you're not a robot --><style>.x:after{content:'Please slide to verify'}</style>"),
+    # Attributes that only contain the word in their name or in other attributes
+    page('<div data-id="captcha-free" title="no captcha here"></div>'),
+    "",
+])
+def test_pages_without_captcha(html):
+    assert detect_captcha(html) is None
+
+
+class FakeDriver:
+    current_url = "https://shop.test/s?k=tv"
+
+    def __init__(self, html):
+        self.page_source = html
+
+
+def test_scraper_scans_the_html_of_the_parsed_page():
+    scraper = GeneralizedScraper(offline_mode=True)
+    soup = scraper.parse_html(page('<div class="h-captcha"></div>'))
+    assert scraper.detect_captcha(soup) == ("attribute", 'class="h-captcha')
+    assert scraper.is_captcha_present(soup)
+    assert scraper.is_captcha_present()  # The last parsed page when there is no browser
+
+    # A soup the scraper did not parse itself
+    other = GeneralizedScraper(offline_mode=True).parse_html(page("<p>Results</p>"))
+    assert not scraper.is_captcha_present(other)
+
+    scraper.driver = FakeDriver(page("<p>unusual traffic</p>"))
+    assert scraper.detect_captcha()[0] == "text"
+
+
+def test_decorator_checks_the_browser_page(monkeypatch):
+    prompts = []
+    monkeypatch.setattr("builtins.input", prompts.append)
+
+    class Page:
+        def __init__(self, html):
+            self.driver = FakeDriver(html)
+
+        @detect_captcha_detector
+        def open(self):
+            return "opened"
+
+    assert Page(page("<p>Results</p>")).open() == "opened"
+    assert prompts == []
+    assert Page(page('<div id="captcha"></div>')).open() == "opened"
+    assert len(prompts) == 1
+
+
+def test_scraper_without_operator_raises_on_a_captcha(monkeypatch):
+    monkeypatch.setattr("builtins.input", lambda prompt: pytest.fail("No console in a worker process"))
+    scraper = GeneralizedScraper(offline_mode=True, prompt_captcha=False)
+    scraper.driver = FakeDriver(page('<div id="captcha"></div>'))
+
+    # A CAPTCHA on a later page of a search is handed back to the caller
+    with pytest.raises(CaptchaDetected, match="shop.test"):
+        scraper.scrape_page_in_browser(2, scroll_based=False, max_scrolls=0, url_template=None,
+                                       page_number_supported=False, use_block_templates=True, in_browser=False,
+                                       incremental=False)
+    with pytest.raises(CaptchaDetected):
+        scraper.open_search_url("https://shop.test/s?k=tv&p={page_number}")
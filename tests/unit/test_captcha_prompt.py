@@ -0,0 +1,59 @@
+import threading
+import time
+
+from UniversalWebshopScraper.generalized_scrapper.core.captcha_prompt import CaptchaPrompt
+
+
+class Operator:
+    """
+    Stands in for input: every prompt waits until the test presses Enter.
+    """
+    def __init__(self):
+        self.prompts = []
+        self.enter = threading.Semaphore(0)
+
+    def __call__(self, prompt):
+        self.prompts.append(prompt)
+        self.enter.acquire()
+        return ""
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_captchas_are_prompted_one_at_a_time_without_blocking():
+    operator = Operator()
+    prompt = CaptchaPrompt(read_line=operator)
+    prompt.report(0, "tv: oled")
+    prompt.report(2, "audio: speaker")
+
+    # The caller is not blocked while the operator works on the first CAPTCHA
+    wait_for(lambda: len(operator.prompts) == 1)
+    assert prompt.resolved() == []
+    assert prompt.waiting() == 1
+
+    operator.enter.release()
+    wait_for(lambda: len(operator.prompts) == 2)
+    operator.enter.release()
+    solved = []
+    wait_for(lambda: solved.extend(prompt.resolved()) or len(solved) == 2)
+    assert solved == [0, 2]
+
+
+def test_cancelled_captcha_is_not_prompted():
+    operator = Operator()
+    prompt = CaptchaPrompt(read_line=operator)
+    prompt.report(0)
+    wait_for(lambda: len(operator.prompts) == 1)
+    prompt.report(1)
+    prompt.cancel(1)  # Worker 1 exited
+    prompt.cancel(0)
+    operator.enter.release()
+
+    time.sleep(0.1)
+    assert prompt.resolved() == []
+    assert len(operator.prompts) == 1
@@ -0,0 +1,79 @@
+import os
+
+import pandas as pd
+import pytest
+
+from UniversalWebshopScraper.generalized_scrapper.core.dataset_writer import (
+    ProductDatasetWriter, convert_csv_tree, load_dataset, parse_price, to_record
+)
+
+
+PRODUCT = {
+    "Website": "https://www.shop.test",
+    "Product URL": "https://www.shop.test/item/1",
+    "Image URL": "https://img.shop.test/1.jpg",
+    "Price": "1,299.99",
+    "Currency": "$",
+    "Title": "Wireless headphones",
+    "All Links": "https://www.shop.test/item/1|https://www.shop.test/item/1?color=red",
+    "All Images": "https://img.shop.test/1.jpg",
+}
+
+
+@pytest.mark.parametrize("price, expected", [
+    ("1,299.99", 1299.99),
+    ("1.299,99", 1299.99),
+    ("12,50", 12.5),
+    ("49", 49.0),
+    (19.9, 19.9),
+    ("", None),
+    (None, None),
+    (float("nan"), None),
+])
+def test_parse_price(price, expected):
+    assert parse_price(price) == expected
+
+
+def test_record_has_typed_price_and_list_columns():
+    record = to_record(PRODUCT, query="headphones")
+
+    assert record["Price"] == 1299.99
+    assert record["All Links"] == ["https://www.shop.test/item/1", "https://www.shop.test/item/1?color=red"]
+    assert record["All Images"] == ["https://img.shop.test/1.jpg"]
+    assert record["Query"] == "headphones"
+    assert to_record({"All Links": float("nan")})["All Links"] == []  # Empty cell of a CSV file
+
+
+def test_rows_are_written_as_row_groups_of_partitioned_files(tmp_path):
+    pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    root = str(tmp_path / "dataset")
+    with ProductDatasetWriter(root, row_group_size=2) as writer:
+        writer.write("shop", "audio", [PRODUCT] * 2, query="headphones")  # A full row group
+        writer.write("shop", "audio", [PRODUCT], query="headphones")  # Written when the writer is closed
+        writer.write("shop", "video", [dict(PRODUCT, Price="20")], query="tv")
+        partition = tmp_path / "dataset" / "shop=shop" / "category=audio"
+        assert os.listdir(partition)[0].startswith(".")  # Not readable before the writer is closed
+
+    (audio_file,) = os.listdir(partition)
+    assert pq.ParquetFile(str(partition / audio_file)).num_row_groups == 2
+    products = load_dataset(root)
+    assert len(products) == writer.rows_written == 4
+    assert products["Price"].dtype == "float64"
+    assert isinstance(products["Currency"].dtype, pd.CategoricalDtype)
+    assert list(products["All Links"].iloc[0]) == PRODUCT["All Links"].split("|")
+    video = load_dataset(root, categories=["video"])
+    assert video["Price"].tolist() == [20.0] and video["Query"].tolist() == ["tv"]
+
+
+def test_csv_tree_is_converted(tmp_path):
+    pytest.importorskip("pyarrow")
+    directory = tmp_path / "csv" / "shop" / "audio"
+    directory.mkdir(parents=True)
+    pd.DataFrame([PRODUCT, PRODUCT]).to_csv(directory / "headphones.csv", index=False)
+
+    assert convert_csv_tree(str(tmp_path / "csv"), str(tmp_path / "dataset")) == 2
+    products = load_dataset(str(tmp_path / "dataset"), shops=["shop"])
+    assert products["Query"].tolist() == ["headphones", "headphones"]
+    assert products["Price"].tolist() == [1299.99, 1299.99]
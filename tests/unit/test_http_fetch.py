@@ -0,0 +1,97 @@
+from UniversalWebshopScraper.generalized_scrapper.core.generalized_scrapper import GeneralizedScraper
+from UniversalWebshopScraper.generalized_scrapper.core.http_fetch import HttpFetcher
+from UniversalWebshopScraper.generalized_scrapper.core.rate_control import RateController
+from UniversalWebshopScraper.generalized_scrapper.botleneck_testing.listing_server import ListingServer
+from UniversalWebshopScraper.generalized_scrapper.botleneck_testing.synthetic_pages import synthetic_listing_page
+
+
+class FakeDriver:
+    """
+    Browser showing a listing page whatever URL it opens.
+    """
+    def __init__(self, base_url):
+        self.current_url = base_url + "/"
+        self.page_source = synthetic_listing_page(20, seed=1)
+        self.urls = []
+
+    def get(self, url):
+        self.urls.append(url)
+        self.current_url = url
+
+    def get_cookies(self):
+        return [{"name": "session", "value": "browser", "domain": "127.0.0.1", "path": "/"}]
+
+    def execute_script(self, script, *args):
+        return "Mozilla/5.0 (Test browser)"
+
+
+def make_scraper(base_url, driver=None):
+    scraper = GeneralizedScraper(shopping_website=base_url, offline_mode=True, http_fetcher=HttpFetcher(),
+                                 rate_controller=RateController(initial_rate=1000, max_rate=1000, burst=1000))
+    scraper.driver = driver
+    scraper.detected_image_urls = set()
+    return scraper
+
+
+def test_http_fetch_mode_scrapes_without_the_browser():
+    with ListingServer(n_products=20) as server:
+        scraper = make_scraper(server.base_url)
+        scraper.scrape_all_products(url_template=server.base_url + "/listing?p={page_number}", max_pages=2,
+                                    fetch_mode="http")
+
+    assert scraper.product_count == 40
+    assert scraper.pages_loaded == 0  # The browser never loaded a page
+
+
+def test_blocked_response_falls_back_to_the_browser():
+    with ListingServer(n_products=20) as server:
+        driver = FakeDriver(server.base_url)
+        scraper = make_scraper(server.base_url, driver)
+        scraper.scrape_all_products(url_template=server.base_url + "/blocked?p={page_number}", max_pages=1,
+                                    fetch_mode="http")
+
+    assert driver.urls == [server.base_url + "/blocked?p=1"]
+    assert scraper.product_count == 20
+    assert scraper.http_fetcher.session.cookies.get("session") == "browser"
+    assert scraper.http_fetcher.session.headers["User-Agent"] == "Mozilla/5.0 (Test browser)"
+
+
+class RecordingRateController(RateController):
+    """
+    Rate controller remembering the page results it was told.
+    """
+    def __init__(self):
+        super().__init__(initial_rate=1000, max_rate=1000, burst=1000)
+        self.results = []
+
+    def record_success(self, domain):
+        self.results.append("success")
+        return super().record_success(domain)
+
+    def record_captcha(self, domain):
+        self.results.append("captcha")
+        return super().record_captcha(domain)
+
+
+def test_blocked_page_is_counted_once():
+    with ListingServer(n_products=20) as server:
+        scraper = make_scraper(server.base_url, FakeDriver(server.base_url))
+        scraper.rate_controller = RecordingRateController()
+        scraper.scrape_all_products(url_template=server.base_url + "/blocked?p={page_number}", max_pages=1,
+                                    fetch_mode="http")
+
+    # The 403 lowers the rate, the browser load of the same page is not counted again
+    assert scraper.rate_controller.results == ["captcha"]
+
+
+def test_empty_response_is_not_an_anti_bot_signal():
+    with ListingServer(n_products=20) as server:
+        driver = FakeDriver(server.base_url)
+        scraper = make_scraper(server.base_url, driver)
+        scraper.rate_controller = RecordingRateController()
+        # The home page is shorter than a listing page, the HTTP client rejects it as almost empty
+        scraper.scrape_all_products(url_template=server.base_url + "/?p={page_number}", max_pages=1,
+                                    fetch_mode="http")
+
+    assert driver.urls == [server.base_url + "/?p=1"]
+    assert scraper.rate_controller.results == ["success"]
@@ -0,0 +1,113 @@
+import pickle
+
+import pandas as pd
+
+from UniversalWebshopScraper.generalized_scrapper.checker.product_list_check import check_missing_products_in_ledger
+from UniversalWebshopScraper.generalized_scrapper.core.generalized_scrapper import GeneralizedScraper
+from UniversalWebshopScraper.generalized_scrapper.core.http_fetch import HttpFetcher
+from UniversalWebshopScraper.generalized_scrapper.core.job_ledger import (
+    DONE, FAILED, IN_PROGRESS, PENDING, JobLedger, SearchCheckpoint, partial_csv_path
+)
+from UniversalWebshopScraper.generalized_scrapper.core.rate_control import RateController
+from UniversalWebshopScraper.generalized_scrapper.botleneck_testing.listing_server import ListingServer
+
+
+def make_scraper(base_url):
+    scraper = GeneralizedScraper(shopping_website=base_url, offline_mode=True, http_fetcher=HttpFetcher(),
+                                 rate_controller=RateController(initial_rate=1000, max_rate=1000, burst=1000))
+    scraper.detected_image_urls = set()
+    return scraper
+
+
+def scrape(server, ledger, save_path, max_pages):
+    scraper = make_scraper(server.base_url)
+    checkpoint = SearchCheckpoint(ledger, "shop", "tv", "oled", save_path)
+    start_page = checkpoint.begin()
+    scraper.scrape_all_products(url_template=server.base_url + "/listing?p={page_number}", max_pages=max_pages,
+                                fetch_mode="http", start_page=start_page, on_page_done=checkpoint.page_done)
+    return checkpoint, start_page
+
+
+def test_interrupted_search_resumes_after_its_last_page(tmp_path):
+    ledger_path = str(tmp_path / "ledger.sqlite")
+    save_path = str(tmp_path / "oled.csv")
+
+    with ListingServer(n_products=20) as server:
+        # Uninterrupted run for reference
+        reference_ledger = JobLedger(str(tmp_path / "reference.sqlite"))
+        checkpoint, _ = scrape(server, reference_ledger, str(tmp_path / "reference.csv"), max_pages=4)
+        checkpoint.finish()
+        reference = pd.read_csv(tmp_path / "reference.csv")
+
+        # The run is killed after page 2, while the products of page 3 were being written
+        ledger = JobLedger(ledger_path)
+        ledger.add_search("shop", "tv", "oled")
+        scrape(server, ledger, save_path, max_pages=2)
+        with open(partial_csv_path(save_path), "a") as file:
+            file.write("Website,half a row of page 3")
+        ledger.close()
+
+        ledger = JobLedger(ledger_path)
+        assert ledger.unfinished_searches("shop") == [("tv", "oled")]
+        assert ledger.status("shop", "tv", "oled") == IN_PROGRESS
+        checkpoint, start_page = scrape(server, ledger, save_path, max_pages=4)
+        assert start_page == 3
+        assert checkpoint.finish()
+
+    resumed = pd.read_csv(save_path)
+    assert len(resumed) == 80
+    assert resumed["Product URL"].tolist() == reference["Product URL"].tolist()
+    assert ledger.status("shop", "tv", "oled") == DONE
+    assert ledger.summary("shop")[DONE]["rows"] == 80
+    assert ledger.unfinished_searches("shop") == []
+
+
+def test_plan_skips_done_searches_and_adopts_existing_csvs(tmp_path):
+    ledger = JobLedger(str(tmp_path / "ledger.sqlite"))
+    (tmp_path / "data" / "shop" / "tv").mkdir(parents=True)
+    (tmp_path / "data" / "shop" / "tv" / "lcd.csv").write_text("Website\n")
+
+    ledger.add_search("shop", "tv", "oled")
+    ledger.start_search("shop", "tv", "oled")
+    ledger.finish_search("shop", "tv", "oled", seconds=1.0)
+    ledger.add_search("shop", "audio", "speaker")
+    ledger.start_search("shop", "audio", "speaker")
+    ledger.fail_search("shop", "audio", "speaker", "timeout")
+
+    remaining = ledger.plan_searches("shop", {"tv": ["oled", "lcd", "qled"], "audio": ["speaker"]},
+                                     str(tmp_path / "data"))
+    assert remaining == {"tv": ["qled"], "audio": ["speaker"]}
+    assert ledger.status("shop", "tv", "lcd") == DONE
+    assert ledger.status("shop", "audio", "speaker") == FAILED
+    assert ledger.status("shop", "tv", "qled") == PENDING
+
+
+def test_missing_products_check_only_reads_the_ledger(tmp_path):
+    path = str(tmp_path / "ledger.sqlite")
+    ledger = JobLedger(path)
+    (tmp_path / "data" / "shop" / "tv").mkdir(parents=True)
+    (tmp_path / "data" / "shop" / "tv" / "lcd.csv").write_text("Website\n")
+    ledger.add_search("shop", "tv", "oled")
+    ledger.start_search("shop", "tv", "oled")
+    ledger.finish_search("shop", "tv", "oled", seconds=1.0)
+    ledger.add_search("shop", "audio", "speaker")
+    rows = ledger.connection.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+
+    missing = check_missing_products_in_ledger("shop", path, {"tv": ["oled", "lcd", "qled"], "audio": ["speaker"]},
+                                               str(tmp_path / "data"))
+    assert missing == {"tv": ["qled"], "audio": ["speaker"]}
+    assert ledger.connection.execute("SELECT COUNT(*) FROM jobs").fetchone()[0] == rows
+    assert ledger.status("shop", "tv", "lcd") is None
+
+
+def test_missing_partial_csv_starts_the_search_over(tmp_path):
+    ledger = JobLedger(str(tmp_path / "ledger.sqlite"))
+    save_path = str(tmp_path / "oled.csv")
+    ledger.start_search("shop", "tv", "oled")
+    ledger.page_done("shop", "tv", "oled", 1, rows=20, seconds=0.5, csv_offset=1000)
+
+    # The ledger is passed to worker processes
+    ledger = pickle.loads(pickle.dumps(ledger))
+    checkpoint = SearchCheckpoint(ledger, "shop", "tv", "oled", save_path)
+    assert checkpoint.begin() == 1
+    assert ledger.status("shop", "tv", "oled", page=1) is None
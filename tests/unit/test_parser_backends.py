@@ -0,0 +1,52 @@
+import pytest
+from UniversalWebshopScraper.generalized_scrapper.core.generalized_scrapper import GeneralizedScraper
+from UniversalWebshopScraper.generalized_scrapper.core.parser_backends import PARSER_BACKENDS, prune_html
+from UniversalWebshopScraper.generalized_scrapper.botleneck_testing.synthetic_pages import synthetic_listing_page
+
+
+@pytest.mark.parametrize("html_input, expected_output", [
+    ("<p>a<!-- comment --></p>", "<p>a</p>"),
+    ('<script src="x.js">var a = "<div>";</script>', '<script src="x.js"></script>'),
+    ("<STYLE type='text/css'>p {}</STYLE>", "<STYLE type='text/css'></STYLE>"),
+    ('<svg viewBox="0 0 1 1"><path d="M0"/></svg><svg/>', '<svg viewBox="0 0 1 1"></svg><svg/>'),
+])
+def test_prune_html(html_input, expected_output):
+    assert prune_html(html_input) == expected_output
+
+
+def detect(parser_backend, html):
+    scraper = GeneralizedScraper(shopping_website="https://www.example.com", offline_mode=True,
+                                 parser_backend=parser_backend)
+    scraper.detected_image_urls = set()
+    soup = scraper.parse_html(html)
+    scraper.trash_detection(soup)
+    scraper.detect_product_blocks(soup)
+    return scraper.stored_products
+
+
+@pytest.mark.parametrize("parser_backend", list(PARSER_BACKENDS))
+def test_backends_detect_same_products(parser_backend):
+    """
+    Every backend must give the same products as the unpruned html.parser tree.
+    """
+    html = synthetic_listing_page(40)
+    reference = GeneralizedScraper(shopping_website="https://www.example.com", offline_mode=True)
+    reference.parser_backend.prune = False
+
+    assert detect(parser_backend, html) == detect(reference.parser_backend, html)
+
+
+@pytest.mark.parametrize("parser_backend", list(PARSER_BACKENDS))
+def test_backends_keep_captcha_scripts(parser_backend):
+    """
+    Pruning the script content must keep the script tag visible to is_captcha_present.
+    """
+    scraper = GeneralizedScraper(offline_mode=True, parser_backend=parser_backend)
+    soup = scraper.parse_html('<html><head><script src="https://www.google.com/recaptcha/api.js">init();</script>'
+                              '</head><body><p>Search</p></body></html>')
+    assert scraper.is_captcha_present(soup)
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        GeneralizedScraper(offline_mode=True, parser_backend="regex")
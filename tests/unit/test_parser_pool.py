@@ -0,0 +1,122 @@
+import os
+import re
+from multiprocessing.shared_memory import SharedMemory
+
+import pytest
+
+from UniversalWebshopScraper.generalized_scrapper.core import parser_pool
+from UniversalWebshopScraper.generalized_scrapper.core.generalized_scrapper import GeneralizedScraper
+from UniversalWebshopScraper.generalized_scrapper.core.parser_pool import (
+    SHARED_MEMORY_MIN_BYTES, ParserPool, extract_products
+)
+from UniversalWebshopScraper.generalized_scrapper.core.rate_control import RateController
+from UniversalWebshopScraper.generalized_scrapper.core.url_dedup import SharedFingerprintSet
+from UniversalWebshopScraper.generalized_scrapper.botleneck_testing.synthetic_pages import synthetic_listing_page
+
+BASE_URL = "https://shop.test"
+
+
+class PagedDriver:
+    def __init__(self):
+        self.current_url = BASE_URL + "/"
+        self.page_source = ""
+
+    def get(self, url):
+        self.current_url = url
+        page = int(re.search(r"p=(\d+)", url).group(1))
+        self.page_source = synthetic_listing_page(20, seed=page, first_product=20 * (page - 1))
+
+
+def make_scraper():
+    scraper = GeneralizedScraper(shopping_website=BASE_URL, offline_mode=True,
+                                 rate_controller=RateController(initial_rate=1000, max_rate=1000, burst=1000))
+    scraper.driver = PagedDriver()
+    scraper.detected_image_urls = set()
+    return scraper
+
+
+def test_extract_products_matches_the_scraper():
+    html = synthetic_listing_page(20, seed=1)
+    scraper = make_scraper()
+    soup = scraper.parse_html(html)
+    scraper.trash_detection(soup)
+    scraper.detect_page_products(soup)
+
+    extraction = extract_products(html, BASE_URL)
+    assert extraction.rows == scraper.stored_products
+    assert len(set(extraction.product_urls)) == len(scraper.detected_products)
+    assert all(url in scraper.detected_products for url in extraction.product_urls)
+    assert extraction.wrong_titles == scraper.wrong_titles
+
+    # URLs known before the page are treated like the scraper's own dedup state
+    known_urls = {row["Product URL"] for row in extraction.rows[:5]}
+    seeded = make_scraper()
+    seeded.detected_products = set(known_urls)
+    soup = seeded.parse_html(html)
+    seeded.trash_detection(soup)
+    seeded.detect_page_products(soup)
+    known = extract_products(html, BASE_URL, known_products=known_urls)
+    assert known.rows == seeded.stored_products
+    assert len(known.rows) < len(extraction.rows)
+
+
+def test_browser_worker_parses_in_the_pool():
+    serial = make_scraper()
+    serial.scrape_all_products(url_template=BASE_URL + "/s?p={page_number}", max_pages=5)
+
+    products, images = SharedFingerprintSet(capacity=4096), SharedFingerprintSet(capacity=4096)
+    try:
+        with ParserPool(n_clients=1, n_processes=2, known_products=products, known_image_urls=images) as pool:
+            scraper = make_scraper()
+            scraper.detected_products, scraper.detected_image_urls = products, images
+            pages = []
+            scraper.scrape_all_products(url_template=BASE_URL + "/s?p={page_number}", max_pages=5,
+                                        parser_pool=pool.client(0),
+                                        on_page_done=lambda page, rows, seconds: pages.append((page, len(rows))))
+
+        assert scraper.stored_products == serial.stored_products
+        assert pages == [(page, 20) for page in range(1, 6)]
+        assert len(products) == len(serial.detected_products)
+    finally:
+        products.unlink()
+        images.unlink()
+
+
+def test_large_pages_go_through_shared_memory():
+    html = synthetic_listing_page(600, seed=2)
+    assert len(html.encode("utf-8")) >= SHARED_MEMORY_MIN_BYTES
+
+    with ParserPool(n_processes=1) as pool:
+        client = pool.client(0)
+        jobs = [client.submit(html, BASE_URL), client.submit(synthetic_listing_page(20, seed=3), BASE_URL)]
+        small = jobs[1].result()  # Results can be collected in any order
+        large = jobs[0].result()
+
+    assert len(large.rows) == 600
+    assert large.rows == extract_products(html, BASE_URL).rows
+    assert len(small.rows) == 20
+    assert client.shared_blocks == {}
+
+
+def test_page_of_a_dead_parser_times_out_and_the_parser_is_started_again(monkeypatch):
+    def crash_on_marked_pages(html, *args):
+        if "crash-the-parser" in html:
+            os._exit(1)
+        return extract_products(html, *args)
+
+    # Inherited by the forked parser processes
+    monkeypatch.setattr(parser_pool, "extract_products", crash_on_marked_pages)
+    html = "<!-- crash-the-parser -->" + synthetic_listing_page(600, seed=2)
+
+    with ParserPool(n_processes=1) as pool:
+        client = pool.client(0)
+        job = client.submit(html, BASE_URL)
+        block_name = client.shared_blocks[job.job_id].name
+        with pytest.raises(TimeoutError):
+            job.result(timeout=1)
+        assert client.shared_blocks == {}
+        with pytest.raises(FileNotFoundError):
+            SharedMemory(name=block_name)
+
+        assert pool.restart_dead() == 1
+        assert len(client.submit(synthetic_listing_page(20, seed=3), BASE_URL).result().rows) == 20
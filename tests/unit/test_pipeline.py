@@ -0,0 +1,77 @@
+import re
+import time
+
+import pytest
+
+from UniversalWebshopScraper.generalized_scrapper.core.captcha_detection import CaptchaDetected
+from UniversalWebshopScraper.generalized_scrapper.core.generalized_scrapper import GeneralizedScraper
+from UniversalWebshopScraper.generalized_scrapper.core.rate_control import RateController
+from UniversalWebshopScraper.generalized_scrapper.botleneck_testing.synthetic_pages import synthetic_listing_page
+
+
+class PagedDriver:
+    """
+    Browser showing page p of a synthetic search, the pages after last_page repeat it.
+    """
+    def __init__(self, last_page=99, load_seconds=0.0, captcha_page=None):
+        self.last_page = last_page
+        self.load_seconds = load_seconds
+        self.captcha_page = captcha_page
+        self.current_url = "https://shop.test/"
+        self.page_source = ""
+        self.urls = []
+
+    def get(self, url):
+        time.sleep(self.load_seconds)
+        self.urls.append(url)
+        self.current_url = url
+        page = min(int(re.search(r"p=(\d+)", url).group(1)), self.last_page)
+        self.page_source = synthetic_listing_page(20, seed=page, first_product=20 * (page - 1))
+        if page == self.captcha_page:
+            self.page_source = '<html><body><div class="g-recaptcha" data-sitekey="x"></div></body></html>'
+
+
+def scrape(driver, pipelined, max_pages):
+    scraper = GeneralizedScraper(shopping_website="https://shop.test", offline_mode=True,
+                                 rate_controller=RateController(initial_rate=1000, max_rate=1000, burst=1000))
+    scraper.driver = driver
+    scraper.detected_image_urls = set()
+    pages = []
+    scraper.scrape_all_products(url_template="https://shop.test/s?p={page_number}", max_pages=max_pages,
+                                pipelined=pipelined,
+                                on_page_done=lambda page, products, seconds: pages.append((page, len(products))))
+    return scraper, pages
+
+
+def test_pipelined_scrape_matches_the_serial_one():
+    serial, serial_pages = scrape(PagedDriver(), pipelined=False, max_pages=5)
+    pipelined, pipelined_pages = scrape(PagedDriver(), pipelined=True, max_pages=5)
+
+    assert pipelined.stored_products == serial.stored_products
+    assert pipelined_pages == serial_pages == [(page, 20) for page in range(1, 6)]
+
+
+def test_pipelined_scrape_stops_one_page_after_the_last_products():
+    serial, serial_pages = scrape(PagedDriver(last_page=4), pipelined=False, max_pages=10)
+    driver = PagedDriver(last_page=4)
+    pipelined, pipelined_pages = scrape(driver, pipelined=True, max_pages=10)
+
+    assert serial_pages == [(1, 20), (2, 20), (3, 20), (4, 20), (5, 0)]
+    # Page 6 was loaded while page 5 was parsed
+    assert pipelined_pages == serial_pages + [(6, 0)]
+    assert len(driver.urls) == 6
+    assert pipelined.stored_products == serial.stored_products
+
+
+def test_page_parsed_during_a_failed_load_is_reported_before_the_error():
+    pages = []
+    scraper = GeneralizedScraper(shopping_website="https://shop.test", offline_mode=True, prompt_captcha=False,
+                                 rate_controller=RateController(initial_rate=1000, max_rate=1000, burst=1000))
+    scraper.driver = PagedDriver(captcha_page=2)
+    scraper.detected_image_urls = set()
+    with pytest.raises(CaptchaDetected):
+        scraper.scrape_all_products(url_template="https://shop.test/s?p={page_number}", max_pages=5, pipelined=True,
+                                    on_page_done=lambda page, products, seconds: pages.append((page, len(products))))
+    # Page 1 was parsed while page 2 showed the CAPTCHA, a retry resumes at page 2
+    assert pages == [(1, 20)]
+    assert len(scraper.stored_products) == 20
@@ -0,0 +1,77 @@
+import pickle
+
+import pytest
+
+from UniversalWebshopScraper.generalized_scrapper.core.generalized_scrapper import GeneralizedScraper
+from UniversalWebshopScraper.generalized_scrapper.core.product_catalog import (
+    CHANGED, NEW, UNCHANGED, PageSaturation, ProductCatalog, canonical_product_url
+)
+
+
+def product(i, price="10.00", title=None):
+    return {"Website": "https://www.shop.test", "Product URL": f"https://www.shop.test/item/{i}?utm_source=x",
+            "Image URL": f"https://img.shop.test/{i}.jpg", "Price": price, "Currency": "$",
+            "Title": title or f"Product {i}", "All Links": "", "All Images": ""}
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("https://www.Shop.test/item/1/?utm_source=mail&color=red#reviews", "https://shop.test/item/1?color=red"),
+    ("https://www.amazon.com/Headphones/dp/B0ABC/ref=sr_1_3?keywords=x&qid=1&th=1",
+     "https://amazon.com/Headphones/dp/B0ABC"),
+    ("https://www.ebay.com/itm/1234?hash=item1&_trkparms=a&var=5", "https://ebay.com/itm/1234?var=5"),
+    ("https://shop.test/p?b=2&a=1", "https://shop.test/p?a=1&b=2"),
+])
+def test_canonical_product_url(url, expected):
+    assert canonical_product_url(url) == expected
+
+
+def test_upsert_reports_new_changed_and_unchanged_products(tmp_path):
+    catalog = ProductCatalog(str(tmp_path / "catalog.sqlite"))
+
+    assert catalog.upsert("shop.test", [product(1), product(2)], now=100) == [NEW, NEW]
+    assert catalog.upsert("shop.test", [product(1), product(2, price="8,50"), product(3)], now=200) == \
+        [UNCHANGED, CHANGED, NEW]
+    assert catalog.upsert("shop.test", [product(1, title="Renamed")], now=300) == [CHANGED]
+
+    row = catalog.product("https://shop.test/item/2")
+    assert (row["price"], row["first_seen"], row["last_changed"], row["seen_count"]) == (8.5, 100, 200, 2)
+    assert catalog.product("https://shop.test/item/1")["last_seen"] == 300
+    changes = catalog.changes(since=2)
+    assert [(change["field"], change["old_value"], change["new_value"]) for change in changes] == [
+        ("price", "10.0", "8.5"), (NEW, None, "10.0"), ("title", "Product 1", "Renamed")]
+    assert catalog.summary("shop.test", since=200) == {"products": 3, NEW: 1, "price": 1, "currency": 0, "title": 1}
+    catalog.close()
+
+
+def test_change_feed_is_read_incrementally_per_shop(tmp_path):
+    catalog = ProductCatalog(str(tmp_path / "catalog.sqlite"))
+    catalog.upsert("a.test", [product(1)])
+    catalog.upsert("b.test", [dict(product(2), **{"Product URL": "https://b.test/item/2"})])
+
+    first = catalog.changes(shop="a.test")
+    assert [change["url"] for change in first] == ["https://shop.test/item/1"]
+    assert catalog.changes(since=first[-1]["id"], shop="a.test") == []
+    assert len(catalog.changes(limit=1)) == 1
+
+
+def test_catalog_is_shared_with_worker_processes(tmp_path):
+    catalog = ProductCatalog(str(tmp_path / "catalog.sqlite"))
+    catalog.upsert("shop.test", [product(1)])
+
+    copy = pickle.loads(pickle.dumps(catalog))
+    assert copy.upsert("shop.test", [product(1)]) == [UNCHANGED]
+
+
+def test_search_stops_after_saturated_pages(tmp_path):
+    saturation = PageSaturation(threshold=0.9, pages=2)
+    assert not saturation.page_done([UNCHANGED] * 9 + [NEW])
+    assert not saturation.page_done([UNCHANGED] * 8 + [NEW, CHANGED])  # Starts over
+    assert not saturation.page_done([UNCHANGED] * 10)
+    assert saturation.page_done([UNCHANGED] * 10)
+
+    catalog = ProductCatalog(str(tmp_path / "catalog.sqlite"))
+    scraper = GeneralizedScraper(shopping_website="https://www.shop.test", offline_mode=True, catalog=catalog)
+    pages = [[product(i) for i in range(5)], [product(i) for i in range(5, 10)]]
+    assert not any(scraper.page_saturated(page) for page in pages)  # First run, everything is new
+    scraper.saturation.reset()
+    assert [scraper.page_saturated(page) for page in pages] == [False, True]  # Next run
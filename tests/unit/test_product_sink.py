@@ -0,0 +1,225 @@
+import json
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from UniversalWebshopScraper.generalized_scrapper.core.generalized_scrapper import GeneralizedScraper
+from UniversalWebshopScraper.generalized_scrapper.core.http_fetch import HttpFetcher
+from UniversalWebshopScraper.generalized_scrapper.core.job_ledger import JobLedger, SearchCheckpoint
+from UniversalWebshopScraper.generalized_scrapper.core.product_sink import (
+    PRODUCT_COLUMNS, CsvBackend, JsonLinesBackend, ProductSink, SinkBackend, make_backend
+)
+from UniversalWebshopScraper.generalized_scrapper.core.rate_control import RateController
+from UniversalWebshopScraper.generalized_scrapper.botleneck_testing.listing_server import ListingServer
+
+DESTINATION = ("shop", "audio", "headphones")
+
+
+def product(i):
+    return {"Website": "https://www.shop.test", "Product URL": f"https://www.shop.test/item/{i}",
+            "Image URL": f"https://img.shop.test/{i}.jpg", "Price": "12,50", "Currency": "zł",
+            "Title": f"Product, \"quoted\" {i}", "All Links": f"https://www.shop.test/item/{i}",
+            "All Images": f"https://img.shop.test/{i}.jpg"}
+
+
+class RecordingBackend(SinkBackend):
+    def __init__(self, delay=0.0, fail=False):
+        super().__init__("unused", "txt")
+        self.batches = []
+        self.delay = delay
+        self.fail = fail
+        self.closed = False
+
+    def write(self, destination, products, page=None):
+        time.sleep(self.delay)
+        if self.fail:
+            raise OSError("disk full")
+        self.batches.append((destination, [p["Product URL"] for p in products]))
+
+    def close(self):
+        self.closed = True
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_full_batch_is_written_in_the_background():
+    backend = RecordingBackend()
+    sink = ProductSink(backend, batch_size=3, flush_interval=60)
+    sink.put_many(DESTINATION, [product(0), product(1)])
+    time.sleep(0.1)
+    assert backend.batches == []  # Below the batch size and the interval
+    sink.put(DESTINATION, product(2))
+    wait_until(lambda: backend.batches)
+    assert backend.batches == [(DESTINATION, [product(i)["Product URL"] for i in range(3)])]
+    sink.close()
+    assert backend.closed
+
+
+def test_buffered_products_are_written_after_the_interval_and_on_close():
+    backend = RecordingBackend()
+    sink = ProductSink(backend, batch_size=100, flush_interval=0.05)
+    sink.put(DESTINATION, product(0))
+    wait_until(lambda: backend.batches)
+    sink.put(("shop", "video", "tv"), product(1))
+    sink.close()
+    assert [destination for destination, _ in backend.batches] == [DESTINATION, ("shop", "video", "tv")]
+    assert sink.metrics()["written"] == 2
+    with pytest.raises(RuntimeError):
+        sink.put(DESTINATION, product(2))
+
+
+def test_full_buffer_makes_the_producer_write():
+    backend = RecordingBackend(delay=0.05)
+    sink = ProductSink(backend, batch_size=2, flush_interval=60, max_buffered=4)
+    for i in range(40):
+        sink.put(DESTINATION, product(i))
+        assert len(sink.buffer) <= 4
+    sink.close()
+    written = [url for _, urls in backend.batches for url in urls]
+    assert written == [product(i)["Product URL"] for i in range(40)]  # In order, across both writers
+
+
+def test_failed_write_is_counted_and_does_not_stop_the_sink():
+    sink = ProductSink(RecordingBackend(fail=True), batch_size=1, flush_interval=60)
+    sink.put(DESTINATION, product(0))
+    sink.close()
+    assert sink.metrics()["dropped"] == 1
+    assert not sink.thread.is_alive()
+
+
+def test_csv_files_have_one_header_and_the_columns_of_store_product(tmp_path):
+    with ProductSink(CsvBackend(str(tmp_path)), batch_size=2) as sink:
+        sink.put_many(DESTINATION, [product(i) for i in range(5)])
+    path = tmp_path / "shop" / "audio" / "headphones.csv"
+    products = pd.read_csv(path, dtype=str)
+    assert list(products.columns) == PRODUCT_COLUMNS
+    assert products["Title"].tolist() == [product(i)["Title"] for i in range(5)]
+
+    with ProductSink(CsvBackend(str(tmp_path))) as sink:
+        sink.begin(DESTINATION)  # The search runs again
+        sink.put(DESTINATION, product(9))
+    assert pd.read_csv(path, dtype=str)["Product URL"].tolist() == [product(9)["Product URL"]]
+
+
+def test_json_lines_backend(tmp_path):
+    with ProductSink(make_backend("jsonl", str(tmp_path))) as sink:
+        sink.put_many(DESTINATION, [product(0), product(1)])
+    lines = (tmp_path / "shop" / "audio" / "headphones.jsonl").read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line) for line in lines] == [product(0), product(1)]
+    with pytest.raises(ValueError):
+        make_backend("xml", str(tmp_path))
+
+
+def test_scraper_streams_its_products_and_keeps_only_the_current_page():
+    backend = RecordingBackend()
+    sink = ProductSink(backend, batch_size=1000)
+    scraper = GeneralizedScraper(shopping_website="https://www.shop.test", offline_mode=True, product_sink=sink)
+    scraper.sink_destination = DESTINATION
+    scraper.store_product("https://www.shop.test/item/1", "https://img.shop.test/1.jpg", "10.00", "$", "A",
+                          ["https://www.shop.test/item/1"], ["https://img.shop.test/1.jpg"])
+    assert len(scraper.stored_products) == 1
+    scraper.release_page_products()
+    assert scraper.stored_products == []
+    sink.close()
+    assert backend.batches == [(DESTINATION, ["https://www.shop.test/item/1"])]
+
+
+def test_close_runs_once_from_several_threads():
+    backend = RecordingBackend()
+    sink = ProductSink(backend)
+    sink.put(DESTINATION, product(0))
+    threads = [threading.Thread(target=sink.close) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(backend.batches) == 1
+
+
+def test_parquet_backend_writes_the_dataset_on_close(tmp_path):
+    pytest.importorskip("pyarrow")
+    from UniversalWebshopScraper.generalized_scrapper.core.dataset_writer import load_dataset
+
+    with ProductSink(make_backend("parquet", str(tmp_path), row_group_size=2)) as sink:
+        sink.put_many(DESTINATION, [product(i) for i in range(3)])
+    products = load_dataset(str(tmp_path))
+    assert products["Query"].tolist() == ["headphones"] * 3
+    assert products["Price"].tolist() == [12.5] * 3
+
+
+def test_parquet_rows_are_readable_after_a_flush_and_replaced_by_a_retry(tmp_path):
+    pytest.importorskip("pyarrow")
+    from UniversalWebshopScraper.generalized_scrapper.core.dataset_writer import load_dataset
+
+    sink = ProductSink(make_backend("parquet", str(tmp_path)), flush_interval=60)
+    other = ("shop", "audio", "headphones wireless")
+    sink.begin(DESTINATION)
+    sink.put_many(DESTINATION, [product(i) for i in range(3)])
+    sink.put_many(other, [product(9)])
+    sink.flush()
+    # On disk without closing the sink, e.g. for a worker that is killed now
+    assert len(load_dataset(str(tmp_path))) == 4
+
+    # The search is run again from a new sink: the rows of the first attempt are replaced, the other search's kept
+    retry = ProductSink(make_backend("parquet", str(tmp_path)), flush_interval=60)
+    retry.begin(DESTINATION)
+    retry.put_many(DESTINATION, [product(i) for i in range(2)])
+    retry.close()
+    sink.close()
+    products = load_dataset(str(tmp_path))
+    assert sorted(products["Query"].tolist()) == ["headphones"] * 2 + ["headphones wireless"]
+
+
+def test_resumed_search_keeps_the_parquet_rows_of_the_pages_before_its_start_page(tmp_path):
+    pytest.importorskip("pyarrow")
+    from UniversalWebshopScraper.generalized_scrapper.core.dataset_writer import load_dataset
+
+    ledger = JobLedger(str(tmp_path / "ledger.sqlite"))
+    destination = ("shop", "tv", "oled")
+
+    def scrape(server, max_pages, recorded_pages):
+        sink = ProductSink(make_backend("parquet", str(tmp_path / "dataset")), flush_interval=60)
+        scraper = GeneralizedScraper(shopping_website=server.base_url, offline_mode=True, http_fetcher=HttpFetcher(),
+                                     rate_controller=RateController(initial_rate=1000, max_rate=1000, burst=1000),
+                                     product_sink=sink)
+        scraper.detected_image_urls = set()
+        checkpoint = SearchCheckpoint(ledger, *destination, str(tmp_path / "oled.csv"))
+        start_page = checkpoint.begin()
+        scraper.sink_destination = destination
+        sink.begin(destination, first_page=start_page)
+
+        def page_done(page, products, seconds):
+            if page <= recorded_pages:
+                checkpoint.page_done(page, products, seconds)
+
+        scraper.scrape_all_products(url_template=server.base_url + "/listing?p={page_number}", max_pages=max_pages,
+                                    fetch_mode="http", start_page=start_page, on_page_done=page_done)
+        sink.flush()
+        return checkpoint, start_page, sink
+
+    with ListingServer(n_products=20) as server:
+        # The worker is killed once the rows of page 3 are written, before the ledger records the page
+        _, _, crashed = scrape(server, max_pages=3, recorded_pages=2)
+        checkpoint, start_page, sink = scrape(server, max_pages=4, recorded_pages=4)
+        sink.close()
+        crashed.close()
+
+    assert start_page == 3
+    products = load_dataset(str(tmp_path / "dataset"))
+    assert len(products) == 80
+    assert products["Product URL"].nunique() == 80
+
+
+def test_written_rows_are_counted_per_successful_write():
+    sink = ProductSink([RecordingBackend(), RecordingBackend(fail=True)], flush_interval=60)
+    sink.put_many(DESTINATION, [product(i) for i in range(3)])
+    sink.close()
+    assert sink.metrics()["written"] == 3
+    assert sink.metrics()["dropped"] == 3
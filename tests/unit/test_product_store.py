@@ -0,0 +1,121 @@
+import pickle
+
+import pandas as pd
+import pytest
+
+from UniversalWebshopScraper.generalized_scrapper.core.generalized_scrapper import GeneralizedScraper
+from UniversalWebshopScraper.generalized_scrapper.core.product_store import COLUMNS, ProductStore
+
+
+def product(i, **fields):
+    links = [f"https://www.shop.test/item/{i}?spm=a.{v}" for v in range(2)]
+    images = [f"https://img.shop.test/{i}-{v}.jpg" for v in range(3)]
+    row = {"Website": "https://www.shop.test", "Product URL": links[0], "Image URL": images[0],
+           "Price": f"{i % 7}.99", "Currency": "$", "Title": f"Product {i} wireless",
+           "All Links": "|".join(links), "All Images": "|".join(images)}
+    row.update(fields)
+    return row
+
+
+def test_store_behaves_like_the_list_of_products():
+    products = [product(1), product(2, Title=None, **{"Image URL": None}), product(3, **{"All Links": ""}),
+                product(4, **{"Product URL": "https://www.shop.test/other/4", "Currency": "€"}),
+                product(5, Title="Écouteurs sans fil ☃")]
+    store = ProductStore(products)
+
+    assert len(store) == 5
+    assert store == products and products == store
+    assert list(store) == products
+    assert store[-1] == products[-1]
+    assert store[1:4] == products[1:4]
+    with pytest.raises(IndexError):
+        store[5]
+
+    store.append(product(6))
+    assert store[5] == product(6)
+    store.clear()
+    assert store == [] and len(store) == 0
+
+
+def test_repeated_values_are_interned_and_urls_stored_once():
+    store = ProductStore(product(i) for i in range(100))
+
+    assert store.websites.values == ["https://www.shop.test"]
+    assert store.currencies.values == ["$"]
+    assert len(store.prices.values) == 7
+    # The product and image URLs are the first link and image, 2 links + 3 images + 1 title per product
+    assert len(store.text_offsets) - 1 == 100 * 6
+    assert store.nbytes() < len(pickle.dumps([product(i) for i in range(100)]))
+
+
+def test_to_dataframe_matches_the_dicts():
+    products = [product(i) for i in range(20)] + [product(20, Title=None)]
+    frame = ProductStore(products).to_dataframe()
+
+    assert list(frame.columns) == COLUMNS
+    assert isinstance(frame["Currency"].dtype, pd.CategoricalDtype)
+    expected = pd.DataFrame(products)
+    pd.testing.assert_frame_equal(frame.astype(object).where(frame.notna(), None),
+                                  expected.astype(object).where(expected.notna(), None))
+
+
+def test_missing_interned_values(tmp_path):
+    products = [product(1), product(2, Website=None, Price=None, Currency=None), product(3, Price=float("nan"))]
+    store = ProductStore(products)
+
+    assert store[1]["Website"] is None and store[1]["Price"] is None and store[1]["Currency"] is None
+    assert store[2]["Price"] is None
+    frame = store.to_dataframe()
+    assert frame["Website"].isna().tolist() == [False, True, False]
+    assert frame["Price"].isna().tolist() == [False, True, True]
+
+    path = tmp_path / "products.csv"
+    store.to_csv(str(path))
+    saved = pd.read_csv(path, dtype=str)
+    assert saved.to_dict("records") == frame.astype(object).to_dict("records")
+
+
+def test_scraper_without_website_saves_its_products(tmp_path):
+    scraper = GeneralizedScraper(offline_mode=True)
+    scraper.stored_products.append(product(1, Website=None, Price=None, Currency=None))
+
+    path = tmp_path / "products.csv"
+    scraper.save_to_csv(str(path))
+    saved = pd.read_csv(path, dtype=str)
+    assert len(saved) == 1
+    assert saved["Title"].tolist() == ["Product 1 wireless"]
+    assert saved[["Website", "Price", "Currency"]].isna().all(axis=None)
+
+
+def test_to_arrow_shares_the_buffers():
+    pa = pytest.importorskip("pyarrow")
+    products = [product(i) for i in range(10)] + [product(10, **{"Image URL": None})]
+    store = ProductStore(products)
+
+    table = store.to_arrow()
+    assert table.column("Title").type == pa.dictionary(pa.int32(), pa.string())
+    assert table.column("All Images").type == pa.list_(pa.dictionary(pa.int32(), pa.string()))
+    rows = table.to_pylist()
+    assert rows[10]["Image URL"] is None
+    assert table.to_pylist() == [dict(row, **{"All Links": row["All Links"].split("|"),
+                                              "All Images": row["All Images"].split("|")})
+                                 for row in products]
+    assert store.to_arrow(joined=True).to_pylist() == products
+    assert rows[3]["Title"] == products[3]["Title"]
+    assert rows[3]["All Links"] == products[3]["All Links"].split("|")
+    assert table.column("Title").chunk(0).dictionary.buffers()[2].address == \
+        pa.py_buffer(store.text_data).address
+
+
+def test_scraper_saves_the_store_to_csv(tmp_path):
+    scraper = GeneralizedScraper(offline_mode=True)
+    scraper.shopping_website = "https://www.shop.test"
+    scraper.store_product("https://www.shop.test/item/1", "https://img.shop.test/1.jpg", "9.99", "$", "Product 1",
+                          ["https://www.shop.test/item/1", "https://www.shop.test/item/1b"],
+                          ["https://img.shop.test/1.jpg"])
+
+    assert isinstance(scraper.stored_products, ProductStore)
+    path = tmp_path / "products.csv"
+    scraper.save_to_csv(str(path))
+    saved = pd.read_csv(path, dtype=str)
+    assert saved.to_dict("records") == list(scraper.stored_products)
@@ -0,0 +1,59 @@
+import pytest
+from UniversalWebshopScraper.generalized_scrapper.core.rate_control import (
+    CAPTCHA_DECREASE, RATE_INCREASE, RateController
+)
+
+
+class FakeClock:
+    """
+    Clock advanced by the controller's sleeps.
+    """
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def make_controller(**kwargs):
+    clock = FakeClock()
+    return RateController(clock=clock, sleep=clock.sleep, **kwargs), clock
+
+
+def test_acquire_paces_page_loads(monkeypatch):
+    monkeypatch.setattr("random.uniform", lambda low, high: 1.0)  # No jitter
+    controller, clock = make_controller(initial_rate=0.5)
+
+    assert controller.acquire("example.com") == 0  # The bucket starts full
+    load_times = []
+    for _ in range(3):
+        controller.acquire("example.com")
+        load_times.append(clock.now)
+    assert load_times == [2.0, 4.0, 6.0]
+
+    # Another domain has its own bucket
+    assert controller.acquire("other.com") == 0
+
+
+def test_aimd_rate_updates():
+    controller, _ = make_controller(initial_rate=1.0, min_rate=0.1, max_rate=1.2)
+
+    assert controller.record_success("example.com") == pytest.approx(1.0 + RATE_INCREASE)
+    assert controller.record_captcha("example.com") == pytest.approx((1.0 + RATE_INCREASE) * CAPTCHA_DECREASE)
+    for _ in range(10):
+        controller.record_captcha("example.com")
+    assert controller.rate("example.com") == 0.1
+    for _ in range(100):
+        controller.record_success("example.com")
+    assert controller.metrics() == {"example.com": 1.2}
+
+
+def test_captcha_drains_the_bucket():
+    controller, clock = make_controller(initial_rate=1.0, burst=3)
+    clock.now = 100.0
+    controller.record_captcha("example.com")
+    # The full bucket is emptied, the next page waits for a token at the lowered rate
+    assert controller.acquire("example.com") > 0
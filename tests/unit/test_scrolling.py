@@ -0,0 +1,50 @@
+import pytest
+from UniversalWebshopScraper.generalized_scrapper.core.generalized_scrapper import GeneralizedScraper
+from UniversalWebshopScraper.generalized_scrapper.core.scrolling import SCROLL_STEP_SCRIPT, ScrollBudget
+
+
+class FakeScrollingPage:
+    """
+    Driver of a page that loads more content on the first `loads` scrolls and is `length` scrolls long.
+    """
+    def __init__(self, loads, length):
+        self.loads = loads
+        self.length = length
+        self.scrolls = 0
+
+    def execute_script(self, script, *args):
+        if script == SCROLL_STEP_SCRIPT:
+            self.scrolls += 1
+            return self.scrolls >= max(self.loads, self.length)
+        loaded = min(self.scrolls, self.loads)
+        return [1000 + 2400 * loaded, 100 + 10 * loaded, 10 * loaded, loaded]
+
+
+def scroll(page, history=()):
+    scraper = GeneralizedScraper(shopping_website="https://www.example.com", offline_mode=True)
+    scraper.driver = page
+    for productive_scrolls in history:
+        scraper.scroll_budget.record("example.com", productive_scrolls)
+    scraper.incremental_scroll_with_html_check(max_scrolls=20, scroll_pause_time=0.02)
+    return scraper
+
+
+@pytest.mark.parametrize("loads, length, history, expected_scrolls", [
+    (3, 0, (), 4),  # Stops at the bottom on the first scroll that loads nothing
+    (1, 8, (3,), 5),  # A long static page stops once the learned budget (3 + 2) is used
+    (6, 0, (1,), 7),  # A page still growing is scrolled past the budget
+])
+def test_scroll_termination(loads, length, history, expected_scrolls):
+    page = FakeScrollingPage(loads, length)
+    scraper = scroll(page, history)
+    assert page.scrolls == expected_scrolls
+    assert scraper.scroll_budget.productive_scrolls["example.com"][-1] == loads
+
+
+def test_scroll_budget():
+    budget = ScrollBudget(margin=2)
+    assert budget.budget("example.com", 20) == 20
+    budget.record("example.com", 3)
+    budget.record("example.com", 5)
+    assert budget.budget("example.com", 20) == 7
+    assert budget.budget("example.com", 6) == 6
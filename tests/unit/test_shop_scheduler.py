@@ -0,0 +1,93 @@
+import pytest
+
+from UniversalWebshopScraper.generalized_scrapper.botleneck_testing.benchmark_shop_scheduler import ideal_seconds, simulate
+from UniversalWebshopScraper.generalized_scrapper.core.shop_scheduler import ShopScheduler
+
+
+def scheduler_with(tasks, n_workers=4, concurrency=None):
+    scheduler = ShopScheduler(list(tasks), n_workers, concurrency=concurrency or {shop: 2 for shop in tasks})
+    scheduler.assign({(shop, "all"): shop_tasks for shop, shop_tasks in tasks.items()})
+    return scheduler
+
+
+def test_free_workers_go_to_the_largest_backlog_within_the_concurrency_limits():
+    scheduler = scheduler_with({"a": ["a1", "a2", "a3", "a4", "a5", "a6"], "b": ["b1", "b2"]})
+
+    assert scheduler.get(0) == ("a1", False)  # a: 6 queued, b: 2 queued
+    assert scheduler.get(1) == ("a2", False)  # a: 5 per 2 workers, b: 2 per worker
+    assert scheduler.get(2) == ("b1", False)  # a is at its limit of 2
+    assert scheduler.get(3) == ("b2", False)
+    scheduler.task_done(3)
+    assert scheduler.get(3) is None  # b is empty and a still at its limit
+    scheduler.task_done(2)
+    scheduler.task_done(0)
+    assert scheduler.get(2) == ("a3", True)  # Moved over from b
+    assert scheduler.metrics()["a"] == {"queued": 3, "running": 2, "concurrency": 2}
+
+
+def test_worker_stays_on_its_shop_while_it_has_room():
+    scheduler = scheduler_with({"a": ["a1", "a2"], "b": ["b1", "b2", "b3", "b4"]})
+
+    assert scheduler.get(0) == ("b1", False)
+    scheduler.task_done(0)
+    assert scheduler.get(1) == ("b2", False)
+    assert scheduler.get(0) == ("b3", False)  # b still has room, though a has more work per running worker
+    assert scheduler.get(2) == ("a1", False)
+
+
+def test_captcha_halves_the_concurrency_of_its_shop_until_tasks_finish():
+    scheduler = scheduler_with({"a": [f"a{i}" for i in range(10)]}, concurrency={"a": 4})
+
+    scheduler.get(0)
+    scheduler.park(0)
+    assert scheduler.metrics()["a"]["concurrency"] == 2
+    scheduler.get(1)
+    assert scheduler.get(2) is None  # Two running, the lowered limit
+    scheduler.unpark(0)
+    for worker_index in (0, 1):
+        scheduler.task_done(worker_index)
+    assert scheduler.concurrency[0] == 2.5
+    for _ in range(8):
+        scheduler.get(0)
+        scheduler.task_done(0)
+    assert scheduler.metrics()["a"] == {"queued": 0, "running": 0, "concurrency": 4}
+    assert scheduler.finished()
+
+
+def test_requeued_task_goes_back_to_its_shop():
+    scheduler = scheduler_with({"a": ["a1"], "b": []})
+
+    task, _ = scheduler.get(0)
+    assert scheduler.requeue(0, task) == "a"
+    scheduler.task_done(0)
+    assert not scheduler.finished()
+    assert scheduler.get(1) == ("a1", False)
+    scheduler.task_done(1)
+    assert scheduler.finished()
+
+    # Once the task is done the worker has no shop to put it back to
+    with pytest.raises(ValueError):
+        scheduler.requeue(1, "a1")
+    assert scheduler.finished()
+
+
+def test_retired_slots_get_no_tasks():
+    scheduler = ShopScheduler(["a"], 3, n_active=1)
+    scheduler.put("a", "a1")
+
+    assert scheduler.active_workers() == [0]
+    assert scheduler.wait_for_task(1) is None
+    scheduler.unpark(1)  # A retired slot stays parked
+    assert scheduler.is_retired(1)
+    scheduler.activate(2)
+    assert scheduler.wait_for_task(2) == ("a1", False)
+
+
+def test_shared_workers_finish_before_workers_split_per_shop():
+    shops = {"a": (12, 0.1), "b": (3, 0.2), "c": (3, 0.1), "d": (2, 0.15)}
+
+    per_shop = simulate(shops, 8, 4, shared=False)
+    shared = simulate(shops, 8, 4, shared=True)
+
+    assert shared < 0.8 * per_shop
+    assert shared < 2 * ideal_seconds(shops, 8, 4)
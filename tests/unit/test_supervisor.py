@@ -0,0 +1,118 @@
+import os
+import queue
+import time
+from multiprocessing import Manager, Process, Queue
+
+from UniversalWebshopScraper.generalized_scrapper.core.supervisor import Heartbeats, WorkerSupervisor, retry_task
+from UniversalWebshopScraper.generalized_scrapper.core.task_queue import WorkStealingQueues
+
+
+def flaky_worker(task_queues, status_queue, heartbeats, worker_index, seen, profile_dir):
+    """
+    Runs ("ok", i) and ("slow", i) tasks, hangs on the first run of a ("hang", i) task and dies on the first run of a ("crash", i).
+    """
+    os.makedirs(os.path.join(profile_dir, "pooled_chrome_1"), exist_ok=True)
+    while True:
+        result = task_queues.wait_for_task(worker_index)
+        if result is None:
+            break
+        task, _ = result
+        heartbeats.beat(worker_index)
+        status_queue.put(('start', worker_index, task))
+        first_run = task not in seen
+        seen[task] = True
+        if first_run and task[0] == "hang":
+            time.sleep(3600)
+        if first_run and task[0] == "crash":
+            os._exit(1)
+        if task[0] == "slow":
+            time.sleep(0.1)
+        status_queue.put(('done', worker_index, task))
+        task_queues.task_done()
+    status_queue.put(('exit', worker_index, os.getpid()))
+
+
+def supervise(tasks, tmp_path, heartbeat_timeout=1, max_attempts=3, n_active=None, scale=None):
+    task_queues = WorkStealingQueues(2, n_active=n_active)
+    task_queues.assign({"all": tasks})
+    status_queue = Queue()
+    heartbeats = Heartbeats(2)
+    manager = Manager()
+    seen = manager.dict()
+
+    def spawn(i):
+        process = Process(target=flaky_worker, args=(task_queues, status_queue, heartbeats, i, seen,
+                                                     supervisor.profile_dir(i)))
+        process.start()
+        return process
+
+    supervisor = WorkerSupervisor(2, spawn, task_queues, heartbeats, {}, profile_root=str(tmp_path / "profiles"),
+                                  heartbeat_timeout=heartbeat_timeout, max_attempts=max_attempts)
+    supervisor.start()
+    if scale:
+        scale(supervisor)
+
+    done, handled = [], []
+    deadline = time.monotonic() + 60
+    while supervisor.running():
+        assert time.monotonic() < deadline
+        try:
+            message = status_queue.get(timeout=0.2)
+        except queue.Empty:
+            handled += supervisor.check()
+            continue
+        status, worker_index = message[:2]
+        if status == 'start':
+            supervisor.task_started(worker_index, message[2])
+        elif status == 'done':
+            supervisor.task_ended(worker_index)
+            done.append(message[2])
+        elif status == 'exit':
+            supervisor.worker_exited(worker_index, message[2])
+    supervisor.stop()
+    manager.shutdown()
+    return done, handled, supervisor
+
+
+def test_dead_and_hung_workers_are_replaced_and_their_tasks_rerun(tmp_path):
+    tasks = [("ok", 0), ("crash", 1), ("ok", 2), ("hang", 3), ("ok", 4)]
+    done, handled, supervisor = supervise(tasks, tmp_path)
+
+    assert sorted(done) == sorted(tasks)
+    reasons = {task: reason for _, reason, task, _ in handled if task is not None}
+    assert reasons[("crash", 1)] == "died"
+    assert reasons[("hang", 3)].startswith("hung")
+    assert sum(supervisor.restarts.values()) == 2
+    assert not os.path.exists(tmp_path / "profiles")  # Reaped with the killed workers' profiles
+
+
+def test_task_failing_too_often_is_given_up():
+    task_queues = WorkStealingQueues(2)
+    task_attempts = {}
+    task_queues.put(0, "search")
+    targets = []
+    for _ in range(3):
+        task, _ = task_queues.get(0)  # Stolen back from the worker it was handed to
+        targets.append(retry_task(task_queues, task_attempts, 0, task, max_attempts=3))
+        task_queues.task_done()
+
+    assert targets == [1, 1, None]
+    assert task_attempts == {"search": 3}
+    assert task_queues.finished()
+
+
+def test_workers_are_added_and_retired(tmp_path):
+    tasks = [("slow", i) for i in range(10)]
+
+    def scale(supervisor):
+        assert supervisor.running_workers() == [0]
+        assert supervisor.add_worker() == 1
+        assert supervisor.add_worker() is None  # Every slot is in use
+        supervisor.retire_worker(0)
+        assert supervisor.running_workers() == [1]
+
+    done, handled, supervisor = supervise(tasks, tmp_path, n_active=1, scale=scale)
+    assert sorted(done) == tasks
+    assert handled == []
+    assert supervisor.restarts == {0: 0, 1: 0}  # The retired worker was not started again
+    assert supervisor.task_queues.is_retired(0)
@@ -0,0 +1,100 @@
+import time
+from multiprocessing import Process, Queue
+from UniversalWebshopScraper.generalized_scrapper.core.task_queue import WorkStealingQueues
+
+
+def drain(queues, worker_index):
+    tasks = []
+    while True:
+        result = queues.get(worker_index)
+        if result is None:
+            return tasks
+        tasks.append(result)
+        queues.task_done()
+
+
+def test_categories_stay_together_and_are_balanced():
+    queues = WorkStealingQueues(2)
+    assignment = queues.assign({"tv": list(range(5)), "audio": list(range(3)), "garden": list(range(2))})
+    assert assignment == {"tv": 0, "audio": 1, "garden": 1}
+
+    # A worker runs its own categories in order and only then steals from the other queue
+    tasks = drain(queues, 1)
+    assert tasks[:5] == [(0, False), (1, False), (2, False), (0, False), (1, False)]
+    assert tasks[5:] == [(i, True) for i in range(5)]
+
+
+def test_idle_worker_steals_and_exits_when_all_tasks_are_finished():
+    queues = WorkStealingQueues(3)
+    queues.assign({"tv": ["a", "b", "c"]})
+    assert queues.get(2) == ("a", True)
+    assert not queues.finished()  # "a" is taken but not finished
+    queues.task_done()
+
+    assert [task for task, _ in drain(queues, 0)] == ["b", "c"]
+    assert queues.finished()
+    assert queues.wait_for_task(1) is None
+
+
+def test_retired_slots_get_no_tasks():
+    queues = WorkStealingQueues(3, n_active=2)
+    assert queues.active_workers() == [0, 1]
+    assert set(queues.assign({"tv": [1, 2], "audio": [3], "garden": [4]}).values()) == {0, 1}
+    assert queues.requeue(0, 5) == 1
+
+    queues.retire(1)
+    queues.unpark(1)  # A retired worker coming back from a CAPTCHA stays parked
+    assert queues.requeue(0, 6) == 2  # The least loaded queue once every other slot is parked
+    assert queues.wait_for_task(1) is None
+
+    queues.activate(2)
+    assert queues.active_workers() == [0, 2]
+    assert queues.requeue(0, 7) == 2
+
+
+def slow_worker(queues, worker_index, results):
+    while True:
+        result = queues.wait_for_task(worker_index)
+        if result is None:
+            break
+        task, stolen = result
+        time.sleep(0.05 if task[0] == "slow" else 0.01)
+        results.put((worker_index, task, stolen))
+        queues.task_done()
+
+
+def test_workers_share_the_tasks_of_an_uneven_split():
+    queues = WorkStealingQueues(3)
+    queues.assign({"slow": [("slow", i) for i in range(12)], "fast": [("fast", i) for i in range(2)]})
+
+    results = Queue()
+    workers = [Process(target=slow_worker, args=(queues, i, results)) for i in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=30)
+
+    done = [results.get(timeout=5) for _ in range(14)]
+    assert sorted(task for _, task, _ in done) == sorted([("slow", i) for i in range(12)] +
+                                                          [("fast", i) for i in range(2)])
+    assert {worker_index for worker_index, _, _ in done} == {0, 1, 2}  # The idle worker helped
+    assert any(stolen for _, _, stolen in done)
+
+
+def test_requeued_task_goes_to_a_healthy_worker():
+    queues = WorkStealingQueues(3)
+    queues.put(1, "backlog")
+    queues.park(0)
+    assert queues.get(0) == ("backlog", True)
+
+    # Worker 0 hit a CAPTCHA: its search goes to the least loaded worker not parked
+    queues.park(2)
+    assert queues.requeue(0, "captcha search") == 1
+    queues.task_done()
+    assert queues.get(1) == ("captcha search", False)
+    queues.task_done()
+    assert queues.finished()
+
+    # With every other worker parked the task still waits in a queue
+    queues.park(1)
+    assert queues.requeue(0, "search") == 1
@@ -0,0 +1,185 @@
+from multiprocessing import Process
+
+import pytest
+
+from UniversalWebshopScraper.generalized_scrapper.core.generalized_scrapper import GeneralizedScraper
+from UniversalWebshopScraper.generalized_scrapper.core.generalized_scrapper import PARENT_BLOCKS_LIMIT
+from UniversalWebshopScraper.generalized_scrapper.core.url_dedup import (
+    FingerprintSet, SharedFingerprintSet, table_capacity, url_fingerprint
+)
+from UniversalWebshopScraper.generalized_scrapper.botleneck_testing.synthetic_pages import synthetic_listing_page
+
+
+class FakeDriver:
+    def __init__(self, html):
+        self.page_source = html
+
+
+@pytest.fixture
+def urls():
+    urls = SharedFingerprintSet(capacity=64)
+    yield urls
+    urls.unlink()
+
+
+def test_add_and_contains(urls):
+    assert urls.capacity == 64
+    assert "https://shop.test/p/1" not in urls
+    assert urls.add("https://shop.test/p/1")
+    assert not urls.add("https://shop.test/p/1")
+    urls.add("https://shop.test/p/2")
+    assert "https://shop.test/p/1" in urls and "https://shop.test/p/2" in urls
+    assert len(urls) == 2
+
+
+def test_full_set_stops_adding(urls):
+    for i in range(100):
+        urls.add(f"https://shop.test/p/{i}")
+    assert len(urls) == 48  # 75% of the slots
+    assert "https://shop.test/p/0" in urls
+    assert "https://shop.test/p/99" not in urls
+
+
+def test_age_eviction_forgets_the_oldest_urls():
+    urls = FingerprintSet(capacity=64, eviction="age")
+    for i in range(48 * 3):
+        assert urls.add(f"https://shop.test/p/{i}")
+
+    # Two generations of 48 URLs: the newest ones are kept, the first generation was dropped
+    assert all(f"https://shop.test/p/{i}" in urls for i in range(48, 48 * 3))
+    assert "https://shop.test/p/0" not in urls
+    assert urls.nbytes == 8 * (8 + 2 * 64)
+    assert urls.metrics()["evicted"] == 48 and urls.metrics()["rotations"] == 2
+
+
+def test_lru_eviction_keeps_the_urls_seen_again():
+    urls = FingerprintSet(capacity=64, eviction="lru")
+    for i in range(48):
+        urls.add(f"https://shop.test/p/{i}")
+    for i in range(48, 96):
+        assert "https://shop.test/p/0" in urls  # Copied to the current generation
+        urls.add(f"https://shop.test/p/{i}")
+    urls.add("https://shop.test/p/96")
+
+    assert "https://shop.test/p/0" in urls
+    assert "https://shop.test/p/1" not in urls
+
+
+def test_max_age_starts_a_new_generation(monkeypatch):
+    urls = FingerprintSet(capacity=64, eviction="age", max_age=60)
+    now = [1000.0]
+    monkeypatch.setattr("time.time", lambda: now[0])
+    urls.clear()
+    urls.add("https://shop.test/p/old")
+    now[0] += 61
+    urls.add("https://shop.test/p/1")
+    now[0] += 61
+    urls.add("https://shop.test/p/2")
+
+    assert "https://shop.test/p/old" not in urls
+    assert "https://shop.test/p/1" in urls and "https://shop.test/p/2" in urls
+
+
+def test_max_bytes_caps_the_memory():
+    assert table_capacity(max_bytes=1 << 20, eviction="lru") == 1 << 15
+    urls = FingerprintSet(max_bytes=1 << 20, eviction="lru")
+    assert urls.nbytes <= 1 << 20
+    for i in range(200000):
+        urls.add(f"https://shop.test/p/{i}")
+    assert urls.nbytes <= 1 << 20
+    assert len(urls) <= 2 * urls.max_size
+    assert "https://shop.test/p/199999" in urls
+    with pytest.raises(ValueError):
+        FingerprintSet(eviction="fifo")
+
+
+def test_fingerprint_is_stable():
+    # Workers started with spawn must compute the same fingerprints
+    assert url_fingerprint("https://shop.test/p/1") == 0xee2def6bddffc03b
+
+
+def add_urls(urls, start, stop):
+    for i in range(start, stop):
+        urls.add(f"https://shop.test/p/{i}")
+    urls.close()
+
+
+def test_processes_share_the_generations():
+    urls = SharedFingerprintSet(capacity=1024, eviction="age")
+    try:
+        worker = Process(target=add_urls, args=(urls, 0, 2000))
+        worker.start()
+        worker.join(timeout=30)
+
+        # The worker filled and rotated the generations, the main process sees its newest URLs only
+        assert urls.metrics()["rotations"] == 2
+        assert "https://shop.test/p/1999" in urls
+        assert "https://shop.test/p/0" not in urls
+    finally:
+        urls.unlink()
+
+
+def test_processes_share_the_set():
+    urls = SharedFingerprintSet(capacity=4096)
+    try:
+        # Overlapping ranges, every URL must be stored once
+        workers = [Process(target=add_urls, args=(urls, start, start + 1000)) for start in (0, 500, 1000)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(timeout=30)
+
+        assert len(urls) == 2000
+        assert all(f"https://shop.test/p/{i}" in urls for i in range(2000))
+        assert "https://shop.test/p/2000" not in urls
+    finally:
+        urls.unlink()
+
+
+def test_scraper_skips_urls_found_by_another_worker():
+    products = SharedFingerprintSet(capacity=1024)
+    images = SharedFingerprintSet(capacity=1024)
+    try:
+        scrapers = []
+        for _ in range(2):
+            scraper = GeneralizedScraper(offline_mode=True)
+            scraper.driver = FakeDriver(synthetic_listing_page(20, seed=1))
+            scraper.detected_products = products
+            scraper.detected_image_urls = images
+            scraper.detect_product_blocks(scraper.extract_page_structure())
+            scrapers.append(scraper)
+
+        assert len(scrapers[0].stored_products) == 20
+        assert len(scrapers[1].stored_products) == 0
+        # Same URLs as a scraper keeping them in its own set and list
+        single = GeneralizedScraper(offline_mode=True)
+        single.driver = FakeDriver(synthetic_listing_page(20, seed=1))
+        single.detected_image_urls = set()
+        single.detect_product_blocks(single.extract_page_structure())
+        assert len(products) == len(single.detected_products)
+        assert len(images) == len(single.detected_image_urls)
+    finally:
+        products.unlink()
+        images.unlink()
+
+
+def test_scraper_state_is_bounded():
+    scraper = GeneralizedScraper(offline_mode=True, dedup_max_bytes=1 << 20)
+    for i in range(PARENT_BLOCKS_LIMIT + 10):
+        scraper.parent_blocks.append(f"<div id='{i}'>")
+        scraper.detected_image_urls.add(f"https://img.shop.test/{i}.jpg")
+
+    metrics = scraper.memory_metrics()
+    assert metrics["parent_blocks"] == PARENT_BLOCKS_LIMIT
+    assert metrics["detected_image_urls"] == PARENT_BLOCKS_LIMIT + 10
+    assert metrics["detected_image_urls_bytes"] == scraper.detected_image_urls.nbytes
+    assert metrics["detected_products_evicted"] == 0
+
+
+def test_scraper_forgets_no_url_without_a_memory_ceiling():
+    scraper = GeneralizedScraper(offline_mode=True)
+    for i in range(100_000):
+        scraper.detected_products.add(f"https://shop.test/p/{i}")
+    assert len(scraper.detected_products) == 100_000
+    assert "https://shop.test/p/0" in scraper.detected_products
+    assert "detected_products_evicted" not in scraper.memory_metrics()